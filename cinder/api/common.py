@@ -25,6 +25,8 @@ import webob
 
 from cinder.api.openstack import wsgi
 from cinder.api import xmlutil
+from cinder.common import sqlalchemyutils
+from cinder import exception
 from cinder.i18n import _
 from cinder import utils
 
@@ -265,6 +267,22 @@ class ViewBuilder(object):
 
     _collection_name = None
 
+    # Set to True in a subclass whose collection is paginated by the DB API
+    # to have the next links carry a continuation token with the sort key
+    # values of the last item instead of its id.
+    _keyset_pagination = False
+
+    # API sort keys that map to a different item attribute
+    _sort_key_aliases = {}
+
+    def _lazy_view_list(self, func, request, items, key):
+        """Return the views of items, each rendered when it is accessed.
+
+        :param func: function returning the view of a single item, with the
+                     view under key
+        """
+        return wsgi.LazyList(items, lambda item: func(request, item)[key])
+
     def _get_links(self, request, identifier):
         return [{"rel": "self",
                  "href": self._get_href_link(request, identifier), },
@@ -275,6 +293,8 @@ class ViewBuilder(object):
         """Return href string with proper limit and marker params."""
         params = request.params.copy()
         params["marker"] = identifier
+        # The marker already points past the skipped items
+        params.pop("offset", None)
         prefix = self._update_link_prefix(get_request_url(request),
                                           CONF.osapi_volume_base_URL)
         url = os.path.join(prefix,
@@ -342,6 +362,9 @@ class ViewBuilder(object):
             last_item_id = last_item[id_key]
         else:
             last_item_id = last_item["id"]
+        if self._keyset_pagination:
+            last_item_id = self._get_marker_token(request, last_item,
+                                                  last_item_id)
         links.append({
             "rel": "next",
             "href": self._get_next_link(request, last_item_id,
@@ -349,6 +372,28 @@ class ViewBuilder(object):
         })
         return links
 
+    def _get_marker_token(self, request, item, item_id):
+        """Return a continuation token for the listing to resume after item.
+
+        The token carries the values of the sort keys of the request (plus
+        the created_at and id keys the DB API always sorts by) so the next
+        page can be fetched with an index seek, without looking up the
+        marker item first. Falls back to the item id if any of the values
+        is not available.
+        """
+        sort_keys, _sort_dirs = get_sort_params(request.params.copy())
+        values = {'id': item_id}
+        for sort_key in sort_keys + ['created_at']:
+            sort_key = self._sort_key_aliases.get(sort_key, sort_key)
+            if sort_key in values:
+                continue
+            try:
+                values[sort_key] = item[sort_key]
+            except (AttributeError, KeyError, NotImplementedError,
+                    exception.CinderException):
+                return item_id
+        return sqlalchemyutils.encode_marker(values)
+
     def _update_link_prefix(self, orig_url, prefix):
         if not prefix:
             return orig_url
@@ -14,6 +14,8 @@
 
 """The Extended Snapshot Attributes API extension."""
 
+import functools
+
 from oslo_log import log as logging
 
 from cinder.api import extensions
@@ -49,8 +51,8 @@ class ExtendedSnapshotAttributesController(wsgi.Controller):
         if authorize(context):
             # Attach our slave template to the response object
             resp_obj.attach(xml=ExtendedSnapshotAttributesTemplate())
-            for snapshot in list(resp_obj.obj['snapshots']):
-                self._extend_snapshot(req, snapshot)
+            resp_obj.extend_items(
+                'snapshots', functools.partial(self._extend_snapshot, req))
 
 
 class Extended_snapshot_attributes(extensions.ExtensionDescriptor):
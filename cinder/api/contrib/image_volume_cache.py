@@ -0,0 +1,100 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslo_log import log as logging
+import six
+import webob
+from webob import exc
+
+from cinder.api import extensions
+from cinder.api.openstack import wsgi
+from cinder import exception
+from cinder.i18n import _
+from cinder import volume as cinder_volume
+
+LOG = logging.getLogger(__name__)
+authorize = extensions.extension_authorizer('volume', 'image_volume_cache')
+
+
+class ImageVolumeCacheController(wsgi.Controller):
+    """The /os-image-volume-cache controller for the OpenStack API."""
+
+    def __init__(self, *args, **kwargs):
+        super(ImageVolumeCacheController, self).__init__(*args, **kwargs)
+        self.volume_api = cinder_volume.API()
+
+    def create(self, req, body):
+        """Pre-warm the image-volume cache of backends with an image.
+
+        Creates an image-volume cache entry for the image on each host,
+        e.g. ahead of a boot storm from it, so that the volumes created
+        from the image on these hosts are cloned from the cache.
+
+        Required HTTP Body:
+
+        {
+         'image_volume_cache':
+          {
+           'image_id': <ID of the image to cache>,
+           'hosts': [<Cinder host of the cache, including the pool, as in
+                      the os-vol-host-attr:host attribute of volumes>, ...],
+          }
+        }
+
+        The request returns once the hosts are validated, the cache entries
+        are created asynchronously.
+        """
+        context = req.environ['cinder.context']
+        authorize(context)
+
+        self.assert_valid_body(body, 'image_volume_cache')
+        cache = body['image_volume_cache']
+
+        image_id = cache.get('image_id')
+        hosts = cache.get('hosts')
+        if not isinstance(image_id, six.string_types) or not image_id:
+            msg = _("image_id must be a non-empty string.")
+            raise exc.HTTPBadRequest(explanation=msg)
+        if (not isinstance(hosts, list) or not hosts or
+                not all(isinstance(host, six.string_types) and host
+                        for host in hosts)):
+            msg = _("hosts must be a non-empty list of host names.")
+            raise exc.HTTPBadRequest(explanation=msg)
+
+        LOG.debug('Pre-warm image-volume cache request body: %s', body)
+
+        try:
+            self.volume_api.prewarm_image_volume_cache(context, image_id,
+                                                       hosts)
+        except exception.ImageNotFound as error:
+            raise exc.HTTPNotFound(explanation=error.msg)
+        except exception.ServiceNotFound:
+            msg = _("Service not found.")
+            raise exc.HTTPNotFound(explanation=msg)
+
+        return webob.Response(status_int=202)
+
+
+class Image_volume_cache(extensions.ExtensionDescriptor):
+    """Allows pre-warming the image-volume cache of backends."""
+
+    name = 'ImageVolumeCache'
+    alias = 'os-image-volume-cache'
+    namespace = ('http://docs.openstack.org/volume/ext/'
+                 'os-image-volume-cache/api/v1')
+    updated = '2016-01-04T00:00:00+00:00'
+
+    def get_resources(self):
+        controller = ImageVolumeCacheController()
+        res = extensions.ResourceExtension(Image_volume_cache.alias,
+                                           controller)
+        return [res]
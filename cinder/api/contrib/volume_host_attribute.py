@@ -12,6 +12,8 @@
 #   License for the specific language governing permissions and limitations
 #   under the License.
 
+import functools
+
 from oslo_log import log as logging
 
 from cinder.api import extensions
@@ -43,8 +45,9 @@ class VolumeHostAttributeController(wsgi.Controller):
         context = req.environ['cinder.context']
         if authorize(context):
             resp_obj.attach(xml=VolumeListHostAttributeTemplate())
-            for vol in list(resp_obj.obj['volumes']):
-                self._add_volume_host_attribute(req, vol)
+            resp_obj.extend_items(
+                'volumes',
+                functools.partial(self._add_volume_host_attribute, req))
 
 
 class Volume_host_attribute(extensions.ExtensionDescriptor):
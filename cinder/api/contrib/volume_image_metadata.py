@@ -13,6 +13,7 @@
 #   under the License.
 
 """The Volume Image Metadata API extension."""
+import functools
 import logging
 
 import six
@@ -67,20 +68,23 @@ class VolumeImageMetadataController(wsgi.Controller):
                             dict means there is no metadata and it should not
                             be retrieved from the db.
         """
-        vol_id_list = []
-        for vol in resp_volume_list:
-            vol_id_list.append(vol['id'])
         if image_metas is None:
-            try:
-                image_metas = self.volume_api.get_list_volumes_image_metadata(
-                    context, vol_id_list)
-            except Exception as e:
-                LOG.debug('Get image metadata error: %s', e)
-                return
+            image_metas = self._get_list_image_metadata(
+                context, [vol['id'] for vol in resp_volume_list])
         if image_metas:
             for vol in resp_volume_list:
-                image_meta = image_metas.get(vol['id'], {})
-                vol['volume_image_metadata'] = dict(image_meta)
+                self._set_image_metadata(image_metas, vol)
+
+    def _get_list_image_metadata(self, context, vol_id_list):
+        try:
+            return self.volume_api.get_list_volumes_image_metadata(
+                context, vol_id_list)
+        except Exception as e:
+            LOG.debug('Get image metadata error: %s', e)
+
+    def _set_image_metadata(self, image_metas, resp_volume):
+        image_meta = image_metas.get(resp_volume['id'], {})
+        resp_volume['volume_image_metadata'] = dict(image_meta)
 
     @wsgi.extends
     def show(self, req, resp_obj, id):
@@ -95,8 +99,16 @@ class VolumeImageMetadataController(wsgi.Controller):
         if authorize(context):
             resp_obj.attach(xml=VolumesImageMetadataTemplate())
             # Just get the image metadata of those volumes in response.
-            self._add_image_metadata(context,
-                                     list(resp_obj.obj.get('volumes', [])))
+            volumes = resp_obj.obj.get('volumes', [])
+            if isinstance(volumes, wsgi.LazyList):
+                # Don't render the views only to get the volume ids
+                volumes = volumes.items
+            image_metas = self._get_list_image_metadata(
+                context, [vol['id'] for vol in volumes])
+            if image_metas:
+                resp_obj.extend_items(
+                    'volumes',
+                    functools.partial(self._set_image_metadata, image_metas))
 
     @wsgi.action("os-set_image_metadata")
     @wsgi.serializers(xml=common.MetadataTemplate)
@@ -12,6 +12,8 @@
 #   License for the specific language governing permissions and limitations
 #   under the License.
 
+import functools
+
 from cinder.api import extensions
 from cinder.api.openstack import wsgi
 from cinder.api import xmlutil
@@ -41,8 +43,9 @@ class VolumeMigStatusAttributeController(wsgi.Controller):
         context = req.environ['cinder.context']
         if authorize(context):
             resp_obj.attach(xml=VolumeListMigStatusAttributeTemplate())
-            for vol in list(resp_obj.obj['volumes']):
-                self._add_volume_mig_status_attribute(req, vol)
+            resp_obj.extend_items(
+                'volumes',
+                functools.partial(self._add_volume_mig_status_attribute, req))
 
 
 class Volume_mig_status_attribute(extensions.ExtensionDescriptor):
@@ -12,6 +12,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import functools
+
 from oslo_log import log as logging
 import six
 import webob
@@ -58,8 +60,9 @@ class VolumeReplicationController(wsgi.Controller):
         context = req.environ['cinder.context']
         if authorize(context):
             resp_obj.attach(xml=VolumeReplicationListAttributeTemplate())
-            for vol in list(resp_obj.obj['volumes']):
-                self._add_replication_attributes(req, vol)
+            resp_obj.extend_items(
+                'volumes',
+                functools.partial(self._add_replication_attributes, req))
 
     @wsgi.response(202)
     @wsgi.action('os-promote-replica')
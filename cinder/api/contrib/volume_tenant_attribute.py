@@ -12,6 +12,8 @@
 #   License for the specific language governing permissions and limitations
 #   under the License.
 
+import functools
+
 from cinder.api import extensions
 from cinder.api.openstack import wsgi
 from cinder.api import xmlutil
@@ -40,8 +42,9 @@ class VolumeTenantAttributeController(wsgi.Controller):
         context = req.environ['cinder.context']
         if authorize(context):
             resp_obj.attach(xml=VolumeListTenantAttributeTemplate())
-            for vol in list(resp_obj.obj['volumes']):
-                self._add_volume_tenant_attribute(req, vol)
+            resp_obj.extend_items(
+                'volumes',
+                functools.partial(self._add_volume_tenant_attribute, req))
 
 
 class Volume_tenant_attribute(extensions.ExtensionDescriptor):
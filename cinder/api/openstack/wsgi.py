@@ -25,6 +25,7 @@ from oslo_log import log as logging
 from oslo_log import versionutils
 from oslo_serialization import jsonutils
 from oslo_utils import excutils
+from oslo_utils import units
 import six
 import webob
 
@@ -40,6 +41,9 @@ XML_NS_V2 = 'http://docs.openstack.org/api/openstack-block-storage/2.0/content'
 XML_NS_ATOM = 'http://www.w3.org/2005/Atom'
 XML_WARNING = False
 
+# Size of the chunks of a streamed JSON response body
+STREAM_CHUNK_SIZE = 64 * units.Ki
+
 LOG = logging.getLogger(__name__)
 
 SUPPORTED_CONTENT_TYPES = (
@@ -411,6 +415,43 @@ class JSONDictSerializer(DictSerializer):
     def default(self, data):
         return jsonutils.dumps(data)
 
+    def serialize_iter(self, data, chunk_size=STREAM_CHUNK_SIZE):
+        """Serialize data to JSON as an iterator of byte string chunks.
+
+        The items of the LazyList values of data are rendered and encoded
+        one at a time, so the whole response never needs to be held in
+        memory, neither as a structure nor as a string.
+        """
+        buf = []
+        buf_size = 0
+        for part in self._iterencode(data):
+            if isinstance(part, six.text_type):
+                part = part.encode('utf-8')
+            buf.append(part)
+            buf_size += len(part)
+            if buf_size >= chunk_size:
+                yield b''.join(buf)
+                buf = []
+                buf_size = 0
+        if buf:
+            yield b''.join(buf)
+
+    def _iterencode(self, data):
+        if isinstance(data, dict):
+            yield '{'
+            for i, (key, value) in enumerate(data.items()):
+                yield '%s%s: ' % (', ' if i else '', jsonutils.dumps(key))
+                for part in self._iterencode(value):
+                    yield part
+            yield '}'
+        elif isinstance(data, LazyList):
+            yield '['
+            for i, item in enumerate(data):
+                yield '%s%s' % (', ' if i else '', jsonutils.dumps(item))
+            yield ']'
+        else:
+            yield jsonutils.dumps(data)
+
 
 class XMLDictSerializer(DictSerializer):
 
@@ -563,6 +604,66 @@ def response(code):
     return decorator
 
 
+class LazyList(object):
+    """Read-only list of views rendered from their items on access.
+
+    List views of large collections use it so that the view of each item
+    only exists while it is being serialized (see
+    JSONDictSerializer.serialize_iter) instead of building them all up
+    front.  Extensions can't modify the rendered views in place, they
+    register a function with add_extension which is then called on every
+    view after it is rendered.
+    """
+
+    def __init__(self, items, render):
+        self._items = items
+        self._render = render
+        self._extensions = []
+
+    @property
+    def items(self):
+        """The items the views are rendered from, without rendering them."""
+        items = self._items
+        while isinstance(items, LazyList):
+            items = items._items
+        return items
+
+    def add_extension(self, func):
+        self._extensions.append(func)
+
+    def _get(self, item):
+        view = self._render(item)
+        for func in self._extensions:
+            func(view)
+        return view
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        for item in self._items:
+            yield self._get(item)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._get(item) for item in self._items[index]]
+        return self._get(self._items[index])
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+def _has_lazy_list(data):
+    return (isinstance(data, dict) and
+            any(isinstance(value, LazyList) for value in data.values()))
+
+
 class ResponseObject(object):
     """Bundles a response object with appropriate serializers.
 
@@ -660,6 +761,21 @@ class ResponseObject(object):
         if self.media_type in kwargs:
             self.serializer.attach(kwargs[self.media_type])
 
+    def extend_items(self, key, func):
+        """Call func on every item of the list under key of the response.
+
+        Items of a LazyList are only rendered while serializing the
+        response, so func is then registered to be called on each of them
+        once rendered.
+        """
+
+        items = self.obj.get(key)
+        if isinstance(items, LazyList):
+            items.add_extension(func)
+        else:
+            for item in items or []:
+                func(item)
+
     def serialize(self, request, content_type, default_serializers=None):
         """Serializes the wrapped object.
 
@@ -680,7 +796,15 @@ class ResponseObject(object):
             response.headers[hdr] = value
         response.headers['Content-Type'] = content_type
         if self.obj is not None:
-            body = serializer.serialize(self.obj)
+            obj = self.obj
+            if _has_lazy_list(obj):
+                if isinstance(serializer, JSONDictSerializer):
+                    # No Content-Length, the body is sent chunked
+                    response.app_iter = serializer.serialize_iter(obj)
+                    return response
+                obj = {key: list(value) if isinstance(value, LazyList)
+                       else value for key, value in obj.items()}
+            body = serializer.serialize(obj)
             if isinstance(body, six.text_type):
                 body = body.encode('utf-8')
             response.body = body
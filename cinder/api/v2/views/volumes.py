@@ -25,6 +25,11 @@ class ViewBuilder(common.ViewBuilder):
     """Model a server API response as a python dictionary."""
 
     _collection_name = "volumes"
+    _keyset_pagination = True
+    _sort_key_aliases = {"name": "display_name"}
+
+    # Volume columns used by the summary view and its next link
+    summary_columns = ('id', 'display_name', 'created_at')
 
     def __init__(self):
         """Initialize view builder."""
@@ -137,7 +142,7 @@ class ViewBuilder(common.ViewBuilder):
                           for a pagination query
         :returns: Volume data in dictionary format
         """
-        volumes_list = [func(request, volume)['volume'] for volume in volumes]
+        volumes_list = self._lazy_view_list(func, request, volumes, 'volume')
         volumes_links = self._get_collection_links(request,
                                                    volumes,
                                                    coll_name,
@@ -167,6 +167,13 @@ class CreateDeserializer(CommonDeserializer):
         return {'body': {'volume': volume}}
 
 
+def _get_volume_with_admin_metadata(volume):
+    """Return a copy of the volume with its visible admin metadata."""
+    volume = dict(volume)
+    utils.add_visible_admin_metadata(volume)
+    return volume
+
+
 class VolumeController(wsgi.Controller):
     """The Volumes API controller for the OpenStack API."""
 
@@ -241,22 +248,28 @@ class VolumeController(wsgi.Controller):
             filters['display_name'] = filters['name']
             del filters['name']
 
+        # The summary view only needs a few columns, plus the sort keys for
+        # the next link, so there's no need to load the related models.
+        columns = None
+        if not is_detail:
+            columns = list(
+                set(self._view_builder.summary_columns).union(sort_keys))
+
         self.volume_api.check_volume_filters(filters)
         volumes = self.volume_api.get_all(context, marker, limit,
                                           sort_keys=sort_keys,
                                           sort_dirs=sort_dirs,
                                           filters=filters,
                                           viewable_admin_meta=True,
-                                          offset=offset)
-
-        volumes = [dict(vol) for vol in volumes]
-
-        for volume in volumes:
-            utils.add_visible_admin_metadata(volume)
+                                          offset=offset,
+                                          columns=columns)
 
         req.cache_db_volumes(volumes)
 
         if is_detail:
+            # The views are rendered while the response is streamed, so
+            # only copy each volume to add its admin metadata at that time.
+            volumes = wsgi.LazyList(volumes, _get_volume_with_admin_metadata)
             volumes = self._view_builder.detail_list(req, volumes)
         else:
             volumes = self._view_builder.summary_list(req, volumes)
@@ -25,6 +25,7 @@ class ViewBuilder(common.ViewBuilder):
     """Model backup API responses as a python dictionary."""
 
     _collection_name = "backups"
+    _keyset_pagination = True
 
     def __init__(self):
         """Initialize view builder."""
@@ -83,7 +84,7 @@ class ViewBuilder(common.ViewBuilder):
 
     def _list_view(self, func, request, backups, backup_count):
         """Provide a view for a list of backups."""
-        backups_list = [func(request, backup)['backup'] for backup in backups]
+        backups_list = self._lazy_view_list(func, request, backups, 'backup')
         backups_links = self._get_collection_links(request,
                                                    backups,
                                                    self._collection_name,
@@ -25,6 +25,7 @@ class ViewBuilder(common.ViewBuilder):
     """Model snapshot API responses as a python dictionary."""
 
     _collection_name = "snapshots"
+    _keyset_pagination = True
 
     def __init__(self):
         """Initialize view builder."""
@@ -69,8 +70,8 @@ class ViewBuilder(common.ViewBuilder):
     def _list_view(self, func, request, snapshots, snapshot_count,
                    coll_name=_collection_name):
         """Provide a view for a list of snapshots."""
-        snapshots_list = [func(request, snapshot)['snapshot']
-                          for snapshot in snapshots]
+        snapshots_list = self._lazy_view_list(func, request, snapshots,
+                                              'snapshot')
         snapshots_links = self._get_collection_links(request,
                                                      snapshots,
                                                      coll_name,
@@ -22,11 +22,16 @@
 """
 
 import abc
+import collections
+import contextlib
 import hashlib
 import json
 import os
+import sys
+import time
 
 import eventlet
+from eventlet import tpool
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_service import loopingcall
@@ -45,12 +50,130 @@ LOG = logging.getLogger(__name__)
 chunkedbackup_service_opts = [
     cfg.StrOpt('backup_compression_algorithm',
                default='zlib',
-               help='Compression algorithm (None to disable)'),
+               help='Compression algorithm (None to disable). lz4 and zstd '
+                    'need the lz4 and zstandard libraries and fall back to '
+                    'zlib when those are not installed.'),
+    cfg.IntOpt('backup_objects_in_flight',
+               default=4,
+               help='Maximum number of backup objects being compressed and '
+                    'written concurrently while the volume is read, or '
+                    'fetched and decompressed ahead of being written to the '
+                    'volume on restore, for chunked backup drivers. Each '
+                    'object in flight holds up to one backup chunk in '
+                    'memory.'),
+    cfg.IntOpt('backup_status_check_interval',
+               default=30,
+               help='Interval in seconds between the checks of the status '
+                    'of a backup being created by a chunked backup driver, '
+                    'to stop it if it was deleted by another process. '
+                    'Deleting it through the backup service running it '
+                    'stops it straight away.'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(chunkedbackup_service_opts)
 
+# Compression algorithms backed by optional libraries. Backups fall back to
+# zlib when the configured one is not installed.
+_OPTIONAL_COMPRESSORS = ('lz4', 'zstd', 'zstandard')
+
+# Before compressing a chunk, a few evenly spaced samples of it are
+# compressed. If they do not shrink below this ratio the chunk is stored
+# uncompressed, instead of compressing it all only to throw the result away.
+_PROBE_SAMPLES = 4
+_PROBE_SAMPLE_SIZE = 4 * units.Ki
+_PROBE_MAX_RATIO = 0.95
+
+
+class _ZstdCompressor(object):
+    """zlib-like interface to the zstandard library.
+
+       zstandard (de)compressor objects must not be shared between threads,
+       so a new one is used for each call.
+    """
+
+    def __init__(self, zstandard):
+        self._zstandard = zstandard
+
+    def compress(self, data):
+        return self._zstandard.ZstdCompressor().compress(data)
+
+    def decompress(self, data):
+        return self._zstandard.ZstdDecompressor().decompress(data)
+
+
+class _StageTimes(object):
+    """Seconds spent in each stage of a backup.
+
+       They are sent in the progress notifications. Objects in flight are
+       compressed and written concurrently with reading the volume, so the
+       stages can add up to more than the elapsed time.
+    """
+
+    STAGES = ('read', 'hash', 'compress', 'write')
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(self.STAGES, 0.0)
+
+    @contextlib.contextmanager
+    def measure(self, stage):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.seconds[stage] += time.time() - start
+
+    def to_dict(self):
+        return {stage: round(seconds, 3)
+                for stage, seconds in self.seconds.items()}
+
+
+def _capture_errors(func, *args):
+    """Call func, returning its result or the error it raised.
+
+       Used for green threads whose result is waited on later, so that a
+       failure is raised by the waiter instead of being logged by the hub.
+    """
+    try:
+        return func(*args), None
+    except Exception:
+        return None, sys.exc_info()
+
+
+class _ObjectWriterPool(object):
+    """Bounded pool of green threads writing backup objects.
+
+       spawn() blocks while the pool is full, so at most ``size`` objects
+       are in flight at any time. The first error raised by a writer is
+       kept and re-raised by check() or wait() in the calling thread.
+    """
+
+    def __init__(self, size):
+        self._pool = eventlet.GreenPool(max(1, size))
+        self._error = None
+
+    def _run(self, func, *args):
+        try:
+            func(*args)
+        except Exception:
+            if self._error is None:
+                self._error = sys.exc_info()
+
+    def spawn(self, func, *args):
+        self.check()
+        self._pool.spawn_n(self._run, func, *args)
+
+    def check(self):
+        if self._error is not None:
+            six.reraise(*self._error)
+
+    def waitall(self):
+        self._pool.waitall()
+
+    def wait(self):
+        self.waitall()
+        self.check()
+
 
 @six.add_metaclass(abc.ABCMeta)
 class ChunkedBackupDriver(driver.BackupDriver):
@@ -77,12 +200,29 @@ class ChunkedBackupDriver(driver.BackupDriver):
             elif algorithm.lower() in ('bz2', 'bzip2'):
                 import bz2 as compressor
                 return compressor
+            elif algorithm.lower() == 'lz4':
+                import lz4.frame as compressor
+                return compressor
+            elif algorithm.lower() in ('zstd', 'zstandard'):
+                import zstandard
+                return _ZstdCompressor(zstandard)
         except ImportError:
             pass
 
         err = _('unsupported compression algorithm: %s') % algorithm
         raise ValueError(err)
 
+    def _get_backup_compressor(self, algorithm):
+        """Return the algorithm name and compressor used for new backups."""
+        try:
+            return algorithm.lower(), self._get_compressor(algorithm)
+        except ValueError:
+            if algorithm.lower() not in _OPTIONAL_COMPRESSORS:
+                raise
+            LOG.warning(_LW('Compression algorithm %s is not available, '
+                            'using zlib instead.'), algorithm)
+            return 'zlib', self._get_compressor('zlib')
+
     def __init__(self, context, chunk_size_bytes, sha_block_size_bytes,
                  backup_default_container, enable_progress_timer,
                  db_driver=None):
@@ -95,10 +235,11 @@ class ChunkedBackupDriver(driver.BackupDriver):
         self.backup_timer_interval = CONF.backup_timer_interval
         self.data_block_num = CONF.backup_object_number_per_notification
         self.az = CONF.storage_availability_zone
-        self.backup_compression_algorithm = CONF.backup_compression_algorithm
-        self.compressor = \
-            self._get_compressor(CONF.backup_compression_algorithm)
+        self.backup_compression_algorithm, self.compressor = \
+            self._get_backup_compressor(CONF.backup_compression_algorithm)
         self.support_force_delete = True
+        self.stage_times = _StageTimes()
+        self._status_checked_at = None
 
     # To create your own "chunked" backup driver, implement the following
     # abstract methods.
@@ -295,8 +436,13 @@ class ChunkedBackupDriver(driver.BackupDriver):
                 volume_size_bytes)
 
     def _backup_chunk(self, backup, container, data, data_offset,
-                      object_meta, extra_metadata):
-        """Backup data chunk based on the object metadata and offset."""
+                      object_meta, extra_metadata, writers=None):
+        """Backup data chunk based on the object metadata and offset.
+
+           The object is added to the metadata list straight away so the list
+           keeps the volume order. If writers is given the chunk is compressed
+           and written by that pool, otherwise it is written before returning.
+        """
         object_prefix = object_meta['prefix']
         object_list = object_meta['list']
 
@@ -306,37 +452,70 @@ class ChunkedBackupDriver(driver.BackupDriver):
         obj[object_name] = {}
         obj[object_name]['offset'] = data_offset
         obj[object_name]['length'] = len(data)
-        LOG.debug('Backing up chunk of data from volume.')
-        algorithm, output_data = self._prepare_output_data(data)
-        obj[object_name]['compression'] = algorithm
-        LOG.debug('About to put_object')
-        with self.get_object_writer(
-                container, object_name, extra_metadata=extra_metadata
-        ) as writer:
-            writer.write(output_data)
-        md5 = hashlib.md5(data).hexdigest()
-        obj[object_name]['md5'] = md5
-        LOG.debug('backup MD5 for %(object_name)s: %(md5)s',
-                  {'object_name': object_name, 'md5': md5})
         object_list.append(obj)
         object_id += 1
         object_meta['list'] = object_list
         object_meta['id'] = object_id
 
+        if writers is None:
+            self._write_chunk(container, object_name, data, obj[object_name],
+                              extra_metadata)
+        else:
+            writers.spawn(self._write_chunk, container, object_name, data,
+                          obj[object_name], extra_metadata)
+
         LOG.debug('Calling eventlet.sleep(0)')
         eventlet.sleep(0)
 
+    def _write_chunk(self, container, object_name, data, object_info,
+                     extra_metadata):
+        """Compress a chunk of data and write it to a backup object."""
+        LOG.debug('Backing up chunk of data from volume.')
+        # Compression and hashing release the GIL, so run them in a native
+        # thread to overlap with reading the volume and other writes.
+        with self.stage_times.measure('compress'):
+            algorithm, output_data = tpool.execute(self._prepare_output_data,
+                                                   data)
+        object_info['compression'] = algorithm
+        LOG.debug('About to put_object')
+        with self.stage_times.measure('write'):
+            with self.get_object_writer(
+                    container, object_name, extra_metadata=extra_metadata
+            ) as writer:
+                writer.write(output_data)
+        with self.stage_times.measure('hash'):
+            md5 = tpool.execute(hashlib.md5, data).hexdigest()
+        object_info['md5'] = md5
+        LOG.debug('backup MD5 for %(object_name)s: %(md5)s',
+                  {'object_name': object_name, 'md5': md5})
+
+    def _is_compressible(self, data):
+        """Guess from a few samples whether compressing data pays off."""
+        data_size_bytes = len(data)
+        if data_size_bytes <= 2 * _PROBE_SAMPLES * _PROBE_SAMPLE_SIZE:
+            return True
+        step = data_size_bytes // _PROBE_SAMPLES
+        sample = b''.join(data[i * step:i * step + _PROBE_SAMPLE_SIZE]
+                          for i in range(_PROBE_SAMPLES))
+        compressed_sample = self.compressor.compress(sample)
+        return len(compressed_sample) < len(sample) * _PROBE_MAX_RATIO
+
     def _prepare_output_data(self, data):
         if self.compressor is None:
             return 'none', data
         data_size_bytes = len(data)
+        if not self._is_compressible(data):
+            LOG.debug('Chunk of %(data_size_bytes)d bytes looks '
+                      'incompressible, using original data for this chunk.',
+                      {'data_size_bytes': data_size_bytes})
+            return 'none', data
         compressed_data = self.compressor.compress(data)
         comp_size_bytes = len(compressed_data)
-        algorithm = CONF.backup_compression_algorithm.lower()
+        algorithm = self.backup_compression_algorithm
         if comp_size_bytes >= data_size_bytes:
             LOG.debug('Compression of this chunk was ineffective: '
                       'original length: %(data_size_bytes)d, '
-                      'compressed length: %(compressed_size_bytes)d. '
+                      'compressed length: %(comp_size_bytes)d. '
                       'Using original data for this chunk.',
                       {'data_size_bytes': data_size_bytes,
                        'comp_size_bytes': comp_size_bytes,
@@ -388,6 +567,7 @@ class ChunkedBackupDriver(driver.BackupDriver):
 
     def _send_progress_end(self, context, backup, object_meta):
         object_meta['backup_percent'] = 100
+        object_meta['stage_seconds'] = self.stage_times.to_dict()
         volume_utils.notify_about_backup_usage(context,
                                                backup,
                                                "createprogress",
@@ -398,12 +578,35 @@ class ChunkedBackupDriver(driver.BackupDriver):
                                     total_block_sent_num, total_volume_size):
         backup_percent = total_block_sent_num * 100 / total_volume_size
         object_meta['backup_percent'] = backup_percent
+        object_meta['stage_seconds'] = self.stage_times.to_dict()
         volume_utils.notify_about_backup_usage(context,
                                                backup,
                                                "createprogress",
                                                extra_usage_info=
                                                object_meta)
 
+    def _backup_cancelled(self, backup):
+        """Whether the backup was deleted while it is being created.
+
+           The backup manager cancels the backups it deletes straight away.
+           The backup status is only checked every
+           backup_status_check_interval seconds, in case another process
+           deleted it.
+        """
+        if self.is_cancelled():
+            return True
+        now = time.time()
+        if (self._status_checked_at is not None and
+                now - self._status_checked_at <
+                CONF.backup_status_check_interval):
+            return False
+        self._status_checked_at = now
+        try:
+            backup = objects.Backup.get_by_id(self.context, backup.id)
+        except exception.BackupNotFound:
+            return True
+        return backup.status in ('deleting', 'deleted')
+
     def backup(self, backup, volume_file, backup_metadata=True):
         """Backup the given volume.
 
@@ -444,6 +647,8 @@ class ChunkedBackupDriver(driver.BackupDriver):
 
         counter = 0
         total_block_sent_num = 0
+        self.stage_times = _StageTimes()
+        self._status_checked_at = None
 
         # There are two mechanisms to send the progress notification.
         # 1. The notifications are periodically sent in a certain interval.
@@ -463,92 +668,104 @@ class ChunkedBackupDriver(driver.BackupDriver):
         sha256_list = object_sha256['sha256s']
         shaindex = 0
         is_backup_canceled = False
-        while True:
-            # First of all, we check the status of this backup. If it
-            # has been changed to delete or has been deleted, we cancel the
-            # backup process to do forcing delete.
-            backup = objects.Backup.get_by_id(self.context, backup.id)
-            if 'deleting' == backup.status or 'deleted' == backup.status:
-                is_backup_canceled = True
-                # To avoid the chunk left when deletion complete, need to
-                # clean up the object of chunk again.
-                self.delete(backup)
-                LOG.debug('Cancel the backup process of %s.', backup.id)
-                break
-            data_offset = volume_file.tell()
-            data = volume_file.read(self.chunk_size_bytes)
-            if data == b'':
-                break
-
-            # Calculate new shas with the datablock.
-            shalist = []
-            off = 0
-            datalen = len(data)
-            while off < datalen:
-                chunk_start = off
-                chunk_end = chunk_start + self.sha_block_size_bytes
-                if chunk_end > datalen:
-                    chunk_end = datalen
-                chunk = data[chunk_start:chunk_end]
-                sha = hashlib.sha256(chunk).hexdigest()
-                shalist.append(sha)
-                off += self.sha_block_size_bytes
-            sha256_list.extend(shalist)
-
-            # If parent_backup is not None, that means an incremental
-            # backup will be performed.
-            if parent_backup:
-                # Find the extent that needs to be backed up.
-                extent_off = -1
-                for idx, sha in enumerate(shalist):
-                    if sha != parent_backup_shalist[shaindex]:
-                        if extent_off == -1:
-                            # Start of new extent.
-                            extent_off = idx * self.sha_block_size_bytes
-                    else:
-                        if extent_off != -1:
-                            # We've reached the end of extent.
-                            extent_end = idx * self.sha_block_size_bytes
-                            segment = data[extent_off:extent_end]
-                            self._backup_chunk(backup, container, segment,
-                                               data_offset + extent_off,
-                                               object_meta,
-                                               extra_metadata)
-                            extent_off = -1
-                    shaindex += 1
-
-                # The last extent extends to the end of data buffer.
-                if extent_off != -1:
-                    extent_end = datalen
-                    segment = data[extent_off:extent_end]
-                    self._backup_chunk(backup, container, segment,
-                                       data_offset + extent_off,
-                                       object_meta, extra_metadata)
+        # Chunks are compressed and written by a bounded pool of writers
+        # while the next ones are read and hashed here, so the metadata
+        # object list and the sha256 list keep the volume order.
+        writers = _ObjectWriterPool(CONF.backup_objects_in_flight)
+        try:
+            while True:
+                # First of all, we check whether this backup has been
+                # deleted, in which case we cancel the backup process to do
+                # forcing delete.
+                if self._backup_cancelled(backup):
+                    is_backup_canceled = True
+                    writers.waitall()
+                    # To avoid the chunk left when deletion complete, need to
+                    # clean up the object of chunk again.
+                    self.delete(backup)
+                    LOG.debug('Cancel the backup process of %s.', backup.id)
+                    break
+                data_offset = volume_file.tell()
+                with self.stage_times.measure('read'):
+                    data = volume_file.read(self.chunk_size_bytes)
+                if data == b'':
+                    break
+
+                # Calculate new shas with the datablock.
+                shalist = []
+                off = 0
+                datalen = len(data)
+                with self.stage_times.measure('hash'):
+                    while off < datalen:
+                        chunk_start = off
+                        chunk_end = chunk_start + self.sha_block_size_bytes
+                        if chunk_end > datalen:
+                            chunk_end = datalen
+                        chunk = data[chunk_start:chunk_end]
+                        sha = hashlib.sha256(chunk).hexdigest()
+                        shalist.append(sha)
+                        off += self.sha_block_size_bytes
+                sha256_list.extend(shalist)
+
+                # If parent_backup is not None, that means an incremental
+                # backup will be performed.
+                if parent_backup:
+                    # Find the extent that needs to be backed up.
                     extent_off = -1
-            else:  # Do a full backup.
-                self._backup_chunk(backup, container, data, data_offset,
-                                   object_meta, extra_metadata)
-
-            # Notifications
-            total_block_sent_num += self.data_block_num
-            counter += 1
-            if counter == self.data_block_num:
-                # Send the notification to Ceilometer when the chunk
-                # number reaches the data_block_num.  The backup percentage
-                # is put in the metadata as the extra information.
-                self._send_progress_notification(self.context, backup,
-                                                 object_meta,
-                                                 total_block_sent_num,
-                                                 volume_size_bytes)
-                # Reset the counter
-                counter = 0
-
-        # Stop the timer.
-        timer.stop()
+                    for idx, sha in enumerate(shalist):
+                        if sha != parent_backup_shalist[shaindex]:
+                            if extent_off == -1:
+                                # Start of new extent.
+                                extent_off = idx * self.sha_block_size_bytes
+                        else:
+                            if extent_off != -1:
+                                # We've reached the end of extent.
+                                extent_end = idx * self.sha_block_size_bytes
+                                segment = data[extent_off:extent_end]
+                                self._backup_chunk(backup, container, segment,
+                                                   data_offset + extent_off,
+                                                   object_meta,
+                                                   extra_metadata, writers)
+                                extent_off = -1
+                        shaindex += 1
+
+                    # The last extent extends to the end of data buffer.
+                    if extent_off != -1:
+                        extent_end = datalen
+                        segment = data[extent_off:extent_end]
+                        self._backup_chunk(backup, container, segment,
+                                           data_offset + extent_off,
+                                           object_meta, extra_metadata,
+                                           writers)
+                        extent_off = -1
+                else:  # Do a full backup.
+                    self._backup_chunk(backup, container, data, data_offset,
+                                       object_meta, extra_metadata, writers)
+
+                # Notifications
+                total_block_sent_num += self.data_block_num
+                counter += 1
+                if counter == self.data_block_num:
+                    # Send the notification to Ceilometer when the chunk
+                    # number reaches the data_block_num.  The backup percentage
+                    # is put in the metadata as the extra information.
+                    self._send_progress_notification(self.context, backup,
+                                                     object_meta,
+                                                     total_block_sent_num,
+                                                     volume_size_bytes)
+                    # Reset the counter
+                    counter = 0
+        finally:
+            # Never leave writes running behind a failed backup.
+            writers.waitall()
+            # Stop the timer.
+            timer.stop()
         # If backup has been cancelled we have nothing more to do
         # but timer.stop().
         if is_backup_canceled:
             return
+        # Raise the first error hit while writing an object, if any.
+        writers.check()
         # All the data have been sent, the backup_percent reaches 100.
         self._send_progress_end(self.context, backup, object_meta)
 
@@ -565,6 +782,22 @@ class ChunkedBackupDriver(driver.BackupDriver):
 
         self._finalize_backup(backup, container, object_meta, object_sha256)
 
+    def _read_object(self, container, object_name, compression_algorithm,
+                     extra_metadata):
+        """Read a backup object and return its decompressed data."""
+        with self.get_object_reader(
+                container, object_name,
+                extra_metadata=extra_metadata) as reader:
+            body = reader.read()
+        decompressor = self._get_compressor(compression_algorithm)
+        if decompressor is None:
+            return body
+        LOG.debug('decompressing data using %s algorithm',
+                  compression_algorithm)
+        # Decompression releases the GIL, so run it in a native thread to
+        # overlap with other reads and the volume writes.
+        return tpool.execute(decompressor.decompress, body)
+
     def _restore_v1(self, backup, volume_id, metadata, volume_file):
         """Restore a v1 volume backup."""
         backup_id = backup['id']
@@ -586,50 +819,63 @@ class ChunkedBackupDriver(driver.BackupDriver):
                     'does not match object list stored in metadata.')
             raise exception.InvalidBackup(reason=err)
 
-        for metadata_object in metadata_objects:
-            object_name, obj = list(metadata_object.items())[0]
-            LOG.debug('restoring object. backup: %(backup_id)s, '
-                      'container: %(container)s, object name: '
-                      '%(object_name)s, volume: %(volume_id)s.',
-                      {
-                          'backup_id': backup_id,
-                          'container': container,
-                          'object_name': object_name,
-                          'volume_id': volume_id,
-                      })
-
-            with self.get_object_reader(
-                    container, object_name,
-                    extra_metadata=extra_metadata) as reader:
-                body = reader.read()
-            compression_algorithm = metadata_object[object_name]['compression']
-            decompressor = self._get_compressor(compression_algorithm)
-            volume_file.seek(obj['offset'])
-            if decompressor is not None:
-                LOG.debug('decompressing data using %s algorithm',
-                          compression_algorithm)
-                decompressed = decompressor.decompress(body)
-                volume_file.write(decompressed)
-            else:
-                volume_file.write(body)
-
-            # force flush every write to avoid long blocking write on close
-            volume_file.flush()
-
-            # Be tolerant to IO implementations that do not support fileno()
-            try:
-                fileno = volume_file.fileno()
-            except IOError:
-                LOG.info(_LI("volume_file does not support "
-                             "fileno() so skipping "
-                             "fsync()"))
-            else:
-                os.fsync(fileno)
-
-            # Restoring a backup to a volume can take some time. Yield so other
-            # threads can run, allowing for among other things the service
-            # status to be updated
-            eventlet.sleep(0)
+        # The next objects are fetched and decompressed concurrently while
+        # the current one is written, always in metadata list order.
+        window = max(1, CONF.backup_objects_in_flight)
+        pending = collections.deque()
+        objects_iter = iter(metadata_objects)
+        try:
+            while True:
+                while len(pending) < window:
+                    metadata_object = next(objects_iter, None)
+                    if metadata_object is None:
+                        break
+                    object_name, obj = list(metadata_object.items())[0]
+                    LOG.debug('restoring object. backup: %(backup_id)s, '
+                              'container: %(container)s, object name: '
+                              '%(object_name)s, volume: %(volume_id)s.',
+                              {
+                                  'backup_id': backup_id,
+                                  'container': container,
+                                  'object_name': object_name,
+                                  'volume_id': volume_id,
+                              })
+                    pending.append((obj, eventlet.spawn(
+                        _capture_errors, self._read_object, container,
+                        object_name, obj['compression'], extra_metadata)))
+                if not pending:
+                    break
+
+                obj, reader_thread = pending.popleft()
+                data, error = reader_thread.wait()
+                if error is not None:
+                    six.reraise(*error)
+                volume_file.seek(obj['offset'])
+                volume_file.write(data)
+
+                # force flush every write to avoid long blocking write on
+                # close
+                volume_file.flush()
+
+                # Be tolerant to IO implementations that do not support
+                # fileno()
+                try:
+                    fileno = volume_file.fileno()
+                except IOError:
+                    LOG.info(_LI("volume_file does not support "
+                                 "fileno() so skipping "
+                                 "fsync()"))
+                else:
+                    os.fsync(fileno)
+
+                # Restoring a backup to a volume can take some time. Yield so
+                # other threads can run, allowing for among other things the
+                # service status to be updated
+                eventlet.sleep(0)
+        finally:
+            # Do not leave reads running behind a failed restore.
+            for _obj, reader_thread in pending:
+                reader_thread.kill()
         LOG.debug('v1 volume backup restore of %s finished.',
                   backup_id)
 
@@ -16,6 +16,7 @@
 """Base class for all backup drivers."""
 
 import abc
+import threading
 
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -327,6 +328,19 @@ class BackupDriver(base.Base):
         # deletion. So it should be set to True if the driver that inherits
         # from BackupDriver supports the force deletion function.
         self.support_force_delete = False
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """Ask the backup being created with this driver to stop.
+
+        The backup manager calls it when the backup is deleted while it is
+        being created. Drivers which can stop part way through a backup
+        check is_cancelled() as they go.
+        """
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
 
     def get_metadata(self, volume_id):
         return self.backup_meta_api.get(volume_id)
@@ -246,7 +246,7 @@ class CephBackupDriver(driver.BackupDriver):
             client.shutdown()
             raise
 
-    def _disconnect_from_rados(self, client, ioctx):
+    def _disconnect_from_rados(self, client, ioctx, failed=False):
         """Terminate connection with the backup Ceph cluster."""
         # closing an ioctx cannot raise an exception
         ioctx.close()
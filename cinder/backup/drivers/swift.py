@@ -204,7 +204,7 @@ class SwiftBackupDriver(chunkeddriver.ChunkedBackupDriver):
                               "but %(param)s not set"),
                           {'param': 'backup_swift_user'})
                 raise exception.ParameterNotFound(param='backup_swift_user')
-            self.conn = swift.Connection(
+            self._connection_kwargs = dict(
                 authurl=self.auth_url,
                 auth_version=CONF.backup_swift_auth_version,
                 tenant_name=CONF.backup_swift_tenant,
@@ -215,19 +215,37 @@ class SwiftBackupDriver(chunkeddriver.ChunkedBackupDriver):
                 insecure=self.backup_swift_auth_insecure,
                 cacert=CONF.backup_swift_ca_cert_file)
         else:
-            self.conn = swift.Connection(retries=self.swift_attempts,
-                                         preauthurl=self.swift_url,
-                                         preauthtoken=self.context.auth_token,
-                                         starting_backoff=self.swift_backoff,
-                                         insecure= (
-                                             self.backup_swift_auth_insecure),
-                                         cacert=CONF.backup_swift_ca_cert_file)
+            self._connection_kwargs = dict(
+                retries=self.swift_attempts,
+                preauthurl=self.swift_url,
+                preauthtoken=self.context.auth_token,
+                starting_backoff=self.swift_backoff,
+                insecure=self.backup_swift_auth_insecure,
+                cacert=CONF.backup_swift_ca_cert_file)
+        self.conn = swift.Connection(**self._connection_kwargs)
+        # Connections for the objects written and read concurrently
+        self._idle_connections = []
+
+    def _get_connection(self):
+        """Return a connection to transfer a single object.
+
+        A swiftclient connection keeps the state of the request in flight,
+        so each object written or read concurrently gets its own connection,
+        given back with _put_connection once done.
+        """
+        if self._idle_connections:
+            return self._idle_connections.pop()
+        return swift.Connection(**self._connection_kwargs)
+
+    def _put_connection(self, conn):
+        self._idle_connections.append(conn)
 
     class SwiftObjectWriter(object):
-        def __init__(self, container, object_name, conn):
+        def __init__(self, container, object_name, conn, put_connection):
             self.container = container
             self.object_name = object_name
             self.conn = conn
+            self.put_connection = put_connection
             self.data = bytearray()
 
         def __enter__(self):
@@ -247,6 +265,8 @@ class SwiftBackupDriver(chunkeddriver.ChunkedBackupDriver):
                                             content_length=len(self.data))
             except socket.error as err:
                 raise exception.SwiftConnectionFailed(reason=err)
+            finally:
+                self.put_connection(self.conn)
             LOG.debug('swift MD5 for %(object_name)s: %(etag)s',
                       {'object_name': self.object_name, 'etag': etag, })
             md5 = hashlib.md5(self.data).hexdigest()
@@ -260,16 +280,17 @@ class SwiftBackupDriver(chunkeddriver.ChunkedBackupDriver):
             return md5
 
     class SwiftObjectReader(object):
-        def __init__(self, container, object_name, conn):
+        def __init__(self, container, object_name, conn, put_connection):
             self.container = container
             self.object_name = object_name
             self.conn = conn
+            self.put_connection = put_connection
 
         def __enter__(self):
             return self
 
         def __exit__(self, exc_type, exc_value, traceback):
-            pass
+            self.put_connection(self.conn)
 
         def read(self):
             try:
@@ -304,7 +325,9 @@ class SwiftBackupDriver(chunkeddriver.ChunkedBackupDriver):
         Returns a writer object that stores a chunk of volume data in a
         Swift object store.
         """
-        return self.SwiftObjectWriter(container, object_name, self.conn)
+        return self.SwiftObjectWriter(container, object_name,
+                                      self._get_connection(),
+                                      self._put_connection)
 
     def get_object_reader(self, container, object_name, extra_metadata=None):
         """Return reader object.
@@ -312,7 +335,9 @@ class SwiftBackupDriver(chunkeddriver.ChunkedBackupDriver):
         Returns a reader object that retrieves a chunk of backed-up volume data
         from a Swift object store.
         """
-        return self.SwiftObjectReader(container, object_name, self.conn)
+        return self.SwiftObjectReader(container, object_name,
+                                      self._get_connection(),
+                                      self._put_connection)
 
     def delete_object(self, container, object_name):
         """Deletes a backup object from a Swift object store."""
@@ -85,6 +85,9 @@ class BackupManager(manager.SchedulerDependentManager):
         self.service = importutils.import_module(self.driver_name)
         self.az = CONF.storage_availability_zone
         self.volume_managers = {}
+        # Backup drivers of the backups being created, by backup id, to
+        # cancel them when they are deleted.
+        self._backups_in_progress = {}
         self._setup_volume_drivers()
         self.backup_rpcapi = backup_rpcapi.BackupAPI()
         super(BackupManager, self).__init__(service_name='backup',
@@ -389,8 +392,12 @@ class BackupManager(manager.SchedulerDependentManager):
             utils.require_driver_initialized(self.driver)
 
             backup_service = self.service.get_backup_driver(context)
-            self._get_driver(backend).backup_volume(context, backup,
-                                                    backup_service)
+            self._backups_in_progress[backup.id] = backup_service
+            try:
+                self._get_driver(backend).backup_volume(context, backup,
+                                                        backup_service)
+            finally:
+                self._backups_in_progress.pop(backup.id, None)
         except Exception as err:
             with excutils.save_and_reraise_exception():
                 self.db.volume_update(context, volume_id,
@@ -530,6 +537,12 @@ class BackupManager(manager.SchedulerDependentManager):
             self._update_backup_error(backup, context, err)
             raise exception.InvalidBackup(reason=err)
 
+        # Stop creating the backup if that is still in progress here.
+        backup_in_progress = self._backups_in_progress.get(backup.id)
+        if backup_in_progress is not None:
+            LOG.info(_LI('Cancelling the creation of backup %s.'), backup.id)
+            backup_in_progress.cancel()
+
         backup_service = self._map_service_to_driver(backup['service'])
         if backup_service is not None:
             configured_service = self.driver_name
@@ -17,9 +17,11 @@
 LVM class for performing LVM operations.
 """
 
+import functools
 import math
 import os
 import re
+import time
 
 from os_brick import executor
 from oslo_concurrency import processutils as putils
@@ -35,13 +37,25 @@ from cinder import utils
 LOG = logging.getLogger(__name__)
 
 
+def _invalidates_report(func):
+    """Drop the cached VG report once a method changing LVs has run."""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            self._vg_report = None
+    return wrapper
+
+
 class LVM(executor.Executor):
     """LVM object to enable various LVM related operations."""
     LVM_CMD_PREFIX = ['env', 'LC_ALL=C']
 
     def __init__(self, vg_name, root_helper, create_vg=False,
                  physical_volumes=None, lvm_type='default',
-                 executor=putils.execute, lvm_conf=None):
+                 executor=putils.execute, lvm_conf=None,
+                 report_cache_ttl=0):
 
         """Initialize the LVM object.
 
@@ -55,6 +69,8 @@ class LVM(executor.Executor):
         :param physical_volumes: List of PVs to build VG on
         :param lvm_type: VG and Volume type (default, or thin)
         :param executor: Execute method to use, None uses common/processutils
+        :param report_cache_ttl: Seconds to reuse the VG and LV report used
+                                 for stats, 0 to always query LVM
 
         """
         super(LVM, self).__init__(execute=executor, root_helper=root_helper)
@@ -70,6 +86,9 @@ class LVM(executor.Executor):
         self._supports_snapshot_lv_activation = None
         self._supports_lvchange_ignoreskipactivation = None
         self.vg_provisioned_capacity = 0.0
+        self._report_cache_ttl = report_cache_ttl
+        self._vg_report = None
+        self._vg_report_time = 0
 
         # Ensure LVM_SYSTEM_DIR has been added to LVM.LVM_CMD_PREFIX
         # before the first LVM command is executed, and use the directory
@@ -149,6 +168,13 @@ class LVM(executor.Executor):
         else:
             return []
 
+    @staticmethod
+    def _calculate_thin_pool_free_space(pool_size, data_percent):
+        """Returns free space in GB (float) from a thin pool size and usage."""
+        pool_size = float(pool_size)
+        consumed_space = pool_size / 100 * float(data_percent)
+        return round(pool_size - consumed_space, 2)
+
     def _get_thin_pool_free_space(self, vg_name, thin_pool_name):
         """Returns available thin pool free space.
 
@@ -174,11 +200,8 @@ class LVM(executor.Executor):
             if out is not None:
                 out = out.strip()
                 data = out.split(':')
-                pool_size = float(data[0])
-                data_percent = float(data[1])
-                consumed_space = pool_size / 100 * data_percent
-                free_space = pool_size - consumed_space
-                free_space = round(free_space, 2)
+                free_space = self._calculate_thin_pool_free_space(data[0],
+                                                                  data[1])
         except putils.ProcessExecutionError as err:
             LOG.exception(_LE('Error querying thin pool about data_percent'))
             LOG.error(_LE('Cmd     :%s'), err.cmd)
@@ -304,6 +327,9 @@ class LVM(executor.Executor):
         :returns: List of Dictionaries with LV info
 
         """
+        if lv_name is None:
+            return [{'vg': lv['vg'], 'name': lv['name'], 'size': lv['size']}
+                    for lv in self._get_vg_report()['lvs']]
         return self.get_lv_info(self._root_helper,
                                 self.vg_name,
                                 lv_name)
@@ -395,6 +421,59 @@ class LVM(executor.Executor):
 
         return vg_list
 
+    def _get_vg_report(self):
+        """Get VG and LV info for this instantiation with a single command.
+
+        vgs reports one line per LV of the VG when asked for LV fields
+        (or a single line with empty LV fields if the VG has none), so the
+        VG, its LVs and the thin pool usage all come from one invocation.
+        The result is reused for report_cache_ttl seconds, and dropped
+        whenever an LV is changed through this object.
+
+        :returns: Dictionary with VG info under 'vg' and a list of
+                  Dictionaries with LV info under 'lvs'
+
+        """
+        if (self._vg_report is not None and
+                time.time() - self._vg_report_time < self._report_cache_ttl):
+            return self._vg_report
+
+        cmd = LVM.LVM_CMD_PREFIX + ['vgs', '--noheadings',
+                                    '--unit=g', '-o',
+                                    'vg_name,vg_size,vg_free,lv_count,'
+                                    'vg_uuid,lv_name,lv_size,data_percent',
+                                    '--separator', ':',
+                                    '--nosuffix', self.vg_name]
+        (out, _err) = self._execute(*cmd,
+                                    root_helper=self._root_helper,
+                                    run_as_root=True)
+
+        vg = None
+        lvs = []
+        for line in (out or '').splitlines():
+            fields = line.strip().split(':')
+            if len(fields) != 8 or fields[0] != self.vg_name:
+                continue
+            if vg is None:
+                vg = {'name': fields[0],
+                      'size': float(fields[1]),
+                      'available': float(fields[2]),
+                      'lv_count': int(fields[3]),
+                      'uuid': fields[4]}
+            if fields[5]:
+                lvs.append({'vg': fields[0],
+                            'name': fields[5],
+                            'size': fields[6],
+                            'data_percent': fields[7]})
+
+        if vg is None:
+            LOG.error(_LE('Unable to find VG: %s'), self.vg_name)
+            raise exception.VolumeGroupNotFound(vg_name=self.vg_name)
+
+        self._vg_report = {'vg': vg, 'lvs': lvs}
+        self._vg_report_time = time.time()
+        return self._vg_report
+
     def update_volume_group_info(self):
         """Update VG info for this instantiation.
 
@@ -404,56 +483,32 @@ class LVM(executor.Executor):
         :returns: Dictionaries of VG info
 
         """
-        vg_list = self.get_all_volume_groups(self._root_helper, self.vg_name)
-
-        if len(vg_list) != 1:
-            LOG.error(_LE('Unable to find VG: %s'), self.vg_name)
-            raise exception.VolumeGroupNotFound(vg_name=self.vg_name)
+        report = self._get_vg_report()
+        vg = report['vg']
 
-        self.vg_size = float(vg_list[0]['size'])
-        self.vg_free_space = float(vg_list[0]['available'])
-        self.vg_lv_count = int(vg_list[0]['lv_count'])
-        self.vg_uuid = vg_list[0]['uuid']
+        self.vg_size = float(vg['size'])
+        self.vg_free_space = float(vg['available'])
+        self.vg_lv_count = int(vg['lv_count'])
+        self.vg_uuid = vg['uuid']
 
         total_vols_size = 0.0
         if self.vg_thin_pool is not None:
-            # NOTE(xyang): If providing only self.vg_name,
-            # get_lv_info will output info on the thin pool and all
-            # individual volumes.
-            # get_lv_info(self._root_helper, 'stack-vg')
-            # sudo lvs --noheadings --unit=g -o vg_name,name,size
-            # --nosuffix stack-vg
-            # stack-vg stack-pool               9.51
-            # stack-vg volume-13380d16-54c3-4979-9d22-172082dbc1a1  1.00
-            # stack-vg volume-629e13ab-7759-46a5-b155-ee1eb20ca892  1.00
-            # stack-vg volume-e3e6281c-51ee-464c-b1a7-db6c0854622c  1.00
-            #
-            # If providing both self.vg_name and self.vg_thin_pool,
-            # get_lv_info will output only info on the thin pool, but not
-            # individual volumes.
-            # get_lv_info(self._root_helper, 'stack-vg', 'stack-pool')
-            # sudo lvs --noheadings --unit=g -o vg_name,name,size
-            # --nosuffix stack-vg/stack-pool
-            # stack-vg stack-pool               9.51
-            #
-            # We need info on both the thin pool and the volumes,
-            # therefore we should provide only self.vg_name, but not
-            # self.vg_thin_pool here.
-            for lv in self.get_lv_info(self._root_helper,
-                                       self.vg_name):
+            # The report has both the thin pool, with its data usage, and
+            # the individual volumes in it.
+            for lv in report['lvs']:
                 lvsize = lv['size']
-                # get_lv_info runs "lvs" command with "--nosuffix".
+                # The report runs "vgs" command with "--nosuffix".
                 # This removes "g" from "1.00g" and only outputs "1.00".
-                # Running "lvs" command without "--nosuffix" will output
+                # Running the command without "--nosuffix" will output
                 # "1.00g" if "g" is the unit.
                 # Remove the unit if it is in lv['size'].
                 if not lv['size'][-1].isdigit():
                     lvsize = lvsize[:-1]
                 if lv['name'] == self.vg_thin_pool:
                     self.vg_thin_pool_size = lvsize
-                    tpfs = self._get_thin_pool_free_space(self.vg_name,
-                                                          self.vg_thin_pool)
-                    self.vg_thin_pool_free_space = tpfs
+                    self.vg_thin_pool_free_space = (
+                        self._calculate_thin_pool_free_space(
+                            lvsize, lv['data_percent'] or 0))
                 else:
                     total_vols_size = total_vols_size + float(lvsize)
             total_vols_size = round(total_vols_size, 2)
@@ -480,6 +535,7 @@ class LVM(executor.Executor):
         # leave 5% free for metadata
         return "%sg" % (self.vg_free_space * 0.95)
 
+    @_invalidates_report
     def create_thin_pool(self, name=None, size_str=None):
         """Creates a thin provisioning pool for this VG.
 
@@ -520,6 +576,7 @@ class LVM(executor.Executor):
         self.vg_thin_pool = name
         return size_str
 
+    @_invalidates_report
     def create_volume(self, name, size_str, lv_type='default', mirror_count=0):
         """Creates a logical volume on the object's VG.
 
@@ -557,6 +614,7 @@ class LVM(executor.Executor):
             LOG.error(_LE('StdErr  :%s'), err.stderr)
             raise
 
+    @_invalidates_report
     @utils.retry(putils.ProcessExecutionError)
     def create_lv_snapshot(self, name, source_lv_name, lv_type='default'):
         """Creates a snapshot of a logical volume.
@@ -652,6 +710,7 @@ class LVM(executor.Executor):
             LOG.error(_LE('StdErr  :%s'), err.stderr)
             raise
 
+    @_invalidates_report
     @utils.retry(putils.ProcessExecutionError)
     def delete(self, name):
         """Delete logical volume or snapshot.
@@ -699,6 +758,7 @@ class LVM(executor.Executor):
             LOG.debug('Successfully deleted volume: %s after '
                       'udev settle.', name)
 
+    @_invalidates_report
     def revert(self, snapshot_name):
         """Revert an LV from snapshot.
 
@@ -721,6 +781,7 @@ class LVM(executor.Executor):
                 return True
         return False
 
+    @_invalidates_report
     def extend_volume(self, lv_name, new_size):
         """Extend the size of an existing volume."""
         # Volumes with snaps have attributes 'o' or 'O' and will be
@@ -765,6 +826,7 @@ class LVM(executor.Executor):
     def vg_mirror_size(self, mirror_count):
         return (self.vg_free_space / (mirror_count + 1))
 
+    @_invalidates_report
     def rename_volume(self, lv_name, new_name):
         """Change the name of an existing volume."""
 
@@ -239,14 +239,27 @@ class DbCommands(object):
 
     @args('age_in_days', type=int,
           help='Purge deleted rows older than age in days')
-    def purge(self, age_in_days):
+    @args('--batch-size', dest='batch_size', type=int, default=1000,
+          help='Rows deleted per transaction (default: %(default)s)')
+    def purge(self, age_in_days, batch_size=1000):
         """Purge deleted rows older than a given age from cinder tables."""
         age_in_days = int(age_in_days)
         if age_in_days <= 0:
             print(_("Must supply a positive, non-zero value for age"))
             exit(1)
+        if batch_size <= 0:
+            print(_("Must supply a positive, non-zero value for batch size"))
+            exit(1)
+
+        def progress(table, rows_purged):
+            print(_("Purged %(rows)d rows from %(table)s") %
+                  {'rows': rows_purged, 'table': table})
+
         ctxt = context.get_admin_context()
-        db.purge_deleted_rows(ctxt, age_in_days)
+        rows_purged = db.purge_deleted_rows(ctxt, age_in_days,
+                                            batch_size=batch_size,
+                                            progress=progress)
+        print(_("Purged %d rows in total") % rows_purged)
 
 
 class VersionCommands(object):
@@ -548,7 +561,7 @@ def get_arg_string(args):
 def fetch_func_args(func):
     fn_args = []
     for args, kwargs in getattr(func, 'args', []):
-        arg = get_arg_string(args[0])
+        arg = kwargs.get('dest') or get_arg_string(args[0])
         fn_args.append(getattr(CONF.category, arg))
 
     return fn_args
@@ -18,7 +18,13 @@
 
 """Implementation of paginate query."""
 
+import base64
+import datetime
+
 from oslo_log import log as logging
+from oslo_serialization import jsonutils
+from oslo_utils import timeutils
+import six
 from six.moves import range
 import sqlalchemy
 
@@ -28,10 +34,72 @@ from cinder.i18n import _, _LW
 
 LOG = logging.getLogger(__name__)
 
+# Prefix identifying an opaque keyset continuation token, as opposed to the
+# plain resource id historically used as pagination marker.
+MARKER_TOKEN_PREFIX = 'k1.'
+
+
+def encode_marker(values):
+    """Encode the sort key values of the last row of a page into a token.
+
+    The returned string can be handed to clients as the pagination marker
+    and passed back to decode_marker() to resume the listing right after
+    that row without having to load it from the database.
+
+    :param values: dictionary of sort key names and their values
+    :returns: opaque, URL safe continuation token
+    """
+    primitive = {}
+    for key, value in values.items():
+        if isinstance(value, datetime.datetime):
+            value = timeutils.normalize_time(value).isoformat()
+        primitive[key] = value
+    data = jsonutils.dumps(primitive, sort_keys=True).encode('utf-8')
+    token = base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+    return MARKER_TOKEN_PREFIX + token
+
+
+def decode_marker(marker):
+    """Decode a continuation token generated by encode_marker().
+
+    :param marker: pagination marker received from the client
+    :returns: dictionary of sort key values or None if the marker is not a
+              continuation token (i.e. it is a plain resource id)
+    :raises InvalidInput: if the marker is a malformed token
+    """
+    if (not isinstance(marker, six.string_types) or
+            not marker.startswith(MARKER_TOKEN_PREFIX)):
+        return None
+
+    token = marker[len(MARKER_TOKEN_PREFIX):]
+    token += '=' * (-len(token) % 4)
+    try:
+        values = jsonutils.loads(
+            base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+    except (TypeError, ValueError, UnicodeError):
+        values = None
+    if not isinstance(values, dict) or 'id' not in values:
+        raise exception.InvalidInput(reason=_('Invalid pagination marker'))
+    return values
+
+
+def _get_marker_value(model, sort_key, value):
+    """Convert a decoded token value to the type of its column."""
+    column = getattr(model, sort_key)
+    if (value is not None and
+            isinstance(getattr(column, 'type', None), sqlalchemy.DateTime)):
+        try:
+            value = timeutils.normalize_time(timeutils.parse_isotime(value))
+        except ValueError:
+            raise exception.InvalidInput(
+                reason=_('Invalid pagination marker'))
+    return value
+
 
 # copied from glance/db/sqlalchemy/api.py
 def paginate_query(query, model, limit, sort_keys, marker=None,
-                   sort_dir=None, sort_dirs=None, offset=None):
+                   sort_dir=None, sort_dirs=None, offset=None,
+                   marker_values=None):
     """Returns a query with sorting / pagination criteria added.
 
     Pagination works by requiring a unique sort_key, specified by sort_keys.
@@ -49,6 +117,12 @@ def paginate_query(query, model, limit, sort_keys, marker=None,
     marker, then the actual marker object must be fetched from the db and
     passed in to us as marker.
 
+    Alternatively the sort key values of the last row can be passed directly
+    as marker_values (see encode_marker and decode_marker), which avoids the
+    marker lookup. In both cases the first sort key is also bounded on its
+    own (k1 >= X1 or k1 <= X1) so the database can seek into an index on it
+    instead of scanning all the rows preceding the marker.
+
     :param query: the query object to which we should add paging/sorting
     :param model: the ORM model class
     :param limit: maximum number of items to return
@@ -57,6 +131,10 @@ def paginate_query(query, model, limit, sort_keys, marker=None,
                     results after this value.
     :param sort_dir: direction in which results should be sorted (asc, desc)
     :param sort_dirs: per-column array of sort_dirs, corresponding to sort_keys
+    :param offset: number of items to skip
+    :param marker_values: dictionary with the values of every sort key of the
+                          last item of the previous page, used instead of
+                          marker
 
     :rtype: sqlalchemy.orm.query.Query
     :return: The query with sorting/pagination added.
@@ -93,11 +171,14 @@ def paginate_query(query, model, limit, sort_keys, marker=None,
         query = query.order_by(sort_dir_func(sort_key_attr))
 
     # Add pagination
-    if marker is not None:
-        marker_values = []
-        for sort_key in sort_keys:
-            v = getattr(marker, sort_key)
-            marker_values.append(v)
+    if marker is not None or marker_values is not None:
+        if marker is not None:
+            marker_values = [getattr(marker, sort_key)
+                             for sort_key in sort_keys]
+        else:
+            marker_values = [_get_marker_value(model, sort_key,
+                                               marker_values[sort_key])
+                             for sort_key in sort_keys]
 
         # Build up an array of sort criteria as in the docstring
         criteria_list = []
@@ -122,6 +203,15 @@ def paginate_query(query, model, limit, sort_keys, marker=None,
         f = sqlalchemy.sql.or_(*criteria_list)
         query = query.filter(f)
 
+        # The OR chain above can't be used by most databases to seek into an
+        # index, so add the equivalent range on the leading sort key.
+        if marker_values[0] is not None:
+            model_attr = getattr(model, sort_keys[0])
+            if sort_dirs[0] == 'desc':
+                query = query.filter(model_attr <= marker_values[0])
+            else:
+                query = query.filter(model_attr >= marker_values[0])
+
     if limit is not None:
         query = query.limit(limit)
 
@@ -180,6 +180,11 @@ def volume_data_get_for_host(context, host, count_only=False):
                                          count_only)
 
 
+def volume_count_get_all_by_host(context):
+    """Get a dict of {host: volume_count} for all hosts with volumes."""
+    return IMPL.volume_count_get_all_by_host(context)
+
+
 def volume_data_get_for_project(context, project_id):
     """Get (volume_count, gigabytes) for project."""
     return IMPL.volume_data_get_for_project(context, project_id)
@@ -206,16 +211,17 @@ def volume_get(context, volume_id):
 
 
 def volume_get_all(context, marker, limit, sort_keys=None, sort_dirs=None,
-                   filters=None, offset=None):
+                   filters=None, offset=None, columns=None):
     """Get all volumes."""
     return IMPL.volume_get_all(context, marker, limit, sort_keys=sort_keys,
                                sort_dirs=sort_dirs, filters=filters,
-                               offset=offset)
+                               offset=offset, columns=columns)
 
 
-def volume_get_all_by_host(context, host, filters=None):
+def volume_get_all_by_host(context, host, filters=None, columns=None):
     """Get all volumes belonging to a host."""
-    return IMPL.volume_get_all_by_host(context, host, filters=filters)
+    return IMPL.volume_get_all_by_host(context, host, filters=filters,
+                                       columns=columns)
 
 
 def volume_get_all_by_group(context, group_id, filters=None):
@@ -225,13 +231,14 @@ def volume_get_all_by_group(context, group_id, filters=None):
 
 def volume_get_all_by_project(context, project_id, marker, limit,
                               sort_keys=None, sort_dirs=None, filters=None,
-                              offset=None):
+                              offset=None, columns=None):
     """Get all volumes belonging to a project."""
     return IMPL.volume_get_all_by_project(context, project_id, marker, limit,
                                           sort_keys=sort_keys,
                                           sort_dirs=sort_dirs,
                                           filters=filters,
-                                          offset=offset)
+                                          offset=offset,
+                                          columns=columns)
 
 
 def volume_get_iscsi_target_num(context, volume_id):
@@ -829,6 +836,14 @@ def quota_reserve(context, resources, quotas, deltas, expire,
                               until_refresh, max_age, project_id=project_id)
 
 
+def quota_reserve_batch(context, resources, quotas, deltas_list, expire,
+                        until_refresh, max_age, project_id=None):
+    """Check quotas and create reservations for several items at once."""
+    return IMPL.quota_reserve_batch(context, resources, quotas, deltas_list,
+                                    expire, until_refresh, max_age,
+                                    project_id=project_id)
+
+
 def reservation_commit(context, reservations, project_id=None):
     """Commit quota reservations."""
     return IMPL.reservation_commit(context, reservations,
@@ -846,9 +861,9 @@ def quota_destroy_by_project(context, project_id):
     return IMPL.quota_destroy_by_project(context, project_id)
 
 
-def reservation_expire(context):
-    """Roll back any expired reservations."""
-    return IMPL.reservation_expire(context)
+def reservation_expire(context, batch_size=1000):
+    """Roll back any expired reservations, batch_size at a time."""
+    return IMPL.reservation_expire(context, batch_size=batch_size)
 
 
 ###################
@@ -1017,13 +1032,18 @@ def cgsnapshot_destroy(context, cgsnapshot_id):
     return IMPL.cgsnapshot_destroy(context, cgsnapshot_id)
 
 
-def purge_deleted_rows(context, age_in_days):
+def purge_deleted_rows(context, age_in_days, batch_size=None,
+                       progress=None):
     """Purge deleted rows older than given age from cinder tables
 
-    Raises InvalidParameterValue if age_in_days is incorrect.
+    Raises InvalidParameterValue if age_in_days or batch_size is incorrect.
+    :param batch_size: delete at most this many rows per transaction
+    :param progress: called as progress(table, rows_purged) as rows of a
+                     table are purged
     :returns: number of deleted rows
     """
-    return IMPL.purge_deleted_rows(context, age_in_days=age_in_days)
+    return IMPL.purge_deleted_rows(context, age_in_days=age_in_days,
+                                   batch_size=batch_size, progress=progress)
 
 
 def get_booleans_for_table(table_name):
@@ -1078,3 +1098,20 @@ def image_volume_cache_get_by_volume_id(context, volume_id):
 def image_volume_cache_get_all_for_host(context, host):
     """Query for all image volume cache entry for a host."""
     return IMPL.image_volume_cache_get_all_for_host(context, host)
+
+
+def image_volume_cache_get_usage_for_host(context, host):
+    """Get the total size and count of the image volume cache of a host."""
+    return IMPL.image_volume_cache_get_usage_for_host(context, host)
+
+
+def image_volume_cache_get_lru_for_host(context, host, limit=None,
+                                        marker=None):
+    """Query for the least recently used image volume cache entries.
+
+    The entries of the host are returned from the least recently used one,
+    after the marker entry if given.
+    """
+    return IMPL.image_volume_cache_get_lru_for_host(context, host,
+                                                    limit=limit,
+                                                    marker=marker)
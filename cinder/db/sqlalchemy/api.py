@@ -43,6 +43,7 @@ from sqlalchemy.orm import RelationshipProperty
 from sqlalchemy.schema import Table
 from sqlalchemy.sql.expression import desc
 from sqlalchemy.sql.expression import literal_column
+from sqlalchemy.sql.expression import null
 from sqlalchemy.sql.expression import true
 from sqlalchemy.sql import func
 from sqlalchemy.sql import sqltypes
@@ -262,9 +263,13 @@ def model_query(context, *args, **kwargs):
 
 
 def _sync_volumes(context, project_id, session, volume_type_id=None,
-                  volume_type_name=None):
-    (volumes, _gigs) = _volume_data_get_for_project(
-        context, project_id, volume_type_id=volume_type_id, session=session)
+                  volume_type_name=None, totals=None):
+    if totals is None:
+        (volumes, _gigs) = _volume_data_get_for_project(
+            context, project_id, volume_type_id=volume_type_id,
+            session=session)
+    else:
+        (volumes, _gigs) = _usage_total(totals, 'volumes', volume_type_id)
     key = 'volumes'
     if volume_type_name:
         key += '_' + volume_type_name
@@ -272,9 +277,14 @@ def _sync_volumes(context, project_id, session, volume_type_id=None,
 
 
 def _sync_snapshots(context, project_id, session, volume_type_id=None,
-                    volume_type_name=None):
-    (snapshots, _gigs) = _snapshot_data_get_for_project(
-        context, project_id, volume_type_id=volume_type_id, session=session)
+                    volume_type_name=None, totals=None):
+    if totals is None:
+        (snapshots, _gigs) = _snapshot_data_get_for_project(
+            context, project_id, volume_type_id=volume_type_id,
+            session=session)
+    else:
+        (snapshots, _gigs) = _usage_total(totals, 'snapshots',
+                                          volume_type_id)
     key = 'snapshots'
     if volume_type_name:
         key += '_' + volume_type_name
@@ -282,41 +292,61 @@ def _sync_snapshots(context, project_id, session, volume_type_id=None,
 
 
 def _sync_backups(context, project_id, session, volume_type_id=None,
-                  volume_type_name=None):
-    (backups, _gigs) = _backup_data_get_for_project(
-        context, project_id, volume_type_id=volume_type_id, session=session)
+                  volume_type_name=None, totals=None):
+    if totals is None:
+        (backups, _gigs) = _backup_data_get_for_project(
+            context, project_id, volume_type_id=volume_type_id,
+            session=session)
+    else:
+        (backups, _gigs) = _usage_total(totals, 'backups')
     key = 'backups'
     return {key: backups}
 
 
 def _sync_gigabytes(context, project_id, session, volume_type_id=None,
-                    volume_type_name=None):
-    (_junk, vol_gigs) = _volume_data_get_for_project(
-        context, project_id, volume_type_id=volume_type_id, session=session)
+                    volume_type_name=None, totals=None):
+    if totals is None:
+        (_junk, vol_gigs) = _volume_data_get_for_project(
+            context, project_id, volume_type_id=volume_type_id,
+            session=session)
+    else:
+        (_junk, vol_gigs) = _usage_total(totals, 'volumes', volume_type_id)
     key = 'gigabytes'
     if volume_type_name:
         key += '_' + volume_type_name
     if CONF.no_snapshot_gb_quota:
         return {key: vol_gigs}
-    (_junk, snap_gigs) = _snapshot_data_get_for_project(
-        context, project_id, volume_type_id=volume_type_id, session=session)
+    if totals is None:
+        (_junk, snap_gigs) = _snapshot_data_get_for_project(
+            context, project_id, volume_type_id=volume_type_id,
+            session=session)
+    else:
+        (_junk, snap_gigs) = _usage_total(totals, 'snapshots',
+                                          volume_type_id)
     return {key: vol_gigs + snap_gigs}
 
 
 def _sync_consistencygroups(context, project_id, session,
                             volume_type_id=None,
-                            volume_type_name=None):
-    (_junk, groups) = _consistencygroup_data_get_for_project(
-        context, project_id, session=session)
+                            volume_type_name=None, totals=None):
+    if totals is None:
+        (_junk, groups) = _consistencygroup_data_get_for_project(
+            context, project_id, session=session)
+    else:
+        (groups, _junk) = _usage_total(totals, 'consistencygroups')
     key = 'consistencygroups'
     return {key: groups}
 
 
 def _sync_backup_gigabytes(context, project_id, session, volume_type_id=None,
-                           volume_type_name=None):
+                           volume_type_name=None, totals=None):
     key = 'backup_gigabytes'
-    (_junk, backup_gigs) = _backup_data_get_for_project(
-        context, project_id, volume_type_id=volume_type_id, session=session)
+    if totals is None:
+        (_junk, backup_gigs) = _backup_data_get_for_project(
+            context, project_id, volume_type_id=volume_type_id,
+            session=session)
+    else:
+        (_junk, backup_gigs) = _usage_total(totals, 'backups')
     return {key: backup_gigs}
 
 
@@ -329,6 +359,91 @@ QUOTA_SYNC_FUNCTIONS = {
     '_sync_backup_gigabytes': _sync_backup_gigabytes
 }
 
+# The tables each sync function counts rows of, so that all the usages
+# refreshed by one reservation can be computed by a single grouped query.
+QUOTA_SYNC_TABLES = {
+    '_sync_volumes': ('volumes',),
+    '_sync_snapshots': ('snapshots',),
+    '_sync_gigabytes': ('volumes', 'snapshots'),
+    '_sync_consistencygroups': ('consistencygroups',),
+    '_sync_backups': ('backups',),
+    '_sync_backup_gigabytes': ('backups',)
+}
+
+
+def _usage_total(totals, table, volume_type_id=None):
+    """Return the (count, size) of a table from grouped usage totals."""
+    groups = totals.get(table, {})
+    if volume_type_id:
+        return groups.get(volume_type_id, (0, 0))
+    return (sum(count for count, _size in groups.values()),
+            sum(size for _count, size in groups.values()))
+
+
+@require_admin_context
+def _project_usage_totals(context, project_id, tables, session=None):
+    """Count and size the project's resources, grouped by volume type.
+
+    All of the requested tables are aggregated by one UNION ALL query.
+    Returns a dict mapping each table name to a dict of
+    volume_type_id: (count, size); tables that are not split by volume
+    type are grouped under None.
+    """
+    queries = []
+    if 'volumes' in tables:
+        queries.append(
+            model_query(context,
+                        func.count(models.Volume.id).label('count'),
+                        func.sum(models.Volume.size).label('size'),
+                        models.Volume.volume_type_id.label('volume_type_id'),
+                        literal_column("'volumes'").label('usage_table'),
+                        read_deleted="no",
+                        session=session).
+            filter_by(project_id=project_id).
+            group_by(models.Volume.volume_type_id))
+    if 'snapshots' in tables:
+        queries.append(
+            model_query(context,
+                        func.count(models.Snapshot.id).label('count'),
+                        func.sum(models.Snapshot.volume_size).label('size'),
+                        models.Volume.volume_type_id.label('volume_type_id'),
+                        literal_column("'snapshots'").label('usage_table'),
+                        read_deleted="no",
+                        session=session).
+            filter(models.Snapshot.project_id == project_id).
+            outerjoin(models.Snapshot.volume).
+            group_by(models.Volume.volume_type_id))
+    if 'backups' in tables:
+        queries.append(
+            model_query(context,
+                        func.count(models.Backup.id).label('count'),
+                        func.sum(models.Backup.size).label('size'),
+                        null().label('volume_type_id'),
+                        literal_column("'backups'").label('usage_table'),
+                        read_deleted="no",
+                        session=session).
+            filter_by(project_id=project_id))
+    if 'consistencygroups' in tables:
+        queries.append(
+            model_query(context,
+                        func.count(models.ConsistencyGroup.id).label('count'),
+                        null().label('size'),
+                        null().label('volume_type_id'),
+                        literal_column("'consistencygroups'").
+                        label('usage_table'),
+                        read_deleted="no",
+                        session=session).
+            filter_by(project_id=project_id))
+
+    totals = {table: {} for table in tables}
+    if not queries:
+        return totals
+    for count, size, volume_type_id, table in \
+            queries[0].union_all(*queries[1:]).all():
+        # NOTE(vish): convert None to 0
+        totals[table][volume_type_id] = (count or 0, size or 0)
+    return totals
+
 
 ###################
 
@@ -767,37 +882,59 @@ def _reservation_create(context, uuid, usage, project_id, resource, delta,
 # code always acquires the lock on quota_usages before acquiring the lock
 # on reservations.
 
-def _get_quota_usages(context, session, project_id):
+def _get_quota_usages(context, session, project_id, resources=None):
     # Broken out for testability
-    rows = model_query(context, models.QuotaUsage,
-                       read_deleted="no",
-                       session=session).\
-        filter_by(project_id=project_id).\
+    query = model_query(context, models.QuotaUsage,
+                        read_deleted="no",
+                        session=session).\
+        filter_by(project_id=project_id)
+    if resources is not None:
+        # NOTE: Only lock the usages being changed, so that reservations
+        # of unrelated resources in the same project don't serialize.
+        query = query.filter(models.QuotaUsage.resource.in_(resources))
+    rows = query.order_by(models.QuotaUsage.id).\
         with_lockmode('update').\
         all()
     return {row.resource: row for row in rows}
 
 
-@require_context
-@_retry_on_deadlock
-def quota_reserve(context, resources, quotas, deltas, expire,
-                  until_refresh, max_age, project_id=None):
+def _quota_usage_needs_refresh(usage, max_age):
+    if usage.in_use < 0:
+        # Negative in_use count indicates a desync, so try to
+        # heal from that...
+        return True
+    elif usage.until_refresh is not None:
+        usage.until_refresh -= 1
+        return usage.until_refresh <= 0
+    elif (max_age and usage.updated_at is not None and
+            (usage.updated_at - timeutils.utcnow()).seconds >= max_age):
+        return True
+    return False
+
+
+def _quota_reserve(context, resources, quotas, deltas_list, expire,
+                   until_refresh, max_age, project_id=None):
     elevated = context.elevated()
+
+    # The quota checks are done against the sum of all the deltas
+    deltas = {}
+    for item_deltas in deltas_list:
+        for resource, delta in item_deltas.items():
+            deltas[resource] = deltas.get(resource, 0) + delta
+
     session = get_session()
     with session.begin():
         if project_id is None:
             project_id = context.project_id
 
         # Get the current usages
-        usages = _get_quota_usages(context, session, project_id)
+        usages = _get_quota_usages(context, session, project_id,
+                                   resources=list(deltas.keys()))
 
         # Handle usage refresh
-        work = set(deltas.keys())
-        while work:
-            resource = work.pop()
-
+        refresh = set()
+        for resource in deltas:
             # Do we need to refresh the usage?
-            refresh = False
             if resource not in usages:
                 usages[resource] = _quota_usage_create(elevated,
                                                        project_id,
@@ -805,59 +942,63 @@ def quota_reserve(context, resources, quotas, deltas, expire,
                                                        0, 0,
                                                        until_refresh or None,
                                                        session=session)
-                refresh = True
-            elif usages[resource].in_use < 0:
-                # Negative in_use count indicates a desync, so try to
-                # heal from that...
-                refresh = True
-            elif usages[resource].until_refresh is not None:
-                usages[resource].until_refresh -= 1
-                if usages[resource].until_refresh <= 0:
-                    refresh = True
-            elif max_age and usages[resource].updated_at is not None and (
-                (usages[resource].updated_at -
-                    timeutils.utcnow()).seconds >= max_age):
-                refresh = True
-
-            # OK, refresh the usage
-            if refresh:
-                # Grab the sync routine
-                sync = QUOTA_SYNC_FUNCTIONS[resources[resource].sync]
-                volume_type_id = getattr(resources[resource],
-                                         'volume_type_id', None)
-                volume_type_name = getattr(resources[resource],
-                                           'volume_type_name', None)
-                updates = sync(elevated, project_id,
-                               volume_type_id=volume_type_id,
-                               volume_type_name=volume_type_name,
-                               session=session)
-                for res, in_use in updates.items():
-                    # Make sure we have a destination for the usage!
-                    if res not in usages:
-                        usages[res] = _quota_usage_create(
-                            elevated,
-                            project_id,
-                            res,
-                            0, 0,
-                            until_refresh or None,
-                            session=session
-                        )
-
-                    # Update the usage
-                    usages[res].in_use = in_use
-                    usages[res].until_refresh = until_refresh or None
-
-                    # Because more than one resource may be refreshed
-                    # by the call to the sync routine, and we don't
-                    # want to double-sync, we make sure all refreshed
-                    # resources are dropped from the work set.
-                    work.discard(res)
-
-                    # NOTE(Vek): We make the assumption that the sync
-                    #            routine actually refreshes the
-                    #            resources that it is the sync routine
-                    #            for.  We don't check, because this is
-                    #            a best-effort mechanism.
+                refresh.add(resource)
+            elif _quota_usage_needs_refresh(usages[resource], max_age):
+                refresh.add(resource)
+
+        # OK, refresh the usages, counting everything the sync routines
+        # need with one query
+        tables = set()
+        for resource in refresh:
+            tables.update(QUOTA_SYNC_TABLES.get(resources[resource].sync, ()))
+        totals = _project_usage_totals(elevated, project_id, tables,
+                                       session=session)
+
+        work = refresh
+        while work:
+            resource = work.pop()
+
+            # Grab the sync routine
+            sync = QUOTA_SYNC_FUNCTIONS[resources[resource].sync]
+            volume_type_id = getattr(resources[resource],
+                                     'volume_type_id', None)
+            volume_type_name = getattr(resources[resource],
+                                       'volume_type_name', None)
+            updates = sync(elevated, project_id,
+                           volume_type_id=volume_type_id,
+                           volume_type_name=volume_type_name,
+                           session=session, totals=totals)
+            for res, in_use in updates.items():
+                # Make sure we have a destination for the usage!
+                if res not in usages:
+                    usages.update(_get_quota_usages(context, session,
+                                                    project_id,
+                                                    resources=[res]))
+                if res not in usages:
+                    usages[res] = _quota_usage_create(
+                        elevated,
+                        project_id,
+                        res,
+                        0, 0,
+                        until_refresh or None,
+                        session=session
+                    )
+
+                # Update the usage
+                usages[res].in_use = in_use
+                usages[res].until_refresh = until_refresh or None
+
+                # Because more than one resource may be refreshed
+                # by the call to the sync routine, and we don't
+                # want to double-sync, we make sure all refreshed
+                # resources are dropped from the work set.
+                work.discard(res)
+
+                # NOTE(Vek): We make the assumption that the sync
+                #            routine actually refreshes the
+                #            resources that it is the sync routine
+                #            for.  We don't check, because this is
+                #            a best-effort mechanism.
 
         # Check for deltas that would go negative
         unders = [r for r, delta in deltas.items()
@@ -882,29 +1023,33 @@ def quota_reserve(context, resources, quotas, deltas, expire,
         # Create the reservations
         if not overs:
             reservations = []
-            for resource, delta in deltas.items():
-                reservation = _reservation_create(elevated,
-                                                  str(uuid.uuid4()),
-                                                  usages[resource],
-                                                  project_id,
-                                                  resource, delta, expire,
-                                                  session=session)
-                reservations.append(reservation.uuid)
-
-                # Also update the reserved quantity
-                # NOTE(Vek): Again, we are only concerned here about
-                #            positive increments.  Here, though, we're
-                #            worried about the following scenario:
-                #
-                #            1) User initiates resize down.
-                #            2) User allocates a new instance.
-                #            3) Resize down fails or is reverted.
-                #            4) User is now over quota.
-                #
-                #            To prevent this, we only update the
-                #            reserved value if the delta is positive.
-                if delta > 0:
-                    usages[resource].reserved += delta
+            for item_deltas in deltas_list:
+                item_reservations = []
+                for resource, delta in item_deltas.items():
+                    reservation = _reservation_create(elevated,
+                                                      str(uuid.uuid4()),
+                                                      usages[resource],
+                                                      project_id,
+                                                      resource, delta,
+                                                      expire,
+                                                      session=session)
+                    item_reservations.append(reservation.uuid)
+
+                    # Also update the reserved quantity
+                    # NOTE(Vek): Again, we are only concerned here about
+                    #            positive increments.  Here, though, we're
+                    #            worried about the following scenario:
+                    #
+                    #            1) User initiates resize down.
+                    #            2) User allocates a new instance.
+                    #            3) Resize down fails or is reverted.
+                    #            4) User is now over quota.
+                    #
+                    #            To prevent this, we only update the
+                    #            reserved value if the delta is positive.
+                    if delta > 0:
+                        usages[resource].reserved += delta
+                reservations.append(item_reservations)
 
     if unders:
         LOG.warning(_LW("Change will make usage less than 0 for the following "
@@ -918,6 +1063,33 @@ def quota_reserve(context, resources, quotas, deltas, expire,
     return reservations
 
 
+@require_context
+@_retry_on_deadlock
+def quota_reserve(context, resources, quotas, deltas, expire,
+                  until_refresh, max_age, project_id=None):
+    return _quota_reserve(context, resources, quotas, [deltas], expire,
+                          until_refresh, max_age, project_id=project_id)[0]
+
+
+@require_context
+@_retry_on_deadlock
+def quota_reserve_batch(context, resources, quotas, deltas_list, expire,
+                        until_refresh, max_age, project_id=None):
+    return _quota_reserve(context, resources, quotas, deltas_list, expire,
+                          until_refresh, max_age, project_id=project_id)
+
+
+def _quota_reservation_resources(session, context, reservations):
+    """Return the resources the reservations are for, without locking."""
+    rows = model_query(context, models.Reservation.resource,
+                       read_deleted="no",
+                       session=session).\
+        filter(models.Reservation.uuid.in_(reservations)).\
+        distinct().\
+        all()
+    return [row[0] for row in rows]
+
+
 def _quota_reservations(session, context, reservations):
     """Return the relevant reservations."""
 
@@ -935,7 +1107,10 @@ def _quota_reservations(session, context, reservations):
 def reservation_commit(context, reservations, project_id=None):
     session = get_session()
     with session.begin():
-        usages = _get_quota_usages(context, session, project_id)
+        usages = _get_quota_usages(
+            context, session, project_id,
+            resources=_quota_reservation_resources(session, context,
+                                                   reservations))
 
         for reservation in _quota_reservations(session, context, reservations):
             usage = usages[reservation.resource]
@@ -951,7 +1126,10 @@ def reservation_commit(context, reservations, project_id=None):
 def reservation_rollback(context, reservations, project_id=None):
     session = get_session()
     with session.begin():
-        usages = _get_quota_usages(context, session, project_id)
+        usages = _get_quota_usages(
+            context, session, project_id,
+            resources=_quota_reservation_resources(session, context,
+                                                   reservations))
 
         for reservation in _quota_reservations(session, context, reservations):
             usage = usages[reservation.resource]
@@ -1013,22 +1191,65 @@ def quota_destroy_all_by_project(context, project_id, only_quotas=False):
 
 @require_admin_context
 @_retry_on_deadlock
-def reservation_expire(context):
+def reservation_expire(context, batch_size=1000):
+    """Roll back expired reservations, batch_size of them at a time."""
+    current_time = timeutils.utcnow()
     session = get_session()
-    with session.begin():
-        current_time = timeutils.utcnow()
-        results = model_query(context, models.Reservation, session=session,
-                              read_deleted="no").\
-            filter(models.Reservation.expire < current_time).\
-            all()
-
-        if results:
-            for reservation in results:
+    while True:
+        with session.begin():
+            rows = model_query(context, models.Reservation.id,
+                               models.Reservation.usage_id,
+                               session=session, read_deleted="no").\
+                filter(models.Reservation.expire < current_time).\
+                order_by(models.Reservation.id).\
+                limit(batch_size).\
+                all()
+            if not rows:
+                break
+
+            # Lock the usages before the reservations, like the rest of the
+            # quota code does, then reread the reservations as some may have
+            # been committed or rolled back meanwhile.
+            model_query(context, models.QuotaUsage.id,
+                        session=session, read_deleted="no").\
+                filter(models.QuotaUsage.id.in_(
+                    set(row.usage_id for row in rows))).\
+                order_by(models.QuotaUsage.id).\
+                with_lockmode('update').\
+                all()
+            expired = model_query(context, models.Reservation.id,
+                                  models.Reservation.usage_id,
+                                  models.Reservation.delta,
+                                  session=session, read_deleted="no").\
+                filter(models.Reservation.id.in_([row.id for row in rows])).\
+                with_lockmode('update').\
+                all()
+
+            # Release what the reservations held with one update per usage
+            released = {}
+            for reservation in expired:
                 if reservation.delta >= 0:
-                    reservation.usage.reserved -= reservation.delta
-                    reservation.usage.save(session=session)
-
-                reservation.delete(session=session)
+                    released[reservation.usage_id] = (
+                        released.get(reservation.usage_id, 0) +
+                        reservation.delta)
+            for usage_id, delta in released.items():
+                model_query(context, models.QuotaUsage,
+                            session=session, read_deleted="no").\
+                    filter_by(id=usage_id).\
+                    update({'reserved': models.QuotaUsage.reserved - delta},
+                           synchronize_session=False)
+
+            if expired:
+                model_query(context, models.Reservation,
+                            session=session, read_deleted="no").\
+                    filter(models.Reservation.id.in_(
+                        [reservation.id for reservation in expired])).\
+                    update({'deleted': True,
+                            'deleted_at': current_time},
+                           synchronize_session=False)
+
+        if len(rows) < batch_size:
+            break
 
 
 ###################
@@ -1138,6 +1359,17 @@ def volume_data_get_for_host(context, host, count_only=False):
         return (result[0] or 0, result[1] or 0)
 
 
+def volume_count_get_all_by_host(context):
+    result = model_query(context,
+                         models.Volume.host,
+                         func.count(models.Volume.id),
+                         read_deleted="no").\
+        filter(models.Volume.host.isnot(None)).\
+        group_by(models.Volume.host).\
+        all()
+    return {host: count for host, count in result}
+
+
 @require_admin_context
 def _volume_data_get_for_project(context, project_id, volume_type_id=None,
                                  session=None):
@@ -1440,7 +1672,7 @@ def volume_get(context, volume_id):
 
 @require_admin_context
 def volume_get_all(context, marker, limit, sort_keys=None, sort_dirs=None,
-                   filters=None, offset=None):
+                   filters=None, offset=None, columns=None):
     """Retrieves all volumes.
 
     If no sort parameters are specified then the returned volumes are sorted
@@ -1459,21 +1691,26 @@ def volume_get_all(context, marker, limit, sort_keys=None, sort_dirs=None,
                     or sets cause an 'IN' operation, while exact matching
                     is used for other values, see _process_volume_filters
                     function for more information
+    :param columns: names of the columns to retrieve; if given, a list of
+                    dictionaries with just those columns is returned
+                    instead of volume models, without loading any related
+                    models
     :returns: list of matching volumes
     """
     session = get_session()
     with session.begin():
         # Generate the query
         query = _generate_paginate_query(context, session, marker, limit,
-                                         sort_keys, sort_dirs, filters, offset)
+                                         sort_keys, sort_dirs, filters, offset,
+                                         columns=columns)
         # No volumes would match, return empty list
         if query is None:
             return []
-        return query.all()
+        return _query_all(query, columns)
 
 
 @require_admin_context
-def volume_get_all_by_host(context, host, filters=None):
+def volume_get_all_by_host(context, host, filters=None, columns=None):
     """Retrieves all volumes hosted on a host.
 
     :param context: context to query under
@@ -1482,6 +1719,10 @@ def volume_get_all_by_host(context, host, filters=None):
                     or sets cause an 'IN' operation, while exact matching
                     is used for other values, see _process_volume_filters
                     function for more information
+    :param columns: names of the columns to retrieve; if given, a list of
+                    dictionaries with just those columns is returned
+                    instead of volume models, without loading any related
+                    models
     :returns: list of matching volumes
     """
     # As a side effect of the introduction of pool-aware scheduler,
@@ -1496,13 +1737,17 @@ def volume_get_all_by_host(context, host, filters=None):
             host_attr = getattr(models.Volume, 'host')
             conditions = [host_attr == host,
                           host_attr.op('LIKE')(host + '#%')]
-            query = _volume_get_query(context).filter(or_(*conditions))
+            query = _volume_get_query(context, session=session,
+                                      joined_load=not columns)
+            query = query.filter(or_(*conditions))
             if filters:
                 query = _process_volume_filters(query, filters)
                 # No volumes would match, return empty list
                 if query is None:
                     return []
-            return query.all()
+            if columns:
+                query = _project_columns(query, models.Volume, columns)
+            return _query_all(query, columns)
     elif not host:
         return []
 
@@ -1531,7 +1776,7 @@ def volume_get_all_by_group(context, group_id, filters=None):
 @require_context
 def volume_get_all_by_project(context, project_id, marker, limit,
                               sort_keys=None, sort_dirs=None, filters=None,
-                              offset=None):
+                              offset=None, columns=None):
     """Retrieves all volumes in a project.
 
     If no sort parameters are specified then the returned volumes are sorted
@@ -1551,6 +1796,10 @@ def volume_get_all_by_project(context, project_id, marker, limit,
                     or sets cause an 'IN' operation, while exact matching
                     is used for other values, see _process_volume_filters
                     function for more information
+    :param columns: names of the columns to retrieve; if given, a list of
+                    dictionaries with just those columns is returned
+                    instead of volume models, without loading any related
+                    models
     :returns: list of matching volumes
     """
     session = get_session()
@@ -1561,16 +1810,17 @@ def volume_get_all_by_project(context, project_id, marker, limit,
         filters['project_id'] = project_id
         # Generate the query
         query = _generate_paginate_query(context, session, marker, limit,
-                                         sort_keys, sort_dirs, filters, offset)
+                                         sort_keys, sort_dirs, filters, offset,
+                                         columns=columns)
         # No volumes would match, return empty list
         if query is None:
             return []
-        return query.all()
+        return _query_all(query, columns)
 
 
 def _generate_paginate_query(context, session, marker, limit, sort_keys,
                              sort_dirs, filters, offset=None,
-                             paginate_type=models.Volume):
+                             paginate_type=models.Volume, columns=None):
     """Generate the query to include the filters and the paginate options.
 
     Returns a query with sorting / pagination criteria added or None
@@ -1579,7 +1829,8 @@ def _generate_paginate_query(context, session, marker, limit, sort_keys,
     :param context: context to query under
     :param session: the session to use
     :param marker: the last item of the previous page; we returns the next
-                    results after this value.
+                    results after this value. Either the id of the item or
+                    a continuation token carrying its sort key values.
     :param limit: maximum number of items to return
     :param sort_keys: list of attributes by which results should be sorted,
                       paired with corresponding item in sort_dirs
@@ -1591,6 +1842,8 @@ def _generate_paginate_query(context, session, marker, limit, sort_keys,
                     function for more information
     :param offset: number of items to skip
     :param paginate_type: type of pagination to generate
+    :param columns: names of the columns the query should return, no related
+                    models are loaded if given; see _query_all
     :returns: updated query or None
     """
     get_query, process_filters, get = PAGINATION_HELPERS[paginate_type]
@@ -1598,22 +1851,60 @@ def _generate_paginate_query(context, session, marker, limit, sort_keys,
     sort_keys, sort_dirs = process_sort_params(sort_keys,
                                                sort_dirs,
                                                default_dir='desc')
-    query = get_query(context, session=session)
+    if columns:
+        # The related models are only joined in to be loaded
+        query = model_query(context, paginate_type, session=session)
+    else:
+        query = get_query(context, session=session)
 
     if filters:
         query = process_filters(query, filters)
         if query is None:
             return None
 
-    marker_volume = None
+    marker_object = None
+    marker_values = None
     if marker is not None:
-        marker_volume = get(context, marker, session)
+        marker_values = sqlalchemyutils.decode_marker(marker)
+        if marker_values is None:
+            marker_object = get(context, marker, session)
+        elif not all(key in marker_values for key in sort_keys):
+            # The token was generated for a different sort order, resolve
+            # the item it refers to instead.
+            marker_object = get(context, marker_values['id'], session)
+            marker_values = None
+
+    query = sqlalchemyutils.paginate_query(query, paginate_type, limit,
+                                           sort_keys,
+                                           marker=marker_object,
+                                           sort_dirs=sort_dirs,
+                                           offset=offset,
+                                           marker_values=marker_values)
+    if columns:
+        query = _project_columns(query, paginate_type, columns)
+    return query
+
+
+def _project_columns(query, model, columns):
+    """Restrict the query to return only the given columns of the model."""
+    try:
+        attrs = [model.__table__.c[column] for column in columns]
+    except KeyError as e:
+        raise exception.InvalidInput(
+            reason=_('Invalid column %s') % six.text_type(e))
+    return query.with_entities(*attrs)
 
-    return sqlalchemyutils.paginate_query(query, paginate_type, limit,
-                                          sort_keys,
-                                          marker=marker_volume,
-                                          sort_dirs=sort_dirs,
-                                          offset=offset)
+
+def _query_all(query, columns=None):
+    """Return all the results of the query.
+
+    If columns are given the query must have been restricted to them with
+    _project_columns and the results are returned as dictionaries, which
+    spares building the models.
+    """
+    if not columns:
+        return query.all()
+    return [dict(zip(columns, row)) for row in query.all()]
 
 
 def _process_volume_filters(query, filters):
@@ -2768,6 +3059,10 @@ def volume_get_active_by_window(context,
     if project_id:
         query = query.filter_by(project_id=project_id)
 
+    # NOTE: Without an explicit order the rows come back in the order of
+    # whichever index the database picks to scan.
+    query = query.order_by(models.Volume.created_at, models.Volume.id)
+
     return query.all()
 
 
@@ -3962,8 +4257,14 @@ def cgsnapshot_destroy(context, cgsnapshot_id):
 
 
 @require_admin_context
-def purge_deleted_rows(context, age_in_days):
-    """Purge deleted rows older than age from cinder tables."""
+def purge_deleted_rows(context, age_in_days, batch_size=None,
+                       progress=None):
+    """Purge deleted rows older than age from cinder tables.
+
+    Rows are deleted batch_size at a time, each batch in its own
+    transaction, and progress(table, rows_purged) is called after each
+    batch with the total number of rows purged from the table so far.
+    """
     try:
         age_in_days = int(age_in_days)
     except ValueError:
@@ -3974,6 +4275,10 @@ def purge_deleted_rows(context, age_in_days):
         msg = _('Must supply a positive value for age')
         LOG.error(msg)
         raise exception.InvalidParameterValue(msg)
+    if batch_size is not None and batch_size <= 0:
+        msg = _('Must supply a positive value for batch size')
+        LOG.error(msg)
+        raise exception.InvalidParameterValue(msg)
 
     engine = get_engine()
     session = get_session()
@@ -3989,25 +4294,57 @@ def purge_deleted_rows(context, age_in_days):
     # Reorder the list so the volumes table is last to avoid FK constraints
     tables.remove("volumes")
     tables.append("volumes")
+    total_purged = 0
     for table in tables:
         t = Table(table, metadata, autoload=True)
         LOG.info(_LI('Purging deleted rows older than age=%(age)d days '
                      'from table=%(table)s'), {'age': age_in_days,
                                                'table': table})
         deleted_age = timeutils.utcnow() - dt.timedelta(days=age_in_days)
+        rows_purged = 0
         try:
-            with session.begin():
-                result = session.execute(
-                    t.delete()
-                    .where(t.c.deleted_at < deleted_age))
+            if batch_size is None:
+                with session.begin():
+                    result = session.execute(
+                        t.delete()
+                        .where(t.c.deleted_at < deleted_age))
+                rows_purged = result.rowcount
+                if progress:
+                    progress(table, rows_purged)
+            else:
+                rows_purged = _purge_table_in_batches(
+                    session, t, deleted_age, batch_size, progress)
         except db_exc.DBReferenceError:
             LOG.exception(_LE('DBError detected when purging from '
                               'table=%(table)s'), {'table': table})
             raise
 
-        rows_purged = result.rowcount
         LOG.info(_LI("Deleted %(row)d rows from table=%(table)s"),
                  {'row': rows_purged, 'table': table})
+        total_purged += rows_purged
+
+    return total_purged
+
+
+def _purge_table_in_batches(session, t, deleted_age, batch_size, progress):
+    # NOTE: Select the primary keys of a batch first, as MySQL supports
+    # neither LIMIT on a multi-table DELETE nor in an IN subquery.
+    key = list(t.primary_key.columns)[0]
+    rows_purged = 0
+    while True:
+        with session.begin():
+            keys = [row[0] for row in session.execute(
+                sqlalchemy.select([key])
+                .where(t.c.deleted_at < deleted_age)
+                .order_by(key)
+                .limit(batch_size))]
+            if keys:
+                result = session.execute(t.delete().where(key.in_(keys)))
+                rows_purged += result.rowcount
+        if keys and progress:
+            progress(t.name, rows_purged)
+        if len(keys) < batch_size:
+            return rows_purged
 
 
 ###############################
@@ -4092,6 +4429,12 @@ def image_volume_cache_delete(context, volume_id):
             delete()
 
 
+# NOTE: Hits on an entry used more recently than this many seconds don't
+# update its last_used, so that a burst of volumes created from the same
+# image doesn't serialize on updating the same row.
+_IMAGE_VOLUME_CACHE_LAST_USED_RESOLUTION = 60
+
+
 @require_context
 def image_volume_cache_get_and_update_last_used(context, image_id, host):
     session = get_session()
@@ -4102,7 +4445,10 @@ def image_volume_cache_get_and_update_last_used(context, image_id, host):
             order_by(desc(models.ImageVolumeCacheEntry.last_used)).\
             first()
 
-        if entry:
+        if entry and (entry.last_used is None or
+                      timeutils.is_older_than(
+                          entry.last_used,
+                          _IMAGE_VOLUME_CACHE_LAST_USED_RESOLUTION)):
             entry.last_used = timeutils.utcnow()
             entry.save(session=session)
         return entry
@@ -4125,3 +4471,33 @@ def image_volume_cache_get_all_for_host(context, host):
             filter_by(host=host).\
             order_by(desc(models.ImageVolumeCacheEntry.last_used)).\
             all()
+
+
+@require_context
+def image_volume_cache_get_usage_for_host(context, host):
+    session = get_session()
+    with session.begin():
+        count, size = session.query(
+            func.count(models.ImageVolumeCacheEntry.id),
+            func.sum(models.ImageVolumeCacheEntry.size)).\
+            filter(models.ImageVolumeCacheEntry.host == host).\
+            one()
+    return {'count': count, 'size': int(size or 0)}
+
+
+@require_context
+def image_volume_cache_get_lru_for_host(context, host, limit=None,
+                                        marker=None):
+    entry_model = models.ImageVolumeCacheEntry
+    session = get_session()
+    with session.begin():
+        query = session.query(entry_model).filter_by(host=host)
+        if marker is not None:
+            query = query.filter(or_(
+                entry_model.last_used > marker['last_used'],
+                sqlalchemy.and_(entry_model.last_used == marker['last_used'],
+                                entry_model.id > marker['id'])))
+        query = query.order_by(entry_model.last_used, entry_model.id)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
@@ -0,0 +1,51 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Index, MetaData, Table
+
+# Based on the default sort order (created_at, id) of the paginated listings
+# from: cinder/db/sqlalchemy/api.py
+TABLES = ('volumes', 'snapshots', 'backups')
+
+
+def _get_indexes(table):
+    return (
+        ('%s_deleted_created_at_id_idx' % table.name,
+         (table.c.deleted, table.c.created_at, table.c.id)),
+        ('%s_project_id_deleted_created_at_id_idx' % table.name,
+         (table.c.project_id, table.c.deleted, table.c.created_at,
+          table.c.id)),
+    )
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    for table_name in TABLES:
+        table = Table(table_name, meta, autoload=True)
+        existing = [idx.name for idx in table.indexes]
+        for name, columns in _get_indexes(table):
+            if name not in existing:
+                Index(name, *columns).create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    for table_name in TABLES:
+        table = Table(table_name, meta, autoload=True)
+        names = [name for name, _columns in _get_indexes(table)]
+        for index in list(table.indexes):
+            if index.name in names:
+                index.drop(migrate_engine)
@@ -0,0 +1,47 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Index, MetaData, Table
+
+# Based on the image volume cache lookups and least recently used listing
+# from: cinder/db/sqlalchemy/api.py
+
+
+def _get_indexes(table):
+    return (
+        ('image_volume_cache_entries_host_image_id_last_used_idx',
+         (table.c.host, table.c.image_id, table.c.last_used)),
+        ('image_volume_cache_entries_host_last_used_idx',
+         (table.c.host, table.c.last_used)),
+    )
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    table = Table('image_volume_cache_entries', meta, autoload=True)
+    existing = [idx.name for idx in table.indexes]
+    for name, columns in _get_indexes(table):
+        if name not in existing:
+            Index(name, *columns).create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    table = Table('image_volume_cache_entries', meta, autoload=True)
+    names = [name for name, _columns in _get_indexes(table)]
+    for index in list(table.indexes):
+        if index.name in names:
+            index.drop(migrate_engine)
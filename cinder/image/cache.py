@@ -26,6 +26,9 @@ CONF = cfg.CONF
 
 LOG = logging.getLogger(__name__)
 
+# Number of least recently used entries fetched at a time for eviction.
+EVICTION_BATCH_SIZE = 10
+
 
 class ImageVolumeCache(object):
     def __init__(self, db, volume_api, max_cache_size_gb=0,
@@ -122,18 +125,11 @@ class ImageVolumeCache(object):
                 space_required > self.max_cache_size_gb):
             return False
 
-        # Assume the entries are ordered by most recently used to least used.
-        entries = self.db.image_volume_cache_get_all_for_host(context, host)
-
-        current_count = len(entries)
-
-        current_size = 0
-        for entry in entries:
-            current_size += entry['size']
+        usage = self.db.image_volume_cache_get_usage_for_host(context, host)
 
         # Add values for the entry we intend to create.
-        current_size += space_required
-        current_count += 1
+        current_size = usage['size'] + space_required
+        current_count = usage['count'] + 1
 
         LOG.debug('Image-volume cache for host %(host)s current_size (GB) = '
                   '%(size_gb)s (max = %(max_gb)s), current count = %(count)s '
@@ -144,9 +140,20 @@ class ImageVolumeCache(object):
                    'count': current_count,
                    'max_count': self.max_cache_size_count})
 
-        while ((current_size > self.max_cache_size_gb
-               or current_count > self.max_cache_size_count)
-               and len(entries)):
+        # Only fetch the least recently used entries as they are evicted.
+        # The volume of an evicted entry is deleted asynchronously, so the
+        # entries are paged through rather than fetched again.
+        entries = []
+        marker = None
+        while (current_size > self.max_cache_size_gb
+               or current_count > self.max_cache_size_count):
+            if not entries:
+                entries = self.db.image_volume_cache_get_lru_for_host(
+                    context, host, limit=EVICTION_BATCH_SIZE, marker=marker)
+                if not entries:
+                    break
+                marker = entries[-1]
+                entries.reverse()
             entry = entries.pop()
             LOG.debug('Reclaiming image-volume cache space; removing cache '
                       'entry %(entry)s.', {'entry': self._entry_to_str(entry)})
@@ -0,0 +1,213 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Node-local cache of images downloaded from the image service.
+
+Downloaded images are kept in image_download_cache_dir, named after the
+image id and checksum, so that creating many volumes from the same image
+on a node only downloads it once.  The cache is bounded by
+image_download_cache_max_size_gb and the least recently used images are
+evicted first.  It is shared by all the cinder processes of the node:
+populating an entry is serialized with a file lock, and an entry in use is
+held with a shared flock so that it is not evicted while it is being read.
+"""
+
+import contextlib
+import errno
+import fcntl
+import hashlib
+import os
+
+from oslo_concurrency import lockutils
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_utils import fileutils
+from oslo_utils import units
+
+from cinder import exception
+from cinder.i18n import _, _LI, _LW
+
+LOG = logging.getLogger(__name__)
+
+image_download_cache_opts = [
+    cfg.StrOpt('image_download_cache_dir',
+               help='Directory where images downloaded from the image '
+                    'service are cached to create further volumes from them '
+                    'without downloading them again.  The cache is disabled '
+                    'if unset.'),
+    cfg.IntOpt('image_download_cache_max_size_gb',
+               default=10,
+               help='Maximum total size in GB of the images in the image '
+                    'download cache.  The least recently used images are '
+                    'evicted to stay below it.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(image_download_cache_opts)
+
+_LOCK_PREFIX = 'cinder-image-download-cache-'
+
+_cache = None
+
+
+def get_cache():
+    """Return the image download cache, or None if it is disabled."""
+    global _cache
+    if not CONF.image_download_cache_dir:
+        return None
+    if (_cache is None or
+            _cache.cache_dir != CONF.image_download_cache_dir or
+            _cache.max_size != CONF.image_download_cache_max_size_gb *
+            units.Gi):
+        _cache = ImageDownloadCache(
+            CONF.image_download_cache_dir,
+            CONF.image_download_cache_max_size_gb * units.Gi)
+    return _cache
+
+
+class _HashingWriter(object):
+    """File wrapper computing the md5 of the data written to it."""
+
+    def __init__(self, image_file):
+        self.image_file = image_file
+        self.md5 = hashlib.md5()
+
+    def write(self, data):
+        self.md5.update(data)
+        self.image_file.write(data)
+
+
+class ImageDownloadCache(object):
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.lock_path = os.path.join(cache_dir, '.locks')
+
+    def is_cacheable(self, image_meta):
+        """Whether an image can be cached.
+
+        Images without a checksum can't be told apart from a changed image
+        with the same id, and images bigger than the cache are not cached.
+        """
+        if not image_meta or not image_meta.get('checksum'):
+            return False
+        size = image_meta.get('size')
+        return size is not None and size <= self.max_size
+
+    def _entry_path(self, image_id, image_meta):
+        return os.path.join(self.cache_dir,
+                            '%s-%s' % (image_id, image_meta['checksum']))
+
+    def _lock(self, name):
+        return lockutils.lock(name, lock_file_prefix=_LOCK_PREFIX,
+                              external=True, lock_path=self.lock_path)
+
+    @contextlib.contextmanager
+    def fetch(self, context, image_service, image_id, image_meta):
+        """Yield the path of the cached image, downloading it if needed.
+
+        The path is only valid within the context: the entry can't be
+        evicted until then.
+        """
+        path = self._entry_path(image_id, image_meta)
+        with self._lock(os.path.basename(path)):
+            while True:
+                try:
+                    entry = open(path, 'rb')
+                except IOError as e:
+                    if e.errno != errno.ENOENT:
+                        raise
+                    self._populate(context, image_service, image_id,
+                                   image_meta, path)
+                    continue
+                fcntl.flock(entry, fcntl.LOCK_SH)
+                if os.fstat(entry.fileno()).st_nlink:
+                    break
+                # Evicted between the open and the flock
+                entry.close()
+
+            LOG.debug("Using image %(id)s from the download cache at "
+                      "%(path)s.", {'id': image_id, 'path': path})
+            # The modification time orders the entries for eviction
+            os.utime(path, None)
+
+        try:
+            yield path
+        finally:
+            fcntl.flock(entry, fcntl.LOCK_UN)
+            entry.close()
+
+    def _populate(self, context, image_service, image_id, image_meta, path):
+        fileutils.ensure_tree(self.cache_dir)
+        self._evict(image_meta['size'])
+
+        part_path = os.path.join(self.cache_dir,
+                                 '.%s.part' % os.path.basename(path))
+        with fileutils.remove_path_on_error(part_path):
+            with open(part_path, 'wb') as image_file:
+                writer = _HashingWriter(image_file)
+                image_service.download(context, image_id, writer)
+            if writer.md5.hexdigest() != image_meta['checksum']:
+                raise exception.ImageUnacceptable(
+                    image_id=image_id,
+                    reason=_("Downloaded image checksum %(actual)s doesn't "
+                             "match the expected %(expected)s.") %
+                    {'actual': writer.md5.hexdigest(),
+                     'expected': image_meta['checksum']})
+            os.rename(part_path, path)
+        LOG.info(_LI("Image %(id)s added to the download cache at "
+                     "%(path)s."), {'id': image_id, 'path': path})
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.startswith('.'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Evicted meanwhile
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self, size):
+        """Evict the least recently used entries to make room for size."""
+        with self._lock('evict'):
+            entries = sorted(self._entries())
+            total = sum(entry_size for _mtime, entry_size, _path in entries)
+            for _mtime, entry_size, path in entries:
+                if total + size <= self.max_size:
+                    break
+                if self._remove_unused(path):
+                    total -= entry_size
+            if total + size > self.max_size:
+                LOG.warning(_LW("Image download cache %(dir)s is over its "
+                                "maximum size, all the images in it are in "
+                                "use."), {'dir': self.cache_dir})
+
+    def _remove_unused(self, path):
+        try:
+            entry = open(path, 'rb')
+        except IOError:
+            return False
+        with entry:
+            try:
+                fcntl.flock(entry, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError:
+                LOG.debug("Not evicting %s from the image download cache, "
+                          "it is in use.", path)
+                return False
+            fileutils.delete_if_exists(path)
+        LOG.debug("Evicted %s from the image download cache.", path)
+        return True
@@ -20,23 +20,31 @@
 from __future__ import absolute_import
 
 import copy
+import hashlib
+import io
 import itertools
+import os
 import random
 import shutil
+import stat
 import sys
 import time
 
+import eventlet
+from eventlet import tpool
 import glanceclient.exc
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import timeutils
+from oslo_utils import units
+import requests
 import six
 from six.moves import range
 from six.moves import urllib
 
 from cinder import exception
-from cinder.i18n import _LE, _LW
+from cinder.i18n import _, _LE, _LW
 
 
 glance_opts = [
@@ -45,6 +53,16 @@ glance_opts = [
                 help='A list of url schemes that can be downloaded directly '
                      'via the direct_url.  Currently supported schemes: '
                      '[file].'),
+    cfg.IntOpt('glance_download_connections',
+               default=1,
+               help='Number of concurrent HTTP connections used to download '
+                    'an image into a file, each one fetching a byte range of '
+                    'the image.  Images are downloaded over a single '
+                    'connection if set to 1.'),
+    cfg.IntOpt('glance_download_min_range_mb',
+               default=64,
+               help='Minimum size in MB of the byte ranges of an image '
+                    'downloaded over several connections.'),
 ]
 glance_core_properties_opts = [
     cfg.ListOpt('glance_core_properties',
@@ -60,6 +78,8 @@ CONF.import_opt('glance_api_version', 'cinder.common.config')
 
 LOG = logging.getLogger(__name__)
 
+_RANGE_CHUNK_SIZE = 64 * units.Ki
+
 
 def _parse_image_ref(image_href):
     """Parse an image href into composite parts.
@@ -146,11 +166,21 @@ class GlanceClientWrapper(object):
                                      self.netloc,
                                      self.use_ssl, self.version)
 
-    def _create_onetime_client(self, context, version):
-        """Create a client that will be used for one call."""
+    def _next_server(self):
         if self.api_servers is None:
             self.api_servers = get_api_servers()
         self.netloc, self.use_ssl = next(self.api_servers)
+
+    def get_endpoint(self):
+        """Return the endpoint URL of the glance server to send calls to."""
+        if self.client is None:
+            self._next_server()
+        scheme = 'https' if self.use_ssl else 'http'
+        return '%s://%s' % (scheme, self.netloc)
+
+    def _create_onetime_client(self, context, version):
+        """Create a client that will be used for one call."""
+        self._next_server()
         return _create_glance_client(context,
                                      self.netloc,
                                      self.use_ssl, version)
@@ -312,6 +342,11 @@ class GlanceImageService(object):
                         shutil.copyfileobj(f, data)
                     return
 
+        if (data and CONF.glance_download_connections > 1 and
+                _is_regular_file(data)):
+            if self._download_ranges(context, image_id, data):
+                return
+
         try:
             image_chunks = self._client.call(context, 'data', image_id)
         except Exception:
@@ -323,6 +358,79 @@ class GlanceImageService(object):
             for chunk in image_chunks:
                 data.write(chunk)
 
+    def _download_ranges(self, context, image_id, data):
+        """Download an image over several connections into a file.
+
+        The image is split into byte ranges which are fetched concurrently
+        and written at their offset in the file.  Returns False if the
+        image is too small to be split or the ranges couldn't be fetched,
+        the file is then left as it was to download the image sequentially.
+        """
+        try:
+            image = self._client.call(context, 'get', image_id)
+        except Exception:
+            _reraise_translated_image_exception(image_id)
+        size = getattr(image, 'size', None)
+        if not size:
+            return False
+        ranges = _split_ranges(size, CONF.glance_download_connections,
+                               CONF.glance_download_min_range_mb * units.Mi)
+        if len(ranges) < 2:
+            return False
+
+        endpoint = self._client.get_endpoint()
+        version = self._client.version or CONF.glance_api_version
+        if version == 1:
+            url = '%s/v1/images/%s' % (endpoint, image_id)
+        else:
+            url = '%s/v2/images/%s/file' % (endpoint, image_id)
+        headers = {}
+        if CONF.auth_strategy == 'keystone':
+            headers['X-Auth-Token'] = context.auth_token
+        kwargs = {'headers': headers,
+                  'timeout': CONF.glance_request_timeout,
+                  'stream': True}
+        if endpoint.startswith('https'):
+            kwargs['verify'] = (CONF.glance_ca_certificates_file or
+                                not CONF.glance_api_insecure)
+
+        data.flush()
+        base = data.tell()
+        fd = data.fileno()
+        start_time = time.time()
+        pool = eventlet.GreenPool(len(ranges))
+        pile = eventlet.GreenPile(pool)
+        for start, end in ranges:
+            pile.spawn(_download_range, url, kwargs, fd, base, start, end)
+        errors = [error for error in pile if error]
+        checksum = getattr(image, 'checksum', None)
+        if not errors and checksum:
+            # The glance client verifies the checksum of sequential
+            # downloads, the ranges can only be verified once all written
+            actual = tpool.execute(_md5_of_range, fd, base, size)
+            if actual != checksum:
+                errors.append(_("Checksum %(actual)s of the downloaded image "
+                                "doesn't match the expected %(expected)s.") %
+                              {'actual': actual, 'expected': checksum})
+        if errors:
+            LOG.warning(_LW("Ranged download of image %(id)s from "
+                            "%(url)s failed, downloading it over a single "
+                            "connection: %(error)s"),
+                        {'id': image_id, 'url': url, 'error': errors[0]})
+            data.seek(base)
+            data.truncate()
+            return False
+
+        data.seek(base + size)
+        duration = max(time.time() - start_time, 0.001)
+        LOG.debug("Downloaded image %(id)s of %(size)d bytes over "
+                  "%(connections)d connections in %(duration).2f seconds "
+                  "(%(mbps).2f MB/s).",
+                  {'id': image_id, 'size': size,
+                   'connections': len(ranges), 'duration': duration,
+                   'mbps': size / duration / units.Mi})
+        return True
+
     def create(self, context, image_meta, data=None):
         """Store the image data and return the new image object."""
         sent_service_image_meta = self._translate_to_glance(image_meta)
@@ -488,6 +596,100 @@ def _convert_to_string(metadata):
     return _convert(_json_dumps, metadata)
 
 
+class _RangeDownloadFailed(Exception):
+    pass
+
+
+def _is_regular_file(data):
+    """Whether data is a file object of a regular file."""
+    try:
+        fd = data.fileno()
+    except (AttributeError, IOError, io.UnsupportedOperation):
+        return False
+    return stat.S_ISREG(os.fstat(fd).st_mode)
+
+
+def _split_ranges(size, count, min_range_size):
+    """Split size bytes into at most count inclusive (start, end) ranges."""
+    count = max(1, min(count, size // max(min_range_size, 1)))
+    range_size = -(-size // count)
+    return [(start, min(start + range_size, size) - 1)
+            for start in range(0, size, range_size)]
+
+
+def _download_range(url, kwargs, fd, base, start, end):
+    """Fetch the inclusive byte range start-end of an image into fd.
+
+    Returns the error if the range couldn't be fetched, None otherwise.
+    """
+    headers = dict(kwargs['headers'], Range='bytes=%d-%d' % (start, end))
+    try:
+        response = requests.get(url, **dict(kwargs, headers=headers))
+        _write_range(response, fd, base, start, end)
+    except (_RangeDownloadFailed, requests.RequestException) as e:
+        return e
+
+
+def _write_range(response, fd, base, start, end):
+    """Write the body of the response to a range request into fd."""
+    try:
+        if response.status_code != 206:
+            raise _RangeDownloadFailed(
+                _("Unexpected status %(status)d for range %(start)d-%(end)d.")
+                % {'status': response.status_code, 'start': start,
+                   'end': end})
+        offset = start
+        for chunk in response.iter_content(_RANGE_CHUNK_SIZE):
+            if offset + len(chunk) > end + 1:
+                raise _RangeDownloadFailed(
+                    _("Too much data received for range %(start)d-%(end)d.")
+                    % {'start': start, 'end': end})
+            _pwrite(fd, chunk, base + offset)
+            offset += len(chunk)
+        if offset != end + 1:
+            raise _RangeDownloadFailed(
+                _("Only %(received)d bytes received for range "
+                  "%(start)d-%(end)d.") %
+                {'received': offset - start, 'start': start, 'end': end})
+    finally:
+        response.close()
+
+
+def _md5_of_range(fd, offset, size):
+    """Return the md5 of size bytes at offset in the file open as fd.
+
+    The file is opened again to be read, fd may be open for writing only.
+    """
+    md5 = hashlib.md5()
+    read_fd = os.open('/proc/self/fd/%d' % fd, os.O_RDONLY)
+    try:
+        os.lseek(read_fd, offset, os.SEEK_SET)
+        while size > 0:
+            chunk = os.read(read_fd, min(size, _RANGE_CHUNK_SIZE))
+            if not chunk:
+                break
+            md5.update(chunk)
+            size -= len(chunk)
+    finally:
+        os.close(read_fd)
+    return md5.hexdigest()
+
+
+def _pwrite(fd, chunk, offset):
+    """Write chunk at offset in fd, leaving the offset of fd undefined."""
+    view = memoryview(chunk)
+    while view:
+        if hasattr(os, 'pwrite'):
+            written = os.pwrite(fd, view, offset)
+        else:
+            # NOTE: The fd is shared by the greenthreads of the download,
+            # which can't switch between the seek and the write.
+            os.lseek(fd, offset, os.SEEK_SET)
+            written = os.write(fd, view)
+        view = view[written:]
+        offset += written
+
+
 def _extract_attributes(image):
     # NOTE(hdd): If a key is not found, base.Resource.__getattr__() may perform
     # a get(), resulting in a useless request back to glance. This list is
@@ -25,9 +25,11 @@ we should look at maybe pushing this up to Oslo
 
 
 import contextlib
+import hashlib
 import math
 import os
 import re
+import stat
 import tempfile
 
 from oslo_concurrency import processutils
@@ -39,6 +41,7 @@ from oslo_utils import units
 
 from cinder import exception
 from cinder.i18n import _, _LI, _LW
+from cinder.image import download_cache
 from cinder.openstack.common import imageutils
 from cinder import utils
 from cinder.volume import throttling
@@ -49,11 +52,20 @@ LOG = logging.getLogger(__name__)
 image_helper_opts = [cfg.StrOpt('image_conversion_dir',
                                 default='$state_path/conversion',
                                 help='Directory used for temporary storage '
-                                'during image conversion'), ]
+                                'during image conversion'),
+                     cfg.BoolOpt('image_stream_skip_zeros',
+                                 default=False,
+                                 help='When raw images are streamed into a '
+                                 'volume, skip writing the chunks which are '
+                                 'all zeros.  Only enable it if new volumes '
+                                 'read back as zeros.'), ]
 
 CONF = cfg.CONF
 CONF.register_opts(image_helper_opts)
 
+# NOTE: The part of an image that qemu-img needs to probe its format
+IMAGE_HEADER_SIZE = 64 * units.Ki
+
 
 def qemu_img_info(path, run_as_root=True):
     """Return a object containing the parsed output from qemu-img info."""
@@ -234,6 +246,12 @@ def fetch_to_volume_format(context, image_service,
     qemu_img = True
     image_meta = image_service.show(context, image_id)
 
+    if (volume_format == 'raw' and
+            can_stream_image(context, image_service, image_id, image_meta)):
+        stream_to_volume(context, image_service, image_id, image_meta, dest,
+                         size=size, run_as_root=run_as_root)
+        return
+
     # NOTE(avishay): I'm not crazy about creating temp files which may be
     # large and cause disk full errors which would confuse users.
     # Unfortunately it seems that you can't pipe to 'qemu-img convert' because
@@ -265,72 +283,315 @@ def fetch_to_volume_format(context, image_service,
                              "can be used if qemu-img is not installed."),
                     image_id=image_id)
 
-        tmp_images = TemporaryImages.for_image_service(image_service)
-        tmp_image = tmp_images.get(context, image_id)
-        if tmp_image:
-            tmp = tmp_image
-        else:
-            fetch(context, image_service, image_id, tmp, user_id, project_id)
-
-        if is_xenserver_image(context, image_service, image_id):
-            replace_xenserver_image_with_coalesced_vhd(tmp)
-
-        if not qemu_img:
-            # qemu-img is not installed but we do have a RAW image.  As a
-            # result we only need to copy the image to the destination and then
-            # return.
-            LOG.debug('Copying image from %(tmp)s to volume %(dest)s - '
-                      'size: %(size)s', {'tmp': tmp, 'dest': dest,
-                                         'size': image_meta['size']})
-            image_size_m = math.ceil(image_meta['size'] / units.Mi)
-            volume_utils.copy_volume(tmp, dest, image_size_m, blocksize)
+        with _fetched_image(context, image_service, image_id, image_meta,
+                            tmp, user_id, project_id) as tmp:
+            if not qemu_img:
+                # qemu-img is not installed but we do have a RAW image.  As
+                # a result we only need to copy the image to the destination
+                # and then return.
+                LOG.debug('Copying image from %(tmp)s to volume %(dest)s - '
+                          'size: %(size)s', {'tmp': tmp, 'dest': dest,
+                                             'size': image_meta['size']})
+                image_size_m = math.ceil(image_meta['size'] / units.Mi)
+                volume_utils.copy_volume(tmp, dest, image_size_m, blocksize)
+                return
+
+            data = qemu_img_info(tmp, run_as_root=run_as_root)
+            virt_size = data.virtual_size / units.Gi
+
+            # NOTE(xqueralt): If the image virtual size doesn't fit in the
+            # requested volume there is no point on resizing it because it will
+            # generate an unusable image.
+            if size is not None and virt_size > size:
+                params = {'image_size': virt_size, 'volume_size': size}
+                reason = _("Size is %(image_size)dGB and doesn't fit in a "
+                           "volume of size %(volume_size)dGB.") % params
+                raise exception.ImageUnacceptable(image_id=image_id,
+                                                  reason=reason)
+
+            fmt = data.file_format
+            if fmt is None:
+                raise exception.ImageUnacceptable(
+                    reason=_("'qemu-img info' parsing failed."),
+                    image_id=image_id)
+
+            backing_file = data.backing_file
+            if backing_file is not None:
+                raise exception.ImageUnacceptable(
+                    image_id=image_id,
+                    reason=_("fmt=%(fmt)s backed by:%(backing_file)s")
+                    % {'fmt': fmt, 'backing_file': backing_file, })
+
+            # NOTE(jdg): I'm using qemu-img convert to write
+            # to the volume regardless if it *needs* conversion or not
+            # NOTE: Bare raw images are written directly to the device by
+            # stream_to_volume instead, which checks with 'qemu-img info'
+            # that their header is in fact raw and not a different format
+            # with a backing file, which may be malicious.
+            LOG.debug("%s was %s, converting to %s ", image_id, fmt,
+                      volume_format)
+            convert_image(tmp, dest, volume_format,
+                          run_as_root=run_as_root)
+
+            data = qemu_img_info(dest, run_as_root=run_as_root)
+
+            if not _validate_file_format(data, volume_format):
+                raise exception.ImageUnacceptable(
+                    image_id=image_id,
+                    reason=_("Converted to %(vol_format)s, but format is "
+                             "now %(file_format)s") %
+                    {'vol_format': volume_format,
+                     'file_format': data.file_format})
+
+
+def can_stream_image(context, image_service, image_id, image_meta):
+    """Whether an image can be written into a raw volume as it downloads.
+
+    Only bare raw images need no conversion, and images already fetched by
+    TemporaryImages or held by the download cache are copied from there.
+    Nothing is streamed while the copy bandwidth is throttled.
+    """
+    if not image_meta or image_meta.get('disk_format') != 'raw':
+        return False
+    if image_meta.get('container_format') not in (None, 'bare'):
+        return False
+    # NOTE: volume_copy_bps_limit throttles the commands which copy the
+    # image, it can't throttle the writes of the volume service itself.
+    if throttling.Throttle.get_default().prefix:
+        return False
+    tmp_images = TemporaryImages.for_image_service(image_service)
+    if tmp_images.get(context, image_id):
+        return False
+    cache = download_cache.get_cache()
+    return not (cache and cache.is_cacheable(image_meta))
+
+
+def check_raw_image_header(image_id, header):
+    """Reject a raw image whose header is the one of another format.
+
+    qemu-img probes the format of an image from its first bytes, so the
+    header of a streamed image is enough to catch e.g. a qcow2 image with
+    a backing file uploaded as raw.
+    """
+    with temporary_file() as tmp:
+        with open(tmp, 'wb') as header_file:
+            header_file.write(header)
+        try:
+            data = qemu_img_info(tmp, run_as_root=False)
+        except processutils.ProcessExecutionError:
+            data = None
+
+    if data is None or data.file_format is None:
+        raise exception.ImageUnacceptable(
+            reason=_("'qemu-img info' parsing failed."),
+            image_id=image_id)
+
+    if data.file_format != 'raw':
+        raise exception.ImageUnacceptable(
+            image_id=image_id,
+            reason=_("Image is not raw, its format is %s.") %
+            data.file_format)
+
+    if data.backing_file is not None:
+        raise exception.ImageUnacceptable(
+            image_id=image_id,
+            reason=(_("fmt=%(fmt)s backed by: %(backing_file)s") %
+                    {'fmt': data.file_format,
+                     'backing_file': data.backing_file}))
+
+
+def check_image_size(image_id, image_size, volume_size):
+    """Reject an image of image_size bytes too big for a volume of size GB."""
+    if volume_size is not None and image_size and \
+            image_size > volume_size * units.Gi:
+        params = {'image_size': image_size / float(units.Gi),
+                  'volume_size': volume_size}
+        reason = _("Size is %(image_size).2fGB and doesn't fit in a "
+                   "volume of size %(volume_size)dGB.") % params
+        raise exception.ImageUnacceptable(image_id=image_id, reason=reason)
+
+
+def check_streamed_image(image_id, image_meta, writer, volume_size=None):
+    """Check an image downloaded through an ImageStreamWriter.
+
+    Its actual size must fit in the volume and its checksum, when known,
+    must match.  Its header was already checked by the writer.
+    """
+    check_image_size(image_id, writer.size, volume_size)
+
+    checksum = image_meta.get('checksum')
+    if checksum and writer.md5.hexdigest() != checksum:
+        raise exception.ImageUnacceptable(
+            image_id=image_id,
+            reason=_("Downloaded image checksum %(actual)s doesn't match "
+                     "the expected %(expected)s.") %
+            {'actual': writer.md5.hexdigest(), 'expected': checksum})
+
+
+class ImageStreamWriter(object):
+    """Base class of the writers an image download is streamed into.
+
+    Counts the bytes of the image, keeps its header and, if checksum,
+    computes their md5 for check_streamed_image.  When image_id is given,
+    the header is checked by check_raw_image_header before anything is
+    written, so the data is held back until the first IMAGE_HEADER_SIZE
+    bytes or the end of the image.  Subclasses write the data in
+    _write_data, or when skip_zeros is set, skip the chunks which are all
+    zeros in _skip_zeros, and call close() at the end of the image.
+    """
+
+    def __init__(self, skip_zeros=False, checksum=True, image_id=None):
+        self.skip_zeros = skip_zeros
+        self.md5 = hashlib.md5() if checksum else None
+        self.image_id = image_id
+        self.header = b''
+        self.size = 0
+        self.skipped = 0
+        self._zeros = b''
+        self._held = [] if image_id is not None else None
+
+    def _is_zeros(self, data):
+        if len(self._zeros) != len(data):
+            self._zeros = b'\0' * len(data)
+        return data == self._zeros
+
+    def write(self, data):
+        if self.md5:
+            self.md5.update(data)
+        if len(self.header) < IMAGE_HEADER_SIZE:
+            self.header += data[:IMAGE_HEADER_SIZE - len(self.header)]
+        if self._held is None:
+            self._put(data)
             return
+        self._held.append(data)
+        if len(self.header) >= IMAGE_HEADER_SIZE:
+            self._check_header()
+
+    def _check_header(self):
+        held, self._held = self._held, None
+        check_raw_image_header(self.image_id, self.header)
+        for data in held:
+            self._put(data)
+
+    def _put(self, data):
+        if self.skip_zeros and self._is_zeros(data):
+            self._skip_zeros(data)
+            self.skipped += len(data)
+        else:
+            self._write_data(data)
+        self.size += len(data)
 
-        data = qemu_img_info(tmp, run_as_root=run_as_root)
-        virt_size = data.virtual_size / units.Gi
+    def _write_data(self, data):
+        raise NotImplementedError()
 
-        # NOTE(xqueralt): If the image virtual size doesn't fit in the
-        # requested volume there is no point on resizing it because it will
-        # generate an unusable image.
-        if size is not None and virt_size > size:
-            params = {'image_size': virt_size, 'volume_size': size}
-            reason = _("Size is %(image_size)dGB and doesn't fit in a "
-                       "volume of size %(volume_size)dGB.") % params
-            raise exception.ImageUnacceptable(image_id=image_id, reason=reason)
+    def _skip_zeros(self, data):
+        raise NotImplementedError()
 
-        fmt = data.file_format
-        if fmt is None:
-            raise exception.ImageUnacceptable(
-                reason=_("'qemu-img info' parsing failed."),
-                image_id=image_id)
+    def close(self):
+        """Check the header of an image shorter than IMAGE_HEADER_SIZE."""
+        if self._held is not None:
+            self._check_header()
 
-        backing_file = data.backing_file
-        if backing_file is not None:
-            raise exception.ImageUnacceptable(
-                image_id=image_id,
-                reason=_("fmt=%(fmt)s backed by:%(backing_file)s")
-                % {'fmt': fmt, 'backing_file': backing_file, })
-
-        # NOTE(jdg): I'm using qemu-img convert to write
-        # to the volume regardless if it *needs* conversion or not
-        # TODO(avishay): We can speed this up by checking if the image is raw
-        # and if so, writing directly to the device. However, we need to keep
-        # check via 'qemu-img info' that what we copied was in fact a raw
-        # image and not a different format with a backing file, which may be
-        # malicious.
-        LOG.debug("%s was %s, converting to %s ", image_id, fmt, volume_format)
-        convert_image(tmp, dest, volume_format,
-                      run_as_root=run_as_root)
 
-        data = qemu_img_info(dest, run_as_root=run_as_root)
+class _VolumeImageWriter(ImageStreamWriter):
+    """Write the chunks of an image into an open volume file.
 
-        if not _validate_file_format(data, volume_format):
-            raise exception.ImageUnacceptable(
-                image_id=image_id,
-                reason=_("Converted to %(vol_format)s, but format is "
-                         "now %(file_format)s") % {'vol_format': volume_format,
-                                                   'file_format': data.
-                                                   file_format})
+    When skip_zeros is set, seeks over the chunks which are all zeros
+    instead of writing them.
+    """
+
+    def __init__(self, volume_file, skip_zeros=False, image_id=None):
+        super(_VolumeImageWriter, self).__init__(skip_zeros,
+                                                 image_id=image_id)
+        self.volume_file = volume_file
+
+    def _write_data(self, data):
+        self.volume_file.write(data)
+
+    def _skip_zeros(self, data):
+        self.volume_file.seek(len(data), os.SEEK_CUR)
+
+    def close(self):
+        super(_VolumeImageWriter, self).close()
+        # Zeros skipped at the end of a volume file still have to extend it
+        file_stat = os.fstat(self.volume_file.fileno())
+        if stat.S_ISREG(file_stat.st_mode) and file_stat.st_size < self.size:
+            self.volume_file.truncate(self.size)
+        self.volume_file.flush()
+        os.fsync(self.volume_file.fileno())
+
+
+def stream_to_volume(context, image_service, image_id, image_meta, dest,
+                     size=None, run_as_root=True):
+    """Write a raw image into a volume as it is downloaded.
+
+    Avoids the temporary copy of the image, and so the scratch space and
+    the I/O of writing it.  The header of the image is checked before
+    anything is written, the rest by check_streamed_image.
+    """
+    check_image_size(image_id, image_meta.get('size'), size)
+
+    LOG.debug("Streaming raw image %(id)s into volume %(dest)s.",
+              {'id': image_id, 'dest': dest})
+    start_time = timeutils.utcnow()
+    if run_as_root:
+        with utils.temporary_chown(dest):
+            writer = _download_to_volume(context, image_service, image_id,
+                                         dest)
+    else:
+        writer = _download_to_volume(context, image_service, image_id, dest)
+
+    check_streamed_image(image_id, image_meta, writer, size)
+
+    duration = max(timeutils.delta_seconds(start_time, timeutils.utcnow()),
+                   1)
+    fsz_mb = writer.size / float(units.Mi)
+    LOG.info(_LI("Image streamed to volume %(dest)s: %(sz).2f MB at "
+                 "%(mbps).2f MB/s, %(skipped).2f MB of zeros skipped"),
+             {'dest': dest, 'sz': fsz_mb, 'mbps': fsz_mb / duration,
+              'skipped': writer.skipped / float(units.Mi)})
+
+
+def _download_to_volume(context, image_service, image_id, dest):
+    # NOTE: Don't truncate a volume file.  A missing one is created, which
+    # only helps when not run as root: temporary_chown() stats it first.
+    fd = os.open(dest, os.O_WRONLY | os.O_CREAT, 0o660)
+    with os.fdopen(fd, 'wb') as volume_file:
+        writer = _VolumeImageWriter(volume_file, CONF.image_stream_skip_zeros,
+                                    image_id=image_id)
+        image_service.download(context, image_id, writer)
+        writer.close()
+    return writer
+
+
+@contextlib.contextmanager
+def _fetched_image(context, image_service, image_id, image_meta, tmp,
+                   user_id, project_id):
+    """Yield the path of the image, downloaded to tmp unless it is cached.
+
+    Images already fetched by TemporaryImages are used as is, and images
+    that can be cached are used from the node's image download cache.
+    """
+    tmp_images = TemporaryImages.for_image_service(image_service)
+    tmp_image = tmp_images.get(context, image_id)
+    if tmp_image:
+        tmp = tmp_image
+    else:
+        cache = download_cache.get_cache()
+        # NOTE: XenServer images are coalesced in place, so the cached
+        # copy can't be used for them.
+        if (cache and cache.is_cacheable(image_meta) and
+                not is_xenserver_format(image_meta)):
+            with cache.fetch(context, image_service, image_id,
+                             image_meta) as cached:
+                yield cached
+            return
+        fetch(context, image_service, image_id, tmp, user_id, project_id)
+
+    if is_xenserver_image(context, image_service, image_id):
+        replace_xenserver_image_with_coalesced_vhd(tmp)
+
+    yield tmp
 
 
 def _validate_file_format(image_data, expected_format):
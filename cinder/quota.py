@@ -369,14 +369,7 @@ class DbQuotaDriver(object):
         """
 
         # Set up the reservation expiration
-        if expire is None:
-            expire = CONF.reservation_expire
-        if isinstance(expire, six.integer_types):
-            expire = datetime.timedelta(seconds=expire)
-        if isinstance(expire, datetime.timedelta):
-            expire = timeutils.utcnow() + expire
-        if not isinstance(expire, datetime.datetime):
-            raise exception.InvalidReservationExpiration(expire=expire)
+        expire = self._get_reservation_expire(expire)
 
         # If project_id is None, then we use the project_id in context
         if project_id is None:
@@ -398,6 +391,56 @@ class DbQuotaDriver(object):
                                 CONF.until_refresh, CONF.max_age,
                                 project_id=project_id)
 
+    def reserve_batch(self, context, resources, deltas_list, expire=None,
+                      project_id=None):
+        """Check quotas and reserve resources for several items at once.
+
+        Works like reserve(), but checks the quotas against the sum of
+        all the deltas and creates the reservations of every item in a
+        single transaction, so either all the items are reserved or an
+        OverQuota exception is raised.  Returns a list holding the list
+        of reservation UUIDs of each item.
+
+        :param context: The request context, for access checks.
+        :param resources: A dictionary of the registered resources.
+        :param deltas_list: A list of dictionaries of the proposed delta
+                            changes, one per item.
+        :param expire: An optional parameter specifying an expiration
+                       time for the reservations, as for reserve().
+        :param project_id: Specify the project_id if current context
+                           is admin and admin wants to impact on
+                           common user's tenant.
+        """
+
+        expire = self._get_reservation_expire(expire)
+
+        # If project_id is None, then we use the project_id in context
+        if project_id is None:
+            project_id = context.project_id
+
+        keys = set()
+        for deltas in deltas_list:
+            keys.update(deltas.keys())
+        quotas = self._get_quotas(context, resources, keys,
+                                  has_sync=True, project_id=project_id)
+
+        return db.quota_reserve_batch(context, resources, quotas,
+                                      deltas_list, expire,
+                                      CONF.until_refresh, CONF.max_age,
+                                      project_id=project_id)
+
+    def _get_reservation_expire(self, expire):
+        """Return the absolute expiration time of new reservations."""
+        if expire is None:
+            expire = CONF.reservation_expire
+        if isinstance(expire, six.integer_types):
+            expire = datetime.timedelta(seconds=expire)
+        if isinstance(expire, datetime.timedelta):
+            expire = timeutils.utcnow() + expire
+        if not isinstance(expire, datetime.datetime):
+            raise exception.InvalidReservationExpiration(expire=expire)
+        return expire
+
     def commit(self, context, reservations, project_id=None):
         """Commit reservations.
 
@@ -811,6 +854,36 @@ class QuotaEngine(object):
 
         return reservations
 
+    def reserve_batch(self, context, deltas_list, expire=None,
+                      project_id=None):
+        """Check quotas and reserve resources for several items at once.
+
+        Like reserve(), but takes a list with the deltas of each item,
+        e.g. of each volume of a multi-volume request.  The quotas are
+        checked against the sum of the deltas and all the reservations
+        are created in one transaction, so either every item fits in
+        the quotas or an OverQuota exception is raised.  Returns a list
+        holding the list of reservation UUIDs of each item, which are
+        committed or rolled back as usual.
+
+        :param context: The request context, for access checks.
+        :param deltas_list: A list of dictionaries of the proposed delta
+                            changes, one per item.
+        :param expire: An optional parameter specifying an expiration
+                       time for the reservations, as for reserve().
+        :param project_id: Specify the project_id if current context
+                           is admin and admin wants to impact on
+                           common user's tenant.
+        """
+
+        reservations = self._driver.reserve_batch(context, self.resources,
+                                                  deltas_list, expire=expire,
+                                                  project_id=project_id)
+
+        LOG.debug("Created reservations %s", reservations)
+
+        return reservations
+
     def commit(self, context, reservations, project_id=None):
         """Commit reservations.
 
@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import operator
 import re
 
@@ -23,6 +24,12 @@ from cinder import exception
 from cinder.i18n import _
 
 
+_VARIABLE_RE = re.compile(r"^[a-zA-Z_]+\.[a-zA-Z_]+$")
+
+# Maximum number of parsed expressions kept by evaluate().
+_EXPRESSION_CACHE_SIZE = 256
+
+
 def _operatorOperands(tokenList):
     it = iter(tokenList)
     while 1:
@@ -37,21 +44,22 @@ def _operatorOperands(tokenList):
 class EvalConstant(object):
     def __init__(self, toks):
         self.value = toks[0]
-
-    def eval(self):
-        result = self.value
-        if (isinstance(result, six.string_types) and
-                re.match("^[a-zA-Z_]+\.[a-zA-Z_]+$", result)):
-            (which_dict, entry) = result.split('.')
+        self.variable = None
+        self.number = None
+        if (isinstance(self.value, six.string_types) and
+                _VARIABLE_RE.match(self.value)):
+            self.variable = self.value.split('.')
+        else:
+            # Literals do not depend on the evaluated stats, so convert
+            # them once at parse time.  Conversion errors are still raised
+            # from eval() below.
             try:
-                result = _vars[which_dict][entry]
-            except KeyError as e:
-                raise exception.EvaluatorParseException(
-                    _("KeyError: %s") % six.text_type(e))
-            except TypeError as e:
-                raise exception.EvaluatorParseException(
-                    _("TypeError: %s") % six.text_type(e))
+                self.number = self._to_number(self.value)
+            except exception.EvaluatorParseException:
+                pass
 
+    @staticmethod
+    def _to_number(result):
         try:
             result = int(result)
         except ValueError:
@@ -63,6 +71,24 @@ class EvalConstant(object):
 
         return result
 
+    def eval(self):
+        if self.number is not None:
+            return self.number
+
+        result = self.value
+        if self.variable is not None:
+            (which_dict, entry) = self.variable
+            try:
+                result = _vars[which_dict][entry]
+            except KeyError as e:
+                raise exception.EvaluatorParseException(
+                    _("KeyError: %s") % six.text_type(e))
+            except TypeError as e:
+                raise exception.EvaluatorParseException(
+                    _("TypeError: %s") % six.text_type(e))
+
+        return self._to_number(result)
+
 
 class EvalSignOp(object):
     operations = {
@@ -223,6 +249,7 @@ class EvalBoolOrOp(object):
 
 _parser = None
 _vars = {}
+_expressions = collections.OrderedDict()
 
 
 def _def_parser():
@@ -272,6 +299,35 @@ def _def_parser():
     return expr
 
 
+def _compile(expression):
+    """Parses an expression into a tree of Eval* nodes.
+
+    Variables are only resolved when the tree is evaluated, so the parsed
+    tree of an expression can be reused for any set of stats.  The most
+    recently used trees are kept in a bounded LRU cache keyed by the
+    expression string.
+    """
+    try:
+        result = _expressions.pop(expression)
+    except KeyError:
+        global _parser
+        if _parser is None:
+            _parser = _def_parser()
+
+        try:
+            result = _parser.parseString(expression, parseAll=True)[0]
+        except pyparsing.ParseException as e:
+            raise exception.EvaluatorParseException(
+                _("ParseException: %s") % six.text_type(e))
+
+        while _expressions and len(_expressions) >= _EXPRESSION_CACHE_SIZE:
+            _expressions.popitem(last=False)
+
+    if _EXPRESSION_CACHE_SIZE > 0:
+        _expressions[expression] = result
+    return result
+
+
 def evaluate(expression, **kwargs):
     """Evaluates an expression.
 
@@ -281,17 +337,9 @@ def evaluate(expression, **kwargs):
     Supports both integer and floating point values, and automatic
     promotion where necessary.
     """
-    global _parser
-    if _parser is None:
-        _parser = _def_parser()
+    result = _compile(expression)
 
     global _vars
     _vars = kwargs
 
-    try:
-        result = _parser.parseString(expression, parseAll=True)[0]
-    except pyparsing.ParseException as e:
-        raise exception.EvaluatorParseException(
-            _("ParseException: %s") % six.text_type(e))
-
     return result.eval()
@@ -20,6 +20,8 @@ You can customize this scheduler by specifying your own volume Filters and
 Weighing Functions.
 """
 
+import copy
+
 from oslo_config import cfg
 from oslo_log import log as logging
 
@@ -101,6 +103,66 @@ class FilterScheduler(driver.Scheduler):
                                          request_spec, filter_properties,
                                          allow_reschedule=True)
 
+    def schedule_create_volumes(self, context, request_spec,
+                                filter_properties, volume_ids):
+        """Place several volumes built from the same request spec.
+
+        All hosts are filtered and weighed once. Each volume is then placed
+        on the top host, virtually consuming its capacity. Only that host's
+        state changed, so only it is filtered again before the candidates
+        are re-weighed in memory to place the next volume.
+
+        :returns: dict of {volume_id: host} for the placed volumes; volumes
+                  which did not fit anywhere are left out.
+        """
+        if filter_properties is None:
+            filter_properties = {}
+        weighed_hosts = self._get_weighted_candidates(context, request_spec,
+                                                      filter_properties)
+
+        hosts = [weighed_host.obj for weighed_host in weighed_hosts]
+        selected = []
+        for volume_id in volume_ids:
+            if selected:
+                host_state = selected[-1][1]
+                if not self.host_manager.get_filtered_hosts(
+                        [host_state], filter_properties):
+                    hosts.remove(host_state)
+                weighed_hosts = (hosts and
+                                 self.host_manager.get_weighed_hosts(
+                                     hosts, filter_properties))
+            if not weighed_hosts:
+                LOG.warning(_LW('No weighed hosts left for %(count)d of '
+                                '%(total)d volumes with properties: %(vt)s'),
+                            {'count': len(volume_ids) - len(selected),
+                             'total': len(volume_ids),
+                             'vt': request_spec['volume_type']})
+                break
+            top_host = self._choose_top_host(weighed_hosts, request_spec)
+            selected.append((volume_id, top_host.obj))
+
+        # context is not serializable
+        filter_properties.pop('context', None)
+
+        placements = {}
+        for volume_id, host_state in selected:
+            host = host_state.host
+            volume_request_spec = dict(request_spec, volume_id=volume_id)
+            volume_filter_properties = copy.deepcopy(filter_properties)
+            volume_filter_properties['request_spec'] = volume_request_spec
+
+            updated_volume = driver.volume_update_db(context, volume_id, host)
+            self._post_select_populate_filter_properties(
+                volume_filter_properties, host_state)
+
+            self.volume_rpcapi.create_volume(context, updated_volume, host,
+                                             volume_request_spec,
+                                             volume_filter_properties,
+                                             allow_reschedule=True)
+            placements[volume_id] = host
+
+        return placements
+
     def host_passes_filters(self, context, host, request_spec,
                             filter_properties):
         """Check if the specified host passes the filters."""
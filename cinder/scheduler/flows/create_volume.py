@@ -141,6 +141,52 @@ class ScheduleCreateVolumeTask(flow_utils.CinderTask):
                                             reason=e)
 
 
+class ScheduleCreateVolumesTask(ScheduleCreateVolumeTask):
+    """Activates a scheduler driver to place several volumes at once.
+
+    Notification strategy: same as ScheduleCreateVolumeTask, for each volume
+    that could not be placed.
+
+    Reversion strategy: N/A
+    """
+
+    default_provides = set(['placements'])
+
+    def _fail_volumes(self, context, request_spec, volume_ids, cause):
+        for volume_id in volume_ids:
+            volume_request_spec = dict(request_spec, volume_id=volume_id)
+            try:
+                self._handle_failure(context, volume_request_spec, cause)
+            finally:
+                common.error_out_volume(context, self.db_api, volume_id,
+                                        reason=cause)
+
+    def execute(self, context, request_spec, filter_properties, volume_ids):
+        try:
+            placements = self.driver_api.schedule_create_volumes(
+                context, request_spec, filter_properties, volume_ids)
+        except Exception as e:
+            # Same as for a single volume: error out every volume and
+            # reraise unless the exception is NoValidHost.
+            with excutils.save_and_reraise_exception(
+                    reraise=not isinstance(e, exception.NoValidHost)):
+                self._fail_volumes(context, request_spec, volume_ids, e)
+            return {
+                'placements': {},
+            }
+
+        unplaced = [volume_id for volume_id in volume_ids
+                    if volume_id not in placements]
+        if unplaced:
+            self._fail_volumes(context, request_spec, unplaced,
+                               exception.NoValidHost(
+                                   reason=_("No weighed hosts available")))
+
+        return {
+            'placements': placements,
+        }
+
+
 def get_flow(context, db_api, driver_api, request_spec=None,
              filter_properties=None,
              volume_id=None, snapshot_id=None, image_id=None):
@@ -177,3 +223,33 @@ def get_flow(context, db_api, driver_api, request_spec=None,
 
     # Now load (but do not run) the flow using the provided initial data.
     return taskflow.engines.load(scheduler_flow, store=create_what)
+
+
+def get_batch_flow(context, db_api, driver_api, request_spec,
+                   filter_properties, volume_ids):
+
+    """Constructs and returns the scheduler entrypoint flow for a batch.
+
+    This flow will do the following:
+
+    1. Inject keys & values for dependent tasks.
+    2. Use provided scheduler driver to select hosts for all the volumes
+       with a single filtering pass and pass each volume creation request
+       further.
+    """
+    create_what = {
+        'context': context,
+        'request_spec': request_spec,
+        'filter_properties': filter_properties,
+        'volume_ids': volume_ids,
+    }
+
+    flow_name = ACTION.replace(":", "_") + "_batch_scheduler"
+    scheduler_flow = linear_flow.Flow(flow_name)
+
+    # This will activate the desired scheduler driver (and handle any
+    # driver related failures appropriately).
+    scheduler_flow.add(ScheduleCreateVolumesTask(db_api, driver_api))
+
+    # Now load (but do not run) the flow using the provided initial data.
+    return taskflow.engines.load(scheduler_flow, store=create_what)
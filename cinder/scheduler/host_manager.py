@@ -18,12 +18,14 @@ Manage hosts in the current zone.
 """
 
 import collections
+import time
 
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import timeutils
 
 from cinder import context as cinder_context
+from cinder import db
 from cinder import exception
 from cinder.i18n import _LI, _LW
 from cinder import objects
@@ -46,7 +48,19 @@ host_manager_opts = [
                 default=[
                     'CapacityWeigher'
                 ],
-                help='Which weigher class names to use for weighing hosts.')
+                help='Which weigher class names to use for weighing hosts.'),
+    cfg.IntOpt('scheduler_volume_count_refresh_interval',
+               default=60,
+               help='Interval, in seconds, at which the scheduler reconciles '
+                    'its in-memory per-pool volume counts with the '
+                    'database. Pools whose backends report '
+                    '"total_volumes" use the reported value instead.'),
+    cfg.IntOpt('scheduler_service_refresh_interval',
+               default=10,
+               help='Interval, in seconds, at which the scheduler reloads '
+                    'the list of volume services from the database and '
+                    'rechecks their liveness. Set to 0 to reload on every '
+                    'scheduling request.'),
 ]
 
 CONF = cfg.CONF
@@ -111,6 +125,9 @@ class HostState(object):
         # Does this backend support attaching a volume to more than
         # once host/instance?
         self.multiattach = False
+        # Number of volumes on this backend/pool, kept in memory by the
+        # HostManager and updated as volumes are "consumed".
+        self.total_volumes = None
 
         # PoolState for all pools
         self.pools = {}
@@ -269,6 +286,8 @@ class HostState(object):
         volume_gb = volume['size']
         self.allocated_capacity_gb += volume_gb
         self.provisioned_capacity_gb += volume_gb
+        if self.total_volumes is not None:
+            self.total_volumes += 1
         if self.free_capacity_gb == 'infinite':
             # There's virtually infinite space on back-end
             pass
@@ -325,6 +344,10 @@ class PoolState(HostState):
             self.thick_provisioning_support = capability.get(
                 'thick_provisioning_support', False)
             self.multiattach = capability.get('multiattach', False)
+            # Backends that report their own volume count override the
+            # scheduler's in-memory count.
+            self.total_volumes = capability.get('total_volumes',
+                                                self.total_volumes)
 
     def update_pools(self, capability):
         # Do nothing, since we don't have pools within pool, yet
@@ -347,6 +370,18 @@ class HostManager(object):
         self.weight_classes = self.weight_handler.get_all_classes()
 
         self._no_capabilities_hosts = set()  # Hosts having no capabilities
+        # Volume services found up at the last service refresh,
+        # { <host>: <service dict> }
+        self._up_services = {}
+        self._services_updated = None
+        self._services_checked_hosts = set()
+        # Capabilities last applied to each host state; a capabilities
+        # report replaces the dict in service_states, marking the host
+        # as needing an update.
+        self._applied_capabilities = {}
+        self._pool_list = []
+        self._volume_counts = {}  # { <host#pool>: <volume count> }
+        self._volume_counts_updated = None
         self._update_host_state_map(cinder_context.get_admin_context())
 
     def _choose_host_filters(self, filter_cls_names):
@@ -443,46 +478,121 @@ class HostManager(object):
     def has_all_capabilities(self):
         return len(self._no_capabilities_hosts) == 0
 
-    def _update_host_state_map(self, context):
-
+    def _services_need_refresh(self):
+        if self._services_updated is None:
+            return True
+        if (time.time() - self._services_updated >=
+                CONF.scheduler_service_refresh_interval):
+            return True
+        # A new host started reporting capabilities since the last refresh.
+        return not self._services_checked_hosts.issuperset(
+            self.service_states)
+
+    def _refresh_services(self, context):
         # Get resource usage across the available volume nodes:
         topic = CONF.volume_topic
         volume_services = objects.ServiceList.get_all_by_topic(context,
                                                                topic,
                                                                disabled=False)
-        active_hosts = set()
-        no_capabilities_hosts = set()
+        up_services = {}
         for service in volume_services.objects:
             host = service.host
             if not utils.service_is_up(service):
                 LOG.warning(_LW("volume service is down. (host: %s)"), host)
                 continue
+            up_services[host] = dict(service)
+
+        self._up_services = up_services
+        self._services_updated = time.time()
+        self._services_checked_hosts = set(self.service_states)
+        # Service info is part of the host state, so reapply it everywhere.
+        self._applied_capabilities = {}
+
+    def _update_host_state_map(self, context):
+        """Bring host_state_map up to date.
+
+        The service list is reloaded from the database only every
+        scheduler_service_refresh_interval seconds, and only hosts whose
+        capabilities changed since they were last applied are updated.
+        The pool list returned by get_all_host_states is rebuilt only
+        when something changed.
+        """
+        if self._services_need_refresh():
+            self._refresh_services(context)
+
+        changed = False
+        no_capabilities_hosts = set()
+        for host, service in self._up_services.items():
             capabilities = self.service_states.get(host, None)
             if capabilities is None:
                 no_capabilities_hosts.add(host)
                 continue
 
             host_state = self.host_state_map.get(host)
+            if (host_state and
+                    self._applied_capabilities.get(host) is capabilities):
+                continue
+
             if not host_state:
                 host_state = self.host_state_cls(host,
                                                  capabilities=capabilities,
-                                                 service=
-                                                 dict(service))
+                                                 service=service)
                 self.host_state_map[host] = host_state
             # update capabilities and attributes in host_state
             host_state.update_from_volume_capability(capabilities,
-                                                     service=
-                                                     dict(service))
-            active_hosts.add(host)
+                                                     service=service)
+            self._applied_capabilities[host] = capabilities
+            changed = True
 
         self._no_capabilities_hosts = no_capabilities_hosts
 
         # remove non-active hosts from host_state_map
+        active_hosts = set(self._up_services) - no_capabilities_hosts
         nonactive_hosts = set(self.host_state_map.keys()) - active_hosts
         for host in nonactive_hosts:
             LOG.info(_LI("Removing non-active host: %(host)s from "
                          "scheduler cache."), {'host': host})
             del self.host_state_map[host]
+            self._applied_capabilities.pop(host, None)
+            changed = True
+
+        if changed:
+            # build a pool list from all hosts' pools
+            self._pool_list = [pool
+                               for state in self.host_state_map.values()
+                               for pool in state.pools.values()]
+
+        self._update_volume_counts(context, changed)
+
+    def _update_volume_counts(self, context, hosts_changed=True):
+        """Fill in per-pool volume counts from the in-memory index.
+
+        The index is seeded from the database with a single grouped query
+        and reconciled every scheduler_volume_count_refresh_interval
+        seconds. In between, pool counts are maintained in memory by
+        HostState.consume_from_volume, so weighing by volume number does
+        not need any database round trips.
+        """
+        if not self.host_state_map:
+            return
+
+        now = time.time()
+        refresh = (self._volume_counts_updated is None or
+                   now - self._volume_counts_updated >=
+                   CONF.scheduler_volume_count_refresh_interval)
+        if refresh:
+            self._volume_counts = db.volume_count_get_all_by_host(context)
+            self._volume_counts_updated = now
+        elif not hosts_changed:
+            return
+
+        for state in self.host_state_map.values():
+            for pool in state.pools.values():
+                if 'total_volumes' in pool.capabilities:
+                    continue
+                if refresh or pool.total_volumes is None:
+                    pool.total_volumes = self._volume_counts.get(pool.host,
+                                                                 0)
 
     def get_all_host_states(self, context):
         """Returns a dict of all the hosts the HostManager knows about.
@@ -496,16 +606,7 @@ class HostManager(object):
 
         self._update_host_state_map(context)
 
-        # build a pool_state map and return that map instead of host_state_map
-        all_pools = {}
-        for host, state in self.host_state_map.items():
-            for key in state.pools:
-                pool = state.pools[key]
-                # use host.pool_name to make sure key is unique
-                pool_key = '.'.join([host, pool.pool_name])
-                all_pools[pool_key] = pool
-
-        return all_pools.values()
+        return list(self._pool_list)
 
     def get_pools(self, context):
         """Returns a dict of all pools on all hosts HostManager knows about."""
@@ -55,7 +55,7 @@ LOG = logging.getLogger(__name__)
 class SchedulerManager(manager.Manager):
     """Chooses a host to create volumes."""
 
-    RPC_API_VERSION = '1.8'
+    RPC_API_VERSION = '1.9'
 
     target = messaging.Target(version=RPC_API_VERSION)
 
@@ -135,6 +135,30 @@ class SchedulerManager(manager.Manager):
         with flow_utils.DynamicLogListener(flow_engine, logger=LOG):
             flow_engine.run()
 
+    def create_volumes(self, context, topic, volume_ids, request_spec,
+                       filter_properties=None):
+        """Schedule several volumes sharing one request spec.
+
+        :returns: dict of {volume_id: host} for the placed volumes
+        """
+
+        self._wait_for_scheduler()
+        try:
+            flow_engine = create_volume.get_batch_flow(context,
+                                                       db, self.driver,
+                                                       request_spec,
+                                                       filter_properties,
+                                                       volume_ids)
+        except Exception:
+            msg = _("Failed to create scheduler manager volume flow")
+            LOG.exception(msg)
+            raise exception.CinderException(msg)
+
+        with flow_utils.DynamicLogListener(flow_engine, logger=LOG):
+            flow_engine.run()
+
+        return flow_engine.storage.fetch('placements')
+
     def request_service_capabilities(self, context):
         volume_rpcapi.VolumeAPI().publish_service_capabilities(context)
 
@@ -25,7 +25,6 @@ number and the weighing has the opposite effect of the default.
 from oslo_config import cfg
 from oslo_log import log as logging
 
-from cinder import db
 from cinder.openstack.common.scheduler import weights
 
 
@@ -51,10 +50,8 @@ class VolumeNumberWeigher(weights.BaseHostWeigher):
     def _weigh_object(self, host_state, weight_properties):
         """Less volume number weights win.
 
-        We want spreading to be the default.
+        We want spreading to be the default.  The volume number is
+        maintained in memory by the HostManager, so no database query
+        is issued per host.
         """
-        context = weight_properties['context']
-        volume_number = db.volume_data_get_for_host(context=context,
-                                                    host=host_state.host,
-                                                    count_only=True)
-        return volume_number
+        return host_state.total_volumes or 0
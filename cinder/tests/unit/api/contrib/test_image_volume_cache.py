@@ -0,0 +1,111 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo_serialization import jsonutils
+import webob
+
+from cinder import context
+from cinder import exception
+from cinder import test
+from cinder.tests.unit.api import fakes
+
+IMAGE_ID = 'c905cedb-7281-47e4-8a62-f26bc5fc4c77'
+
+
+def app():
+    # no auth, just let environ['cinder.context'] pass through
+    api = fakes.router.APIRouter()
+    mapper = fakes.urlmap.URLMap()
+    mapper['/v2'] = api
+    return mapper
+
+
+def service_get_by_host_and_topic(context, host, topic):
+    if host == 'host_ok@backend':
+        return {}
+    raise exception.ServiceNotFound(service_id=host)
+
+
+def image_show(context, image_id):
+    if image_id == IMAGE_ID:
+        return {'id': image_id}
+    raise exception.ImageNotFound(image_id=image_id)
+
+
+@mock.patch('cinder.objects.Service.get_by_host_and_topic',
+            mock.Mock(side_effect=service_get_by_host_and_topic))
+@mock.patch('cinder.image.glance.GlanceImageService.show',
+            mock.Mock(side_effect=image_show))
+@mock.patch('cinder.volume.rpcapi.VolumeAPI.prewarm_image_volume_cache')
+class ImageVolumeCacheTest(test.TestCase):
+    """Test cases for cinder/api/contrib/image_volume_cache.py
+
+    The API extension adds a POST /os-image-volume-cache API that is passed
+    an image and cinder hosts.  If everything is passed correctly, the
+    volume services of the hosts are asked to pre-warm their image-volume
+    cache with the image.
+    """
+
+    def _get_resp(self, body, is_admin=True):
+        """Helper to execute an os-image-volume-cache API call."""
+        req = webob.Request.blank('/v2/fake/os-image-volume-cache')
+        req.method = 'POST'
+        req.headers['Content-Type'] = 'application/json'
+        req.environ['cinder.context'] = context.RequestContext(
+            'admin', 'fake', is_admin)
+        req.body = jsonutils.dumps(body)
+        return req.get_response(app())
+
+    def test_prewarm(self, mock_prewarm):
+        hosts = ['host_ok@backend#pool1', 'host_ok@backend#pool2']
+        res = self._get_resp({'image_volume_cache': {'image_id': IMAGE_ID,
+                                                     'hosts': hosts}})
+        self.assertEqual(202, res.status_int)
+        self.assertEqual([mock.call(mock.ANY, IMAGE_ID, host)
+                          for host in hosts],
+                         mock_prewarm.call_args_list)
+
+    def test_prewarm_image_not_found(self, mock_prewarm):
+        res = self._get_resp({'image_volume_cache':
+                              {'image_id': 'missing',
+                               'hosts': ['host_ok@backend#pool']}})
+        self.assertEqual(404, res.status_int)
+        self.assertFalse(mock_prewarm.called)
+
+    def test_prewarm_host_not_found(self, mock_prewarm):
+        res = self._get_resp({'image_volume_cache':
+                              {'image_id': IMAGE_ID,
+                               'hosts': ['host_ok@backend#pool',
+                                         'host_bad@backend#pool']}})
+        self.assertEqual(404, res.status_int)
+        self.assertFalse(mock_prewarm.called)
+
+    def test_prewarm_bad_body(self, mock_prewarm):
+        for body in ({'image_volume_cache': {'hosts': ['host_ok@backend']}},
+                     {'image_volume_cache': {'image_id': IMAGE_ID}},
+                     {'image_volume_cache': {'image_id': IMAGE_ID,
+                                             'hosts': []}},
+                     {'image_volume_cache': {'image_id': IMAGE_ID,
+                                             'hosts': 'host_ok@backend'}},
+                     {'image_id': IMAGE_ID, 'hosts': ['host_ok@backend']}):
+            res = self._get_resp(body)
+            self.assertEqual(400, res.status_int)
+        self.assertFalse(mock_prewarm.called)
+
+    def test_prewarm_not_admin(self, mock_prewarm):
+        res = self._get_resp({'image_volume_cache':
+                              {'image_id': IMAGE_ID,
+                               'hosts': ['host_ok@backend#pool']}},
+                             is_admin=False)
+        self.assertEqual(403, res.status_int)
+        self.assertFalse(mock_prewarm.called)
@@ -16,6 +16,7 @@ import json
 import uuid
 from xml.dom import minidom
 
+import mock
 from oslo_serialization import jsonutils
 from oslo_utils import timeutils
 import webob
@@ -142,6 +143,21 @@ class VolumeImageMetadataTest(test.TestCase):
         self.assertEqual(fake_image_metadata,
                          self._get_image_metadata_list(res.body)[0])
 
+    def test_list_detail_volumes_not_rendered(self):
+        render = mock.Mock()
+        volumes = wsgi.LazyList([{'id': 'fake'}], render)
+        resp_obj = wsgi.ResponseObject({'volumes': volumes})
+        req = fakes.HTTPRequest.blank('/v2/fake/volumes/detail',
+                                      use_admin_context=True)
+
+        with mock.patch.object(self.controller, '_get_list_image_metadata',
+                               return_value={}) as mock_get_list:
+            self.controller.detail(req, resp_obj)
+
+        mock_get_list.assert_called_once_with(req.environ['cinder.context'],
+                                              ['fake'])
+        self.assertFalse(render.called)
+
     def test_list_detail_volumes_with_limit(self):
         ctxt = context.get_admin_context()
         db.volume_create(ctxt, {'id': 'fake', 'status': 'available',
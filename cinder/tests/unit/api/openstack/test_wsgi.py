@@ -12,6 +12,8 @@
 
 import inspect
 
+import mock
+from oslo_serialization import jsonutils
 import webob
 
 from cinder.api.openstack import wsgi
@@ -222,6 +224,50 @@ class JSONDictSerializerTest(test.TestCase):
         result = result.replace('\n', '').replace(' ', '')
         self.assertEqual(expected_json, result)
 
+    def test_serialize_iter(self):
+        items = wsgi.LazyList([1, 2, 3], lambda i: {'id': i, 'name': 'x' * i})
+        input_dict = {'volumes': items, 'volumes_links': [{'rel': 'next'}]}
+        serializer = wsgi.JSONDictSerializer()
+
+        chunks = list(serializer.serialize_iter(input_dict, chunk_size=16))
+
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertIsInstance(chunk, bytes)
+        self.assertEqual(
+            {'volumes': [{'id': 1, 'name': 'x'}, {'id': 2, 'name': 'xx'},
+                         {'id': 3, 'name': 'xxx'}],
+             'volumes_links': [{'rel': 'next'}]},
+            jsonutils.loads(b''.join(chunks).decode('utf-8')))
+
+    def test_serialize_iter_empty(self):
+        serializer = wsgi.JSONDictSerializer()
+        result = b''.join(serializer.serialize_iter(
+            {'volumes': wsgi.LazyList([], None)}))
+        self.assertEqual({'volumes': []},
+                         jsonutils.loads(result.decode('utf-8')))
+
+
+class LazyListTest(test.TestCase):
+    def test_render_on_access(self):
+        render = mock.Mock(side_effect=lambda i: {'id': i})
+        items = wsgi.LazyList([1, 2, 3], render)
+        self.assertFalse(render.called)
+
+        self.assertEqual(3, len(items))
+        self.assertEqual({'id': 3}, items[-1])
+        self.assertEqual([{'id': 2}, {'id': 3}], items[1:])
+        self.assertEqual([{'id': 1}, {'id': 2}, {'id': 3}], items)
+        self.assertEqual([mock.call(3), mock.call(2), mock.call(3),
+                          mock.call(1), mock.call(2), mock.call(3)],
+                         render.call_args_list)
+
+    def test_extensions(self):
+        items = wsgi.LazyList([1, 2], lambda i: {'id': i})
+        items.add_extension(lambda view: view.update(ext=view['id'] * 2))
+        self.assertEqual([{'id': 1, 'ext': 2}, {'id': 2, 'ext': 4}],
+                         list(items))
+
 
 class TextDeserializerTest(test.TestCase):
     def test_dispatch_default(self):
@@ -954,6 +1000,49 @@ class ResponseObjectTest(test.TestCase):
             self.assertEqual(202, response.status_int)
             self.assertEqual(mtype, response.body.decode('utf-8'))
 
+    def test_serialize_lazy_list(self):
+        items = wsgi.LazyList([1, 2], lambda i: {'id': i})
+        robj = wsgi.ResponseObject({'volumes': items})
+        robj.extend_items('volumes', lambda view: view.update(ext=True))
+        request = wsgi.Request.blank('/tests/123')
+
+        response = robj.serialize(request, 'application/json',
+                                  {'json': wsgi.JSONDictSerializer})
+
+        self.assertIsNone(response.content_length)
+        self.assertEqual({'volumes': [{'id': 1, 'ext': True},
+                                      {'id': 2, 'ext': True}]},
+                         jsonutils.loads(response.body.decode('utf-8')))
+
+    def test_lazy_list_items(self):
+        render = mock.Mock()
+        items = wsgi.LazyList(wsgi.LazyList([1, 2], render), render)
+
+        self.assertEqual([1, 2], items.items)
+        self.assertFalse(render.called)
+
+    def test_serialize_lazy_list_not_json(self):
+        serializer = mock.Mock()
+        serializer.return_value.serialize.return_value = 'xml'
+        items = wsgi.LazyList([1, 2], lambda i: {'id': i})
+        robj = wsgi.ResponseObject({'volumes': items}, xml=serializer)
+        request = wsgi.Request.blank('/tests/123')
+
+        response = robj.serialize(request, 'application/xml')
+
+        self.assertEqual(b'xml', response.body)
+        serializer.return_value.serialize.assert_called_once_with(
+            {'volumes': [{'id': 1}, {'id': 2}]})
+        self.assertIsInstance(
+            serializer.return_value.serialize.call_args[0][0]['volumes'],
+            list)
+
+    def test_extend_items(self):
+        robj = wsgi.ResponseObject({'volumes': [{'id': 1}, {'id': 2}]})
+        robj.extend_items('volumes', lambda view: view.update(ext=True))
+        self.assertEqual({'volumes': [{'id': 1, 'ext': True},
+                                      {'id': 2, 'ext': True}]}, robj.obj)
+
 
 class ValidBodyTest(test.TestCase):
 
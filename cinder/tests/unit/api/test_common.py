@@ -17,7 +17,10 @@
 Test suites for 'common' code used throughout the OpenStack HTTP API.
 """
 
+import datetime
+
 import mock
+from six.moves import urllib
 from testtools import matchers
 import webob
 import webob.exc
@@ -25,7 +28,9 @@ import webob.exc
 from oslo_config import cfg
 
 from cinder.api import common
+from cinder.common import sqlalchemyutils
 from cinder import test
+from cinder.tests.unit.api import fakes
 
 
 NS = "{http://docs.openstack.org/compute/api/v1.1}"
@@ -534,6 +539,49 @@ class TestCollectionLinks(test.TestCase):
                                  should_link_exist)
 
 
+class KeysetNextLinkTest(test.TestCase):
+    """Tests the continuation tokens of the next links."""
+
+    def setUp(self):
+        super(KeysetNextLinkTest, self).setUp()
+        self.created_at = datetime.datetime(2015, 10, 5, 12, 30)
+        self.items = [{'id': 'fake_id', 'display_name': 'vol',
+                       'created_at': self.created_at}]
+
+    def _get_marker(self, builder, url):
+        req = fakes.HTTPRequest.blank(url)
+        links = builder._generate_next_link(self.items, 'uuid', req,
+                                            'volumes')
+        query = urllib.parse.urlparse(links[0]['href']).query
+        return urllib.parse.parse_qs(query)
+
+    def test_next_link_marker_id(self):
+        params = self._get_marker(common.ViewBuilder(), '/v2/volumes')
+        self.assertEqual(['fake_id'], params['marker'])
+
+    def test_next_link_marker_token(self):
+        builder = common.ViewBuilder()
+        builder._keyset_pagination = True
+        builder._sort_key_aliases = {'name': 'display_name'}
+
+        params = self._get_marker(builder,
+                                  '/v2/volumes?sort=name&offset=3&limit=1')
+
+        self.assertNotIn('offset', params)
+        self.assertEqual(['1'], params['limit'])
+        self.assertEqual({'id': 'fake_id', 'display_name': 'vol',
+                          'created_at': self.created_at.isoformat()},
+                         sqlalchemyutils.decode_marker(params['marker'][0]))
+
+    def test_next_link_marker_token_missing_key(self):
+        builder = common.ViewBuilder()
+        builder._keyset_pagination = True
+
+        params = self._get_marker(builder, '/v2/volumes?sort=size')
+
+        self.assertEqual(['fake_id'], params['marker'])
+
+
 class LinkPrefixTest(test.TestCase):
     def test_update_link_prefix(self):
         vb = common.ViewBuilder()
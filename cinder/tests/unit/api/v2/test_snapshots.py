@@ -22,6 +22,7 @@ import webob
 
 from cinder.api import common
 from cinder.api.v2 import snapshots
+from cinder.common import sqlalchemyutils
 from cinder import context
 from cinder import db
 from cinder import exception
@@ -330,7 +331,7 @@ class SnapshotApiTest(test.TestCase):
         self.assertEqual(1, len(resp_snapshots))
         self.assertIn('updated_at', resp_snapshots[0])
 
-        resp_snapshot = resp_snapshots.pop()
+        resp_snapshot = resp_snapshots[0]
         self.assertEqual(UUID, resp_snapshot['id'])
 
     @mock.patch('cinder.db.snapshot_metadata_get', return_value=dict())
@@ -442,6 +443,11 @@ class SnapshotApiTest(test.TestCase):
             # And the query from the next link must match what we were
             # expecting
             params = urllib.parse_qs(href_parts.query)
+            # The marker is a continuation token for the last snapshot
+            if 'marker' in params:
+                token = sqlalchemyutils.decode_marker(params['marker'][0])
+                self.assertIn('created_at', token)
+                params['marker'] = [token['id']]
             self.assertDictEqual(expected_query, params)
 
         # Make sure we don't have links if we were not expecting them
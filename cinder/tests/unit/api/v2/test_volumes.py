@@ -785,7 +785,7 @@ class VolumeApiTest(test.TestCase):
                                            sort_keys=None, sort_dirs=None,
                                            filters=None,
                                            viewable_admin_meta=False,
-                                           offset=0):
+                                           offset=0, columns=None):
             return [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
@@ -882,7 +882,7 @@ class VolumeApiTest(test.TestCase):
                                            sort_keys=None, sort_dirs=None,
                                            filters=None,
                                            viewable_admin_meta=False,
-                                           offset=0):
+                                           offset=0, columns=None):
             return [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
@@ -1056,7 +1056,7 @@ class VolumeApiTest(test.TestCase):
                                            sort_keys=None, sort_dirs=None,
                                            filters=None,
                                            viewable_admin_meta=False,
-                                           offset=0):
+                                           offset=0, columns=None):
             self.assertEqual(True, filters['no_migration_targets'])
             self.assertFalse('all_tenants' in filters)
             return [stubs.stub_volume(1, display_name='vol1')]
@@ -1064,7 +1064,8 @@ class VolumeApiTest(test.TestCase):
         def stub_volume_get_all(context, marker, limit,
                                 sort_keys=None, sort_dirs=None,
                                 filters=None,
-                                viewable_admin_meta=False, offset=0):
+                                viewable_admin_meta=False, offset=0,
+                                columns=None):
             return []
         self.stubs.Set(db, 'volume_get_all_by_project',
                        stub_volume_get_all_by_project)
@@ -1083,14 +1084,15 @@ class VolumeApiTest(test.TestCase):
                                             sort_keys=None, sort_dirs=None,
                                             filters=None,
                                             viewable_admin_meta=False,
-                                            offset=0):
+                                            offset=0, columns=None):
             self.assertFalse('no_migration_targets' in filters)
             return [stubs.stub_volume(1, display_name='vol2')]
 
         def stub_volume_get_all2(context, marker, limit,
                                  sort_keys=None, sort_dirs=None,
                                  filters=None,
-                                 viewable_admin_meta=False, offset=0):
+                                 viewable_admin_meta=False, offset=0,
+                                 columns=None):
             return []
         self.stubs.Set(db, 'volume_get_all_by_project',
                        stub_volume_get_all_by_project2)
@@ -1107,13 +1109,14 @@ class VolumeApiTest(test.TestCase):
                                             sort_keys=None, sort_dirs=None,
                                             filters=None,
                                             viewable_admin_meta=False,
-                                            offset=0):
+                                            offset=0, columns=None):
             return []
 
         def stub_volume_get_all3(context, marker, limit,
                                  sort_keys=None, sort_dirs=None,
                                  filters=None,
-                                 viewable_admin_meta=False, offset=0):
+                                 viewable_admin_meta=False, offset=0,
+                                 columns=None):
             self.assertFalse('no_migration_targets' in filters)
             self.assertFalse('all_tenants' in filters)
             return [stubs.stub_volume(1, display_name='vol3')]
@@ -1318,7 +1321,7 @@ class VolumeApiTest(test.TestCase):
             context, None, CONF.osapi_max_limit,
             sort_keys=['created_at'], sort_dirs=['desc'],
             filters={'display_name': 'Volume-573108026'},
-            viewable_admin_meta=True, offset=0)
+            viewable_admin_meta=True, offset=0, columns=None)
 
     @mock.patch('cinder.volume.api.API.get_all')
     def test_get_volumes_filter_with_true(self, get_all):
@@ -1332,7 +1335,7 @@ class VolumeApiTest(test.TestCase):
             context, None, CONF.osapi_max_limit,
             sort_keys=['created_at'], sort_dirs=['desc'],
             filters={'display_name': 'Volume-573108026', 'bootable': True},
-            viewable_admin_meta=True, offset=0)
+            viewable_admin_meta=True, offset=0, columns=None)
 
     @mock.patch('cinder.volume.api.API.get_all')
     def test_get_volumes_filter_with_false(self, get_all):
@@ -1346,7 +1349,7 @@ class VolumeApiTest(test.TestCase):
             context, None, CONF.osapi_max_limit,
             sort_keys=['created_at'], sort_dirs=['desc'],
             filters={'display_name': 'Volume-573108026', 'bootable': False},
-            viewable_admin_meta=True, offset=0)
+            viewable_admin_meta=True, offset=0, columns=None)
 
     @mock.patch('cinder.volume.api.API.get_all')
     def test_get_volumes_filter_with_list(self, get_all):
@@ -1360,7 +1363,7 @@ class VolumeApiTest(test.TestCase):
             context, None, CONF.osapi_max_limit,
             sort_keys=['created_at'], sort_dirs=['desc'],
             filters={'id': ['1', '2', '3']}, viewable_admin_meta=True,
-            offset=0)
+            offset=0, columns=None)
 
     @mock.patch('cinder.volume.api.API.get_all')
     def test_get_volumes_filter_with_expression(self, get_all):
@@ -1373,7 +1376,8 @@ class VolumeApiTest(test.TestCase):
         get_all.assert_called_once_with(
             context, None, CONF.osapi_max_limit,
             sort_keys=['created_at'], sort_dirs=['desc'],
-            filters={'display_name': 'd-'}, viewable_admin_meta=True, offset=0)
+            filters={'display_name': 'd-'}, viewable_admin_meta=True, offset=0,
+            columns=None)
 
     @mock.patch('cinder.volume.api.API.get_all')
     def test_get_volumes_filter_with_status(self, get_all):
@@ -1387,7 +1391,7 @@ class VolumeApiTest(test.TestCase):
             ctxt, None, CONF.osapi_max_limit,
             sort_keys=['created_at'], sort_dirs=['desc'],
             filters={'status': 'available'}, viewable_admin_meta=True,
-            offset=0)
+            offset=0, columns=None)
 
     @mock.patch('cinder.volume.api.API.get_all')
     def test_get_volumes_filter_with_metadata(self, get_all):
@@ -1401,7 +1405,7 @@ class VolumeApiTest(test.TestCase):
             ctxt, None, CONF.osapi_max_limit,
             sort_keys=['created_at'], sort_dirs=['desc'],
             filters={'metadata': {'fake_key': 'fake_value'}},
-            viewable_admin_meta=True, offset=0)
+            viewable_admin_meta=True, offset=0, columns=None)
 
     @mock.patch('cinder.volume.api.API.get_all')
     def test_get_volumes_filter_with_availability_zone(self, get_all):
@@ -1415,7 +1419,7 @@ class VolumeApiTest(test.TestCase):
             ctxt, None, CONF.osapi_max_limit,
             sort_keys=['created_at'], sort_dirs=['desc'],
             filters={'availability_zone': 'nova'}, viewable_admin_meta=True,
-            offset=0)
+            offset=0, columns=None)
 
     @mock.patch('cinder.volume.api.API.get_all')
     def test_get_volumes_filter_with_invalid_filter(self, get_all):
@@ -1430,7 +1434,7 @@ class VolumeApiTest(test.TestCase):
             ctxt, None, CONF.osapi_max_limit,
             sort_keys=['created_at'], sort_dirs=['desc'],
             filters={'availability_zone': 'nova'}, viewable_admin_meta=True,
-            offset=0)
+            offset=0, columns=None)
 
     @mock.patch('cinder.volume.api.API.get_all')
     def test_get_volumes_sort_by_name(self, get_all):
@@ -1445,7 +1449,27 @@ class VolumeApiTest(test.TestCase):
         get_all.assert_called_once_with(
             ctxt, None, CONF.osapi_max_limit,
             sort_dirs=['desc'], viewable_admin_meta=True,
-            sort_keys=['display_name'], filters={}, offset=0)
+            sort_keys=['display_name'], filters={}, offset=0,
+            columns=None)
+
+    @mock.patch('cinder.volume.api.API.get_all')
+    def test_get_volumes_summary_columns(self, get_all):
+        """Summary listing only retrieves the columns it renders."""
+        get_all.return_value = [{'id': 'fake_id', 'display_name': 'vol',
+                                 'created_at': None, 'size': 1}]
+        req = mock.MagicMock()
+        ctxt = context.RequestContext('fake', 'fake', auth_token=True)
+        req.environ = {'cinder.context': ctxt}
+        req.params = {'sort': 'size'}
+        self.controller._view_builder.summary_list = mock.Mock()
+
+        self.controller._get_volumes(req, False)
+
+        columns = get_all.call_args[1]['columns']
+        self.assertEqual(['created_at', 'display_name', 'id', 'size'],
+                         sorted(columns))
+        self.controller._view_builder.summary_list.assert_called_once_with(
+            req, get_all.return_value)
 
     def test_get_volume_filter_options_using_config(self):
         self.override_config('query_volume_filters', ['name', 'status',
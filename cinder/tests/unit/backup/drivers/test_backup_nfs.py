@@ -243,6 +243,76 @@ class BackupNFSSwiftBasedTestCase(test.TestCase):
         self.assertTrue(_send_progress.called)
         self.assertTrue(_send_progress_end.called)
 
+    @mock.patch('cinder.volume.utils.notify_about_backup_usage')
+    def test_backup_notify_stage_seconds(self, notify):
+        self._create_backup_db_entry()
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+        stage_seconds = notify.call_args[1]['extra_usage_info'][
+            'stage_seconds']
+        self.assertEqual(['compress', 'hash', 'read', 'write'],
+                         sorted(stage_seconds))
+        for seconds in stage_seconds.values():
+            self.assertGreaterEqual(seconds, 0)
+
+    def _backup_deleted_meanwhile(self, cancel):
+        """Back up the volume in 4 chunks, calling cancel after each."""
+        self.flags(backup_file_size=(8 * 1024))
+        self.flags(backup_sha_block_size_bytes=1024)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self._create_backup_db_entry()
+        backup = objects.Backup.get_by_id(self.ctxt, 123)
+        backup_chunk = service._backup_chunk
+
+        def fake_backup_chunk(*args, **kwargs):
+            backup_chunk(*args, **kwargs)
+            cancel(service, backup)
+
+        self.volume_file.seek(0)
+        with mock.patch.object(service, '_backup_chunk',
+                               side_effect=fake_backup_chunk) as mock_chunk, \
+                mock.patch.object(service, 'delete') as mock_delete, \
+                mock.patch.object(service,
+                                  '_finalize_backup') as mock_finalize:
+            service.backup(backup, self.volume_file)
+        return mock_chunk.call_count, mock_delete, mock_finalize
+
+    def test_backup_cancelled(self):
+        with mock.patch.object(objects.Backup, 'get_by_id',
+                               wraps=objects.Backup.get_by_id) as get_by_id:
+            chunks, mock_delete, mock_finalize = (
+                self._backup_deleted_meanwhile(
+                    lambda service, backup: service.cancel()))
+        self.assertEqual(1, chunks)
+        self.assertEqual(1, mock_delete.call_count)
+        self.assertFalse(mock_finalize.called)
+        # The status is only checked once when the backup starts
+        self.assertEqual(2, get_by_id.call_count)
+
+    def test_backup_deleted_by_another_process(self):
+        def delete(service, backup):
+            db.backup_update(self.ctxt, backup.id, {'status': 'deleting'})
+
+        self.flags(backup_status_check_interval=0)
+        chunks, mock_delete, mock_finalize = self._backup_deleted_meanwhile(
+            delete)
+        self.assertEqual(1, chunks)
+        self.assertEqual(1, mock_delete.call_count)
+        self.assertFalse(mock_finalize.called)
+
+    def test_backup_status_checked_at_interval(self):
+        def delete(service, backup):
+            db.backup_update(self.ctxt, backup.id, {'status': 'deleting'})
+
+        chunks, mock_delete, mock_finalize = self._backup_deleted_meanwhile(
+            delete)
+        # Not noticed before the next status check
+        self.assertEqual(4, chunks)
+        self.assertFalse(mock_delete.called)
+        self.assertTrue(mock_finalize.called)
+
     def test_backup_custom_container(self):
         volume_id = '449b8140-85b6-465e-bdf6-0000002b29c4'
         container_name = 'fake99'
@@ -499,6 +569,52 @@ class BackupNFSSwiftBasedTestCase(test.TestCase):
                           service.backup,
                           backup, self.volume_file)
 
+    def test_backup_objects_in_flight(self):
+        volume_id = '5d6a1e5c-9a45-4c3e-8f35-000000a1e6c2'
+        self._create_backup_db_entry(volume_id=volume_id)
+        self._create_backup_db_entry(volume_id=volume_id, backup_id=124)
+        self.flags(backup_compression_algorithm='zlib')
+        self.flags(backup_file_size=(1024 * 3))
+        self.flags(backup_sha_block_size_bytes=1024)
+
+        def _backup(backup_id, objects_in_flight):
+            self.flags(backup_objects_in_flight=objects_in_flight)
+            service = nfs.NFSBackupDriver(self.ctxt)
+            self.volume_file.seek(0)
+            backup = objects.Backup.get_by_id(self.ctxt, backup_id)
+            service.backup(backup, self.volume_file)
+            backup = objects.Backup.get_by_id(self.ctxt, backup_id)
+            return (service._read_metadata(backup)['objects'],
+                    service._read_sha256file(backup)['sha256s'])
+
+        serial_objects, serial_sha256s = _backup(123, 1)
+        pipelined_objects, sha256s = _backup(124, 4)
+
+        self.assertEqual(serial_sha256s, sha256s)
+        self.assertEqual(11, len(pipelined_objects))
+        self.assertEqual([list(obj.values()) for obj in serial_objects],
+                         [list(obj.values()) for obj in pipelined_objects])
+
+    def test_backup_object_write_fail(self):
+        volume_id = '7c1b8d0e-3f5a-4b6e-9d2c-000000f3a4b1'
+        self._create_backup_db_entry(volume_id=volume_id)
+        self.flags(backup_compression_algorithm='none')
+        self.flags(backup_file_size=(1024 * 3))
+        self.flags(backup_sha_block_size_bytes=1024)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, 123)
+
+        self.mock_object(service, 'get_object_writer',
+                         mock.Mock(side_effect=exception.BackupDriverException(
+                             message=_('fake'))))
+        self.mock_object(service, '_finalize_backup')
+
+        self.assertRaises(exception.BackupDriverException,
+                          service.backup,
+                          backup, self.volume_file)
+        self.assertFalse(service._finalize_backup.called)
+
     def test_restore_uncompressed(self):
         volume_id = 'b6f39bd5-ad93-474b-8ee4-000000a0d11e'
 
@@ -553,6 +669,55 @@ class BackupNFSSwiftBasedTestCase(test.TestCase):
             self.assertTrue(filecmp.cmp(self.volume_file.name,
                             restored_file.name))
 
+    def test_restore_objects_in_flight(self):
+        volume_id = '0f3c7a52-8e0d-4a0b-b7a4-000000c5d2e9'
+
+        self._create_backup_db_entry(volume_id=volume_id)
+        self.flags(backup_compression_algorithm='zlib')
+        self.flags(backup_file_size=(1024 * 3))
+        self.flags(backup_sha_block_size_bytes=1024)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+
+        for objects_in_flight in (1, 4, 100):
+            self.flags(backup_objects_in_flight=objects_in_flight)
+            with tempfile.NamedTemporaryFile() as restored_file:
+                backup = objects.Backup.get_by_id(self.ctxt, 123)
+                service.restore(backup, volume_id, restored_file)
+                self.assertTrue(filecmp.cmp(self.volume_file.name,
+                                restored_file.name))
+
+    def test_restore_object_read_fail(self):
+        volume_id = '9a2e4f61-c0b7-4d8e-a3f5-000000e7b8c0'
+
+        self._create_backup_db_entry(volume_id=volume_id)
+        self.flags(backup_compression_algorithm='none')
+        self.flags(backup_file_size=(1024 * 3))
+        self.flags(backup_sha_block_size_bytes=1024)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+
+        read_object = service._read_object
+
+        def fake_read_object(container, object_name, *args):
+            if object_name.endswith('-00003'):
+                raise exception.BackupDriverException(message=_('fake'))
+            return read_object(container, object_name, *args)
+
+        self.mock_object(service, '_read_object', fake_read_object)
+        with tempfile.NamedTemporaryFile() as restored_file:
+            backup = objects.Backup.get_by_id(self.ctxt, 123)
+            self.assertRaises(exception.BackupDriverException,
+                              service.restore, backup, volume_id,
+                              restored_file)
+            # Only the objects before the failed one were written.
+            self.assertEqual(1024 * 3 * 2,
+                             os.path.getsize(restored_file.name))
+
     def test_restore_delta(self):
         volume_id = '486249dc-83c6-4a02-8d65-000000d819e7'
 
@@ -620,6 +785,63 @@ class BackupNFSSwiftBasedTestCase(test.TestCase):
         self.assertEqual(compressor, bz2)
         self.assertRaises(ValueError, service._get_compressor, 'fake')
 
+    def test_get_compressor_optional(self):
+        service = nfs.NFSBackupDriver(self.ctxt)
+        lz4 = mock.Mock()
+        zstandard = mock.Mock()
+        zstandard.ZstdDecompressor.return_value.decompress.return_value = (
+            b'data')
+
+        with mock.patch.dict('sys.modules', {'lz4': lz4,
+                                             'lz4.frame': lz4.frame,
+                                             'zstandard': zstandard}):
+            self.assertEqual(lz4.frame, service._get_compressor('lz4'))
+            compressor = service._get_compressor('zstd')
+        self.assertEqual(b'data', compressor.decompress(b'compressed'))
+        zstandard.ZstdDecompressor.return_value.decompress.assert_called_with(
+            b'compressed')
+
+        with mock.patch.dict('sys.modules', {'lz4': None, 'lz4.frame': None,
+                                             'zstandard': None}):
+            self.assertRaises(ValueError, service._get_compressor, 'lz4')
+            self.assertRaises(ValueError, service._get_compressor, 'zstd')
+
+    def test_init_optional_compressor_unavailable(self):
+        self.flags(backup_compression_algorithm='zstd')
+
+        with mock.patch.dict('sys.modules', {'zstandard': None}):
+            service = nfs.NFSBackupDriver(self.ctxt)
+
+        self.assertEqual('zlib', service.backup_compression_algorithm)
+        self.assertEqual(zlib, service.compressor)
+
+    def test_init_unsupported_compressor(self):
+        self.flags(backup_compression_algorithm='fake')
+
+        self.assertRaises(ValueError, nfs.NFSBackupDriver, self.ctxt)
+
+    def test_prepare_output_data_probe_incompressible(self):
+        service = nfs.NFSBackupDriver(self.ctxt)
+        service.compressor = mock.Mock(wraps=zlib)
+        fake_data = os.urandom(128 * 1024)
+
+        result = service._prepare_output_data(fake_data)
+
+        self.assertEqual(('none', fake_data), result)
+        # Only the samples were compressed, not the whole chunk.
+        service.compressor.compress.assert_called_once_with(mock.ANY)
+        self.assertEqual(16 * 1024,
+                         len(service.compressor.compress.call_args[0][0]))
+
+    def test_prepare_output_data_probe_compressible(self):
+        service = nfs.NFSBackupDriver(self.ctxt)
+        fake_data = b'\0' * 128 * 1024
+
+        result = service._prepare_output_data(fake_data)
+
+        self.assertEqual('zlib', result[0])
+        self.assertEqual(fake_data, zlib.decompress(result[1]))
+
     def test_prepare_output_data_effective_compression(self):
         service = nfs.NFSBackupDriver(self.ctxt)
         # Set up buffer of 128 zeroed bytes
@@ -56,6 +56,42 @@ class BrickLvmTestCase(test.TestCase):
     def fake_customised_lvm_version(obj, *cmd, **kwargs):
         return ("  LVM version:     2.02.100(2)-RHEL6 (2013-09-12)\n", "")
 
+    def fake_vg_report(obj, cmd_string):
+        data = "\n"
+
+        if 'test-prov-cap-vg-unit' in cmd_string:
+            data = ("  test-prov-cap-vg-unit:10.00:10.00:3:"
+                    "mXzbuX-dKpG-Rz7E-xtKY-jeju-QsYU-SLG8Z4:"
+                    "test-prov-cap-pool-unit:9.50g:20.00\n")
+            data += ("  test-prov-cap-vg-unit:10.00:10.00:3:"
+                     "mXzbuX-dKpG-Rz7E-xtKY-jeju-QsYU-SLG8Z4:"
+                     "fake-volume-1:1.00g:\n")
+            data += ("  test-prov-cap-vg-unit:10.00:10.00:3:"
+                     "mXzbuX-dKpG-Rz7E-xtKY-jeju-QsYU-SLG8Z4:"
+                     "fake-volume-2:2.00g:\n")
+        elif 'test-prov-cap-vg-no-unit' in cmd_string:
+            data = ("  test-prov-cap-vg-no-unit:10.00:10.00:3:"
+                    "mXzbuX-dKpG-Rz7E-xtKY-jeju-QsYU-SLG8Z4:"
+                    "test-prov-cap-pool-no-unit:9.50:20.00\n")
+            data += ("  test-prov-cap-vg-no-unit:10.00:10.00:3:"
+                     "mXzbuX-dKpG-Rz7E-xtKY-jeju-QsYU-SLG8Z4:"
+                     "fake-volume-1:1.00:\n")
+            data += ("  test-prov-cap-vg-no-unit:10.00:10.00:3:"
+                     "mXzbuX-dKpG-Rz7E-xtKY-jeju-QsYU-SLG8Z4:"
+                     "fake-volume-2:2.00:\n")
+        elif 'test-empty-vg' in cmd_string:
+            data = ("  test-empty-vg:10.00:10.00:0:"
+                    "kVxztV-dKpG-Rz7E-xtKY-jeju-QsYU-SLG6Z1:::\n")
+        elif 'fake-vg' in cmd_string:
+            data = ("  fake-vg:10.00:10.00:2:"
+                    "kVxztV-dKpG-Rz7E-xtKY-jeju-QsYU-SLG6Z1:"
+                    "fake-1:1.00g:\n")
+            data += ("  fake-vg:10.00:10.00:2:"
+                     "kVxztV-dKpG-Rz7E-xtKY-jeju-QsYU-SLG6Z1:"
+                     "fake-2:1.00g:\n")
+
+        return data
+
     def fake_execute(obj, *cmd, **kwargs):
         cmd_string = ', '.join(cmd)
         data = "\n"
@@ -72,6 +108,11 @@ class BrickLvmTestCase(test.TestCase):
         elif ('env, LC_ALL=C, vgs, --noheadings, -o, uuid, fake-vg' in
               cmd_string):
             data = "  kVxztV-dKpG-Rz7E-xtKY-jeju-QsYU-SLG6Z1\n"
+        elif 'env, LC_ALL=C, vgs, --noheadings, --unit=g, ' \
+             '-o, vg_name,vg_size,vg_free,lv_count,vg_uuid,' \
+             'lv_name,lv_size,data_percent, ' \
+             '--separator, :, --nosuffix' in cmd_string:
+            data = obj.fake_vg_report(cmd_string)
         elif 'env, LC_ALL=C, vgs, --noheadings, --unit=g, ' \
              '-o, name,size,free,lv_count,uuid, ' \
              '--separator, :, --nosuffix' in cmd_string:
@@ -180,6 +221,52 @@ class BrickLvmTestCase(test.TestCase):
         self.assertEqual('1.00g', out[0]['size'])
         self.assertEqual('fake-vg', out[0]['vg'])
 
+    def test_get_all_volumes_empty_vg(self):
+        self.vg.vg_name = 'test-empty-vg'
+
+        self.assertEqual([], self.vg.get_volumes())
+        self.vg.update_volume_group_info()
+        self.assertEqual(0, self.vg.vg_lv_count)
+        self.assertEqual(10.0, self.vg.vg_size)
+
+    def test_update_volume_group_info_vg_not_found(self):
+        self.vg.vg_name = 'fake-missing-vg'
+
+        self.assertRaises(exception.VolumeGroupNotFound,
+                          self.vg.update_volume_group_info)
+
+    def test_vg_report_cache(self):
+        self.vg._report_cache_ttl = 60
+        self.vg._execute = mock.Mock(side_effect=self.vg._execute)
+
+        self.vg.update_volume_group_info()
+        self.assertEqual(2, len(self.vg.get_volumes()))
+        self.assertEqual(1, self.vg._execute.call_count)
+
+        # Changing an LV drops the cached report.
+        self.vg.create_volume('fake-3', '1G')
+        self.vg.get_volumes()
+        self.assertEqual(3, self.vg._execute.call_count)
+
+    @mock.patch('time.time')
+    def test_vg_report_cache_expired(self, mock_time):
+        mock_time.side_effect = [0, 61, 61]
+        self.vg._report_cache_ttl = 60
+        self.vg._execute = mock.Mock(side_effect=self.vg._execute)
+
+        self.vg.update_volume_group_info()
+        self.vg.update_volume_group_info()
+
+        self.assertEqual(2, self.vg._execute.call_count)
+
+    def test_vg_report_no_cache(self):
+        self.vg._execute = mock.Mock(side_effect=self.vg._execute)
+
+        self.vg.update_volume_group_info()
+        self.vg.update_volume_group_info()
+
+        self.assertEqual(2, self.vg._execute.call_count)
+
     def test_get_volume(self):
         self.assertEqual('fake-1', self.vg.get_volume('fake-1')['name'])
 
@@ -89,6 +89,26 @@ class PurgeDeletedTest(test.TestCase):
         self.assertEqual(2, rows)
         self.assertEqual(2, meta_rows)
 
+    def test_purge_deleted_rows_in_batches(self):
+        progress = []
+        rows_purged = db.purge_deleted_rows(
+            self.context, age_in_days=10, batch_size=1,
+            progress=lambda table, rows: progress.append((table, rows)))
+
+        self.assertEqual(8, rows_purged)
+        self.assertEqual(2, self.session.query(self.volumes).count())
+        self.assertEqual(2, self.session.query(self.vm).count())
+        self.assertEqual([(table, rows) for table in ('volume_metadata',
+                                                      'volumes')
+                          for rows in range(1, 5)],
+                         [p for p in progress
+                          if p[0] in ('volume_metadata', 'volumes')])
+
+    def test_purge_deleted_rows_bad_batch_size(self):
+        self.assertRaises(exception.InvalidParameterValue,
+                          db.purge_deleted_rows, self.context,
+                          age_in_days=10, batch_size=0)
+
     def test_purge_deleted_rows_bad_args(self):
         # Test with no age argument
         self.assertRaises(TypeError, db.purge_deleted_rows, self.context)
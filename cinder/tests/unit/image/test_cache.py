@@ -50,6 +50,20 @@ class ImageVolumeCacheTestCase(test.TestCase):
         }
         return entry
 
+    def _mock_entries(self, entries):
+        """Mock the cache entries of a host, most recently used first."""
+        self.mock_db.image_volume_cache_get_usage_for_host.return_value = {
+            'size': sum(entry['size'] for entry in entries),
+            'count': len(entries)}
+
+        def get_lru(context, host, limit=None, marker=None):
+            lru = entries[::-1]
+            if marker is not None:
+                lru = lru[lru.index(marker) + 1:]
+            return lru[:limit]
+
+        self.mock_db.image_volume_cache_get_lru_for_host.side_effect = get_lru
+
     def test_get_by_image_volume(self):
         cache = self._build_cache()
         ret = {'id': 1}
@@ -218,7 +232,7 @@ class ImageVolumeCacheTestCase(test.TestCase):
     def test_ensure_space_no_entries(self):
         cache = self._build_cache(max_gb=100, max_count=10)
         host = 'foo@bar#whatever'
-        self.mock_db.image_volume_cache_get_all_for_host.return_value = []
+        self._mock_entries([])
 
         has_space = cache.ensure_space(self.context, 5, host)
         self.assertTrue(has_space)
@@ -238,7 +252,7 @@ class ImageVolumeCacheTestCase(test.TestCase):
         entries.append(entry2)
         entry3 = self._build_entry(size=10)
         entries.append(entry3)
-        self.mock_db.image_volume_cache_get_all_for_host.return_value = entries
+        self._mock_entries(entries)
 
         has_space = cache.ensure_space(self.context, 15, host)
         self.assertTrue(has_space)
@@ -256,7 +270,7 @@ class ImageVolumeCacheTestCase(test.TestCase):
         entries.append(entry1)
         entry2 = self._build_entry(size=5)
         entries.append(entry2)
-        self.mock_db.image_volume_cache_get_all_for_host.return_value = entries
+        self._mock_entries(entries)
 
         has_space = cache.ensure_space(self.context, 12, host)
         self.assertTrue(has_space)
@@ -275,7 +289,7 @@ class ImageVolumeCacheTestCase(test.TestCase):
         entries.append(entry2)
         entry3 = self._build_entry(size=12)
         entries.append(entry3)
-        self.mock_db.image_volume_cache_get_all_for_host.return_value = entries
+        self._mock_entries(entries)
 
         has_space = cache.ensure_space(self.context, 16, host)
         self.assertTrue(has_space)
@@ -288,9 +302,33 @@ class ImageVolumeCacheTestCase(test.TestCase):
         mock_delete = mock.patch.object(cache, '_delete_image_volume').start()
         host = 'foo@bar#whatever'
 
-        entries = list(self._build_entry(size=25))
-        self.mock_db.image_volume_cache_get_all_for_host.return_value = entries
+        entries = [self._build_entry(size=25)]
+        self._mock_entries(entries)
 
         has_space = cache.ensure_space(self.context, 50, host)
         self.assertFalse(has_space)
         mock_delete.assert_not_called()
+        self.assertFalse(
+            self.mock_db.image_volume_cache_get_lru_for_host.called)
+
+    @mock.patch.object(image_cache, 'EVICTION_BATCH_SIZE', 2)
+    def test_ensure_space_evicts_in_batches(self):
+        cache = self._build_cache(max_gb=30, max_count=10)
+        mock_delete = mock.patch.object(cache, '_delete_image_volume').start()
+        host = 'foo@bar#whatever'
+
+        entries = [dict(self._build_entry(size=5), id=i) for i in range(6)]
+        self._mock_entries(entries)
+
+        has_space = cache.ensure_space(self.context, 20, host)
+        self.assertTrue(has_space)
+        # The 4 least recently used entries are evicted, oldest first
+        self.assertEqual([mock.call(self.context, entry)
+                          for entry in entries[:1:-1]],
+                         mock_delete.call_args_list)
+        self.assertEqual(
+            [mock.call(self.context, host, limit=2, marker=None),
+             mock.call(self.context, host, limit=2, marker=entries[4])],
+            self.mock_db.image_volume_cache_get_lru_for_host.call_args_list)
+        self.assertFalse(
+            self.mock_db.image_volume_cache_get_all_for_host.called)
@@ -0,0 +1,167 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+
+import mock
+
+from cinder import context
+from cinder import exception
+from cinder.image import download_cache
+from cinder import test
+
+
+class FakeImageService(object):
+    def __init__(self):
+        self.images = {}
+        self.downloads = 0
+
+    def add(self, image_id, data):
+        self.images[image_id] = data
+        return {'id': image_id,
+                'size': len(data),
+                'checksum': hashlib.md5(data).hexdigest()}
+
+    def download(self, context, image_id, data=None):
+        self.downloads += 1
+        data.write(self.images[image_id])
+
+
+class ImageDownloadCacheTestCase(test.TestCase):
+
+    def setUp(self):
+        super(ImageDownloadCacheTestCase, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.context = context.get_admin_context()
+        self.image_service = FakeImageService()
+        self.cache = download_cache.ImageDownloadCache(self.cache_dir, 10)
+
+    def _read(self, image_meta):
+        with self.cache.fetch(self.context, self.image_service,
+                              image_meta['id'], image_meta) as path:
+            with open(path, 'rb') as f:
+                return f.read()
+
+    def _cached(self):
+        return sorted(name for name in os.listdir(self.cache_dir)
+                      if not name.startswith('.'))
+
+    def test_get_cache_disabled(self):
+        self.assertIsNone(download_cache.get_cache())
+
+    def test_get_cache(self):
+        self.flags(image_download_cache_dir=self.cache_dir,
+                   image_download_cache_max_size_gb=2)
+        cache = download_cache.get_cache()
+        self.assertEqual(self.cache_dir, cache.cache_dir)
+        self.assertEqual(2 * 1024 ** 3, cache.max_size)
+        self.assertIs(cache, download_cache.get_cache())
+
+    def test_is_cacheable(self):
+        image_meta = self.image_service.add('image1', b'12345')
+        self.assertTrue(self.cache.is_cacheable(image_meta))
+        self.assertFalse(self.cache.is_cacheable(
+            dict(image_meta, checksum=None)))
+        self.assertFalse(self.cache.is_cacheable(dict(image_meta, size=11)))
+        self.assertFalse(self.cache.is_cacheable(None))
+
+    def test_fetch_downloads_once(self):
+        image_meta = self.image_service.add('image1', b'12345')
+        self.assertEqual(b'12345', self._read(image_meta))
+        self.assertEqual(b'12345', self._read(image_meta))
+        self.assertEqual(1, self.image_service.downloads)
+        self.assertEqual(['image1-%s' % image_meta['checksum']],
+                         self._cached())
+
+    def test_fetch_new_checksum(self):
+        image_meta = self.image_service.add('image1', b'12345')
+        self._read(image_meta)
+        image_meta = self.image_service.add('image1', b'54321')
+        self.assertEqual(b'54321', self._read(image_meta))
+        self.assertEqual(2, self.image_service.downloads)
+
+    def test_fetch_checksum_mismatch(self):
+        image_meta = self.image_service.add('image1', b'12345')
+        image_meta['checksum'] = hashlib.md5(b'other').hexdigest()
+        self.assertRaises(exception.ImageUnacceptable, self._read,
+                          image_meta)
+        self.assertEqual([], self._cached())
+        self.assertEqual(['.locks'], os.listdir(self.cache_dir))
+
+    def test_evict_least_recently_used(self):
+        image1 = self.image_service.add('image1', b'1234')
+        image2 = self.image_service.add('image2', b'5678')
+        image3 = self.image_service.add('image3', b'9012')
+        self._read(image1)
+        self._read(image2)
+        path1 = self.cache._entry_path('image1', image1)
+        path2 = self.cache._entry_path('image2', image2)
+        os.utime(path1, (1000, 1000))
+        os.utime(path2, (2000, 2000))
+        # Using image1 makes image2 the least recently used
+        self._read(image1)
+
+        self._read(image3)
+
+        self.assertEqual(['image1-%s' % image1['checksum'],
+                          'image3-%s' % image3['checksum']], self._cached())
+
+    def test_evict_skips_images_in_use(self):
+        image1 = self.image_service.add('image1', b'1234')
+        image2 = self.image_service.add('image2', b'5678')
+        image3 = self.image_service.add('image3', b'9012')
+        self._read(image2)
+        path2 = self.cache._entry_path('image2', image2)
+        os.utime(path2, (2000, 2000))
+
+        with self.cache.fetch(self.context, self.image_service, 'image1',
+                              image1) as path1:
+            os.utime(path1, (1000, 1000))
+            self._read(image3)
+            self.assertTrue(os.path.exists(path1))
+
+        self.assertEqual(['image1-%s' % image1['checksum'],
+                          'image3-%s' % image3['checksum']], self._cached())
+
+    @mock.patch.object(download_cache, 'LOG')
+    def test_evict_all_in_use(self, mock_log):
+        image1 = self.image_service.add('image1', b'123456')
+        image2 = self.image_service.add('image2', b'789012')
+        with self.cache.fetch(self.context, self.image_service, 'image1',
+                              image1):
+            self.assertEqual(b'789012', self._read(image2))
+        self.assertEqual(1, mock_log.warning.call_count)
+
+    def test_fetch_retries_evicted_entry(self):
+        image_meta = self.image_service.add('image1', b'12345')
+        self._read(image_meta)
+        path = self.cache._entry_path('image1', image_meta)
+        real_flock = fcntl.flock
+        evicted = []
+
+        def fake_flock(f, operation):
+            # Evict the entry between its open and its flock, once
+            if not evicted:
+                evicted.append(f.name)
+                os.unlink(path)
+            real_flock(f, operation)
+
+        with mock.patch.object(download_cache.fcntl, 'flock',
+                               side_effect=fake_flock):
+            self.assertEqual(b'12345', self._read(image_meta))
+        self.assertEqual([path], evicted)
+        self.assertEqual(2, self.image_service.downloads)
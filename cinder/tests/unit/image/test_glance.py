@@ -15,10 +15,17 @@
 
 
 import datetime
+import hashlib
+import tempfile
+import threading
+import time
 
 import glanceclient.exc
 import mock
 from oslo_config import cfg
+import six
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
 
 from cinder import context
 from cinder import exception
@@ -666,6 +673,191 @@ class TestGlanceImageService(test.TestCase):
         self.assertEqual(expected, actual)
 
 
+class _RangeRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves the images of the server, honoring Range headers."""
+
+    def do_GET(self):
+        server = self.server
+        range_header = self.headers.get('Range')
+        with server.lock:
+            server.requests.append((self.path, range_header,
+                                    self.headers.get('X-Auth-Token')))
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            # Let the other connections of the download overlap this one
+            time.sleep(server.delay)
+            image = server.images.get(self.path)
+            if image is None:
+                self.send_error(404)
+                return
+            if range_header and server.ranges:
+                start, end = [int(x) for x in
+                              range_header[len('bytes='):].split('-')]
+                body = image[start:end + 1]
+                self.send_response(206)
+                self.send_header('Content-Range', 'bytes %d-%d/%d' %
+                                 (start, end, len(image)))
+            else:
+                body = image
+                self.send_response(200)
+            body = body[:len(body) - server.truncate]
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+class _ImageHTTPServer(socketserver.ThreadingMixIn,
+                       BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                           _RangeRequestHandler)
+        self.images = {}
+        self.requests = []
+        self.ranges = True
+        self.truncate = 0
+        self.delay = 0
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+
+class TestGlanceImageServiceRangedDownload(test.TestCase):
+    """Tests downloads from a local stand-in for the glance API server."""
+
+    def setUp(self):
+        super(TestGlanceImageServiceRangedDownload, self).setUp()
+        self.server = _ImageHTTPServer()
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  kwargs={'poll_interval': 0.01})
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.client = glance_stubs.StubGlanceClient()
+        self.stubs.Set(glance, '_create_glance_client',
+                       lambda *args, **kwargs: self.client)
+        netloc = '127.0.0.1:%d' % self.server.server_address[1]
+        self.service = glance.GlanceImageService(
+            client=glance.GlanceClientWrapper('fake', netloc, False))
+        self.context = context.RequestContext('fake', 'fake',
+                                              auth_token='token')
+        self.flags(auth_strategy='keystone',
+                   glance_api_version=2,
+                   glance_download_connections=4,
+                   glance_download_min_range_mb=0)
+
+    def _create_image(self, size, path='/v2/images/%s/file'):
+        image = b''.join(six.int2byte(i % 251) for i in range(size))
+        image_id = self.client.create(
+            size=size, checksum=hashlib.md5(image).hexdigest()).id
+        self.server.images[path % image_id] = image
+        return image_id, image
+
+    def _download(self, image_id):
+        with tempfile.TemporaryFile() as image_file:
+            self.service.download(self.context, image_id, image_file)
+            image_file.seek(0)
+            return image_file.read()
+
+    def test_download_ranges(self):
+        image_id, image = self._create_image(1000)
+        self.assertEqual(image, self._download(image_id))
+        self.assertEqual(
+            [('/v2/images/%s/file' % image_id, 'bytes=%s' % byte_range,
+              'token')
+             for byte_range in ('0-249', '250-499', '500-749', '750-999')],
+            sorted(self.server.requests))
+
+    def test_download_ranges_concurrently(self):
+        self.server.delay = 0.1
+        image_id, image = self._create_image(1000)
+        self.assertEqual(image, self._download(image_id))
+        self.assertEqual(4, self.server.max_active)
+
+    def test_download_ranges_v1(self):
+        self.flags(glance_api_version=1)
+        image_id, image = self._create_image(1000, path='/v1/images/%s')
+        self.assertEqual(image, self._download(image_id))
+        self.assertEqual(4, len(self.server.requests))
+
+    def test_download_ranges_appends(self):
+        image_id, image = self._create_image(1000)
+        with tempfile.TemporaryFile() as image_file:
+            image_file.write(b'head')
+            self.service.download(self.context, image_id, image_file)
+            image_file.write(b'tail')
+            image_file.seek(0)
+            self.assertEqual(b'head' + image + b'tail', image_file.read())
+
+    @mock.patch.object(glance, 'LOG')
+    def test_download_ranges_not_supported(self, mock_log):
+        self.server.ranges = False
+        image_id, _image = self._create_image(1000)
+        # Downloaded sequentially through the glance client instead
+        self.assertEqual(b'*' * 1000, self._download(image_id))
+        self.assertEqual(1, mock_log.warning.call_count)
+
+    @mock.patch.object(glance, 'LOG')
+    def test_download_ranges_short(self, mock_log):
+        self.server.truncate = 1
+        image_id, _image = self._create_image(1000)
+        self.assertEqual(b'*' * 1000, self._download(image_id))
+        self.assertEqual(1, mock_log.warning.call_count)
+
+    @mock.patch.object(glance, 'LOG')
+    def test_download_ranges_checksum_mismatch(self, mock_log):
+        image_id, image = self._create_image(1000)
+        self.server.images['/v2/images/%s/file' % image_id] = (
+            b'x' + image[1:])
+        # Downloaded sequentially through the glance client instead
+        self.assertEqual(b'*' * 1000, self._download(image_id))
+        self.assertEqual(4, len(self.server.requests))
+        self.assertIn('Checksum',
+                      six.text_type(mock_log.warning.call_args[0][1]['error']))
+
+    def test_download_ranges_write_only_file(self):
+        image_id, image = self._create_image(1000)
+        with tempfile.NamedTemporaryFile() as result_file:
+            with open(result_file.name, 'wb') as image_file:
+                image_file.write(b'head')
+                self.service.download(self.context, image_id, image_file)
+            self.assertEqual(b'head' + image, result_file.read())
+            self.assertEqual(4, len(self.server.requests))
+
+    def test_download_ranges_small_image(self):
+        self.flags(glance_download_min_range_mb=1)
+        image_id, _image = self._create_image(1000)
+        self.assertEqual(b'*' * 1000, self._download(image_id))
+        self.assertEqual([], self.server.requests)
+
+    def test_download_ranges_disabled(self):
+        self.flags(glance_download_connections=1)
+        image_id, _image = self._create_image(1000)
+        self.assertEqual(b'*' * 1000, self._download(image_id))
+        self.assertEqual([], self.server.requests)
+
+    def test_download_ranges_not_a_file(self):
+        image_id, _image = self._create_image(1000)
+        self.service.download(self.context, image_id, NullWriter())
+        self.assertEqual([], self.server.requests)
+
+    def test_split_ranges(self):
+        self.assertEqual([(0, 3), (4, 7), (8, 9)],
+                         glance._split_ranges(10, 3, 1))
+        self.assertEqual([(0, 4), (5, 9)], glance._split_ranges(10, 3, 5))
+        self.assertEqual([(0, 9)], glance._split_ranges(10, 3, 11))
+
+
 class TestGlanceClientVersion(test.TestCase):
     """Tests the version of the glance client generated."""
 
@@ -192,6 +192,69 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         self.assertIsNotNone(weighed_host.obj)
         self.assertTrue(_mock_service_get_all_by_topic.called)
 
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    @mock.patch('cinder.scheduler.driver.volume_update_db')
+    def test_schedule_create_volumes(self, _mock_volume_update_db,
+                                     _mock_service_get_all_by_topic):
+        sched = fakes.FakeFilterScheduler()
+        sched.host_manager = fakes.FakeHostManager()
+        sched.volume_rpcapi = mock.Mock()
+        fake_context = context.RequestContext('user', 'project',
+                                              is_admin=True)
+
+        fakes.mock_host_manager_db_calls(_mock_service_get_all_by_topic)
+        _mock_volume_update_db.side_effect = (
+            lambda ctxt, volume_id, host: {'id': volume_id, 'host': host})
+
+        request_spec = {'volume_type': {'name': 'LVM_iSCSI'},
+                        'volume_properties': {'project_id': 1,
+                                              'size': 400}}
+        filter_properties = {}
+        with mock.patch.object(sched.host_manager, 'get_all_host_states',
+                               wraps=sched.host_manager.get_all_host_states
+                               ) as get_all_host_states:
+            placements = sched.schedule_create_volumes(
+                fake_context, request_spec, filter_properties,
+                ['fake-id1', 'fake-id2', 'fake-id3'])
+        self.assertEqual(1, get_all_host_states.call_count)
+
+        # host1 has room for two 400G volumes, capacity consumed by those
+        # makes the third one go to host5, whose free capacity is unknown.
+        self.assertEqual({'fake-id1': 'host1#lvm1',
+                          'fake-id2': 'host1#lvm1',
+                          'fake-id3': 'host5#_pool0'}, placements)
+        self.assertEqual(3, sched.volume_rpcapi.create_volume.call_count)
+        for call in sched.volume_rpcapi.create_volume.call_args_list:
+            (ctxt, volume, host, volume_request_spec,
+             volume_filter_properties) = call[0]
+            self.assertEqual(volume['id'], volume_request_spec['volume_id'])
+            self.assertEqual(host, placements[volume['id']])
+            self.assertEqual([host],
+                             volume_filter_properties['retry']['hosts'])
+            self.assertNotIn('context', volume_filter_properties)
+
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    @mock.patch('cinder.scheduler.driver.volume_update_db')
+    def test_schedule_create_volumes_partial(self, _mock_volume_update_db,
+                                             _mock_service_get_all_by_topic):
+        sched = fakes.FakeFilterScheduler()
+        sched.host_manager = fakes.FakeHostManager()
+        sched.volume_rpcapi = mock.Mock()
+        fake_context = context.RequestContext('user', 'project',
+                                              is_admin=True)
+
+        fakes.mock_host_manager_db_calls(_mock_service_get_all_by_topic)
+        # Only host1 can fit a volume that large.
+        request_spec = {'volume_type': {'name': 'LVM_iSCSI'},
+                        'volume_properties': {'project_id': 1,
+                                              'size': 500,
+                                              'availability_zone': 'zone1'}}
+        placements = sched.schedule_create_volumes(
+            fake_context, request_spec, {}, ['fake-id1', 'fake-id2'])
+
+        self.assertEqual({'fake-id1': 'host1#lvm1'}, placements)
+        self.assertEqual(1, sched.volume_rpcapi.create_volume.call_count)
+
     def test_max_attempts(self):
         self.flags(scheduler_max_attempts=4)
 
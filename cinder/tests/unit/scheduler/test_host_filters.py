@@ -700,6 +700,42 @@ class AffinityFilterTestCase(HostFiltersTestCase):
 
         self.assertFalse(filt_cls.host_passes(host, filter_properties))
 
+    def test_same_filter_looks_up_volumes_once(self):
+        filt_cls = self.class_map['SameBackendFilter']()
+        hosts = [fakes.FakeHostState('host%s#pool0' % i, {})
+                 for i in range(1, 4)]
+        volume = utils.create_volume(self.context, host='host2#pool0')
+        vol_id = volume.id
+
+        filter_properties = {'context': self.context.elevated(),
+                             'scheduler_hints': {
+            'same_host': [vol_id], }}
+
+        with mock.patch.object(filt_cls.volume_api, 'get_all',
+                               wraps=filt_cls.volume_api.get_all) as get_all:
+            passes = [filt_cls.host_passes(host, filter_properties)
+                      for host in hosts]
+        self.assertEqual([False, True, False], passes)
+        self.assertEqual(1, get_all.call_count)
+
+    def test_different_filter_looks_up_volumes_once(self):
+        filt_cls = self.class_map['DifferentBackendFilter']()
+        hosts = [fakes.FakeHostState('host%s#pool0' % i, {})
+                 for i in range(1, 4)]
+        volume = utils.create_volume(self.context, host='host2#pool0')
+        vol_id = volume.id
+
+        filter_properties = {'context': self.context.elevated(),
+                             'scheduler_hints': {
+            'different_host': [vol_id], }}
+
+        with mock.patch.object(filt_cls.volume_api, 'get_all',
+                               wraps=filt_cls.volume_api.get_all) as get_all:
+            passes = [filt_cls.host_passes(host, filter_properties)
+                      for host in hosts]
+        self.assertEqual([True, False, True], passes)
+        self.assertEqual(1, get_all.call_count)
+
 
 class DriverFilterTestCase(HostFiltersTestCase):
     def test_passing_function(self):
@@ -153,12 +153,15 @@ class HostManagerTestCase(test.TestCase):
                                                       host3_volume_capabs)
         self.assertTrue(self.host_manager.has_all_capabilities())
 
+    @mock.patch('cinder.db.volume_count_get_all_by_host',
+                return_value={})
     @mock.patch('cinder.db.service_get_all_by_topic')
     @mock.patch('cinder.utils.service_is_up')
     @mock.patch('oslo_utils.timeutils.utcnow')
     def test_update_and_get_pools(self, _mock_utcnow,
                                   _mock_service_is_up,
-                                  _mock_service_get_all_by_topic):
+                                  _mock_service_get_all_by_topic,
+                                  _mock_volume_count_get_all_by_host):
         """Test interaction between update and get_pools
 
         This test verifies that each time that get_pools is called it gets the
@@ -206,10 +209,15 @@ class HostManagerTestCase(test.TestCase):
             self.assertEqual(1, len(res))
             self.assertEqual(dates[2], res[0]['capabilities']['timestamp'])
 
+    @mock.patch('cinder.db.volume_count_get_all_by_host',
+                return_value={})
     @mock.patch('cinder.db.service_get_all_by_topic')
     @mock.patch('cinder.utils.service_is_up')
     def test_get_all_host_states(self, _mock_service_is_up,
-                                 _mock_service_get_all_by_topic):
+                                 _mock_service_get_all_by_topic,
+                                 _mock_volume_count_get_all_by_host):
+        # Reload services on every call to check liveness tracking.
+        self.flags(scheduler_service_refresh_interval=0)
         context = 'fake_context'
         topic = CONF.volume_topic
 
@@ -306,10 +314,13 @@ class HostManagerTestCase(test.TestCase):
             test_service.TestService._compare(self, volume_node,
                                               host_state_map[host].service)
 
+    @mock.patch('cinder.db.volume_count_get_all_by_host',
+                return_value={})
     @mock.patch('cinder.db.service_get_all_by_topic')
     @mock.patch('cinder.utils.service_is_up')
     def test_get_pools(self, _mock_service_is_up,
-                       _mock_service_get_all_by_topic):
+                       _mock_service_get_all_by_topic,
+                       _mock_volume_count_get_all_by_host):
         context = 'fake_context'
 
         services = [
@@ -397,6 +408,133 @@ class HostManagerTestCase(test.TestCase):
             self.assertEqual(sorted(expected, key=sort_func),
                              sorted(res, key=sort_func))
 
+    @mock.patch('time.time')
+    @mock.patch('cinder.db.volume_count_get_all_by_host',
+                return_value={})
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    @mock.patch('cinder.utils.service_is_up')
+    def test_get_all_host_states_incremental(
+            self, _mock_service_is_up, _mock_service_get_all_by_topic,
+            _mock_volume_count_get_all_by_host, _mock_time):
+        self.flags(scheduler_service_refresh_interval=10)
+        context = 'fake_context'
+        services = [
+            dict(id=1, host='host1', topic='volume', disabled=False,
+                 availability_zone='zone1', updated_at=timeutils.utcnow()),
+            dict(id=2, host='host2', topic='volume', disabled=False,
+                 availability_zone='zone1', updated_at=timeutils.utcnow()),
+        ]
+        self.host_manager.service_states = {
+            'host1': dict(volume_backend_name='AAA',
+                          total_capacity_gb=512, free_capacity_gb=200,
+                          timestamp=datetime.fromtimestamp(400),
+                          reserved_percentage=0),
+            'host2': dict(volume_backend_name='BBB',
+                          total_capacity_gb=256, free_capacity_gb=100,
+                          timestamp=datetime.fromtimestamp(400),
+                          reserved_percentage=0),
+        }
+        _mock_service_get_all_by_topic.return_value = services
+        _mock_service_is_up.return_value = True
+        _mock_time.return_value = 1000
+
+        # The first call loads services and applies all capabilities.
+        pools = self.host_manager.get_all_host_states(context)
+        self.assertEqual(set(['host1#AAA', 'host2#BBB']),
+                         set(pool.host for pool in pools))
+        self.assertEqual(1, _mock_service_get_all_by_topic.call_count)
+
+        # Nothing changed, neither the DB nor host states are touched.
+        with mock.patch.object(host_manager.HostState,
+                               'update_from_volume_capability') as update:
+            again = self.host_manager.get_all_host_states(context)
+            self.assertFalse(update.called)
+        self.assertEqual(1, _mock_service_get_all_by_topic.call_count)
+        self.assertEqual(set(pools), set(again))
+
+        # Only the host that reported new capabilities is updated.
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(volume_backend_name='AAA',
+                                    total_capacity_gb=512,
+                                    free_capacity_gb=100,
+                                    reserved_percentage=0))
+        with mock.patch.object(
+                host_manager.HostState, 'update_from_volume_capability',
+                autospec=True,
+                side_effect=host_manager.HostState.
+                update_from_volume_capability) as update:
+            pools = self.host_manager.get_all_host_states(context)
+            self.assertEqual(['host1'],
+                             [call[0][0].host for call in
+                              update.call_args_list])
+        self.assertEqual(1, _mock_service_get_all_by_topic.call_count)
+        pools = {pool.host: pool for pool in pools}
+        self.assertEqual(100, pools['host1#AAA'].free_capacity_gb)
+
+        # Services are reloaded once the refresh interval has elapsed.
+        _mock_time.return_value = 1010
+        _mock_service_is_up.side_effect = [True, False]
+        pools = self.host_manager.get_all_host_states(context)
+        self.assertEqual(2, _mock_service_get_all_by_topic.call_count)
+        self.assertEqual(['host1#AAA'], [pool.host for pool in pools])
+
+    @mock.patch('time.time')
+    @mock.patch('cinder.db.volume_count_get_all_by_host')
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    @mock.patch('cinder.utils.service_is_up')
+    def test_get_all_host_states_volume_counts(
+            self, _mock_service_is_up, _mock_service_get_all_by_topic,
+            _mock_volume_count_get_all_by_host, _mock_time):
+        self.flags(scheduler_volume_count_refresh_interval=60)
+        context = 'fake_context'
+        services = [
+            dict(id=1, host='host1', topic='volume', disabled=False,
+                 availability_zone='zone1', updated_at=timeutils.utcnow()),
+            dict(id=2, host='host2', topic='volume', disabled=False,
+                 availability_zone='zone1', updated_at=timeutils.utcnow()),
+        ]
+        service_states = {
+            'host1': dict(volume_backend_name='AAA',
+                          total_capacity_gb=512, free_capacity_gb=200,
+                          timestamp=datetime.fromtimestamp(400),
+                          reserved_percentage=0),
+            'host2': dict(volume_backend_name='BBB',
+                          total_capacity_gb=256, free_capacity_gb=100,
+                          timestamp=datetime.fromtimestamp(400),
+                          reserved_percentage=0,
+                          total_volumes=7),
+        }
+        self.host_manager.service_states = service_states
+        _mock_service_get_all_by_topic.return_value = services
+        _mock_service_is_up.return_value = True
+        _mock_volume_count_get_all_by_host.return_value = {'host1#AAA': 3,
+                                                           'host2#BBB': 2}
+        _mock_time.return_value = 1000
+
+        def get_pools():
+            pools = self.host_manager.get_all_host_states(context)
+            return {pool.host: pool for pool in pools}
+
+        # Counts are seeded from the DB, reported counts take precedence.
+        pools = get_pools()
+        self.assertEqual(3, pools['host1#AAA'].total_volumes)
+        self.assertEqual(7, pools['host2#BBB'].total_volumes)
+        _mock_volume_count_get_all_by_host.assert_called_once_with(context)
+
+        # Consumed volumes are counted in memory without DB queries.
+        pools['host1#AAA'].consume_from_volume({'size': 1})
+        _mock_time.return_value = 1059
+        pools = get_pools()
+        self.assertEqual(4, pools['host1#AAA'].total_volumes)
+        self.assertEqual(1, _mock_volume_count_get_all_by_host.call_count)
+
+        # Once the refresh interval has elapsed the index is reconciled.
+        _mock_time.return_value = 1060
+        pools = get_pools()
+        self.assertEqual(3, pools['host1#AAA'].total_volumes)
+        self.assertEqual(7, pools['host2#BBB'].total_volumes)
+        self.assertEqual(2, _mock_volume_count_get_all_by_host.call_count)
+
 
 class HostStateTestCase(test.TestCase):
     """Test case for HostState class."""
@@ -98,6 +98,15 @@ class SchedulerRpcAPITestCase(test.TestCase):
                                  filter_properties='filter_properties',
                                  version='1.2')
 
+    def test_create_volumes(self):
+        self._test_scheduler_api('create_volumes',
+                                 rpc_method='call',
+                                 topic='topic',
+                                 volume_ids=['volume_id1', 'volume_id2'],
+                                 request_spec='fake_request_spec',
+                                 filter_properties='filter_properties',
+                                 version='1.9')
+
     def test_migrate_volume_to_host(self):
         self._test_scheduler_api('migrate_volume_to_host',
                                  rpc_method='cast',
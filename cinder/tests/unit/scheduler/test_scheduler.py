@@ -172,6 +172,42 @@ class SchedulerManagerTestCase(test.TestCase):
                                                    {})
         self.assertFalse(_mock_sleep.called)
 
+    @mock.patch('cinder.scheduler.driver.Scheduler.schedule_create_volumes')
+    @mock.patch('cinder.db.volume_update')
+    def test_create_volumes(self, _mock_volume_update, _mock_sched_create):
+        topic = 'fake_topic'
+        request_spec = {'volume_properties': {'size': 1}}
+        _mock_sched_create.return_value = {'fake-id1': 'host1'}
+
+        placements = self.manager.create_volumes(
+            self.context, topic, ['fake-id1', 'fake-id2'],
+            request_spec=request_spec, filter_properties={})
+
+        self.assertEqual({'fake-id1': 'host1'}, placements)
+        _mock_sched_create.assert_called_once_with(
+            self.context, request_spec, {}, ['fake-id1', 'fake-id2'])
+        # The volume which did not fit anywhere is put in error state.
+        _mock_volume_update.assert_called_once_with(self.context,
+                                                    'fake-id2',
+                                                    {'status': 'error'})
+
+    @mock.patch('cinder.scheduler.driver.Scheduler.schedule_create_volumes')
+    @mock.patch('cinder.db.volume_update')
+    def test_create_volumes_exception_puts_volumes_in_error_state(
+            self, _mock_volume_update, _mock_sched_create):
+        _mock_sched_create.side_effect = exception.NoValidHost(reason="")
+        topic = 'fake_topic'
+        request_spec = {'volume_properties': {'size': 1}}
+
+        placements = self.manager.create_volumes(
+            self.context, topic, ['fake-id1', 'fake-id2'],
+            request_spec=request_spec, filter_properties={})
+
+        self.assertEqual({}, placements)
+        _mock_volume_update.assert_has_calls([
+            mock.call(self.context, 'fake-id1', {'status': 'error'}),
+            mock.call(self.context, 'fake-id2', {'status': 'error'})])
+
     @mock.patch('cinder.db.volume_get')
     @mock.patch('cinder.scheduler.driver.Scheduler.host_passes_filters')
     @mock.patch('cinder.db.volume_update')
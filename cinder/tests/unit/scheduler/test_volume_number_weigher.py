@@ -30,20 +30,12 @@ from cinder.volume import utils
 CONF = cfg.CONF
 
 
-def fake_volume_data_get_for_host(context, host, count_only=False):
-    host = utils.extract_host(host)
-    if host == 'host1':
-        return 1
-    elif host == 'host2':
-        return 2
-    elif host == 'host3':
-        return 3
-    elif host == 'host4':
-        return 4
-    elif host == 'host5':
-        return 5
-    else:
-        return 6
+def fake_volume_count_get_all_by_host(context):
+    return {'host1#lvm1': 1,
+            'host2#lvm2': 2,
+            'host3#lvm3': 3,
+            'host4#lvm4': 4,
+            'host5#_pool0': 5}
 
 
 class VolumeNumberWeigherTestCase(test.TestCase):
@@ -62,6 +54,8 @@ class VolumeNumberWeigherTestCase(test.TestCase):
             hosts,
             weight_properties)[0]
 
+    @mock.patch.object(api, 'volume_count_get_all_by_host',
+                       fake_volume_count_get_all_by_host)
     @mock.patch('cinder.db.sqlalchemy.api.service_get_all_by_topic')
     def _get_all_hosts(self, _mock_service_get_all_by_topic, disabled=False):
         ctxt = context.get_admin_context()
@@ -82,12 +76,10 @@ class VolumeNumberWeigherTestCase(test.TestCase):
         # host4: 4 volumes
         # host5: 5 volumes   Norm=-1.0
         # so, host1 should win:
-        with mock.patch.object(api, 'volume_data_get_for_host',
-                               fake_volume_data_get_for_host):
-            weighed_host = self._get_weighed_host(hostinfo_list)
-            self.assertEqual(0.0, weighed_host.weight)
-            self.assertEqual('host1',
-                             utils.extract_host(weighed_host.obj.host))
+        weighed_host = self._get_weighed_host(hostinfo_list)
+        self.assertEqual(0.0, weighed_host.weight)
+        self.assertEqual('host1',
+                         utils.extract_host(weighed_host.obj.host))
 
     def test_volume_number_weight_multiplier2(self):
         self.flags(volume_number_multiplier=1.0)
@@ -99,9 +91,34 @@ class VolumeNumberWeigherTestCase(test.TestCase):
         # host4: 4 volumes
         # host5: 5 volumes     Norm=1
         # so, host5 should win:
-        with mock.patch.object(api, 'volume_data_get_for_host',
-                               fake_volume_data_get_for_host):
+        weighed_host = self._get_weighed_host(hostinfo_list)
+        self.assertEqual(1.0, weighed_host.weight)
+        self.assertEqual('host5',
+                         utils.extract_host(weighed_host.obj.host))
+
+    def test_volume_number_weight_consume_from_volume(self):
+        self.flags(volume_number_multiplier=-1.0)
+        hostinfo_list = self._get_all_hosts()
+
+        # host1 starts with the fewest volumes, consuming two volumes from
+        # it should make host2 win without any further database access.
+        host1 = [h for h in hostinfo_list
+                 if utils.extract_host(h.host) == 'host1'][0]
+        host1.consume_from_volume({'size': 1})
+        host1.consume_from_volume({'size': 1})
+        self.assertEqual(3, host1.total_volumes)
+        with mock.patch.object(api, 'volume_count_get_all_by_host') as m:
             weighed_host = self._get_weighed_host(hostinfo_list)
-            self.assertEqual(1.0, weighed_host.weight)
-            self.assertEqual('host5',
-                             utils.extract_host(weighed_host.obj.host))
+            self.assertFalse(m.called)
+        self.assertEqual('host2',
+                         utils.extract_host(weighed_host.obj.host))
+
+    def test_volume_number_weight_reported_total_volumes(self):
+        self.flags(volume_number_multiplier=-1.0)
+        self.host_manager.service_states['host3']['total_volumes'] = 0
+        hostinfo_list = self._get_all_hosts()
+
+        weighed_host = self._get_weighed_host(hostinfo_list)
+        self.assertEqual(0.0, weighed_host.weight)
+        self.assertEqual('host3',
+                         utils.extract_host(weighed_host.obj.host))
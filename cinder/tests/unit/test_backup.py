@@ -519,6 +519,7 @@ class BackupTestCase(BaseBackupTest):
         self.assertEqual('available', backup['status'])
         self.assertEqual(vol_size, backup['size'])
         self.assertTrue(_mock_volume_backup.called)
+        self.assertEqual({}, self.backup_mgr._backups_in_progress)
 
     @mock.patch('cinder.volume.utils.notify_about_backup_usage')
     @mock.patch('%s.%s' % (CONF.volume_driver, 'backup_volume'))
@@ -725,6 +726,15 @@ class BackupTestCase(BaseBackupTest):
         self.backup_mgr.delete_backup(self.ctxt, backup)
         self.assertEqual(2, notify.call_count)
 
+    def test_delete_backup_cancels_backup_in_progress(self):
+        vol_id = self._create_volume_db_entry(size=1)
+        backup = self._create_backup_db_entry(status='deleting',
+                                              volume_id=vol_id)
+        backup_service = mock.Mock()
+        self.backup_mgr._backups_in_progress[backup.id] = backup_service
+        self.backup_mgr.delete_backup(self.ctxt, backup)
+        backup_service.cancel.assert_called_once_with()
+
     def test_list_backup(self):
         backups = db.backup_get_all_by_project(self.ctxt, 'project1')
         self.assertEqual(0, len(backups))
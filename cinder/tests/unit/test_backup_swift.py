@@ -226,6 +226,36 @@ class BackupSwiftTestCase(test.TestCase):
                                                     starting_backoff=ANY,
                                                     cacert=ANY)
 
+    @mock.patch.object(swift, 'Connection')
+    def test_object_writers_own_connections(self, mock_connection):
+        mock_connection.side_effect = lambda **kwargs: mock.Mock()
+        service = swift_dr.SwiftBackupDriver(self.ctxt)
+
+        writer1 = service.get_object_writer('container', 'object1')
+        writer2 = service.get_object_writer('container', 'object2')
+
+        self.assertIsNot(service.conn, writer1.conn)
+        self.assertIsNot(writer1.conn, writer2.conn)
+        conn1 = writer1.conn
+        conn1.put_object.return_value = hashlib.md5(b'').hexdigest()
+        writer1.close()
+        self.assertIs(conn1, service.get_object_writer('container',
+                                                       'object3').conn)
+
+    @mock.patch.object(swift, 'Connection')
+    def test_object_readers_own_connections(self, mock_connection):
+        mock_connection.side_effect = lambda **kwargs: mock.Mock()
+        service = swift_dr.SwiftBackupDriver(self.ctxt)
+
+        with service.get_object_reader('container', 'object1') as reader1:
+            with service.get_object_reader('container',
+                                           'object2') as reader2:
+                self.assertIsNot(service.conn, reader1.conn)
+                self.assertIsNot(reader1.conn, reader2.conn)
+
+        self.assertEqual([reader2.conn, reader1.conn],
+                         service._idle_connections)
+
     def test_backup_uncompressed(self):
         volume_id = '2b9f10a3-42b4-4fdf-b316-000000ceb039'
         self._create_backup_db_entry(volume_id=volume_id)
@@ -401,6 +401,35 @@ class TestCinderManageCmd(test.TestCase):
             db_cmds.version()
             self.assertEqual(1, db_version.call_count)
 
+    @mock.patch('cinder.db.purge_deleted_rows')
+    @mock.patch('cinder.context.get_admin_context')
+    def test_db_commands_purge(self, get_admin_context, purge_deleted_rows):
+        get_admin_context.return_value = mock.sentinel.ctxt
+
+        def fake_purge(ctxt, age_in_days, batch_size=None, progress=None):
+            progress('volumes', 10)
+            progress('volumes', 15)
+            return 15
+        purge_deleted_rows.side_effect = fake_purge
+
+        db_cmds = cinder_manage.DbCommands()
+        with mock.patch('sys.stdout', new=six.StringIO()) as fake_out:
+            db_cmds.purge(30, batch_size=10)
+
+        purge_deleted_rows.assert_called_once_with(mock.sentinel.ctxt, 30,
+                                                   batch_size=10,
+                                                   progress=mock.ANY)
+        self.assertEqual('Purged 10 rows from volumes\n'
+                         'Purged 15 rows from volumes\n'
+                         'Purged 15 rows in total\n', fake_out.getvalue())
+
+    @mock.patch('cinder.db.purge_deleted_rows')
+    def test_db_commands_purge_bad_batch_size(self, purge_deleted_rows):
+        db_cmds = cinder_manage.DbCommands()
+        with mock.patch('sys.stdout', new=six.StringIO()):
+            self.assertRaises(SystemExit, db_cmds.purge, 30, batch_size=0)
+        self.assertFalse(purge_deleted_rows.called)
+
     @mock.patch('cinder.version.version_string')
     def test_versions_commands_list(self, version_string):
         version_cmds = cinder_manage.VersionCommands()
@@ -17,11 +17,14 @@
 import datetime
 
 import enum
+import mock
 from oslo_config import cfg
+from oslo_utils import timeutils
 from oslo_utils import uuidutils
 import six
 
 from cinder.api import common
+from cinder.common import sqlalchemyutils
 from cinder import context
 from cinder import db
 from cinder.db.sqlalchemy import api as sqlalchemy_api
@@ -295,6 +298,21 @@ class DBAPIVolumeTestCase(BaseTest):
                              db.volume_data_get_for_host(
                                  self.ctxt, 'h%d@lvmdriver-1' % i))
 
+    def test_volume_count_get_all_by_host(self):
+        for i in range(THREE):
+            for j in range(i + 1):
+                db.volume_create(self.ctxt, {'host':
+                                             'h%d@lvmdriver-1#lvmdriver-1' % i,
+                                             'size': ONE_HUNDREDS})
+        db.volume_create(self.ctxt, {'size': ONE_HUNDREDS})
+        deleted = db.volume_create(self.ctxt, {'host': 'h0@lvmdriver-1',
+                                               'size': ONE_HUNDREDS})
+        db.volume_destroy(self.ctxt, deleted['id'])
+        self.assertEqual({'h0@lvmdriver-1#lvmdriver-1': 1,
+                          'h1@lvmdriver-1#lvmdriver-1': 2,
+                          'h2@lvmdriver-1#lvmdriver-1': 3},
+                         db.volume_count_get_all_by_host(self.ctxt))
+
     def test_volume_data_get_for_project(self):
         for i in range(THREE):
             for j in range(THREE):
@@ -371,6 +389,110 @@ class DBAPIVolumeTestCase(BaseTest):
         self._assertEqualListsOfObjects(volumes[2:], db.volume_get_all(
                                         self.ctxt, 2, 2, ['id'], ['asc']))
 
+    def test_volume_get_all_marker_token(self):
+        now = timeutils.utcnow()
+        volumes = [db.volume_create(self.ctxt,
+                                    {'created_at': now - datetime.timedelta(
+                                        seconds=i)})
+                   for i in range(5)]
+
+        marker = None
+        result = []
+        for _page in range(3):
+            page = db.volume_get_all(self.ctxt, marker, 2)
+            result.extend(page)
+            if page:
+                marker = sqlalchemyutils.encode_marker(
+                    {'id': page[-1]['id'],
+                     'created_at': page[-1]['created_at']})
+        self._assertEqualListsOfObjects(volumes, result)
+
+    def test_volume_get_all_marker_token_no_lookup(self):
+        volumes = [db.volume_create(self.ctxt, {'size': i})
+                   for i in range(1, 5)]
+        marker = sqlalchemyutils.encode_marker({'id': volumes[1]['id'],
+                                                'size': 2})
+
+        with mock.patch.object(sqlalchemy_api, '_volume_get') as mock_get:
+            result = db.volume_get_all(self.ctxt, marker, 2, ['size'],
+                                       ['asc'])
+
+        self.assertFalse(mock_get.called)
+        self._assertEqualListsOfObjects(volumes[2:], result)
+
+    def test_volume_get_all_marker_token_other_sort_keys(self):
+        volumes = [db.volume_create(self.ctxt, {'size': i})
+                   for i in range(1, 5)]
+        marker = sqlalchemyutils.encode_marker({'id': volumes[1]['id']})
+
+        result = db.volume_get_all(self.ctxt, marker, 2, ['size'], ['asc'])
+
+        self._assertEqualListsOfObjects(volumes[2:], result)
+
+    def test_volume_get_all_invalid_marker_token(self):
+        for marker in ('k1.', 'k1.!!!', sqlalchemyutils.encode_marker({})):
+            self.assertRaises(exception.InvalidInput, db.volume_get_all,
+                              self.ctxt, marker, 2)
+
+    def test_volume_get_all_by_project_marker_token(self):
+        volumes = [db.volume_create(self.ctxt, {'project_id': 'p1',
+                                                'size': i})
+                   for i in range(1, 5)]
+        db.volume_create(self.ctxt, {'project_id': 'p2', 'size': 5})
+        marker = sqlalchemyutils.encode_marker({'id': volumes[0]['id'],
+                                                'size': 1})
+
+        result = db.volume_get_all_by_project(self.ctxt, 'p1', marker, None,
+                                              sort_keys=['size'],
+                                              sort_dirs=['asc'])
+
+        self._assertEqualListsOfObjects(volumes[1:], result)
+
+    def test_volume_get_all_columns(self):
+        volumes = [db.volume_create(self.ctxt, {'display_name': 'vol%d' % i,
+                                                'size': i})
+                   for i in range(3)]
+        db.volume_metadata_update(self.ctxt, volumes[0]['id'],
+                                  {'key': 'value'}, False)
+
+        result = db.volume_get_all(self.ctxt, None, None, ['size'], ['asc'],
+                                   filters={'metadata': {'key': 'value'}},
+                                   columns=['id', 'display_name'])
+
+        self.assertEqual([{'id': volumes[0]['id'], 'display_name': 'vol0'}],
+                         result)
+
+    def test_volume_get_all_by_project_columns(self):
+        volumes = [db.volume_create(self.ctxt, {'project_id': 'p1',
+                                                'size': i})
+                   for i in range(3)]
+        db.volume_create(self.ctxt, {'project_id': 'p2', 'size': 3})
+
+        result = db.volume_get_all_by_project(self.ctxt, 'p1', None, 2,
+                                              sort_keys=['size'],
+                                              sort_dirs=['desc'],
+                                              columns=['id', 'size'])
+
+        self.assertEqual([{'id': volumes[2]['id'], 'size': 2},
+                          {'id': volumes[1]['id'], 'size': 1}], result)
+
+    def test_volume_get_all_invalid_columns(self):
+        self.assertRaises(exception.InvalidInput, db.volume_get_all,
+                          self.ctxt, None, None, columns=['id', 'foo'])
+
+    def test_volume_get_all_by_host_columns(self):
+        volumes = [db.volume_create(self.ctxt, {'host': 'h1#pool',
+                                                'project_id': 'p%d' % i})
+                   for i in range(2)]
+        db.volume_create(self.ctxt, {'host': 'h2'})
+
+        result = db.volume_get_all_by_host(self.ctxt, 'h1',
+                                           columns=['project_id'])
+
+        self.assertEqual(sorted([{'project_id': v['project_id']}
+                                 for v in volumes]),
+                         sorted(result))
+
     def test_volume_get_all_by_host(self):
         volumes = []
         for i in range(3):
@@ -1079,6 +1201,24 @@ class DBAPISnapshotTestCase(BaseTest):
         actual = db.snapshot_data_get_for_project(self.ctxt, 'project1')
         self.assertEqual((1, 42), actual)
 
+    def test_snapshot_get_all_marker_token(self):
+        db.volume_create(self.ctxt, {'id': 1})
+        snapshots = [db.snapshot_create(self.ctxt, {'id': i, 'volume_id': 1,
+                                                    'volume_size': i})
+                     for i in range(1, 5)]
+        marker = sqlalchemyutils.encode_marker({'id': '2',
+                                                'volume_size': 2})
+
+        with mock.patch.object(sqlalchemy_api,
+                               '_snapshot_get') as mock_get:
+            result = db.snapshot_get_all(self.ctxt, marker=marker,
+                                         sort_keys=['volume_size'],
+                                         sort_dirs=['asc'])
+
+        self.assertFalse(mock_get.called)
+        self._assertEqualListsOfObjects(snapshots[2:], result,
+                                        ignored_keys=['metadata', 'volume'])
+
     def test_snapshot_get_all_by_filter(self):
         db.volume_create(self.ctxt, {'id': 1})
         db.volume_create(self.ctxt, {'id': 2})
@@ -1633,6 +1773,45 @@ class DBAPIReservationTestCase(BaseTest):
                              self.ctxt,
                              'project1'))
 
+    def test_reservation_expire_in_batches(self):
+        resources = {
+            'volumes': quota.ReservableResource('volumes', '_sync_volumes'),
+            'gigabytes': quota.ReservableResource('gigabytes',
+                                                  '_sync_gigabytes')}
+        quotas = {'volumes': -1, 'gigabytes': -1}
+        deltas = {'volumes': 1, 'gigabytes': 2}
+        expired = timeutils.utcnow() - datetime.timedelta(seconds=1)
+        for i in range(3):
+            db.quota_reserve(self.ctxt, resources, quotas, deltas, expired,
+                             0, 0, 'project1')
+        expire = timeutils.utcnow() + datetime.timedelta(days=1)
+        reservations = db.quota_reserve(self.ctxt, resources, quotas, deltas,
+                                        expire, 0, 0, 'project1')
+        db.reservation_expire(self.ctxt, batch_size=2)
+
+        expected = {'project_id': 'project1',
+                    'gigabytes': {'reserved': 2, 'in_use': 0},
+                    'volumes': {'reserved': 1, 'in_use': 0}}
+        self.assertEqual(expected,
+                         db.quota_usage_get_all_by_project(
+                             self.ctxt,
+                             'project1'))
+        self.assertEqual(2, sqlalchemy_api.model_query(
+            self.ctxt, sqlalchemy_api.models.Reservation,
+            read_deleted="no").count())
+
+        db.reservation_commit(self.ctxt, reservations, 'project1')
+        expected = {'project_id': 'project1',
+                    'gigabytes': {'reserved': 0, 'in_use': 2},
+                    'volumes': {'reserved': 0, 'in_use': 1}}
+        self.assertEqual(expected,
+                         db.quota_usage_get_all_by_project(
+                             self.ctxt,
+                             'project1'))
+        self.assertEqual(0, sqlalchemy_api.model_query(
+            self.ctxt, sqlalchemy_api.models.Reservation,
+            read_deleted="no").count())
+
 
 class DBAPIQuotaClassTestCase(BaseTest):
 
@@ -1737,6 +1916,76 @@ class DBAPIQuotaTestCase(BaseTest):
                           'volumes': {'reserved': 1, 'in_use': 0}},
                          quota_usage)
 
+    def test_quota_reserve_batch(self):
+        resources = {
+            'volumes': quota.ReservableResource('volumes', '_sync_volumes'),
+            'gigabytes': quota.ReservableResource('gigabytes',
+                                                  '_sync_gigabytes')}
+        quotas = {'volumes': 3, 'gigabytes': 30}
+        expire = timeutils.utcnow() + datetime.timedelta(days=1)
+        deltas_list = [{'volumes': 1, 'gigabytes': 10} for i in range(3)]
+        reservations = db.quota_reserve_batch(self.ctxt, resources, quotas,
+                                              deltas_list, expire, 0, 0,
+                                              'project1')
+        self.assertEqual(3, len(reservations))
+        self.assertEqual({'project_id': 'project1',
+                          'gigabytes': {'reserved': 30, 'in_use': 0},
+                          'volumes': {'reserved': 3, 'in_use': 0}},
+                         db.quota_usage_get_all_by_project(self.ctxt,
+                                                           'project1'))
+
+        db.reservation_commit(self.ctxt, reservations[0], 'project1')
+        db.reservation_rollback(self.ctxt, reservations[1], 'project1')
+        self.assertEqual({'project_id': 'project1',
+                          'gigabytes': {'reserved': 10, 'in_use': 10},
+                          'volumes': {'reserved': 1, 'in_use': 1}},
+                         db.quota_usage_get_all_by_project(self.ctxt,
+                                                           'project1'))
+
+        self.assertRaises(exception.OverQuota, db.quota_reserve_batch,
+                          self.ctxt, resources, quotas, deltas_list[:2],
+                          expire, 0, 0, 'project1')
+
+    def test_project_usage_totals(self):
+        for size, type_id in ((1, 'type1'), (2, 'type1'), (4, None)):
+            volume = db.volume_create(self.ctxt,
+                                      {'project_id': 'project1',
+                                       'size': size,
+                                       'volume_type_id': type_id})
+            db.snapshot_create(self.ctxt, {'project_id': 'project1',
+                                           'volume_id': volume.id,
+                                           'volume_size': size})
+        db.backup_create(self.ctxt, {'project_id': 'project1',
+                                     'volume_id': volume.id,
+                                     'size': 8})
+        db.volume_create(self.ctxt, {'project_id': 'project2', 'size': 16})
+
+        totals = sqlalchemy_api._project_usage_totals(
+            self.ctxt, 'project1',
+            set(['volumes', 'snapshots', 'backups', 'consistencygroups']))
+        self.assertEqual({'volumes': {'type1': (2, 3), None: (1, 4)},
+                          'snapshots': {'type1': (2, 3), None: (1, 4)},
+                          'backups': {None: (1, 8)},
+                          'consistencygroups': {None: (0, 0)}},
+                         totals)
+
+        # The usages computed from the totals match the ones queried one
+        # by one by the sync functions.
+        session = sqlalchemy_api.get_session()
+        for name, sync in sqlalchemy_api.QUOTA_SYNC_FUNCTIONS.items():
+            volume_types = [(None, None)]
+            if name in ('_sync_volumes', '_sync_snapshots',
+                        '_sync_gigabytes'):
+                volume_types.append(('type1', 'type1'))
+            for type_id, type_name in volume_types:
+                self.assertEqual(
+                    sync(self.ctxt, 'project1', session,
+                         volume_type_id=type_id, volume_type_name=type_name),
+                    sync(self.ctxt, 'project1', session,
+                         volume_type_id=type_id, volume_type_name=type_name,
+                         totals=totals),
+                    name)
+
     def test_quota_destroy(self):
         db.quota_create(self.ctxt, 'project1', 'resource1', 41)
         self.assertIsNone(db.quota_destroy(self.ctxt, 'project1',
@@ -1925,6 +2174,16 @@ class DBAPIBackupTestCase(BaseTest):
         filtered_backups = db.backup_get_all(self.ctxt, filters=filters)
         self._assertEqualListsOfObjects([], filtered_backups)
 
+    def test_backup_get_all_marker_token(self):
+        backups = sorted(self.created, key=lambda b: b['size'])
+        marker = sqlalchemyutils.encode_marker({'id': backups[0]['id'],
+                                                'size': backups[0]['size']})
+
+        result = db.backup_get_all(self.ctxt, marker=marker,
+                                   sort_keys=['size'], sort_dirs=['asc'])
+
+        self._assertEqualListsOfObjects(backups[1:], result)
+
     def test_backup_get_all_by_host(self):
         byhost = db.backup_get_all_by_host(self.ctxt,
                                            self.created[1]['host'])
@@ -2290,3 +2549,70 @@ class DBAPIImageVolumeCacheEntryTestCase(BaseTest):
         host = 'abc@123#poolz'
         entries = db.image_volume_cache_get_all_for_host(self.ctxt, host)
         self.assertEqual([], entries)
+
+    def _set_last_used(self, entry, last_used):
+        sqlalchemy_api.get_session().query(
+            sqlalchemy_api.models.ImageVolumeCacheEntry).\
+            filter_by(id=entry['id']).\
+            update({'last_used': last_used})
+
+    def _create_entries(self, host, sizes):
+        image_updated_at = datetime.datetime.utcnow()
+        now = timeutils.utcnow()
+        entries = []
+        for i, size in enumerate(sizes):
+            entry = db.image_volume_cache_create(self.ctxt, host,
+                                                 'image-' + str(i),
+                                                 image_updated_at,
+                                                 'vol-' + str(i), size)
+            self._set_last_used(entry, now - datetime.timedelta(hours=i))
+            entries.append(entry)
+        return entries
+
+    def test_cache_entry_get_usage_for_host(self):
+        host = 'abc@123#poolz'
+        self._create_entries(host, [6, 1, 10])
+        self._create_entries('someOtherHost', [3])
+
+        self.assertEqual({'size': 17, 'count': 3},
+                         db.image_volume_cache_get_usage_for_host(self.ctxt,
+                                                                  host))
+        self.assertEqual({'size': 0, 'count': 0},
+                         db.image_volume_cache_get_usage_for_host(self.ctxt,
+                                                                  'nohost'))
+
+    def test_cache_entry_get_lru_for_host(self):
+        host = 'abc@123#poolz'
+        entries = self._create_entries(host, [6, 1, 10, 2])
+        self._create_entries('someOtherHost', [3])
+
+        lru = db.image_volume_cache_get_lru_for_host(self.ctxt, host)
+        self.assertEqual([entry.id for entry in entries[::-1]],
+                         [entry.id for entry in lru])
+
+        page = db.image_volume_cache_get_lru_for_host(self.ctxt, host,
+                                                      limit=2)
+        self.assertEqual([entries[3].id, entries[2].id],
+                         [entry.id for entry in page])
+        page = db.image_volume_cache_get_lru_for_host(self.ctxt, host,
+                                                      limit=2,
+                                                      marker=page[-1])
+        self.assertEqual([entries[1].id, entries[0].id],
+                         [entry.id for entry in page])
+
+    def test_cache_entry_get_and_update_last_used_recently_used(self):
+        host = 'abc@123#poolz'
+        entry = self._create_entries(host, [6])[0]
+        last_used = timeutils.utcnow() - datetime.timedelta(seconds=10)
+        self._set_last_used(entry, last_used)
+
+        # Not updated when used less than a minute ago
+        entry = db.image_volume_cache_get_and_update_last_used(
+            self.ctxt, 'image-0', host)
+        self.assertEqual(last_used, entry['last_used'])
+
+        last_used -= datetime.timedelta(minutes=1)
+        self._set_last_used(entry, last_used)
+        entry = db.image_volume_cache_get_and_update_last_used(
+            self.ctxt, 'image-0', host)
+        self.assertGreater(entry['last_used'], last_used)
@@ -13,6 +13,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
+import mock
+
 from cinder import exception
 from cinder.scheduler.evaluator import evaluator
 from cinder import test
@@ -137,3 +141,27 @@ class EvaluatorTestCase(test.TestCase):
         self.assertRaises(exception.EvaluatorParseException,
                           evaluator.evaluate,
                           "7 / 0")
+
+    def test_cached_expression_uses_new_vars(self):
+        expression = "stats.free_space * 2 + 1"
+        self.assertEqual(11, evaluator.evaluate(expression,
+                                                stats={'free_space': 5}))
+        self.assertEqual(21, evaluator.evaluate(expression,
+                                                stats={'free_space': 10}))
+        self.assertRaises(exception.EvaluatorParseException,
+                          evaluator.evaluate,
+                          expression,
+                          stats={})
+
+    @mock.patch.object(evaluator, '_EXPRESSION_CACHE_SIZE', 2)
+    @mock.patch.object(evaluator, '_expressions', collections.OrderedDict())
+    def test_expression_cache(self):
+        evaluator.evaluate("1 + 1")
+        with mock.patch.object(evaluator, '_parser') as mock_parser:
+            self.assertEqual(2, evaluator.evaluate("1 + 1"))
+            self.assertFalse(mock_parser.parseString.called)
+
+        evaluator.evaluate("1 + 2")
+        evaluator.evaluate("1 + 1")
+        evaluator.evaluate("1 + 3")
+        self.assertEqual(["1 + 1", "1 + 3"], list(evaluator._expressions))
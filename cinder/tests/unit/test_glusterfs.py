@@ -16,11 +16,13 @@
 
 import errno
 import os
+import shutil
 import six
 import tempfile
 import time
 import traceback
 
+import eventlet
 import mock
 import os_brick
 from oslo_concurrency import processutils as putils
@@ -95,6 +97,8 @@ class GlusterFsDriverTestCase(test.TestCase):
         self._configuration.nas_ip = None
         self._configuration.nas_share_path = None
         self._configuration.nas_mount_options = None
+        self._configuration.nas_share_probe_timeout = 30
+        self._configuration.nas_share_capacity_cache_ttl = 0
 
         self._driver =\
             glusterfs.GlusterfsDriver(configuration=self._configuration,
@@ -197,20 +201,270 @@ class GlusterFsDriverTestCase(test.TestCase):
             result = drv._get_available_capacity(self.TEST_EXPORT1)
             self.assertEqual((df_avail, df_total_size), result)
 
+    def test_get_available_capacity_with_statvfs(self):
+        drv = self._driver
+        fs_stat = mock.Mock(f_frsize=4096, f_blocks=100, f_bavail=25)
+
+        with mock.patch.object(drv, '_get_mount_point_for_share',
+                               return_value=self.TEST_MNT_POINT),\
+                mock.patch.object(drv, '_execute') as mock_execute,\
+                mock.patch.object(remotefs_drv.os, 'statvfs',
+                                  return_value=fs_stat) as mock_statvfs:
+            result = drv._get_available_capacity(self.TEST_EXPORT1)
+
+            self.assertEqual((25 * 4096, 100 * 4096), result)
+            mock_statvfs.assert_called_once_with(self.TEST_MNT_POINT)
+            self.assertFalse(mock_execute.called)
+
+    def test_get_shares_capacity_info_cached(self):
+        drv = self._driver
+        drv.configuration.nas_share_capacity_cache_ttl = 60
+        shares = [self.TEST_EXPORT1, self.TEST_EXPORT2]
+
+        with mock.patch.object(drv, '_get_capacity_info',
+                               side_effect=lambda share: (share, 1, 0)) as \
+                mock_get_capacity_info:
+            drv._get_shares_capacity_info(shares)
+            capacity_info = drv._get_shares_capacity_info(shares)
+
+            self.assertEqual({self.TEST_EXPORT1: (self.TEST_EXPORT1, 1, 0),
+                              self.TEST_EXPORT2: (self.TEST_EXPORT2, 1, 0)},
+                             capacity_info)
+            self.assertEqual([mock.call(self.TEST_EXPORT1),
+                              mock.call(self.TEST_EXPORT2)],
+                             mock_get_capacity_info.call_args_list)
+
+            # Changing a volume invalidates the cache
+            drv._forget_volume_files(self._simple_volume())
+            drv._get_shares_capacity_info(shares)
+
+            self.assertEqual(4, mock_get_capacity_info.call_count)
+
+    def test_get_shares_capacity_info_timeout(self):
+        drv = self._driver
+        drv.configuration.nas_share_probe_timeout = 0.01
+
+        def fake_get_capacity_info(share):
+            if share == self.TEST_EXPORT2:
+                # Hung server
+                eventlet.sleep(10)
+            return 10, 5, 5
+
+        with mock.patch.object(drv, '_get_capacity_info',
+                               side_effect=fake_get_capacity_info):
+            capacity_info = drv._get_shares_capacity_info(
+                [self.TEST_EXPORT1, self.TEST_EXPORT2])
+
+        self.assertEqual({self.TEST_EXPORT1: (10, 5, 5)}, capacity_info)
+
+    def test_get_shares_capacity_info_timeout_last_known(self):
+        drv = self._driver
+        drv.configuration.nas_share_probe_timeout = 0.01
+        hung = eventlet.event.Event()
+        probes = []
+
+        def fake_get_capacity_info(share):
+            probes.append(share)
+            if len(probes) == 2:
+                # Hung server
+                hung.wait()
+            return 10, 5, len(probes)
+
+        with mock.patch.object(drv, '_get_capacity_info',
+                               side_effect=fake_get_capacity_info):
+            drv._get_shares_capacity_info([self.TEST_EXPORT1])
+            # The last known capacity is used while the probe is hung, and
+            # the share isn't probed again meanwhile
+            for _i in range(2):
+                self.assertEqual({self.TEST_EXPORT1: (10, 5, 1)},
+                                 drv._get_shares_capacity_info(
+                                     [self.TEST_EXPORT1]))
+            self.assertEqual(2, len(probes))
+
+            hung.send()
+            eventlet.sleep(0)
+
+        self.assertEqual((10, 5, 2),
+                         drv._capacity_info_cache[self.TEST_EXPORT1][1])
+        self.assertEqual({}, drv._share_probes)
+
+    def test_run_on_shares_timeout_kills_processes(self):
+        drv = self._driver
+        drv.configuration.nas_share_probe_timeout = 0.01
+        process = mock.Mock()
+        killed = eventlet.event.Event()
+        process.kill.side_effect = killed.send
+
+        def fake_execute(*cmd, **kwargs):
+            kwargs['on_execute'](process)
+            killed.wait()
+            kwargs['on_completion'](process)
+        execute = drv._probe_execute(fake_execute)
+
+        results = list(drv._run_on_shares(
+            lambda share: execute('df', share), [self.TEST_EXPORT1]))
+
+        self.assertEqual(1, len(results))
+        share, result, exc = results[0]
+        self.assertEqual(self.TEST_EXPORT1, share)
+        self.assertIsInstance(exc, eventlet.Timeout)
+        process.kill.assert_called_once_with()
+
+    def test_probe_execute_outside_probes(self):
+        execute = mock.Mock()
+        self._driver._probe_execute(execute)('df', run_as_root=True)
+        execute.assert_called_once_with('df', run_as_root=True)
+
+    def _make_file(self, path, size):
+        with open(path, 'w') as f:
+            f.truncate(size)
+
     def test_get_provisioned_capacity(self):
         """_get_provisioned_size should calculate correct value."""
         drv = self._driver
+        mnt_point = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, mnt_point)
+        os.mkdir(os.path.join(mnt_point, 'subdir'))
+        self._make_file(os.path.join(mnt_point, self.VOLUME_NAME), units.Gi)
+        self._make_file(os.path.join(mnt_point, 'subdir', 'file'),
+                        2 * units.Gi)
 
         drv.shares = {'127.7.7.7:/gluster1': None}
+        drv.configuration.nas_provisioned_capacity_walk_interval = 3600
         with mock.patch.object(drv, '_get_mount_point_for_share') as \
                 mock_get_mount_point_for_share,\
-                mock.patch.object(drv, '_execute') as mock_execute:
-            mock_get_mount_point_for_share.\
-                return_value = self.TEST_MNT_POINT
-            mock_execute.return_value = ("3221225472 /mount/point", '')
-            provisioned_capacity = drv._get_provisioned_capacity()
+                mock.patch.object(drv, '_execute') as mock_execute,\
+                mock.patch.object(remotefs_drv, '_get_file_sizes',
+                                  wraps=remotefs_drv._get_file_sizes) as \
+                mock_get_file_sizes:
+            mock_get_mount_point_for_share.return_value = mnt_point
+
+            self.assertEqual(3.0, drv._get_provisioned_capacity())
+            self.assertEqual(3.0, drv._get_provisioned_capacity())
+
+            mock_get_file_sizes.assert_called_once_with([mnt_point])
+            self.assertFalse(mock_execute.called)
+
+    @mock.patch.object(remotefs_drv, 'LOG')
+    def test_get_provisioned_capacity_unreadable_dir(self, mock_log):
+        drv = self._driver
+        mnt_point = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, mnt_point)
+        self._make_file(os.path.join(mnt_point, self.VOLUME_NAME), units.Gi)
+        missing_mnt_point = os.path.join(mnt_point, 'missing')
+
+        drv.shares = {'127.7.7.7:/gluster1': None,
+                      '127.7.7.7:/gluster2': None}
+        mount_points = {'127.7.7.7:/gluster1': mnt_point,
+                        '127.7.7.7:/gluster2': missing_mnt_point}
+        with mock.patch.object(drv, '_get_mount_point_for_share',
+                               side_effect=mount_points.get):
+            self.assertEqual(1.0, drv._get_provisioned_capacity())
+
+        self.assertEqual(1, mock_log.warning.call_count)
+        self.assertEqual(missing_mnt_point,
+                         mock_log.warning.call_args[0][1]['path'])
+
+    def test_get_provisioned_capacity_hung_share(self):
+        drv = self._driver
+        drv.configuration.nas_share_probe_timeout = 0.01
+        drv.shares = {self.TEST_EXPORT1: None, self.TEST_EXPORT2: None}
+        mount_points = {self.TEST_EXPORT1: '/mnt/a',
+                        self.TEST_EXPORT2: '/mnt/b'}
+        hung = eventlet.event.Event()
+        self.addCleanup(hung.send, ({}, []))
+        walked = []
+
+        def fake_get_file_sizes(paths):
+            walked.extend(paths)
+            if paths == ['/mnt/b']:
+                # Hung server
+                return hung.wait()
+            return {'/mnt/a/volume-1': units.Gi}, []
+
+        with mock.patch.object(drv, '_get_mount_point_for_share',
+                               side_effect=mount_points.get),\
+                mock.patch.object(remotefs_drv.tpool, 'execute',
+                                  side_effect=lambda func, paths:
+                                  fake_get_file_sizes(paths)):
+            # The other shares are counted, and the hung one isn't walked
+            # again meanwhile
+            for _i in range(2):
+                self.assertEqual(1.0, drv._get_provisioned_capacity())
+
+        self.assertEqual(['/mnt/a', '/mnt/b'], sorted(walked))
+        self.assertEqual(['/mnt/b'], list(drv._walkers.keys()))
+
+    @mock.patch.object(remotefs_drv.eventlet, 'spawn')
+    def test_get_provisioned_files_walks_in_background(self, mock_spawn):
+        drv = self._driver
+        drv.configuration.nas_provisioned_capacity_walk_interval = 60
+        drv._provisioned_files = {'/mnt/a': {'/mnt/a/volume-1': units.Gi}}
+        drv._provisioned_files_walked_at = {'/mnt/a': time.time() - 60}
+
+        for _i in range(2):
+            self.assertEqual({'/mnt/a/volume-1': units.Gi},
+                             drv._get_provisioned_files('/mnt/a'))
+
+        mock_spawn.assert_called_once_with(drv._walk_provisioned_files,
+                                           '/mnt/a')
+        self.assertEqual({'/mnt/a': mock_spawn.return_value}, drv._walkers)
+        self.assertFalse(mock_spawn.return_value.wait.called)
+
+    @mock.patch.object(remotefs_drv.eventlet, 'spawn')
+    def test_get_provisioned_files_walk_disabled(self, mock_spawn):
+        drv = self._driver
+        drv.configuration.nas_provisioned_capacity_walk_interval = 0
+        drv._provisioned_files = {'/mnt/a': {'/mnt/a/volume-1': units.Gi}}
+        drv._provisioned_files_walked_at = {'/mnt/a': time.time() - 3600}
+
+        self.assertEqual({'/mnt/a/volume-1': units.Gi},
+                         drv._get_provisioned_files('/mnt/a'))
+
+        self.assertFalse(mock_spawn.called)
+
+    def test_update_volume_files(self):
+        drv = self._driver
+        volume_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, volume_dir)
+        volume = self._simple_volume()
+        volume_path = os.path.join(volume_dir, self.VOLUME_NAME)
+        snap_path = '%s.%s' % (volume_path, self.SNAP_UUID)
+        self._make_file(volume_path, units.Gi)
+        self._make_file(snap_path, units.Mi)
+        drv._write_info_file(volume_path + '.info',
+                             {'active': os.path.basename(snap_path),
+                              self.SNAP_UUID: os.path.basename(snap_path)})
+        other_path = os.path.join(volume_dir, 'volume-other')
+        drv._provisioned_files = {
+            volume_dir: {volume_path: 1, other_path: units.Gi}}
+
+        with mock.patch.object(drv, '_get_mount_point_for_share',
+                               return_value=volume_dir),\
+                mock.patch.object(drv, '_local_volume_dir',
+                                  return_value=volume_dir):
+            drv._update_volume_files(volume)
+
+            self.assertEqual(
+                {volume_path: units.Gi,
+                 snap_path: units.Mi,
+                 volume_path + '.info': os.path.getsize(volume_path + '.info'),
+                 other_path: units.Gi},
+                drv._provisioned_files[volume_dir])
+
+            drv._forget_volume_files(volume)
+
+            self.assertEqual({other_path: units.Gi},
+                             drv._provisioned_files[volume_dir])
+
+    def test_update_volume_files_before_walk(self):
+        drv = self._driver
+
+        with mock.patch.object(drv, '_volume_files') as mock_volume_files:
+            drv._update_volume_files(self._simple_volume())
 
-            self.assertEqual(3.0, provisioned_capacity)
+        self.assertEqual({}, drv._provisioned_files)
+        self.assertFalse(mock_volume_files.called)
 
     def test_update_volume_stats_thin(self):
         """_update_volume_stats_thin with qcow2 files."""
@@ -15,7 +15,10 @@
 #    under the License.
 """Unit tests for image utils."""
 
+import hashlib
 import math
+import os
+import tempfile
 
 import mock
 from oslo_concurrency import processutils
@@ -657,6 +660,58 @@ class TestFetchToVolumeFormat(test.TestCase):
         mock_convert.assert_called_once_with(tmp, dest, volume_format,
                                              run_as_root=run_as_root)
 
+    @mock.patch('cinder.image.image_utils.download_cache.get_cache')
+    @mock.patch('cinder.image.image_utils.convert_image')
+    @mock.patch('cinder.image.image_utils.volume_utils.copy_volume')
+    @mock.patch(
+        'cinder.image.image_utils.replace_xenserver_image_with_coalesced_vhd')
+    @mock.patch('cinder.image.image_utils.is_xenserver_image',
+                return_value=False)
+    @mock.patch('cinder.image.image_utils.fetch')
+    @mock.patch('cinder.image.image_utils.qemu_img_info')
+    @mock.patch('cinder.image.image_utils.temporary_file')
+    @mock.patch('cinder.image.image_utils.CONF')
+    def test_download_cache(self, mock_conf, mock_temp, mock_info,
+                            mock_fetch, mock_is_xen, mock_repl_xen,
+                            mock_copy, mock_convert, mock_get_cache):
+        ctxt = mock.sentinel.context
+        ctxt.user_id = mock.sentinel.user_id
+        image_service = mock.Mock(temp_images=None)
+        image_meta = {'disk_format': 'qcow2', 'container_format': 'bare',
+                      'size': 4321, 'checksum': 'abc'}
+        image_service.show.return_value = image_meta
+        image_id = mock.sentinel.image_id
+        dest = mock.sentinel.dest
+        volume_format = mock.sentinel.volume_format
+        blocksize = mock.sentinel.blocksize
+
+        data = mock_info.return_value
+        data.file_format = volume_format
+        data.backing_file = None
+        data.virtual_size = 1234
+        tmp = mock_temp.return_value.__enter__.return_value
+        cache = mock_get_cache.return_value
+        cache.is_cacheable.return_value = True
+        cached = cache.fetch.return_value.__enter__.return_value
+
+        output = image_utils.fetch_to_volume_format(ctxt, image_service,
+                                                    image_id, dest,
+                                                    volume_format, blocksize)
+
+        self.assertIsNone(output)
+        cache.is_cacheable.assert_called_once_with(image_meta)
+        cache.fetch.assert_called_once_with(ctxt, image_service, image_id,
+                                            image_meta)
+        self.assertTrue(cache.fetch.return_value.__exit__.called)
+        mock_info.assert_has_calls([
+            mock.call(tmp, run_as_root=True),
+            mock.call(cached, run_as_root=True),
+            mock.call(dest, run_as_root=True)])
+        self.assertFalse(mock_fetch.called)
+        self.assertFalse(mock_repl_xen.called)
+        mock_convert.assert_called_once_with(cached, dest, volume_format,
+                                             run_as_root=True)
+
     @mock.patch('cinder.image.image_utils.convert_image')
     @mock.patch('cinder.image.image_utils.volume_utils.copy_volume')
     @mock.patch(
@@ -1099,6 +1154,233 @@ class TestFetchToVolumeFormat(test.TestCase):
                                              run_as_root=run_as_root)
 
 
+class TestStreamToVolume(test.TestCase):
+    def setUp(self):
+        super(TestStreamToVolume, self).setUp()
+        fd, self.dest = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.unlink, self.dest)
+        self.context = mock.sentinel.context
+        self.chunks = [b'a' * 4, b'\0' * 4, b'b' * 4, b'\0' * 4]
+        self.image_service = mock.Mock()
+
+        def fake_download(context, image_id, data):
+            for chunk in self.chunks:
+                data.write(chunk)
+        self.image_service.download.side_effect = fake_download
+
+        self.headers = []
+
+        def fake_qemu_img_info(path, run_as_root=True):
+            with open(path, 'rb') as f:
+                self.headers.append(f.read())
+            return self.info
+        self.info = mock.Mock(file_format='raw', backing_file=None)
+        self.mock_info = self.mock_object(
+            image_utils, 'qemu_img_info',
+            mock.Mock(side_effect=fake_qemu_img_info))
+
+    def _image_meta(self, **kwargs):
+        image_meta = {'disk_format': 'raw', 'container_format': 'bare',
+                      'size': 16,
+                      'checksum': hashlib.md5(b''.join(self.chunks)).
+                      hexdigest()}
+        image_meta.update(kwargs)
+        return image_meta
+
+    def _read_dest(self):
+        with open(self.dest, 'rb') as f:
+            return f.read()
+
+    def test_stream(self):
+        image_utils.stream_to_volume(self.context, self.image_service,
+                                     mock.sentinel.image_id,
+                                     self._image_meta(), self.dest,
+                                     size=1, run_as_root=False)
+
+        self.image_service.download.assert_called_once_with(
+            self.context, mock.sentinel.image_id, mock.ANY)
+        self.assertEqual(b''.join(self.chunks), self._read_dest())
+        self.mock_info.assert_called_once_with(mock.ANY, run_as_root=False)
+        self.assertEqual([b''.join(self.chunks)], self.headers)
+
+    def test_stream_header(self):
+        self.chunks = [b'a' * image_utils.IMAGE_HEADER_SIZE, b'b' * 4]
+
+        image_utils.stream_to_volume(self.context, self.image_service,
+                                     mock.sentinel.image_id,
+                                     self._image_meta(size=None), self.dest,
+                                     run_as_root=False)
+
+        self.assertEqual([self.chunks[0]], self.headers)
+
+    def _test_stream_not_raw(self):
+        self.assertRaises(exception.ImageUnacceptable,
+                          image_utils.stream_to_volume,
+                          self.context, self.image_service,
+                          mock.sentinel.image_id, self._image_meta(),
+                          self.dest, run_as_root=False)
+
+    def test_stream_not_raw(self):
+        self.info.file_format = 'qcow2'
+        self._test_stream_not_raw()
+
+    def test_stream_not_raw_nothing_written(self):
+        self.chunks = [b'a' * image_utils.IMAGE_HEADER_SIZE, b'b' * 4]
+        self.info.file_format = 'qcow2'
+
+        self.assertRaises(exception.ImageUnacceptable,
+                          image_utils.stream_to_volume,
+                          self.context, self.image_service,
+                          mock.sentinel.image_id,
+                          self._image_meta(size=None), self.dest,
+                          run_as_root=False)
+
+        self.assertEqual(b'', self._read_dest())
+
+    def test_writer_holds_data_until_header_checked(self):
+        written = []
+
+        class Writer(image_utils.ImageStreamWriter):
+            def _write_data(self, data):
+                written.append(data)
+
+        writer = Writer(checksum=False, image_id=mock.sentinel.image_id)
+        writer.write(b'a' * 4)
+        self.assertEqual([], written)
+        self.assertFalse(self.mock_info.called)
+
+        writer.close()
+
+        self.assertEqual([b'a' * 4], written)
+        self.assertEqual([b'a' * 4], self.headers)
+        self.assertIsNone(writer.md5)
+
+    def test_stream_backing_file(self):
+        self.info.backing_file = '/etc/shadow'
+        self._test_stream_not_raw()
+
+    def test_stream_info_error(self):
+        self.mock_info.side_effect = processutils.ProcessExecutionError
+        self._test_stream_not_raw()
+
+    def test_stream_skip_zeros(self):
+        self.flags(image_stream_skip_zeros=True)
+        with open(self.dest, 'wb') as f:
+            f.write(b'x' * 20)
+
+        image_utils.stream_to_volume(self.context, self.image_service,
+                                     mock.sentinel.image_id,
+                                     self._image_meta(), self.dest,
+                                     run_as_root=False)
+
+        # The zero chunks were not written
+        self.assertEqual(b'aaaaxxxxbbbbxxxxxxxx', self._read_dest())
+
+    def test_stream_skip_zeros_extends_file(self):
+        self.flags(image_stream_skip_zeros=True)
+
+        image_utils.stream_to_volume(self.context, self.image_service,
+                                     mock.sentinel.image_id,
+                                     self._image_meta(), self.dest,
+                                     run_as_root=False)
+
+        self.assertEqual(b''.join(self.chunks), self._read_dest())
+
+    @mock.patch('cinder.utils.temporary_chown')
+    def test_stream_run_as_root(self, mock_chown):
+        image_utils.stream_to_volume(self.context, self.image_service,
+                                     mock.sentinel.image_id,
+                                     self._image_meta(), self.dest)
+
+        mock_chown.assert_called_once_with(self.dest)
+        self.assertEqual(b''.join(self.chunks), self._read_dest())
+
+    def test_stream_checksum_mismatch(self):
+        self.assertRaises(exception.ImageUnacceptable,
+                          image_utils.stream_to_volume,
+                          self.context, self.image_service,
+                          mock.sentinel.image_id,
+                          self._image_meta(checksum='bad'), self.dest,
+                          run_as_root=False)
+
+    def test_stream_size_error(self):
+        self.assertRaises(exception.ImageUnacceptable,
+                          image_utils.stream_to_volume,
+                          self.context, self.image_service,
+                          mock.sentinel.image_id,
+                          self._image_meta(size=2 * units.Gi), self.dest,
+                          size=1, run_as_root=False)
+        self.assertFalse(self.image_service.download.called)
+
+    def test_check_streamed_image_size_error(self):
+        writer = mock.Mock(size=2 * units.Gi)
+        self.assertRaises(exception.ImageUnacceptable,
+                          image_utils.check_streamed_image,
+                          mock.sentinel.image_id, self._image_meta(size=None),
+                          writer, 1)
+        self.assertFalse(self.mock_info.called)
+
+    @mock.patch('cinder.image.image_utils.stream_to_volume')
+    @mock.patch('cinder.image.image_utils.temporary_file')
+    def test_fetch_to_raw_streams(self, mock_temp, mock_stream):
+        image_meta = self._image_meta()
+        self.image_service.show.return_value = image_meta
+        self.image_service.temp_images = None
+
+        image_utils.fetch_to_raw(self.context, self.image_service,
+                                 mock.sentinel.image_id, self.dest,
+                                 mock.sentinel.blocksize, size=1)
+
+        mock_stream.assert_called_once_with(
+            self.context, self.image_service, mock.sentinel.image_id,
+            image_meta, self.dest, size=1, run_as_root=True)
+        self.assertFalse(mock_temp.called)
+
+    @mock.patch('cinder.image.image_utils.download_cache.get_cache')
+    @mock.patch('cinder.image.image_utils.stream_to_volume')
+    @mock.patch('cinder.image.image_utils.fetch')
+    @mock.patch('cinder.image.image_utils.convert_image')
+    @mock.patch('cinder.image.image_utils.qemu_img_info')
+    def test_fetch_to_raw_no_stream(self, mock_info, mock_convert,
+                                    mock_fetch, mock_stream, mock_get_cache):
+        mock_get_cache.return_value = None
+        mock_info.return_value.file_format = 'raw'
+        mock_info.return_value.backing_file = None
+        mock_info.return_value.virtual_size = 16
+        self.image_service.temp_images = None
+        for image_meta in (self._image_meta(disk_format='qcow2'),
+                           self._image_meta(container_format='ova')):
+            self.image_service.show.return_value = image_meta
+            image_utils.fetch_to_raw(self.context, self.image_service,
+                                     mock.sentinel.image_id, self.dest,
+                                     mock.sentinel.blocksize)
+
+        self.assertFalse(mock_stream.called)
+        self.assertEqual(2, mock_fetch.call_count)
+
+    @mock.patch('cinder.image.image_utils.download_cache.get_cache',
+                return_value=None)
+    def test_can_stream_image(self, mock_get_cache):
+        self.image_service.temp_images = None
+
+        self.assertTrue(image_utils.can_stream_image(
+            self.context, self.image_service, mock.sentinel.image_id,
+            self._image_meta()))
+
+    @mock.patch('cinder.image.image_utils.download_cache.get_cache',
+                return_value=None)
+    def test_can_stream_image_throttled(self, mock_get_cache):
+        self.image_service.temp_images = None
+        throttling.Throttle.set_default(
+            throttling.Throttle(prefix=['cgcmd']))
+        self.addCleanup(throttling.Throttle.set_default, None)
+
+        self.assertFalse(image_utils.can_stream_image(
+            self.context, self.image_service, mock.sentinel.image_id,
+            self._image_meta()))
+
+
 class TestXenserverUtils(test.TestCase):
     @mock.patch('cinder.image.image_utils.is_xenserver_format')
     def test_is_xenserver_image(self, mock_format):
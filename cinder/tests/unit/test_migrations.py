@@ -924,6 +924,53 @@ class MigrationsMixin(test_migrations.WalkVersionsMixin):
                                              "image_volume_cache_entries")
         self.assertFalse(has_table)
 
+    def _check_061(self, engine, data):
+        """Test adding the pagination indexes."""
+        for table_name in ('volumes', 'snapshots', 'backups'):
+            table = db_utils.get_table(engine, table_name)
+            indexes = {idx.name: idx.columns.keys()
+                       for idx in table.indexes}
+            self.assertEqual(
+                ['deleted', 'created_at', 'id'],
+                indexes.get('%s_deleted_created_at_id_idx' % table_name))
+            self.assertEqual(
+                ['project_id', 'deleted', 'created_at', 'id'],
+                indexes.get('%s_project_id_deleted_created_at_id_idx' %
+                            table_name))
+
+    def _post_downgrade_061(self, engine):
+        """Test removing the pagination indexes."""
+        for table_name in ('volumes', 'snapshots', 'backups'):
+            table = db_utils.get_table(engine, table_name)
+            index_names = [idx.name for idx in table.indexes]
+            self.assertNotIn('%s_deleted_created_at_id_idx' % table_name,
+                             index_names)
+            self.assertNotIn(
+                '%s_project_id_deleted_created_at_id_idx' % table_name,
+                index_names)
+
+    def _check_062(self, engine, data):
+        """Test adding the image volume cache indexes."""
+        table = db_utils.get_table(engine, 'image_volume_cache_entries')
+        indexes = {idx.name: idx.columns.keys()
+                   for idx in table.indexes}
+        self.assertEqual(
+            ['host', 'image_id', 'last_used'],
+            indexes.get('image_volume_cache_entries_host_image_id_'
+                        'last_used_idx'))
+        self.assertEqual(
+            ['host', 'last_used'],
+            indexes.get('image_volume_cache_entries_host_last_used_idx'))
+
+    def _post_downgrade_062(self, engine):
+        """Test removing the image volume cache indexes."""
+        table = db_utils.get_table(engine, 'image_volume_cache_entries')
+        index_names = [idx.name for idx in table.indexes]
+        self.assertNotIn('image_volume_cache_entries_host_image_id_'
+                         'last_used_idx', index_names)
+        self.assertNotIn('image_volume_cache_entries_host_last_used_idx',
+                         index_names)
+
     def test_walk_versions(self):
         self.walk_versions(True, False)
 
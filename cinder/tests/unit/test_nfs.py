@@ -17,7 +17,9 @@
 import ddt
 import errno
 import os
+import time
 
+import eventlet
 import mock
 from mox3 import mox as mox_lib
 from mox3.mox import stubout
@@ -56,6 +58,8 @@ class RemoteFsDriverTestCase(test.TestCase):
         self.configuration.nas_secure_file_operations = 'false'
         self.configuration.max_over_subscription_ratio = 1.0
         self.configuration.reserved_percentage = 5
+        self.configuration.nas_share_probe_timeout = 30
+        self.configuration.nas_share_capacity_cache_ttl = 0
         self._driver = remotefs.RemoteFSDriver(
             configuration=self.configuration)
 
@@ -379,6 +383,9 @@ class NfsDriverTestCase(test.TestCase):
         self.configuration.nas_share_path = None
         self.configuration.nas_mount_options = None
         self.configuration.volume_dd_blocksize = '1M'
+        self.configuration.nas_share_probe_timeout = 30
+        self.configuration.nas_share_capacity_cache_ttl = 0
+        self.configuration.nas_provisioned_capacity_walk_interval = 3600
         self._driver = nfs.NfsDriver(configuration=self.configuration)
         self._driver.shares = {}
         self.addCleanup(self.stubs.UnsetAll)
@@ -472,8 +479,17 @@ class NfsDriverTestCase(test.TestCase):
         stat_avail = 2129984
         stat_output = '1 %d %d' % (stat_total_size, stat_avail)
 
-        du_used = 490560
-        du_output = '%d /mnt' % du_used
+        used = 490560
+        mnt = self.TEST_MNT_POINT
+        drv._provisioned_files = {
+            mnt: {os.path.join(mnt, 'volume-1'): used - 1024,
+                  os.path.join(mnt, 'subdir', 'volume-2'): 1024,
+                  # Left out as snapshots
+                  os.path.join(mnt, 'volume-1.snapshot-1'): 4096,
+                  os.path.join(mnt, '.snapshot', 'volume-1'): 4096},
+            # On another share
+            mnt + '-other': {mnt + '-other/volume-3': 4096}}
+        drv._provisioned_files_walked_at = {mnt: time.time()}
 
         mox.StubOutWithMock(drv, '_get_mount_point_for_share')
         drv._get_mount_point_for_share(self.TEST_NFS_EXPORT1).\
@@ -484,14 +500,9 @@ class NfsDriverTestCase(test.TestCase):
                      self.TEST_MNT_POINT,
                      run_as_root=True).AndReturn((stat_output, None))
 
-        drv._execute('du', '-sb', '--apparent-size',
-                     '--exclude', '*snapshot*',
-                     self.TEST_MNT_POINT,
-                     run_as_root=True).AndReturn((du_output, None))
-
         mox.ReplayAll()
 
-        self.assertEqual((stat_total_size, stat_avail, du_used),
+        self.assertEqual((stat_total_size, stat_avail, used),
                          drv._get_capacity_info(self.TEST_NFS_EXPORT1))
 
         mox.VerifyAll()
@@ -505,8 +516,17 @@ class NfsDriverTestCase(test.TestCase):
         stat_avail = 2129984
         stat_output = '1 %d %d' % (stat_total_size, stat_avail)
 
-        du_used = 490560
-        du_output = '%d /mnt' % du_used
+        used = 490560
+        mnt = self.TEST_MNT_POINT_SPACES
+        drv._provisioned_files = {
+            mnt: {os.path.join(mnt, 'volume-1'): used - 1024,
+                  os.path.join(mnt, 'subdir', 'volume-2'): 1024,
+                  # Left out as snapshots
+                  os.path.join(mnt, 'volume-1.snapshot-1'): 4096,
+                  os.path.join(mnt, '.snapshot', 'volume-1'): 4096},
+            # On another share
+            mnt + '-other': {mnt + '-other/volume-3': 4096}}
+        drv._provisioned_files_walked_at = {mnt: time.time()}
 
         mox.StubOutWithMock(drv, '_get_mount_point_for_share')
         drv._get_mount_point_for_share(self.TEST_NFS_EXPORT_SPACES).\
@@ -517,18 +537,42 @@ class NfsDriverTestCase(test.TestCase):
                      self.TEST_MNT_POINT_SPACES,
                      run_as_root=True).AndReturn((stat_output, None))
 
-        drv._execute('du', '-sb', '--apparent-size',
-                     '--exclude', '*snapshot*',
-                     self.TEST_MNT_POINT_SPACES,
-                     run_as_root=True).AndReturn((du_output, None))
-
         mox.ReplayAll()
 
-        self.assertEqual((stat_total_size, stat_avail, du_used),
+        self.assertEqual((stat_total_size, stat_avail, used),
                          drv._get_capacity_info(self.TEST_NFS_EXPORT_SPACES))
 
         mox.VerifyAll()
 
+    def test_get_shares_capacity_info_hung_walk(self):
+        drv = self._driver
+        drv.configuration.nas_share_probe_timeout = 0.01
+        mount_points = {self.TEST_NFS_EXPORT1: '/mnt/a',
+                        self.TEST_NFS_EXPORT2: '/mnt/b'}
+        hung = eventlet.event.Event()
+        self.addCleanup(hung.send, ({}, []))
+
+        def fake_get_file_sizes(paths):
+            if paths == ['/mnt/b']:
+                # Hung server
+                return hung.wait()
+            return {'/mnt/a/volume-1': units.Gi}, []
+
+        self.mock_object(drv, '_get_mount_point_for_share',
+                         mock.Mock(side_effect=mount_points.get))
+        self.mock_object(drv, '_get_fs_capacity',
+                         mock.Mock(return_value=(10 * units.Gi, units.Gi)))
+        self.mock_object(remotefs.tpool, 'execute',
+                         mock.Mock(side_effect=lambda func, paths:
+                                   fake_get_file_sizes(paths)))
+
+        # The walk of a hung share only holds up the probe of that share
+        for _i in range(2):
+            self.assertEqual(
+                {self.TEST_NFS_EXPORT1: (10 * units.Gi, units.Gi, units.Gi)},
+                drv._get_shares_capacity_info([self.TEST_NFS_EXPORT1,
+                                               self.TEST_NFS_EXPORT2]))
+
     def test_load_shares_config(self):
         mox = self.mox
         drv = self._driver
@@ -641,20 +685,15 @@ class NfsDriverTestCase(test.TestCase):
         drv = self._driver
 
         drv._mounted_shares = [self.TEST_NFS_EXPORT1, self.TEST_NFS_EXPORT2]
+        self.configuration.nas_share_capacity_cache_ttl = 60
 
         mox.StubOutWithMock(drv, '_get_capacity_info')
-        drv._get_capacity_info(self.TEST_NFS_EXPORT1).\
-            AndReturn((5 * units.Gi, 2 * units.Gi,
-                       2 * units.Gi))
         drv._get_capacity_info(self.TEST_NFS_EXPORT1).\
             AndReturn((5 * units.Gi, 2 * units.Gi,
                        2 * units.Gi))
         drv._get_capacity_info(self.TEST_NFS_EXPORT2).\
             AndReturn((10 * units.Gi, 3 * units.Gi,
                        1 * units.Gi))
-        drv._get_capacity_info(self.TEST_NFS_EXPORT2).\
-            AndReturn((10 * units.Gi, 3 * units.Gi,
-                       1 * units.Gi))
 
         mox.ReplayAll()
 
@@ -663,6 +702,20 @@ class NfsDriverTestCase(test.TestCase):
 
         mox.VerifyAll()
 
+    def test_find_share_skips_share_failing_probe(self):
+        drv = self._driver
+        drv._mounted_shares = [self.TEST_NFS_EXPORT1, self.TEST_NFS_EXPORT2]
+
+        def fake_get_capacity_info(nfs_share):
+            if nfs_share == self.TEST_NFS_EXPORT2:
+                raise OSError()
+            return 10 * units.Gi, 3 * units.Gi, 1 * units.Gi
+
+        self.stubs.Set(drv, '_get_capacity_info', fake_get_capacity_info)
+
+        self.assertEqual(self.TEST_NFS_EXPORT1,
+                         drv._find_share(self.TEST_SIZE_IN_GB))
+
     def test_find_share_should_throw_error_if_there_is_not_enough_space(self):
         """_find_share should throw error if there is no share to host vol."""
         mox = self.mox
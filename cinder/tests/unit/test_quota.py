@@ -370,6 +370,12 @@ class FakeDriver(object):
                             expire, project_id))
         return self.reservations
 
+    def reserve_batch(self, context, resources, deltas_list, expire=None,
+                      project_id=None):
+        self.called.append(('reserve_batch', context, resources,
+                            deltas_list, expire, project_id))
+        return [self.reservations for deltas in deltas_list]
+
     def commit(self, context, reservations, project_id=None):
         self.called.append(('commit', context, reservations, project_id))
 
@@ -783,6 +789,21 @@ class QuotaEngineTestCase(test.TestCase):
                           'resv-03',
                           'resv-04', ], result3)
 
+    def test_reserve_batch(self):
+        context = FakeContext(None, None)
+        driver = FakeDriver(reservations=['resv-01', 'resv-02'])
+        quota_obj = self._make_quota_obj(driver)
+        deltas_list = [dict(test_resource1=1, test_resource2=2),
+                       dict(test_resource1=3, test_resource2=4)]
+        result = quota_obj.reserve_batch(context, deltas_list,
+                                         project_id='fake_project')
+
+        self.assertEqual([('reserve_batch', context, quota_obj.resources,
+                           deltas_list, None, 'fake_project')],
+                         driver.called)
+        self.assertEqual([['resv-01', 'resv-02'], ['resv-01', 'resv-02']],
+                         result)
+
     def test_commit(self):
         context = FakeContext(None, None)
         driver = FakeDriver()
@@ -1402,6 +1423,30 @@ class DbQuotaDriverTestCase(test.TestCase):
                           ('quota_reserve', expire, 0, 86400), ], self.calls)
         self.assertEqual(['resv-1', 'resv-2', 'resv-3'], result)
 
+    def test_reserve_batch(self):
+        self._stub_get_project_quotas()
+
+        def fake_quota_reserve_batch(context, resources, quotas, deltas_list,
+                                     expire, until_refresh, max_age,
+                                     project_id=None):
+            self.calls.append(('quota_reserve_batch', quotas, deltas_list,
+                               expire, project_id))
+            return [['resv-1'], ['resv-2']]
+        self.stubs.Set(db, 'quota_reserve_batch', fake_quota_reserve_batch)
+
+        deltas_list = [dict(volumes=1), dict(volumes=1, gigabytes=2)]
+        result = self.driver.reserve_batch(
+            FakeContext('test_project', 'test_class'),
+            quota.QUOTAS.resources, deltas_list, expire=60)
+
+        expire = timeutils.utcnow() + datetime.timedelta(seconds=60)
+        self.assertEqual(['get_project_quotas',
+                          ('quota_reserve_batch',
+                           dict(volumes=10, gigabytes=1000),
+                           deltas_list, expire, 'test_project')],
+                         self.calls)
+        self.assertEqual([['resv-1'], ['resv-2']], result)
+
     def _stub_quota_destroy_by_project(self):
         def fake_quota_destroy_by_project(context, project_id):
             self.calls.append(('quota_destroy_by_project', project_id))
@@ -1446,7 +1491,7 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
 
         def make_sync(res_name):
             def fake_sync(context, project_id, volume_type_id=None,
-                          volume_type_name=None, session=None):
+                          volume_type_name=None, session=None, totals=None):
                 self.sync_called.add(res_name)
                 if res_name in self.usages:
                     if self.usages[res_name].in_use < 0:
@@ -1468,13 +1513,22 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
 
         self.usages = {}
         self.usages_created = {}
+        self.usages_locked = set()
         self.reservations_created = {}
+        self.totals_tables = []
 
         def fake_get_session():
             return FakeSession()
 
-        def fake_get_quota_usages(context, session, project_id):
-            return self.usages.copy()
+        def fake_get_quota_usages(context, session, project_id,
+                                  resources=None):
+            self.usages_locked.update(resources)
+            return {k: v for k, v in self.usages.items() if k in resources}
+
+        def fake_project_usage_totals(context, project_id, tables,
+                                      session=None):
+            self.totals_tables.append(tables)
+            return {}
 
         def fake_quota_usage_create(context, project_id, resource, in_use,
                                     reserved, until_refresh, session=None,
@@ -1499,6 +1553,8 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
 
         self.stubs.Set(sqa_api, 'get_session', fake_get_session)
         self.stubs.Set(sqa_api, '_get_quota_usages', fake_get_quota_usages)
+        self.stubs.Set(sqa_api, '_project_usage_totals',
+                       fake_project_usage_totals)
         self.stubs.Set(sqa_api, '_quota_usage_create', fake_quota_usage_create)
         self.stubs.Set(sqa_api, '_reservation_create', fake_reservation_create)
 
@@ -1823,6 +1879,70 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
                                        project_id='test_project',
                                        delta=-2 * 1024), ])
 
+    def test_quota_reserve_locks_only_deltas(self):
+        self.init_usage('test_project', 'volumes', 1, 0)
+        self.init_usage('test_project', 'gigabytes', 1, 0)
+        context = FakeContext('test_project', 'test_class')
+        quotas = dict(volumes=5)
+        deltas = dict(volumes=1)
+        sqa_api.quota_reserve(context, self.resources, quotas,
+                              deltas, self.expire, 0, 0)
+
+        self.assertEqual(set(['volumes']), self.usages_locked)
+        self.assertEqual(1, self.usages['volumes'].reserved)
+        self.assertEqual(0, self.usages['gigabytes'].reserved)
+
+    def test_quota_reserve_refresh_single_query(self):
+        self.init_usage('test_project', 'volumes', -1, 0)
+        self.init_usage('test_project', 'gigabytes', -1, 0)
+        context = FakeContext('test_project', 'test_class')
+        quotas = dict(volumes=5, gigabytes=10 * 1024, )
+        deltas = dict(volumes=2, gigabytes=2 * 1024, )
+        sqa_api.quota_reserve(context, self.resources, quotas,
+                              deltas, self.expire, 0, 0)
+
+        self.assertEqual(set(['volumes', 'gigabytes']), self.sync_called)
+        self.assertEqual([set(['volumes', 'snapshots'])], self.totals_tables)
+
+    def test_quota_reserve_batch(self):
+        self.init_usage('test_project', 'volumes', 1, 0)
+        self.init_usage('test_project', 'gigabytes', 10, 0)
+        context = FakeContext('test_project', 'test_class')
+        quotas = dict(volumes=5, gigabytes=100, )
+        deltas_list = [dict(volumes=1, gigabytes=10) for i in range(4)]
+        result = sqa_api.quota_reserve_batch(context, self.resources, quotas,
+                                             deltas_list, self.expire, 0, 0)
+
+        self.assertEqual(4, len(result))
+        for item in result:
+            self.assertEqual(2, len(item))
+        self.assertEqual(8, len(set(sum(result, []))))
+        self.compare_usage(self.usages, [dict(resource='volumes',
+                                              in_use=1,
+                                              reserved=4),
+                                         dict(resource='gigabytes',
+                                              in_use=10,
+                                              reserved=40), ])
+
+    def test_quota_reserve_batch_overs(self):
+        self.init_usage('test_project', 'volumes', 1, 0)
+        self.init_usage('test_project', 'gigabytes', 10, 0)
+        context = FakeContext('test_project', 'test_class')
+        quotas = dict(volumes=5, gigabytes=100, )
+        deltas_list = [dict(volumes=1, gigabytes=10) for i in range(5)]
+        self.assertRaises(exception.OverQuota,
+                          sqa_api.quota_reserve_batch,
+                          context, self.resources, quotas,
+                          deltas_list, self.expire, 0, 0)
+
+        self.compare_usage(self.usages, [dict(resource='volumes',
+                                              in_use=1,
+                                              reserved=0),
+                                         dict(resource='gigabytes',
+                                              in_use=10,
+                                              reserved=0), ])
+        self.assertEqual({}, self.reservations_created)
+
 
 class QuotaVolumeTypeReservationTestCase(test.TestCase):
 
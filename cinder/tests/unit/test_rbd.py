@@ -16,6 +16,7 @@
 #    under the License.
 
 
+import hashlib
 import math
 import os
 import tempfile
@@ -138,6 +139,9 @@ class RBDTestCase(test.TestCase):
         self.cfg.rbd_user = None
         self.cfg.volume_dd_blocksize = '1M'
         self.cfg.rbd_store_chunk_size = 4
+        self.cfg.rados_connection_pool_size = 4
+        self.cfg.rados_connection_max_idle_time = 300
+        self.cfg.rbd_aio_window = 8
 
         mock_exec = mock.Mock()
         mock_exec.return_value = ('', '')
@@ -686,6 +690,89 @@ class RBDTestCase(test.TestCase):
                                     mock_image_service, None]
                             self.driver.copy_image_to_volume(*args)
 
+    def _stream_image(self, data, file_format='raw', **image_meta):
+        image_meta = dict({'disk_format': 'raw', 'container_format': 'bare',
+                           'size': len(data),
+                           'checksum': hashlib.md5(data).hexdigest()},
+                          **image_meta)
+        image_service = mock.Mock(temp_images=None)
+        image_service.show.return_value = image_meta
+
+        def download(context, image_id, writer):
+            for offset in range(0, len(data), 1024):
+                writer.write(data[offset:offset + 1024])
+
+        image_service.download.side_effect = download
+        image = self.mock_proxy.return_value.__enter__.return_value.volume
+        image.aio_write.return_value.get_return_value.return_value = 0
+        with mock.patch.object(image_utils, 'fetch_to_raw') as mock_fetch, \
+                mock.patch.object(image_utils, 'qemu_img_info') as mock_info:
+            mock_info.return_value.file_format = file_format
+            mock_info.return_value.backing_file = None
+            self.driver.copy_image_to_volume(mock.Mock(), self.volume,
+                                             image_service, 'image_id')
+        self.assertFalse(mock_fetch.called)
+        mock_info.assert_called_once_with(mock.ANY, run_as_root=False)
+        return image
+
+    @common_mocks
+    def test_copy_image_to_volume_streamed(self):
+        image = self._stream_image(b'\0' * 4096 + b'x' * 4096)
+        self.mock_proxy.assert_called_once_with(self.driver, self.volume_name,
+                                                self.cfg.rbd_pool)
+        image.aio_write.assert_called_once_with(b'x' * 4096, 4096,
+                                                mock.ANY)
+
+    @common_mocks
+    def test_copy_image_to_volume_streamed_bad_checksum(self):
+        self.assertRaises(exception.ImageUnacceptable, self._stream_image,
+                          b'x' * 4096, checksum='bad')
+
+    @common_mocks
+    def test_copy_image_to_volume_streamed_not_raw(self):
+        self.assertRaises(exception.ImageUnacceptable, self._stream_image,
+                          b'x' * 4096, file_format='qcow2')
+
+    @common_mocks
+    def test_copy_image_to_volume_streamed_too_big(self):
+        self.assertRaises(exception.ImageUnacceptable, self._stream_image,
+                          b'x' * 4096, size=2 * units.Gi)
+        self.assertFalse(self.mock_proxy.called)
+
+    @common_mocks
+    def test_copy_volume_to_image_raw(self):
+        image_service = mock.Mock()
+        image_meta = {'id': 'image_id', 'disk_format': 'raw'}
+        with mock.patch.object(self.driver, '_try_execute') as mock_exec:
+            self.driver.copy_volume_to_image(None, self.volume,
+                                             image_service, image_meta)
+        self.assertFalse(mock_exec.called)
+        self.mock_proxy.assert_called_once_with(self.driver, self.volume_name,
+                                                self.cfg.rbd_pool,
+                                                read_only=True)
+        image_service.update.assert_called_once_with(None, 'image_id', {},
+                                                     mock.ANY)
+        rbd_fd = image_service.update.call_args[0][3]
+        self.assertIsInstance(rbd_fd, driver.RBDImageAioIOWrapper)
+        self.assertEqual(self.mock_proxy.return_value.__enter__.return_value,
+                         rbd_fd.rbd_image)
+
+    @common_mocks
+    def test_backup_volume(self):
+        backup_service = mock.Mock()
+        backup = {'volume_id': 'volume_id'}
+        with mock.patch.object(self.driver, 'db') as mock_db, \
+                mock.patch.object(driver.RBDImageAioIOWrapper,
+                                  'close') as mock_close:
+            mock_db.volume_get.return_value = self.volume
+            self.driver.backup_volume(None, backup, backup_service)
+        backup_service.backup.assert_called_once_with(backup, mock.ANY)
+        rbd_fd = backup_service.backup.call_args[0][1]
+        self.assertIsInstance(rbd_fd, driver.RBDImageAioIOWrapper)
+        self.assertEqual(4 * units.Mi, rbd_fd.block_size)
+        self.assertEqual(8, rbd_fd.window)
+        mock_close.assert_called_once_with()
+
     @common_mocks
     def test_copy_image_no_volume_tmp(self):
         self.cfg.volume_tmp_dir = None
@@ -952,6 +1039,304 @@ class RBDTestCase(test.TestCase):
         self.assertEqual(
             3, self.mock_rados.Rados.return_value.shutdown.call_count)
 
+    def test_rados_client_reuses_connection(self):
+        self.cfg.rados_connect_timeout = -1
+        self.driver.rados = mock.Mock()
+        self.driver.rados.Error = MockException
+        self.driver.rados.Rados.return_value.state = 'connected'
+
+        with driver.RADOSClient(self.driver) as client:
+            pass
+        with driver.RADOSClient(self.driver) as client2:
+            self.assertIs(client.ioctx, client2.ioctx)
+        self.assertEqual(1, self.driver.rados.Rados.call_count)
+
+        # An error closes the connection
+        def fail():
+            with driver.RADOSClient(self.driver):
+                raise MockException()
+
+        self.assertRaises(MockException, fail)
+        self.assertEqual(1, self.driver.rados.Rados.return_value.
+                         shutdown.call_count)
+        with driver.RADOSClient(self.driver):
+            pass
+        self.assertEqual(2, self.driver.rados.Rados.call_count)
+
+
+class FakeAioImage(object):
+    """librbd Image with aio requests completing straight away."""
+
+    def __init__(self, data):
+        self.data = bytearray(data)
+        self.reads = []
+        self.writes = []
+        self.ret = None
+
+    def size(self):
+        return len(self.data)
+
+    def _completion(self, ret):
+        completion = mock.Mock()
+        completion.get_return_value.return_value = (
+            ret if self.ret is None else self.ret)
+        return completion
+
+    def aio_read(self, offset, length, oncomplete):
+        self.reads.append((offset, length))
+        completion = self._completion(length)
+        oncomplete(completion, bytes(self.data[offset:offset + length]))
+        return completion
+
+    def aio_write(self, data, offset, oncomplete):
+        self.writes.append((offset, len(data)))
+        self.data[offset:offset + len(data)] = data
+        return self._completion(0)
+
+    def flush(self):
+        pass
+
+
+class RBDImageAioIOWrapperTestCase(test.TestCase):
+    def setUp(self):
+        super(RBDImageAioIOWrapperTestCase, self).setUp()
+        self.data = bytes(bytearray(range(40)))
+        self.image = FakeAioImage(self.data)
+        self.meta = driver.RBDImageMetadata(self.image, 'pool', None, None)
+        self.wrapper = driver.RBDImageAioIOWrapper(self.meta, 4, 3)
+
+    def test_read_ahead(self):
+        self.assertEqual(self.data[:3], self.wrapper.read(3))
+        self.assertEqual([(0, 4), (4, 4), (8, 4), (12, 4)], self.image.reads)
+        self.assertEqual(self.data[3:6], self.wrapper.read(3))
+        self.assertEqual(self.data[6:8], self.wrapper.read(2))
+        self.assertEqual(self.data[8:9], self.wrapper.read(1))
+        self.assertEqual([(0, 4), (4, 4), (8, 4), (12, 4), (16, 4),
+                          (20, 4)], self.image.reads)
+        self.assertEqual(9, self.wrapper.tell())
+
+    def test_read_all(self):
+        self.assertEqual(self.data, self.wrapper.read())
+        self.assertEqual(b'', self.wrapper.read())
+        self.assertEqual(10, len(self.image.reads))
+
+    def test_read_short_last_block(self):
+        image = FakeAioImage(self.data[:10])
+        wrapper = driver.RBDImageAioIOWrapper(
+            driver.RBDImageMetadata(image, 'pool', None, None), 4, 3)
+        self.assertEqual(self.data[:10], wrapper.read(20))
+        self.assertEqual([(0, 4), (4, 4), (8, 2)], image.reads)
+
+    def test_readinto(self):
+        buf = bytearray(5)
+        self.wrapper.seek(37)
+        self.assertEqual(3, self.wrapper.readinto(buf))
+        self.assertEqual(self.data[37:] + b'\0\0', bytes(buf))
+
+    def test_read_after_seek(self):
+        self.wrapper.read(2)
+        self.wrapper.seek(20)
+        self.assertEqual(self.data[20:22], self.wrapper.read(2))
+        self.assertEqual([(0, 4), (4, 4), (8, 4), (12, 4), (20, 4), (24, 4),
+                          (28, 4), (32, 4)], self.image.reads)
+
+    def test_read_failed(self):
+        self.image.ret = -5
+        self.assertRaises(IOError, self.wrapper.read, 2)
+
+    def test_read_without_aio(self):
+        image = mock.Mock(spec=['size', 'read'])
+        image.size.return_value = 10
+        image.read.return_value = b'abc'
+        wrapper = driver.RBDImageAioIOWrapper(
+            driver.RBDImageMetadata(image, 'pool', None, None), 4, 3)
+        self.assertEqual(b'abc', wrapper.read(3))
+        image.read.assert_called_once_with(0, 3)
+
+    def test_size_cached(self):
+        self.image.size = mock.Mock(return_value=40)
+        wrapper = driver.RBDImageAioIOWrapper(self.meta, 4, 3)
+        wrapper.read(2)
+        wrapper.seek(0, 2)
+        self.assertEqual(40, wrapper.tell())
+        self.assertEqual(1, self.image.size.call_count)
+
+    def test_write_behind(self):
+        self.wrapper.write(b'abc')
+        self.wrapper.write(b'def')
+        # Only the first block was written yet
+        self.assertEqual([(0, 6)], self.image.writes)
+        self.wrapper.write(b'g')
+        self.assertEqual(self.data[6:], bytes(self.image.data[6:]))
+        # Reads wait for the writes
+        self.wrapper.seek(0)
+        self.assertEqual(b'abcdefg', self.wrapper.read(7))
+        self.assertEqual([(0, 6), (6, 1)], self.image.writes)
+
+    def test_write_after_seek(self):
+        self.wrapper.write(b'ab')
+        self.wrapper.seek(10)
+        self.wrapper.write(b'cd')
+        self.wrapper.flush()
+        self.assertEqual([(0, 2), (10, 2)], self.image.writes)
+        self.assertEqual(b'ab' + self.data[2:10] + b'cd' + self.data[12:],
+                         bytes(self.image.data))
+
+    def test_write_zeros(self):
+        self.wrapper.write(b'\0\0')
+        self.wrapper.flush()
+        self.assertEqual(b'\0\0', bytes(self.image.data[:2]))
+
+    def test_close(self):
+        self.wrapper.write(b'ab')
+        self.wrapper.close()
+        self.assertEqual([(0, 2)], self.image.writes)
+
+
+class RBDImageAioWriterTestCase(test.TestCase):
+    def setUp(self):
+        super(RBDImageAioWriterTestCase, self).setUp()
+        self.image = mock.Mock()
+        self.completions = []
+        self.image.aio_write.side_effect = self._aio_write
+        self.writer = driver.RBDImageAioWriter(self.image, 8, 2)
+
+    def _aio_write(self, data, offset, oncomplete):
+        completion = mock.Mock()
+        completion.get_return_value.return_value = 0
+        self.completions.append(completion)
+        return completion
+
+    def test_write_gathers_data(self):
+        for data in (b'abcd', b'efgh', b'ij', b'\0\0', b'kl'):
+            self.writer.write(data)
+        self.writer.close()
+        self.assertEqual([mock.call(b'abcdefgh', 0, mock.ANY),
+                          mock.call(b'ij', 8, mock.ANY),
+                          mock.call(b'kl', 12, mock.ANY)],
+                         self.image.aio_write.call_args_list)
+        self.assertEqual(14, self.writer.offset)
+        self.assertEqual(2, self.writer.skipped)
+        self.assertEqual(hashlib.md5(b'abcdefghij\0\0kl').hexdigest(),
+                         self.writer.md5.hexdigest())
+        for completion in self.completions:
+            completion.wait_for_complete_and_cb.assert_called_once_with()
+
+    def test_write_bounded_window(self):
+        for _i in range(3):
+            self.writer.write(b'abcdefgh')
+        # The first write completed before the third one was issued
+        self.completions[0].wait_for_complete_and_cb.assert_called_once_with()
+        self.assertFalse(self.completions[1].wait_for_complete_and_cb.called)
+        self.assertEqual(3, len(self.completions))
+
+    def test_write_failed(self):
+        self.writer.write(b'abcdefgh')
+        self.completions[0].get_return_value.return_value = -5
+        self.assertRaises(exception.VolumeBackendAPIException,
+                          self.writer.close)
+
+    def test_write_failed_waits_for_all(self):
+        self.writer = driver.RBDImageAioWriter(self.image, 8, 4)
+        for _i in range(4):
+            self.writer.write(b'abcdefgh')
+        self.completions[0].get_return_value.return_value = -5
+        self.completions[2].get_return_value.return_value = -28
+
+        exc = self.assertRaises(exception.VolumeBackendAPIException,
+                                self.writer.close)
+
+        self.assertIn(os.strerror(5), exc.msg)
+        for completion in self.completions:
+            completion.wait_for_complete_and_cb.assert_called_once_with()
+
+    def test_abort(self):
+        self.writer.write(b'abcdefgh')
+        self.writer.write(b'ij')
+        self.completions[0].get_return_value.return_value = -5
+        self.writer.abort()
+        self.assertEqual(1, self.image.aio_write.call_count)
+        self.completions[0].wait_for_complete_and_cb.assert_called_once_with()
+
+    def test_write_without_aio(self):
+        image = mock.Mock(spec=['write'])
+        writer = driver.RBDImageAioWriter(image, 8, 2)
+        writer.write(b'abcdefgh')
+        writer.close()
+        image.write.assert_called_once_with(b'abcdefgh', 0)
+
+
+class RADOSConnectionPoolTestCase(test.TestCase):
+    def setUp(self):
+        super(RADOSConnectionPoolTestCase, self).setUp()
+        self.connect = mock.Mock(side_effect=self._connect)
+        self.pool = driver.RADOSConnectionPool(self.connect, 2, 300)
+
+    def _connect(self, pool):
+        client = mock.Mock(state='connected')
+        return client, client.ioctx
+
+    def test_get_reuses_connection(self):
+        client, ioctx = self.pool.get('rbd')
+        self.pool.put(client, ioctx)
+        self.assertEqual((client, ioctx), self.pool.get('rbd'))
+        self.assertEqual(1, self.connect.call_count)
+        self.assertFalse(client.shutdown.called)
+
+    def test_get_by_pool(self):
+        client, ioctx = self.pool.get('rbd')
+        self.pool.put(client, ioctx)
+        self.assertNotEqual((client, ioctx), self.pool.get('other'))
+        self.connect.assert_called_with('other')
+
+    def test_put_bounded(self):
+        connections = [self.pool.get('rbd') for _i in range(3)]
+        for client, ioctx in connections:
+            self.pool.put(client, ioctx)
+        # The oldest idle connection was closed
+        self.assertEqual(1, connections[0][0].shutdown.call_count)
+        self.assertEqual(1, connections[0][1].close.call_count)
+        self.assertEqual(connections[2], self.pool.get('rbd'))
+        self.assertEqual(connections[1], self.pool.get('rbd'))
+        self.pool.get('rbd')
+        self.assertEqual(4, self.connect.call_count)
+
+    def test_put_failed(self):
+        client, ioctx = self.pool.get('rbd')
+        self.pool.put(client, ioctx, failed=True)
+        self.assertEqual(1, client.shutdown.call_count)
+        self.assertNotEqual((client, ioctx), self.pool.get('rbd'))
+
+    def test_pool_disabled(self):
+        self.pool.max_idle = 0
+        client, ioctx = self.pool.get('rbd')
+        self.pool.put(client, ioctx)
+        self.assertEqual(1, client.shutdown.call_count)
+
+    @mock.patch('time.time')
+    def test_get_closes_stale_connections(self, mock_time):
+        mock_time.return_value = 1000
+        idle_client, idle_ioctx = self.pool.get('rbd')
+        self.pool.put(idle_client, idle_ioctx)
+        disconnected_client, disconnected_ioctx = self.pool.get('rbd')
+        self.assertIs(idle_client, disconnected_client)
+        client, ioctx = self.pool.get('rbd')
+        self.pool.put(client, ioctx)
+        self.pool.put(idle_client, idle_ioctx)
+
+        idle_client.state = 'shutdown'
+        mock_time.return_value = 1300
+        self.assertNotIn(self.pool.get('rbd')[0], (idle_client, client))
+        self.assertEqual(1, idle_client.shutdown.call_count)
+        self.assertEqual(1, client.shutdown.call_count)
+
+    def test_close(self):
+        client, ioctx = self.pool.get('rbd')
+        self.pool.put(client, ioctx)
+        self.pool.close()
+        self.assertEqual(1, client.shutdown.call_count)
+        self.assertNotEqual((client, ioctx), self.pool.get('rbd'))
+
 
 class RBDImageIOWrapperTestCase(test.TestCase):
     def setUp(self):
@@ -1069,6 +1454,34 @@ class RBDImageIOWrapperTestCase(test.TestCase):
     def test_close(self):
         self.mock_rbd_wrapper.close()
 
+    def test_readinto(self):
+        self.meta.image.size.return_value = self.data_length
+        self.meta.image.read.return_value = self.full_data[:10]
+        buf = bytearray(10)
+        self.assertEqual(10, self.mock_rbd_wrapper.readinto(buf))
+        self.assertEqual(self.full_data[:10], bytes(buf))
+        self.meta.image.read.assert_called_once_with(0, 10)
+
+    def test_allocated_extents(self):
+        self.meta.image.size.return_value = 100
+
+        def diff_iterate(offset, length, from_snapshot, iterate_cb):
+            self.assertEqual((0, 100, None), (offset, length, from_snapshot))
+            iterate_cb(0, 10, True)
+            iterate_cb(10, 10, True)
+            iterate_cb(20, 10, False)
+            iterate_cb(40, 10, True)
+
+        self.meta.image.diff_iterate.side_effect = diff_iterate
+        self.assertEqual([(0, 20), (40, 10)],
+                         self.mock_rbd_wrapper.allocated_extents())
+
+    def test_allocated_extents_without_diff_iterate(self):
+        self.meta.image = mock.Mock(spec=['size'])
+        self.meta.image.size.return_value = 100
+        self.assertEqual([(10, 90)],
+                         self.mock_rbd_wrapper.allocated_extents(10))
+
 
 class ManagedRBDTestCase(test_volume.DriverTestCase):
     driver_name = "cinder.volume.drivers.rbd.RBDDriver"
@@ -323,3 +323,52 @@ class RemoteFsSnapDriverTestCase(test.TestCase):
         self._locked_volume_operation_test_helper(
             func=synchronized_func,
             expected_exception=exception.VolumeBackendAPIException)
+
+    def test_create_snapshot_updates_volume_files(self):
+        self._driver._create_snapshot = mock.Mock(
+            return_value=mock.sentinel.ret_val)
+        self._driver._update_volume_files = mock.Mock()
+
+        ret_val = self._driver.create_snapshot(self._FAKE_SNAPSHOT)
+
+        self.assertEqual(mock.sentinel.ret_val, ret_val)
+        self._driver._update_volume_files.assert_called_once_with(
+            self._FAKE_VOLUME)
+
+    def test_delete_snapshot_updates_volume_files(self):
+        self._driver._delete_snapshot = mock.Mock()
+        self._driver._update_volume_files = mock.Mock()
+
+        self._driver.delete_snapshot(self._FAKE_SNAPSHOT)
+
+        self._driver._update_volume_files.assert_called_once_with(
+            self._FAKE_VOLUME)
+
+    def test_create_cloned_volume_updates_volume_files(self):
+        volume = {'id': 'fake_clone_id', 'name': 'volume-fake_clone_id'}
+        self._driver._create_cloned_volume = mock.Mock(
+            return_value={'provider_location': 'fake_share'})
+        self._driver._update_volume_files = mock.Mock()
+
+        self._driver.create_cloned_volume(volume, self._FAKE_VOLUME)
+
+        self.assertEqual('fake_share', volume['provider_location'])
+        self._driver._update_volume_files.assert_called_once_with(volume)
+
+    def test_volume_files(self):
+        fake_info = {'active': os.path.basename(self._FAKE_SNAPSHOT_PATH),
+                     self._FAKE_SNAPSHOT_ID:
+                         os.path.basename(self._FAKE_SNAPSHOT_PATH)}
+        self._driver._read_info_file = mock.Mock(return_value=fake_info)
+        self._driver._local_volume_dir = mock.Mock(
+            return_value=self._FAKE_MNT_POINT)
+        self._driver.local_path = mock.Mock(
+            return_value=self._FAKE_VOLUME_PATH)
+
+        files = self._driver._volume_files(self._FAKE_VOLUME)
+
+        self.assertEqual(set([self._FAKE_VOLUME_PATH,
+                              self._FAKE_VOLUME_PATH + '.info',
+                              self._FAKE_SNAPSHOT_PATH]), files)
+        self._driver._read_info_file.assert_called_once_with(
+            self._FAKE_VOLUME_PATH + '.info', empty_if_missing=True)
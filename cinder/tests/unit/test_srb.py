@@ -446,6 +446,38 @@ class SRBDriverTestCase(test.TestCase):
 
         return check, act
 
+    def _fake_vg_report(self):
+        def check(cmd_string):
+            return 'env, LC_ALL=C, vgs, --noheadings, --unit=g, ' \
+                '-o, vg_name,vg_size,vg_free,lv_count,vg_uuid,' \
+                'lv_name,lv_size,data_percent, --separator, :, ' \
+                '--nosuffix' in cmd_string
+
+        def act(cmd):
+            data = ''
+
+            search_vgname = cmd[10]
+            for vname in self._volumes:
+                vol = self._volumes[vname]
+                for vgname in vol['vgs']:
+                    if search_vgname != vgname:
+                        continue
+                    vg = vol['vgs'][vgname]
+                    vg_fields = "  %s:%.2f:%.2f:%i:%s" %\
+                        (vgname,
+                         vol['size'] / units.Gi, vol['size'] / units.Gi,
+                         len(vg['lvs']) + len(vg['snaps']), vgname)
+                    if not vg['lvs']:
+                        data += vg_fields + ":::\n"
+                    for lvname in vg['lvs']:
+                        lv_size = vg['lvs'][lvname]
+                        data += "%s:%s:%.2f:0.00\n" %\
+                            (vg_fields, lvname, lv_size / units.Gi)
+
+            return data
+
+        return check, act
+
     def _fake_get_all_volume_groups(self):
         def check(cmd_string):
             return 'env, LC_ALL=C, vgs, --noheadings, --unit=g, ' \
@@ -712,6 +744,7 @@ class SRBDriverTestCase(test.TestCase):
             self._fake_thinpool_free_space(),
             self._fake_udevadm_settle(),
             self._fake_vg_list(),
+            self._fake_vg_report(),
             self._fake_vgchange_an(),
             self._fake_vgchange_ay(),
             self._fake_vgcreate(),
@@ -43,6 +43,7 @@ from cinder.brick.local_dev import lvm as brick_lvm
 from cinder import context
 from cinder import db
 from cinder import exception
+from cinder.image import cache as image_cache
 from cinder.image import image_utils
 from cinder import keymgr
 from cinder import objects
@@ -7435,10 +7436,18 @@ class ISCSITestCase(DriverTestCase):
                        'get_all_physical_volumes',
                        _fake_get_all_physical_volumes)
 
+        def _fake_get_vg_report(obj):
+            vg = obj.get_all_volume_groups('sudo', 'cinder-volumes')[0]
+            return {'vg': vg, 'lvs': _fake_get_volumes(obj)}
+
         self.stubs.Set(brick_lvm.LVM,
                        'get_volumes',
                        _fake_get_volumes)
 
+        self.stubs.Set(brick_lvm.LVM,
+                       '_get_vg_report',
+                       _fake_get_vg_report)
+
         self.volume.driver.vg = brick_lvm.LVM('cinder-volumes', 'sudo')
 
         self.volume.driver._update_volume_stats()
@@ -7685,3 +7694,133 @@ class ImageVolumeCacheTestCase(BaseVolumeTestCase):
         entry = db.image_volume_cache_get_by_volume_id(self.context,
                                                        volume['id'])
         self.assertIsNone(entry)
+
+    def _setup_prewarm(self):
+        self.volume.image_volume_cache = image_cache.ImageVolumeCache(
+            db, mock.Mock())
+        self.internal_context = context.RequestContext('internal_user',
+                                                       'internal_project')
+        self.mock_object(context, 'get_internal_tenant_context',
+                         mock.Mock(return_value=self.internal_context))
+        self.image_id = '70a599e0-31e7-49b7-b260-868f441e862b'
+        self.image_meta = {'id': self.image_id,
+                           'min_disk': 0,
+                           'updated_at': timeutils.parse_isotime(
+                               '2015-11-11T11:11:11Z')}
+        image_service = mock.Mock()
+        image_service.show.return_value = self.image_meta
+        self.mock_object(vol_manager.glance, 'get_remote_image_service',
+                         mock.Mock(return_value=(image_service,
+                                                 self.image_id)))
+        self.mock_object(vol_manager.image_utils.TemporaryImages, 'fetch',
+                         mock.MagicMock())
+        self.mock_object(vol_manager.image_utils, 'qemu_img_info',
+                         mock.Mock(return_value=mock.Mock(
+                             virtual_size=units.Gi + 1)))
+        return image_service
+
+    def test_prewarm_image_volume_cache(self):
+        image_service = self._setup_prewarm()
+        host = volutils.append_host(self.volume.host, 'pool')
+        volume_type = volume_types.create(self.context, 'prewarm_type')
+        self.flags(default_volume_type='prewarm_type')
+
+        with mock.patch.object(self.volume.driver,
+                               'copy_image_to_volume') as mock_copy:
+            self.volume.prewarm_image_volume_cache(self.context,
+                                                   self.image_id, host)
+
+        entry = db.image_volume_cache_get_and_update_last_used(
+            self.internal_context, self.image_id, host)
+        self.assertEqual(2, entry['size'])
+        # The volume isn't cached once more by the create volume flow
+        self.assertEqual(
+            1, len(db.image_volume_cache_get_all_for_host(self.context,
+                                                          host)))
+        image_volume = db.volume_get(self.internal_context,
+                                     entry['volume_id'])
+        self.assertEqual('available', image_volume['status'])
+        self.assertEqual(host, image_volume['host'])
+        self.assertEqual('internal_project', image_volume['project_id'])
+        self.assertEqual(2, image_volume['size'])
+        self.assertEqual(volume_type['id'], image_volume['volume_type_id'])
+        self.assertTrue(image_volume['bootable'])
+        # The image is downloaded with the credentials of the caller
+        mock_copy.assert_called_once_with(mock.ANY, mock.ANY,
+                                          image_service, self.image_id)
+        self.assertEqual(self.context.project_id,
+                         mock_copy.call_args[0][0].project_id)
+
+    def test_prewarm_image_volume_cache_raw(self):
+        self._setup_prewarm()
+        self.image_meta.update({'disk_format': 'raw',
+                                'container_format': 'bare',
+                                'size': 3 * units.Gi})
+        host = volutils.append_host(self.volume.host, 'pool')
+
+        with mock.patch.object(self.volume.driver, 'copy_image_to_volume'):
+            self.volume.prewarm_image_volume_cache(self.context,
+                                                   self.image_id, host)
+
+        # The image is only fetched by the create volume flow
+        self.assertEqual(
+            1, vol_manager.image_utils.TemporaryImages.fetch.call_count)
+        self.assertFalse(vol_manager.image_utils.qemu_img_info.called)
+        entry = db.image_volume_cache_get_and_update_last_used(
+            self.internal_context, self.image_id, host)
+        self.assertEqual(3, entry['size'])
+
+    def test_prewarm_image_volume_cache_already_cached(self):
+        self._setup_prewarm()
+        host = volutils.append_host(self.volume.host, 'pool')
+        db.image_volume_cache_create(
+            self.internal_context, host, self.image_id,
+            self.image_meta['updated_at'].replace(tzinfo=None),
+            'fake_volume_id', 1)
+
+        with mock.patch.object(self.volume.driver,
+                               'create_volume') as mock_create:
+            self.volume.prewarm_image_volume_cache(self.context,
+                                                   self.image_id, host)
+        self.assertFalse(mock_create.called)
+
+    def test_prewarm_image_volume_cache_failure(self):
+        self._setup_prewarm()
+        host = volutils.append_host(self.volume.host, 'pool')
+
+        with mock.patch.object(self.volume.driver, 'copy_image_to_volume',
+                               side_effect=exception.ImageCopyFailure(
+                                   reason='fake')), \
+                mock.patch.object(self.volume,
+                                  'delete_volume') as mock_delete:
+            self.assertRaises(exception.ImageCopyFailure,
+                              self.volume.prewarm_image_volume_cache,
+                              self.context, self.image_id, host)
+
+        mock_delete.assert_called_once_with(self.internal_context,
+                                            mock.ANY)
+        self.assertIsNone(db.image_volume_cache_get_and_update_last_used(
+            self.internal_context, self.image_id, host))
+
+    def test_prewarm_image_volume_cache_failure_delete_failure(self):
+        self._setup_prewarm()
+        host = volutils.append_host(self.volume.host, 'pool')
+
+        with mock.patch.object(self.volume.driver, 'copy_image_to_volume',
+                               side_effect=exception.ImageCopyFailure(
+                                   reason='fake')), \
+                mock.patch.object(self.volume, 'delete_volume',
+                                  side_effect=exception.VolumeIsBusy(
+                                      volume_name='fake')):
+            # The original error is raised
+            self.assertRaises(exception.ImageCopyFailure,
+                              self.volume.prewarm_image_volume_cache,
+                              self.context, self.image_id, host)
+
+    def test_prewarm_image_volume_cache_disabled(self):
+        self.volume.image_volume_cache = None
+        with mock.patch.object(vol_manager.glance,
+                               'get_remote_image_service') as mock_get:
+            self.volume.prewarm_image_volume_cache(self.context, 'fake_id',
+                                                   'some_host')
+        self.assertFalse(mock_get.called)
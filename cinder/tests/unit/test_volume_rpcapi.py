@@ -17,6 +17,7 @@ Unit Tests for cinder.volume.rpcapi
 """
 import copy
 
+import mock
 from oslo_config import cfg
 from oslo_serialization import jsonutils
 
@@ -438,3 +439,15 @@ class VolumeRpcAPITestCase(test.TestCase):
                               rpc_method='cast',
                               volume=self.fake_volume,
                               version='1.30')
+
+    def test_prewarm_image_volume_cache(self):
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        rpcapi = volume_rpcapi.VolumeAPI()
+        with mock.patch.object(rpcapi.client, 'prepare') as mock_prepare:
+            rpcapi.prewarm_image_volume_cache(ctxt, 'fake_image_id',
+                                              'fake_host@backend#pool')
+        mock_prepare.assert_called_once_with(server='fake_host@backend',
+                                             version='1.32')
+        mock_prepare.return_value.cast.assert_called_once_with(
+            ctxt, 'prewarm_image_volume_cache', image_id='fake_image_id',
+            host='fake_host@backend#pool')
@@ -17,6 +17,7 @@
 
 
 import datetime
+import errno
 import io
 import mock
 import six
@@ -648,7 +649,8 @@ class CopyVolumeTestCase(test.TestCase):
         handle2 = io.RawIOBase()
         output = volume_utils.copy_volume(handle1, handle2, 1024, 1)
         self.assertIsNone(output)
-        mock_copy.assert_called_once_with(handle1, handle2, 1024)
+        mock_copy.assert_called_once_with(handle1, handle2, 1024,
+                                          sparse=False)
 
     @mock.patch('cinder.volume.utils._transfer_data')
     @mock.patch('cinder.volume.utils._open_volume_with_path')
@@ -657,7 +659,121 @@ class CopyVolumeTestCase(test.TestCase):
         output = volume_utils.copy_volume('/foo/bar', handle, 1024, 1)
         self.assertIsNone(output)
         mock_transfer.assert_called_once_with(mock.ANY, mock.ANY,
-                                              1073741824, mock.ANY)
+                                              1073741824, mock.ANY,
+                                              sparse=False)
+
+    def test_transfer_data(self):
+        data = b''.join(six.int2byte(i % 256) for i in range(10000))
+        src = io.BytesIO(data)
+        dest = io.BytesIO()
+
+        transferred = volume_utils._transfer_data(src, dest, len(data), 1024)
+
+        self.assertEqual(len(data), transferred)
+        self.assertEqual(data, dest.getvalue())
+
+    def test_transfer_data_stops_at_length(self):
+        src = io.BytesIO(b'x' * 4096)
+        dest = io.BytesIO()
+
+        transferred = volume_utils._transfer_data(src, dest, 3000, 1024)
+
+        self.assertEqual(3000, transferred)
+        self.assertEqual(b'x' * 3000, dest.getvalue())
+
+    def test_transfer_data_read_only_source(self):
+        class ReadOnly(io.RawIOBase):
+            def __init__(self, data):
+                self._data = io.BytesIO(data)
+
+            def read(self, size=-1):
+                return self._data.read(size)
+
+        dest = io.BytesIO()
+
+        volume_utils._transfer_data(ReadOnly(b'abc' * 1000), dest, 3000, 512)
+
+        self.assertEqual(b'abc' * 1000, dest.getvalue())
+
+    def test_transfer_data_non_io_dest(self):
+        class BytesOnly(object):
+            def __init__(self):
+                self.chunks = []
+
+            def write(self, data):
+                if not isinstance(data, bytes):
+                    raise TypeError('expected bytes')
+                # Keep a reference, as a write-behind writer would.
+                self.chunks.append(data)
+
+            def flush(self):
+                pass
+
+        data = b''.join(six.int2byte(i % 256) for i in range(10000))
+        dest = BytesOnly()
+
+        volume_utils._transfer_data(io.BytesIO(data), dest, len(data), 1024)
+
+        self.assertEqual(data, b''.join(dest.chunks))
+
+    def test_transfer_data_sparse(self):
+        data = b'a' * 1024 + b'\0' * 2048 + b'b' * 1024 + b'\0' * 1024
+        src = io.BytesIO(data)
+        dest = mock.Mock(wraps=io.BytesIO())
+
+        transferred = volume_utils._transfer_data(src, dest, len(data), 1024,
+                                                  sparse=True)
+
+        self.assertEqual(len(data), transferred)
+        self.assertEqual(data, dest.getvalue())
+        # Two data chunks and the last byte of the trailing hole.
+        self.assertEqual(3, dest.write.call_count)
+
+    def test_transfer_data_sparse_unseekable_dest(self):
+        data = b'\0' * 2048
+        dest = mock.Mock(wraps=io.BytesIO())
+        dest.seekable.return_value = False
+
+        volume_utils._transfer_data(io.BytesIO(data), dest, len(data), 1024,
+                                    sparse=True)
+
+        self.assertEqual(data, dest.getvalue())
+        self.assertFalse(dest.seek.called)
+
+    @mock.patch('cinder.volume.utils._transfer_data_in_kernel',
+                return_value=4096)
+    def test_transfer_data_uses_in_kernel_copy(self, mock_in_kernel):
+        src = mock.Mock()
+        dest = mock.Mock()
+
+        transferred = volume_utils._transfer_data(src, dest, 4096, 1024)
+
+        self.assertEqual(4096, transferred)
+        mock_in_kernel.assert_called_once_with(src, dest, 4096, mock.ANY)
+        self.assertFalse(src.read.called)
+        self.assertFalse(src.readinto.called)
+
+    def test_transfer_data_in_kernel_fallback(self):
+        copy = mock.Mock(side_effect=OSError(errno.EXDEV, 'cross-device'))
+        src = mock.Mock(**{'fileno.return_value': 3})
+        dest = mock.Mock(**{'fileno.return_value': 4})
+
+        with mock.patch.object(volume_utils.os, 'copy_file_range', copy,
+                               create=True):
+            self.assertIsNone(volume_utils._transfer_data_in_kernel(
+                src, dest, 4096, 1024))
+        copy.assert_called_once_with(3, 4, 1024)
+
+    def test_transfer_data_in_kernel_copy(self):
+        copy = mock.Mock(side_effect=[1024, 1024, 0])
+        src = mock.Mock(**{'fileno.return_value': 3})
+        dest = mock.Mock(**{'fileno.return_value': 4})
+
+        with mock.patch.object(volume_utils.os, 'copy_file_range', copy,
+                               create=True):
+            self.assertEqual(2048, volume_utils._transfer_data_in_kernel(
+                src, dest, 4096, 1024))
+        self.assertEqual(3, copy.call_count)
 
 
 class VolumeUtilsTestCase(test.TestCase):
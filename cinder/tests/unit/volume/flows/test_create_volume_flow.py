@@ -570,6 +570,45 @@ class CreateVolumeFlowManagerImageCacheTestCase(test.TestCase):
             image_meta=image_meta
         )
 
+    def test_create_from_image_internal_tenant_skips_cache(
+            self, mock_get_internal_context, mock_create_from_img_dl,
+            mock_create_from_src, mock_handle_bootable, mock_fetch_img):
+        mock_get_internal_context.return_value = self.internal_context
+        self.mock_driver.clone_image.return_value = (None, False)
+        volume = fake_volume.fake_volume_obj(
+            self.ctxt, project_id=self.internal_context.project_id)
+
+        image_location = 'someImageLocationStr'
+        image_id = 'c7a8b8d4-e519-46c7-a0df-ddf1b9b9fff2'
+        image_meta = mock.Mock()
+
+        manager = create_volume_manager.CreateVolumeFromSpecTask(
+            self.mock_volume_manager,
+            self.mock_db,
+            self.mock_driver,
+            image_volume_cache=self.mock_cache
+        )
+
+        manager._create_from_image(self.ctxt,
+                                   volume,
+                                   image_location,
+                                   image_id,
+                                   image_meta,
+                                   self.mock_image_service)
+
+        # An image-volume of the internal tenant is a cache entry itself
+        self.assertFalse(self.mock_cache.get_entry.called)
+        self.assertFalse(mock_create_from_src.called)
+        self.assertFalse(
+            self.mock_volume_manager._create_image_cache_volume_entry.called)
+        mock_create_from_img_dl.assert_called_once_with(
+            self.ctxt,
+            volume,
+            image_location,
+            image_id,
+            self.mock_image_service
+        )
+
     def test_create_from_image_cache_hit(
             self, mock_get_internal_context, mock_create_from_img_dl,
             mock_create_from_src, mock_handle_bootable, mock_fetch_img):
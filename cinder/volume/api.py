@@ -482,7 +482,7 @@ class API(base.Base):
 
     def get_all(self, context, marker=None, limit=None, sort_keys=None,
                 sort_dirs=None, filters=None, viewable_admin_meta=False,
-                offset=None):
+                offset=None, columns=None):
         check_policy(context, 'get_all')
 
         if filters is None:
@@ -517,7 +517,8 @@ class API(base.Base):
                                              sort_keys=sort_keys,
                                              sort_dirs=sort_dirs,
                                              filters=filters,
-                                             offset=offset)
+                                             offset=offset,
+                                             columns=columns)
         else:
             if viewable_admin_meta:
                 context = context.elevated()
@@ -527,7 +528,8 @@ class API(base.Base):
                                                         sort_keys=sort_keys,
                                                         sort_dirs=sort_dirs,
                                                         filters=filters,
-                                                        offset=offset)
+                                                        offset=offset,
+                                                        columns=columns)
 
         LOG.info(_LI("Get all volumes completed successfully."))
         return volumes
@@ -1613,6 +1615,32 @@ class API(base.Base):
                                                     ref, host)
         return snapshot_object
 
+    def prewarm_image_volume_cache(self, context, image_id, hosts):
+        """Pre-warm the image-volume cache of hosts with an image.
+
+        The cache entries are created asynchronously by the volume
+        services of the hosts.
+        """
+        self.image_service.show(context, image_id)
+        elevated = context.elevated()
+        for host in hosts:
+            svc_host = volume_utils.extract_host(host, 'backend')
+            try:
+                objects.Service.get_by_host_and_topic(elevated, svc_host,
+                                                      CONF.volume_topic)
+            except exception.ServiceNotFound:
+                with excutils.save_and_reraise_exception():
+                    LOG.error(_LE('Unable to find service: %(service)s for '
+                                  'given host: %(host)s.'),
+                              {'service': CONF.volume_topic, 'host': host})
+
+        for host in hosts:
+            self.volume_rpcapi.prewarm_image_volume_cache(context, image_id,
+                                                          host)
+        LOG.info(_LI("Pre-warm image-volume cache request issued "
+                     "successfully for image %(image_id)s on hosts "
+                     "%(hosts)s."), {'image_id': image_id, 'hosts': hosts})
+
     #  Replication V2 methods ##
 
     # NOTE(jdg): It might be kinda silly to propogate the named
@@ -72,7 +72,7 @@ class GlusterfsDriver(remotefs_drv.RemoteFSSnapDriver,
                             'glusterfs_mount_point_base',
                             CONF.glusterfs_mount_point_base)
         self._remotefsclient = remotefs_brick.RemoteFsClient(
-            'glusterfs', root_helper, execute,
+            'glusterfs', root_helper, self._probe_execute(execute),
             glusterfs_mount_point_base=self.base)
 
     def do_setup(self, context):
@@ -190,6 +190,7 @@ class GlusterfsDriver(remotefs_drv.RemoteFSSnapDriver,
         LOG.info(_LI('casted to %s'), volume['provider_location'])
 
         self._do_create_volume(volume)
+        self._update_volume_files(volume)
 
         return {'provider_location': volume['provider_location']}
 
@@ -256,6 +257,7 @@ class GlusterfsDriver(remotefs_drv.RemoteFSSnapDriver,
 
         info_path = self._local_path_volume_info(volume)
         fileutils.delete_if_exists(info_path)
+        self._forget_volume_files(volume)
 
     def _get_matching_backing_file(self, backing_chain, snapshot_file):
         return next(f for f in backing_chain
@@ -323,6 +325,7 @@ class GlusterfsDriver(remotefs_drv.RemoteFSSnapDriver,
 
         # qemu-img can resize both raw and qcow2 files
         image_utils.resize_image(volume_path, size_gb)
+        self._update_volume_files(volume)
 
     def _do_create_volume(self, volume):
         """Create a volume on given glusterfs_share.
@@ -360,16 +363,9 @@ class GlusterfsDriver(remotefs_drv.RemoteFSSnapDriver,
     def _ensure_shares_mounted(self):
         """Mount all configured GlusterFS shares."""
 
-        self._mounted_shares = []
-
         self._load_shares_config(self.configuration.glusterfs_shares_config)
 
-        for share in self.shares.keys():
-            try:
-                self._ensure_share_mounted(share)
-                self._mounted_shares.append(share)
-            except Exception as exc:
-                LOG.error(_LE('Exception during mounting %s'), exc)
+        self._mounted_shares = self._mount_shares(list(self.shares.keys()))
 
         LOG.debug('Available shares: %s', self._mounted_shares)
 
@@ -409,8 +405,11 @@ class GlusterfsDriver(remotefs_drv.RemoteFSSnapDriver,
         greatest_size = 0
         greatest_share = None
 
+        capacity_info = self._get_shares_capacity_info(self._mounted_shares)
         for glusterfs_share in self._mounted_shares:
-            capacity = self._get_available_capacity(glusterfs_share)[0]
+            if glusterfs_share not in capacity_info:
+                continue
+            capacity = capacity_info[glusterfs_share][1]
             if capacity > greatest_size:
                 greatest_share = glusterfs_share
                 greatest_size = capacity
@@ -59,7 +59,13 @@ volume_opts = [
                help='LVM conf file to use for the LVM driver in Cinder; '
                     'this setting is ignored if the specified file does '
                     'not exist (You can also specify \'None\' to not use '
-                    'a conf file even if one exists).')
+                    'a conf file even if one exists).'),
+    cfg.IntOpt('lvm_report_cache_ttl',
+               default=10,
+               help='Seconds for which the LVM driver reuses the volume '
+                    'group and logical volume report it gathers for stats. '
+                    'The report is refreshed anyway when volumes are '
+                    'changed by the driver. 0 queries LVM every time.'),
 ]
 
 CONF = cfg.CONF
@@ -266,7 +272,9 @@ class LVMVolumeDriver(driver.VolumeDriver):
                                   root_helper,
                                   lvm_type=self.configuration.lvm_type,
                                   executor=self._execute,
-                                  lvm_conf=lvm_conf_file)
+                                  lvm_conf=lvm_conf_file,
+                                  report_cache_ttl=(
+                                      self.configuration.lvm_report_cache_ttl))
 
             except exception.VolumeGroupNotFound:
                 message = (_("Volume Group %s does not exist") %
@@ -116,7 +116,7 @@ class NfsDriver(driver.ExtendVD, remotefs.RemoteFSDriver):
             opts = nas_mount_options
 
         self._remotefsclient = remotefs_brick.RemoteFsClient(
-            'nfs', root_helper, execute=execute,
+            'nfs', root_helper, execute=self._probe_execute(execute),
             nfs_mount_point_base=self.base,
             nfs_mount_options=opts)
 
@@ -200,11 +200,14 @@ class NfsDriver(driver.ExtendVD, remotefs.RemoteFSDriver):
         target_share = None
         target_share_reserved = 0
 
+        capacity_info = self._get_shares_capacity_info(self._mounted_shares)
         for nfs_share in self._mounted_shares:
-            if not self._is_share_eligible(nfs_share, volume_size_in_gib):
+            if (nfs_share not in capacity_info or
+                    not self._is_share_eligible(nfs_share,
+                                                volume_size_in_gib)):
                 continue
             _total_size, _total_available, total_allocated = \
-                self._get_capacity_info(nfs_share)
+                capacity_info[nfs_share]
             if target_share is not None:
                 if target_share_reserved > total_allocated:
                     target_share = nfs_share
@@ -251,8 +254,11 @@ class NfsDriver(driver.ExtendVD, remotefs.RemoteFSDriver):
         oversub_ratio = self.over_subscription_ratio
         requested_volume_size = volume_size_in_gib * units.Gi
 
+        capacity_info = self._get_shares_capacity_info([nfs_share])
+        if nfs_share not in capacity_info:
+            return False
         total_size, total_available, total_allocated = \
-            self._get_capacity_info(nfs_share)
+            capacity_info[nfs_share]
         apparent_size = max(0, total_size * oversub_ratio)
         apparent_available = max(0, apparent_size - total_allocated)
 
@@ -287,16 +293,23 @@ class NfsDriver(driver.ExtendVD, remotefs.RemoteFSDriver):
 
         mount_point = self._get_mount_point_for_share(nfs_share)
 
-        df, _ = self._execute('stat', '-f', '-c', '%S %b %a', mount_point,
-                              run_as_root=run_as_root)
-        block_size, blocks_total, blocks_avail = map(float, df.split())
-        total_available = block_size * blocks_avail
-        total_size = block_size * blocks_total
-
-        du, _ = self._execute('du', '-sb', '--apparent-size', '--exclude',
-                              '*snapshot*', mount_point,
-                              run_as_root=run_as_root)
-        total_allocated = float(du.split()[0])
+        fs_capacity = self._get_fs_capacity(mount_point)
+        if fs_capacity is not None:
+            total_size, total_available = map(float, fs_capacity)
+        else:
+            df, _ = self._execute('stat', '-f', '-c', '%S %b %a',
+                                  mount_point, run_as_root=run_as_root)
+            block_size, blocks_total, blocks_avail = map(float, df.split())
+            total_available = block_size * blocks_avail
+            total_size = block_size * blocks_total
+
+        # The files matching *snapshot* are left out, as they used to be by
+        # 'du --exclude'
+        prefix = os.path.join(mount_point, '')
+        total_allocated = float(sum(
+            size for path, size in
+            self._get_provisioned_files(mount_point).items()
+            if 'snapshot' not in path[len(prefix):]))
         return total_size, total_available, total_allocated
 
     def _get_mount_point_base(self):
@@ -318,6 +331,7 @@ class NfsDriver(driver.ExtendVD, remotefs.RemoteFSDriver):
         if not self._is_file_size_equal(path, new_size):
             raise exception.ExtendVolumeError(
                 reason='Resizing image file failed.')
+        self._update_volume_files(volume)
 
     def _is_file_size_equal(self, path, size):
         """Checks if file size at path is equal to size."""
@@ -14,16 +14,21 @@
 """RADOS Block Device Driver"""
 
 from __future__ import absolute_import
+import collections
+import contextlib
 import io
 import json
 import math
 import os
 import tempfile
+import time
 
 from eventlet import tpool
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_utils import excutils
 from oslo_utils import fileutils
+from oslo_utils import timeutils
 from oslo_utils import units
 from six.moves import urllib
 
@@ -85,7 +90,20 @@ rbd_opts = [
                       'failed.')),
     cfg.IntOpt('rados_connection_interval', default=5,
                help=_('Interval value (in seconds) between connection '
-                      'retries to ceph cluster.'))
+                      'retries to ceph cluster.')),
+    cfg.IntOpt('rados_connection_pool_size', default=4,
+               help=_('Maximum number of idle connections to the ceph '
+                      'cluster kept open for each RADOS pool, to be reused '
+                      'instead of connecting again. Set to 0 to close the '
+                      'connections once done with.')),
+    cfg.IntOpt('rados_connection_max_idle_time', default=300,
+               help=_('Idle connections to the ceph cluster are closed '
+                      'instead of being reused after this number of '
+                      'seconds.')),
+    cfg.IntOpt('rbd_aio_window', default=8,
+               help=_('Maximum number of asynchronous librbd requests in '
+                      'flight for each image when streaming data to or from '
+                      'a volume, e.g. raw images from the image service.')),
 ]
 
 CONF = cfg.CONF
@@ -97,8 +115,9 @@ class RBDImageMetadata(object):
     def __init__(self, image, pool, user, conf):
         self.image = image
         self.pool = utils.convert_str(pool)
-        self.user = utils.convert_str(user)
-        self.conf = utils.convert_str(conf)
+        # NOTE: rbd_user and rbd_ceph_conf may be unset
+        self.user = user and utils.convert_str(user)
+        self.conf = conf and utils.convert_str(conf)
 
 
 class RBDImageIOWrapper(io.RawIOBase):
@@ -131,9 +150,12 @@ class RBDImageIOWrapper(io.RawIOBase):
     def rbd_conf(self):
         return self._rbd_meta.conf
 
+    def _image_size(self):
+        return self._rbd_meta.image.size()
+
     def read(self, length=None):
         offset = self._offset
-        total = self._rbd_meta.image.size()
+        total = self._image_size()
 
         # NOTE(dosaboy): posix files do not barf if you read beyond their
         # length (they just return nothing) but rbd images do so we need to
@@ -150,6 +172,39 @@ class RBDImageIOWrapper(io.RawIOBase):
         self._inc_offset(length)
         return self._rbd_meta.image.read(int(offset), int(length))
 
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def allocated_extents(self, offset=0, length=None):
+        """Return the (offset, length) of the allocated extents.
+
+        The rest of the image are holes which read back as zeros, so callers
+        can skip them. Adjacent extents are merged. Without diff_iterate in
+        librbd the whole range is reported as allocated.
+        """
+        if length is None:
+            length = self._image_size() - offset
+        image = self._rbd_meta.image
+        if not hasattr(image, 'diff_iterate'):
+            return [(offset, length)] if length > 0 else []
+
+        extents = []
+
+        def _add_extent(extent_offset, extent_length, exists):
+            if not exists:
+                return
+            if extents:
+                last_offset, last_length = extents[-1]
+                if last_offset + last_length == extent_offset:
+                    extents[-1] = (last_offset, last_length + extent_length)
+                    return
+            extents.append((extent_offset, extent_length))
+
+        tpool.execute(image.diff_iterate, offset, length, None, _add_extent)
+        return extents
+
     def write(self, data):
         self._rbd_meta.image.write(data, self._offset)
         self._inc_offset(len(data))
@@ -163,7 +218,7 @@ class RBDImageIOWrapper(io.RawIOBase):
         elif whence == 1:
             new_offset = self._offset + offset
         elif whence == 2:
-            new_offset = self._rbd_meta.image.size()
+            new_offset = self._image_size()
             new_offset += offset
         else:
             raise IOError(_("Invalid argument - whence=%s not supported") %
@@ -200,6 +255,302 @@ class RBDImageIOWrapper(io.RawIOBase):
         pass
 
 
+class RBDImageAioWriter(image_utils.ImageStreamWriter):
+    """Writes a stream of data into a librbd Image with aio writes.
+
+    The data is gathered into writes of write_size bytes from offset on,
+    with at most window of them in flight. If sparse, chunks of zeros are
+    skipped instead of being written, so the image must read back as zeros
+    there, e.g. because it was just created. If checksum, the data can be
+    checked by image_utils.check_streamed_image. If image_id, the header
+    of the image is checked before anything is written.
+    """
+
+    def __init__(self, image, write_size, window, offset=0, sparse=True,
+                 checksum=True, image_id=None):
+        super(RBDImageAioWriter, self).__init__(skip_zeros=sparse,
+                                                checksum=checksum,
+                                                image_id=image_id)
+        self.image = image
+        self.write_size = write_size
+        self.window = max(1, window)
+        self.offset = offset
+        self._buffer = []
+        self._buffer_size = 0
+        self._pending = collections.deque()
+
+    def _write_data(self, data):
+        self._buffer.append(data)
+        self._buffer_size += len(data)
+        self.offset += len(data)
+        if self._buffer_size >= self.write_size:
+            self._flush_buffer()
+
+    def _skip_zeros(self, data):
+        self._flush_buffer()
+        self.offset += len(data)
+
+    def _flush_buffer(self):
+        if not self._buffer:
+            return
+        data = b''.join(self._buffer)
+        offset = self.offset - len(data)
+        self._buffer = []
+        self._buffer_size = 0
+        if not hasattr(self.image, 'aio_write'):
+            # NOTE: librbd versions without aio writes
+            tpool.execute(self.image.write, data, offset)
+            return
+        if len(self._pending) >= self.window:
+            self._wait(self._pending.popleft())
+        self._pending.append(self.image.aio_write(data, offset,
+                                                  lambda completion: None))
+
+    @staticmethod
+    def _wait(completion):
+        # Wait in a native thread so that the other green threads run
+        tpool.execute(completion.wait_for_complete_and_cb)
+        ret = completion.get_return_value()
+        if ret < 0:
+            msg = (_("Asynchronous write to rbd image failed: %s.") %
+                   os.strerror(-ret))
+            raise exception.VolumeBackendAPIException(data=msg)
+
+    def close(self):
+        """Write the gathered data and wait for all the writes.
+
+        All the writes in flight are waited for before the first error is
+        raised, so that none of them outlives the image.
+        """
+        try:
+            super(RBDImageAioWriter, self).close()
+            self._flush_buffer()
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self.abort()
+        error = None
+        while self._pending:
+            try:
+                self._wait(self._pending.popleft())
+            except Exception as e:
+                if error is None:
+                    error = e
+        if error is not None:
+            raise error
+
+    def abort(self):
+        """Drop the gathered data and wait for the writes in flight."""
+        self._buffer = []
+        self._buffer_size = 0
+        while self._pending:
+            tpool.execute(self._pending.popleft().wait_for_complete_and_cb)
+
+
+class _AioRead(object):
+    """A librbd aio read, whose data is returned by wait()."""
+
+    def __init__(self, image, offset, length):
+        self.offset = offset
+        self.data = None
+        self.completion = image.aio_read(offset, length, self._complete)
+
+    def _complete(self, completion, data):
+        self.data = data
+
+    def wait(self):
+        # Wait in a native thread so that the other green threads run
+        tpool.execute(self.completion.wait_for_complete_and_cb)
+        ret = self.completion.get_return_value()
+        if ret < 0:
+            raise IOError(-ret, os.strerror(-ret))
+        return self.data
+
+
+class RBDImageAioIOWrapper(RBDImageIOWrapper):
+    """RBDImageIOWrapper keeping librbd aio requests in flight.
+
+    Reads are served from blocks of block_size bytes read ahead of the
+    caller, with up to window of them in flight, so sequential reads wait
+    on the cluster much less. Writes are gathered and written behind the
+    caller by an RBDImageAioWriter; flush() waits for them. The image size
+    is read once, so the image must not be resized while it is wrapped.
+    """
+
+    def __init__(self, rbd_meta, block_size, window):
+        super(RBDImageAioIOWrapper, self).__init__(rbd_meta)
+        self.block_size = block_size
+        self.window = max(1, window)
+        self._size = rbd_meta.image.size()
+        # Reads in flight, in offset order from _readahead_offset on
+        self._readahead = collections.deque()
+        self._readahead_offset = 0
+        # Last block read, and its data
+        self._block = None
+        self._block_data = b''
+        self._writer = None
+
+    def _image_size(self):
+        return self._size
+
+    def _discard_readahead(self):
+        while self._readahead:
+            try:
+                self._readahead.popleft().wait()
+            except IOError:
+                pass
+        self._block = None
+        self._block_data = b''
+
+    def _fill_readahead(self):
+        image = self._rbd_meta.image
+        while (len(self._readahead) < self.window and
+               self._readahead_offset < self._size):
+            length = min(self.block_size,
+                         self._size - self._readahead_offset)
+            self._readahead.append(_AioRead(image, self._readahead_offset,
+                                            length))
+            self._readahead_offset += length
+
+    def _read_block(self, offset):
+        """Return the offset and the data of the block holding offset."""
+        if (self._block is not None and
+                self._block <= offset < self._block + len(self._block_data)):
+            return self._block, self._block_data
+        block = offset - offset % self.block_size
+        if self._readahead and self._readahead[0].offset != block:
+            # Not reading sequentially any more
+            self._discard_readahead()
+        if not self._readahead:
+            self._readahead_offset = block
+        self._fill_readahead()
+        aio_read = self._readahead.popleft()
+        self._fill_readahead()
+        self._block = None
+        self._block_data = aio_read.wait()
+        self._block = block
+        return self._block, self._block_data
+
+    def _wait_for_writes(self):
+        if self._writer is not None:
+            writer, self._writer = self._writer, None
+            writer.close()
+
+    def read(self, length=None):
+        if not hasattr(self._rbd_meta.image, 'aio_read'):
+            # NOTE: librbd versions without aio reads
+            return super(RBDImageAioIOWrapper, self).read(length)
+        self._wait_for_writes()
+        offset = self._offset
+        if offset >= self._size:
+            return b''
+        if length is None or offset + length > self._size:
+            length = self._size - offset
+        end = offset + length
+        data = []
+        while offset < end:
+            block, block_data = self._read_block(offset)
+            chunk = block_data[offset - block:end - block]
+            if not chunk:
+                raise IOError(_("Short read from rbd image at offset %d") %
+                              offset)
+            data.append(chunk)
+            offset += len(chunk)
+        self._offset = end
+        return b''.join(data)
+
+    def write(self, data):
+        self._discard_readahead()
+        if self._writer is None or self._writer.offset != self._offset:
+            self._wait_for_writes()
+            self._writer = RBDImageAioWriter(self._rbd_meta.image,
+                                             self.block_size, self.window,
+                                             offset=self._offset,
+                                             sparse=False, checksum=False)
+        self._writer.write(data)
+        self._inc_offset(len(data))
+
+    def flush(self):
+        self._wait_for_writes()
+        super(RBDImageAioIOWrapper, self).flush()
+
+    def close(self):
+        # Never leave requests in flight once done with the image
+        self._discard_readahead()
+        self._wait_for_writes()
+
+
+class RADOSConnectionPool(object):
+    """Connections to the ceph cluster kept open to be reused.
+
+    Connecting to the monitors dominates the latency of small operations, so
+    connections are kept open once done with, up to max_idle of them for
+    each RADOS pool, and given out again instead of connecting. A connection
+    is closed rather than reused when it has been idle for max_idle_time
+    seconds, when its client is no longer connected or when an operation
+    using it failed, in case the connection was the cause.
+    """
+
+    def __init__(self, connect, max_idle, max_idle_time):
+        self._connect = connect
+        self.max_idle = max_idle
+        self.max_idle_time = max_idle_time
+        # (client, ioctx, idle since) of each RADOS pool, oldest first
+        self._idle = collections.defaultdict(list)
+        # RADOS pool of the connections given out, by ioctx
+        self._pools = {}
+
+    def _usable(self, client, idle_since):
+        return (time.time() - idle_since < self.max_idle_time and
+                client.state == 'connected')
+
+    @staticmethod
+    def _close(client, ioctx):
+        # closing an ioctx cannot raise an exception
+        ioctx.close()
+        client.shutdown()
+
+    def get(self, pool):
+        """Return a client and an ioctx for pool, connecting if needed."""
+        idle = self._idle[pool]
+        while idle:
+            client, ioctx, idle_since = idle.pop()
+            if self._usable(client, idle_since):
+                LOG.debug("reusing connection to ceph cluster for pool %s.",
+                          pool)
+                break
+            self._close(client, ioctx)
+        else:
+            client, ioctx = self._connect(pool)
+        self._pools[id(ioctx)] = pool
+        return client, ioctx
+
+    def put(self, client, ioctx, failed=False):
+        """Give back a connection from get() once done with it."""
+        pool = self._pools.pop(id(ioctx), None)
+        now = time.time()
+        if (pool is None or failed or self.max_idle <= 0 or
+                not self._usable(client, now)):
+            self._close(client, ioctx)
+            return
+        idle = self._idle[pool]
+        # Make room by closing the oldest connections, and the stale ones
+        while idle:
+            old_client, old_ioctx, idle_since = idle[0]
+            if (len(idle) < self.max_idle and
+                    self._usable(old_client, idle_since)):
+                break
+            del idle[0]
+            self._close(old_client, old_ioctx)
+        idle.append((client, ioctx, now))
+
+    def close(self):
+        """Close all the idle connections."""
+        for idle in self._idle.values():
+            while idle:
+                client, ioctx, _idle_since = idle.pop()
+                self._close(client, ioctx)
+
+
 class RBDVolumeProxy(object):
     """Context manager for dealing with an existing rbd volume.
 
@@ -235,7 +586,9 @@ class RBDVolumeProxy(object):
         try:
             self.volume.close()
         finally:
-            self.driver._disconnect_from_rados(self.client, self.ioctx)
+            self.driver._disconnect_from_rados(
+                self.client, self.ioctx,
+                failed=type_ is not None)
 
     def __getattr__(self, attrib):
         return getattr(self.volume, attrib)
@@ -251,7 +604,9 @@ class RADOSClient(object):
         return self
 
     def __exit__(self, type_, value, traceback):
-        self.driver._disconnect_from_rados(self.cluster, self.ioctx)
+        self.driver._disconnect_from_rados(
+            self.cluster, self.ioctx,
+            failed=type_ is not None)
 
     @property
     def features(self):
@@ -275,6 +630,10 @@ class RBDDriver(driver.TransferVD, driver.ExtendVD,
         # allow overrides for testing
         self.rados = kwargs.get('rados', rados)
         self.rbd = kwargs.get('rbd', rbd)
+        self._rados_connections = RADOSConnectionPool(
+            self._open_rados_connection,
+            self.configuration.rados_connection_pool_size,
+            self.configuration.rados_connection_max_idle_time)
 
         # All string args used with librbd must be None or utf-8 otherwise
         # librbd will break.
@@ -309,10 +668,17 @@ class RBDDriver(driver.TransferVD, driver.ExtendVD,
             args.extend(['--cluster', self.configuration.rbd_cluster_name])
         return args
 
+    def _connect_to_rados(self, pool=None):
+        if pool is not None:
+            pool = utils.convert_str(pool)
+        else:
+            pool = self.configuration.rbd_pool
+        return self._rados_connections.get(pool)
+
     @utils.retry(exception.VolumeBackendAPIException,
                  CONF.rados_connection_interval,
                  CONF.rados_connection_retries)
-    def _connect_to_rados(self, pool=None):
+    def _open_rados_connection(self, pool):
         LOG.debug("opening connection to ceph cluster (timeout=%s).",
                   self.configuration.rados_connect_timeout)
 
@@ -320,10 +686,6 @@ class RBDDriver(driver.TransferVD, driver.ExtendVD,
             rados_id=self.configuration.rbd_user,
             clustername=self.configuration.rbd_cluster_name,
             conffile=self.configuration.rbd_ceph_conf)
-        if pool is not None:
-            pool = utils.convert_str(pool)
-        else:
-            pool = self.configuration.rbd_pool
 
         try:
             if self.configuration.rados_connect_timeout >= 0:
@@ -339,10 +701,10 @@ class RBDDriver(driver.TransferVD, driver.ExtendVD,
             client.shutdown()
             raise exception.VolumeBackendAPIException(data=msg)
 
-    def _disconnect_from_rados(self, client, ioctx):
-        # closing an ioctx cannot raise an exception
-        ioctx.close()
-        client.shutdown()
+    def _disconnect_from_rados(self, client, ioctx, failed=False):
+        # The connection is kept open to be reused unless an operation
+        # using it failed.
+        self._rados_connections.put(client, ioctx, failed=failed)
 
     def _get_backup_snaps(self, rbd_image):
         """Get list of any backup snapshots that exist on this volume.
@@ -910,7 +1272,53 @@ class RBDDriver(driver.TransferVD, driver.ExtendVD,
 
         return tmpdir
 
+    def _stream_image_to_volume(self, context, volume, image_service,
+                                image_id, image_meta):
+        """Write a raw image into the volume as it is downloaded.
+
+        This needs no scratch space and writes the image once instead of
+        twice. The volume was just created, so the chunks of zeros are
+        skipped as rbd import does.
+        """
+        image_utils.check_image_size(image_id, image_meta.get('size'),
+                                     int(volume['size']))
+
+        LOG.debug("streaming raw image %(image)s into volume %(volume)s",
+                  {'image': image_id, 'volume': volume['name']})
+        start_time = timeutils.utcnow()
+        with RBDVolumeProxy(self, volume['name'],
+                            self.configuration.rbd_pool) as rbd_image:
+            writer = RBDImageAioWriter(
+                rbd_image.volume,
+                self.configuration.rbd_store_chunk_size * units.Mi,
+                self.configuration.rbd_aio_window, image_id=image_id)
+            try:
+                image_service.download(context, image_id, writer)
+                writer.close()
+            except Exception:
+                with excutils.save_and_reraise_exception():
+                    writer.abort()
+
+        image_utils.check_streamed_image(image_id, image_meta, writer,
+                                         int(volume['size']))
+
+        duration = max(timeutils.delta_seconds(start_time,
+                                               timeutils.utcnow()), 1)
+        size_mb = writer.size / float(units.Mi)
+        LOG.info(_LI("Image %(image)s streamed to volume %(volume)s: "
+                     "%(size).2f MB at %(mbps).2f MB/s, %(skipped).2f MB of "
+                     "zeros skipped"),
+                 {'image': image_id, 'volume': volume['name'],
+                  'size': size_mb, 'mbps': size_mb / duration,
+                  'skipped': writer.skipped / float(units.Mi)})
+
     def copy_image_to_volume(self, context, volume, image_service, image_id):
+        image_meta = image_service.show(context, image_id)
+        if image_utils.can_stream_image(context, image_service, image_id,
+                                        image_meta):
+            self._stream_image_to_volume(context, volume, image_service,
+                                         image_id, image_meta)
+            return
 
         tmp_dir = self._image_conversion_dir()
 
@@ -935,7 +1343,34 @@ class RBDDriver(driver.TransferVD, driver.ExtendVD,
             self._try_execute(*args)
         self._resize(volume)
 
+    @contextlib.contextmanager
+    def _image_io(self, rbd_image):
+        """Yield an aio IO wrapper for streaming the data of rbd_image."""
+        rbd_meta = RBDImageMetadata(rbd_image, self.configuration.rbd_pool,
+                                    self.configuration.rbd_user,
+                                    self.configuration.rbd_ceph_conf)
+        rbd_fd = RBDImageAioIOWrapper(
+            rbd_meta, self.configuration.rbd_store_chunk_size * units.Mi,
+            self.configuration.rbd_aio_window)
+        try:
+            yield rbd_fd
+        finally:
+            # No aio request may outlive the image
+            rbd_fd.close()
+
     def copy_volume_to_image(self, context, volume, image_service, image_meta):
+        if image_meta['disk_format'] == 'raw':
+            # Upload straight from the volume, without exporting it first
+            LOG.debug("uploading volume %(volume)s to image %(image)s",
+                      {'volume': volume['name'], 'image': image_meta['id']})
+            with RBDVolumeProxy(self, volume['name'],
+                                self.configuration.rbd_pool,
+                                read_only=True) as rbd_image:
+                with self._image_io(rbd_image) as rbd_fd:
+                    image_service.update(context, image_meta['id'], {},
+                                         rbd_fd)
+            return
+
         tmp_dir = self._image_conversion_dir()
         tmp_file = os.path.join(tmp_dir,
                                 volume['name'] + '-' + image_meta['id'])
@@ -955,11 +1390,8 @@ class RBDDriver(driver.TransferVD, driver.ExtendVD,
 
         with RBDVolumeProxy(self, volume['name'],
                             self.configuration.rbd_pool) as rbd_image:
-            rbd_meta = RBDImageMetadata(rbd_image, self.configuration.rbd_pool,
-                                        self.configuration.rbd_user,
-                                        self.configuration.rbd_ceph_conf)
-            rbd_fd = RBDImageIOWrapper(rbd_meta)
-            backup_service.backup(backup, rbd_fd)
+            with self._image_io(rbd_image) as rbd_fd:
+                backup_service.backup(backup, rbd_fd)
 
         LOG.debug("volume backup complete.")
 
@@ -967,11 +1399,8 @@ class RBDDriver(driver.TransferVD, driver.ExtendVD,
         """Restore an existing backup to a new or existing volume."""
         with RBDVolumeProxy(self, volume['name'],
                             self.configuration.rbd_pool) as rbd_image:
-            rbd_meta = RBDImageMetadata(rbd_image, self.configuration.rbd_pool,
-                                        self.configuration.rbd_user,
-                                        self.configuration.rbd_ceph_conf)
-            rbd_fd = RBDImageIOWrapper(rbd_meta)
-            backup_service.restore(backup, volume['id'], rbd_fd)
+            with self._image_io(rbd_image) as rbd_fd:
+                backup_service.restore(backup, volume['id'], rbd_fd)
 
         LOG.debug("volume restore complete.")
 
@@ -19,9 +19,12 @@ import inspect
 import json
 import os
 import re
+import stat
 import tempfile
 import time
 
+import eventlet
+from eventlet import tpool
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import units
@@ -95,6 +98,26 @@ volume_opts = [
                deprecated_opts=old_vol_type_opts,
                help=('Provisioning type that will be used when '
                      'creating volumes.')),
+    cfg.IntOpt('nas_provisioned_capacity_walk_interval',
+               default=3600,
+               help=('Interval in seconds between the background walks of '
+                     'the shares reconciling the provisioned capacity, '
+                     'which is otherwise kept up to date from the volume '
+                     'and snapshot files created by Cinder. Each share is '
+                     'always walked the first time its provisioned '
+                     'capacity is needed, set to 0 to never walk it '
+                     'again.')),
+    cfg.IntOpt('nas_share_probe_timeout',
+               default=30,
+               help=('Timeout in seconds for mounting a share or probing its '
+                     'capacity. The shares are mounted and probed '
+                     'concurrently, a share which does not answer in time '
+                     'is skipped. Set to 0 to wait indefinitely.')),
+    cfg.IntOpt('nas_share_capacity_cache_ttl',
+               default=10,
+               help=('Time in seconds for which the capacity probed on a '
+                     'share is reused. Set to 0 to probe the shares every '
+                     'time.')),
 ]
 
 CONF = cfg.CONF
@@ -133,6 +156,51 @@ def locked_volume_id_operation(f, external=False):
     return lvo_inner1
 
 
+def _scan_dir(path):
+    """Yields the paths and lstat results of the entries of a directory.
+
+    Entries deleted meanwhile are skipped.
+    """
+    scandir = getattr(os, 'scandir', None)
+    if scandir:
+        entries = ((entry.path, entry) for entry in scandir(path))
+    else:
+        entries = ((os.path.join(path, name), None)
+                   for name in os.listdir(path))
+    for entry_path, entry in entries:
+        try:
+            if entry is not None:
+                entry_stat = entry.stat(follow_symlinks=False)
+            else:
+                entry_stat = os.lstat(entry_path)
+        except OSError:
+            continue
+        yield entry_path, entry_stat
+
+
+def _get_file_sizes(paths):
+    """Returns the sizes of the files under directories, by file path.
+
+    Directories which can't be listed, e.g. shares not mounted, are skipped
+    and returned along with the error, since this runs in a native thread
+    which must not log.
+    """
+    sizes = {}
+    unreadable_dirs = []
+    dirs = list(paths)
+    while dirs:
+        dir_path = dirs.pop()
+        try:
+            for path, path_stat in _scan_dir(dir_path):
+                if stat.S_ISDIR(path_stat.st_mode):
+                    dirs.append(path)
+                else:
+                    sizes[path] = path_stat.st_size
+        except OSError as exc:
+            unreadable_dirs.append((dir_path, exc))
+    return sizes, unreadable_dirs
+
+
 class RemoteFSDriver(driver.LocalVD, driver.TransferVD, driver.BaseVD):
     """Common base for drivers that work like NFS."""
 
@@ -146,11 +214,24 @@ class RemoteFSDriver(driver.LocalVD, driver.TransferVD, driver.BaseVD):
         self.shares = {}
         self._mounted_shares = []
         self._execute_as_root = True
+        # Sizes of the files on each share by path, and the time the share
+        # was last walked for them, by mount point of the walked shares
+        self._provisioned_files = {}
+        self._provisioned_files_walked_at = {}
+        # The green threads walking the shares, by mount point
+        self._walkers = {}
+        # Capacity info of the shares and the time it was probed, by share
+        self._capacity_info_cache = {}
+        # The green threads running a function on a share, by function and
+        # share, and the processes started by each of them
+        self._share_probes = {}
+        self._probe_processes = {}
         self._is_voldb_empty_at_startup = kwargs.pop('is_vol_db_empty', None)
 
         if self.configuration:
             self.configuration.append_config_values(nas_opts)
             self.configuration.append_config_values(volume_opts)
+        self._execute = self._probe_execute(self._execute)
 
     def check_for_setup_error(self):
         """Just to override parent behavior."""
@@ -198,15 +279,112 @@ class RemoteFSDriver(driver.LocalVD, driver.TransferVD, driver.BaseVD):
         """Returns the provisioned capacity.
 
         Get the sum of sizes of volumes, snapshots and any other
-        files on the mountpoint.
+        files on the mountpoints.  The shares not walked yet are walked
+        concurrently, those which can't be walked in time are left out.
+        """
+        provisioned_size = 0
+        for share, sizes, exc in self._run_on_shares(
+                self._get_share_provisioned_files, list(self.shares.keys())):
+            if exc is None:
+                provisioned_size += sum(sizes.values())
+            else:
+                LOG.warning(_LW('Failed to walk share %(share)s, its files '
+                                'are not counted in the provisioned '
+                                'capacity: %(exc)s'),
+                            {'share': share, 'exc': exc})
+        return round(float(provisioned_size) / units.Gi, 2)
+
+    def _get_share_provisioned_files(self, share):
+        return self._get_provisioned_files(
+            self._get_mount_point_for_share(share))
+
+    def _get_provisioned_files(self, mount_point):
+        """Returns the sizes of the files on a share, by path.
+
+        Each share is only walked for them once, and then again in the
+        background every nas_provisioned_capacity_walk_interval seconds: in
+        between, the sizes of the files of the volumes are updated as they
+        are created, extended, snapshotted and deleted.  Only the first walk
+        of a share is waited for, by the callers asking for that share.
         """
-        provisioned_size = 0.0
-        for share in self.shares.keys():
-            mount_path = self._get_mount_point_for_share(share)
-            out, _ = self._execute('du', '--bytes', mount_path,
-                                   run_as_root=True)
-            provisioned_size += int(out.split()[0])
-        return round(provisioned_size / units.Gi, 2)
+        walker = self._walkers.get(mount_point)
+        sizes = self._provisioned_files.get(mount_point)
+        if sizes is None:
+            # Callers timing out leave the walk running for the next ones
+            if walker is None:
+                walker = eventlet.spawn(self._walk_provisioned_files,
+                                        mount_point)
+                self._walkers[mount_point] = walker
+            return walker.wait()
+
+        interval = self.configuration.nas_provisioned_capacity_walk_interval
+        if (interval > 0 and walker is None and
+                time.time() - self._provisioned_files_walked_at[mount_point]
+                >= interval):
+            self._walkers[mount_point] = eventlet.spawn(
+                self._walk_provisioned_files, mount_point)
+        return sizes
+
+    def _walk_provisioned_files(self, mount_point):
+        """Reconciles the provisioned capacity with the files on a share.
+
+        Changes made to the volumes during the walk may be missed until the
+        next one.
+        """
+        try:
+            # The stat calls block, keep them off the eventlet hub
+            sizes, unreadable_dirs = tpool.execute(_get_file_sizes,
+                                                   [mount_point])
+            for path, exc in unreadable_dirs:
+                LOG.warning(_LW('Failed to list %(path)s, the files under '
+                                'it are not counted in the provisioned '
+                                'capacity: %(exc)s'),
+                            {'path': path, 'exc': exc})
+            self._provisioned_files[mount_point] = sizes
+            self._provisioned_files_walked_at[mount_point] = time.time()
+            LOG.debug('Walked %(path)s, %(count)d files found on it.',
+                      {'path': mount_point, 'count': len(sizes)})
+            return sizes
+        finally:
+            del self._walkers[mount_point]
+
+    def _volume_files(self, volume):
+        """Returns the paths of the files of a volume."""
+        return [self.local_path(volume)]
+
+    def _volume_provisioned_files(self, volume):
+        """Returns the sizes of the files on the share of a volume, if any."""
+        if not self._provisioned_files or not volume['provider_location']:
+            return None
+        mount_point = self._get_mount_point_for_share(
+            volume['provider_location'])
+        return self._provisioned_files.get(mount_point)
+
+    def _forget_volume_files(self, volume):
+        """Removes the files of a volume from the provisioned capacity."""
+        # The capacity of the shares changes with the files of the volume
+        self._capacity_info_cache.clear()
+        sizes = self._volume_provisioned_files(volume)
+        if sizes is None:
+            return
+        volume_path = self.local_path(volume)
+        for path in list(sizes.keys()):
+            if path == volume_path or path.startswith(volume_path + '.'):
+                del sizes[path]
+
+    def _update_volume_files(self, volume):
+        """Updates the provisioned capacity with the files of a volume."""
+        self._forget_volume_files(volume)
+        sizes = self._volume_provisioned_files(volume)
+        if sizes is None:
+            # They will be counted by the first walk of the share
+            return
+        for path in self._volume_files(volume):
+            try:
+                sizes[path] = os.stat(path).st_size
+            except OSError:
+                LOG.debug('Not counting missing file %s in the provisioned '
+                          'capacity.', path)
 
     def _get_mount_point_base(self):
         """Returns the mount point base for the remote fs.
@@ -236,6 +414,7 @@ class RemoteFSDriver(driver.LocalVD, driver.TransferVD, driver.BaseVD):
         LOG.info(_LI('casted to %s'), volume['provider_location'])
 
         self._do_create_volume(volume)
+        self._update_volume_files(volume)
 
         return {'provider_location': volume['provider_location']}
 
@@ -257,22 +436,149 @@ class RemoteFSDriver(driver.LocalVD, driver.TransferVD, driver.BaseVD):
 
     def _ensure_shares_mounted(self):
         """Look for remote shares in the flags and mount them locally."""
-        mounted_shares = []
-
         self._load_shares_config(getattr(self.configuration,
                                          self.driver_prefix +
                                          '_shares_config'))
 
-        for share in self.shares.keys():
-            try:
-                self._ensure_share_mounted(share)
+        self._mounted_shares = self._mount_shares(list(self.shares.keys()))
+
+        LOG.debug('Available shares %s', self._mounted_shares)
+
+    def _mount_shares(self, shares):
+        """Mounts shares concurrently, returns the ones mounted."""
+        mounted_shares = []
+        for share, _result, exc in self._run_on_shares(
+                self._ensure_share_mounted, shares):
+            if exc is None:
                 mounted_shares.append(share)
-            except Exception as exc:
+            else:
                 LOG.error(_LE('Exception during mounting %s'), exc)
+        return mounted_shares
 
-        self._mounted_shares = mounted_shares
+    def _run_on_shares(self, func, shares):
+        """Runs func on each share concurrently.
 
-        LOG.debug('Available shares %s', self._mounted_shares)
+        Yields the share, the result and the exception raised, or
+        eventlet.Timeout if func did not return within
+        nas_share_probe_timeout seconds, in the order of shares.  func runs
+        at most once at a time on a share: a call still running, e.g. on a
+        hung share, is waited for again instead of being run once more.
+        The processes it started are killed on timeout.
+        """
+        timeout = self.configuration.nas_share_probe_timeout or None
+        probes = []
+        for share in shares:
+            probe = self._share_probes.get((func, share))
+            if probe is None:
+                probe = eventlet.spawn(self._probe_share, func, share)
+                self._share_probes[(func, share)] = probe
+            probes.append((share, probe))
+
+        deadline = time.time() + timeout if timeout else None
+        for share, probe in probes:
+            remaining = None
+            if deadline is not None:
+                remaining = max(deadline - time.time(), 0)
+            timer = eventlet.Timeout(remaining)
+            try:
+                result, exc = probe.wait()
+            except eventlet.Timeout as expired:
+                if expired is not timer:
+                    raise
+                self._kill_probe_processes(probe)
+                result, exc = None, timer
+            finally:
+                timer.cancel()
+            yield share, result, exc
+
+    def _probe_share(self, func, share):
+        """Returns the result of func on share and the exception raised."""
+        self._probe_processes[eventlet.getcurrent()] = []
+        try:
+            return func(share), None
+        except Exception as exc:
+            return None, exc
+        finally:
+            del self._probe_processes[eventlet.getcurrent()]
+            del self._share_probes[(func, share)]
+
+    def _probe_execute(self, execute):
+        """Wraps execute to record the processes started by share probes."""
+        def _execute(*cmd, **kwargs):
+            processes = self._probe_processes.get(eventlet.getcurrent())
+            if processes is not None:
+                kwargs['on_execute'] = processes.append
+                kwargs['on_completion'] = processes.remove
+            return execute(*cmd, **kwargs)
+        return _execute
+
+    def _kill_probe_processes(self, probe):
+        for process in list(self._probe_processes.get(probe, [])):
+            try:
+                process.kill()
+            except OSError as exc:
+                LOG.warning(_LW('Failed to kill process %(pid)s of a timed '
+                                'out share probe: %(exc)s'),
+                            {'pid': process.pid, 'exc': exc})
+
+    def _get_shares_capacity_info(self, shares):
+        """Returns the capacity info of shares, by share.
+
+        The shares which were not probed within the last
+        nas_share_capacity_cache_ttl seconds are probed concurrently.  Those
+        whose probe times out keep their last known capacity info until it
+        returns, without waiting for it again, and those which can't be
+        probed are left out.
+        """
+        ttl = self.configuration.nas_share_capacity_cache_ttl
+        now = time.time()
+        capacity_info = {}
+        stale_shares = []
+        for share in shares:
+            probed_at, info = self._capacity_info_cache.get(share,
+                                                            (None, None))
+            probing = (self._probe_capacity_info, share) in self._share_probes
+            if probed_at is not None and (now - probed_at < ttl or probing):
+                capacity_info[share] = info
+            else:
+                stale_shares.append(share)
+
+        probes = self._run_on_shares(self._probe_capacity_info, stale_shares)
+        for share, info, exc in probes:
+            if exc is None:
+                capacity_info[share] = info
+            elif (isinstance(exc, eventlet.Timeout) and
+                    share in self._capacity_info_cache):
+                LOG.warning(_LW('Timed out probing the capacity of share '
+                                '%s, using the last known one.'), share)
+                capacity_info[share] = self._capacity_info_cache[share][1]
+            else:
+                LOG.error(_LE('Failed to get the capacity of share '
+                              '%(share)s: %(exc)s'),
+                          {'share': share, 'exc': exc})
+        return capacity_info
+
+    def _probe_capacity_info(self, share):
+        # Cache the capacity info even if the caller timed out meanwhile
+        info = self._get_capacity_info(share)
+        self._capacity_info_cache[share] = (time.time(), info)
+        return info
+
+    def _get_fs_capacity(self, mount_point):
+        """Returns the size and available space of a file system.
+
+        Returns None if it can't be read by the cinder user, callers fall
+        back to running a command as root then.
+        """
+        try:
+            # statvfs blocks on a hung server, keep it off the eventlet hub
+            fs_stat = tpool.execute(os.statvfs, mount_point)
+        except OSError as exc:
+            LOG.debug('Failed to statvfs %(path)s: %(exc)s',
+                      {'path': mount_point, 'exc': exc})
+            return None
+        return (fs_stat.f_frsize * fs_stat.f_blocks,
+                fs_stat.f_frsize * fs_stat.f_bavail)
 
     def delete_volume(self, volume):
         """Deletes a logical volume.
@@ -290,6 +596,7 @@ class RemoteFSDriver(driver.LocalVD, driver.TransferVD, driver.BaseVD):
         mounted_path = self.local_path(volume)
 
         self._delete(mounted_path)
+        self._forget_volume_files(volume)
 
     def ensure_export(self, ctx, volume):
         """Synchronously recreates an export for a logical volume."""
@@ -411,6 +718,7 @@ class RemoteFSDriver(driver.LocalVD, driver.TransferVD, driver.BaseVD):
         # and then verify the final virtual size
         image_utils.resize_image(self.local_path(volume), volume['size'],
                                  run_as_root=run_as_root)
+        self._update_volume_files(volume)
 
         data = image_utils.qemu_img_info(self.local_path(volume),
                                          run_as_root=run_as_root)
@@ -520,8 +828,8 @@ class RemoteFSDriver(driver.LocalVD, driver.TransferVD, driver.BaseVD):
 
         global_capacity = 0
         global_free = 0
-        for share in self._mounted_shares:
-            capacity, free, used = self._get_capacity_info(share)
+        capacity_info = self._get_shares_capacity_info(self._mounted_shares)
+        for capacity, free, used in capacity_info.values():
             global_capacity += capacity
             global_free += free
 
@@ -663,6 +971,16 @@ class RemoteFSSnapDriver(RemoteFSDriver, driver.SnapshotVD):
     def _local_path_volume_info(self, volume):
         return '%s%s' % (self.local_path(volume), '.info')
 
+    def _volume_files(self, volume):
+        """Returns the paths of the files of a volume and its snapshots."""
+        info_path = self._local_path_volume_info(volume)
+        snap_info = self._read_info_file(info_path, empty_if_missing=True)
+        volume_dir = self._local_volume_dir(volume)
+        files = set(os.path.join(volume_dir, snap_file)
+                    for snap_file in snap_info.values())
+        files.update([self.local_path(volume), info_path])
+        return files
+
     def _read_file(self, filename):
         """This method is to make it easier to stub out code for testing.
 
@@ -790,6 +1108,11 @@ class RemoteFSSnapDriver(RemoteFSDriver, driver.SnapshotVD):
         """
         mount_point = self._get_mount_point_for_share(share)
 
+        fs_capacity = self._get_fs_capacity(mount_point)
+        if fs_capacity is not None:
+            size, available = fs_capacity
+            return available, size
+
         out, _ = self._execute('df', '--portability', '--block-size', '1',
                                mount_point,
                                run_as_root=self._execute_as_root)
@@ -1413,22 +1736,31 @@ class RemoteFSSnapDriver(RemoteFSDriver, driver.SnapshotVD):
     def create_snapshot(self, snapshot):
         """Apply locking to the create snapshot operation."""
 
-        return self._create_snapshot(snapshot)
+        result = self._create_snapshot(snapshot)
+        self._update_volume_files(snapshot['volume'])
+        return result
 
     @locked_volume_id_operation
     def delete_snapshot(self, snapshot):
         """Apply locking to the delete snapshot operation."""
 
-        return self._delete_snapshot(snapshot)
+        result = self._delete_snapshot(snapshot)
+        self._update_volume_files(snapshot['volume'])
+        return result
 
     @locked_volume_id_operation
     def create_volume_from_snapshot(self, volume, snapshot):
-        return self._create_volume_from_snapshot(volume, snapshot)
+        result = self._create_volume_from_snapshot(volume, snapshot)
+        self._update_volume_files(volume)
+        return result
 
     @locked_volume_id_operation
     def create_cloned_volume(self, volume, src_vref):
         """Creates a clone of the specified volume."""
-        return self._create_cloned_volume(volume, src_vref)
+        result = self._create_cloned_volume(volume, src_vref)
+        volume['provider_location'] = result['provider_location']
+        self._update_volume_files(volume)
+        return result
 
     @locked_volume_id_operation
     def copy_volume_to_image(self, context, volume, image_service, image_meta):
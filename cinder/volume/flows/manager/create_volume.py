@@ -718,7 +718,10 @@ class CreateVolumeFromSpecTask(flow_utils.CinderTask):
             LOG.warning(_LW('Unable to get Cinder internal context, will '
                             'not use image-volume cache.'))
 
-        if not cloned and internal_context and self.image_volume_cache:
+        # NOTE: The image-volumes of the internal tenant, e.g. pre-warmed
+        # ones, are cache entries themselves.
+        if (not cloned and internal_context and self.image_volume_cache and
+                volume_ref['project_id'] != internal_context.project_id):
             model_update, cloned = self._create_from_image_cache(
                 context,
                 internal_context,
@@ -37,6 +37,7 @@ intact.
 """
 
 
+import math
 import time
 
 from oslo_config import cfg
@@ -60,6 +61,7 @@ from cinder import flow_utils
 from cinder.i18n import _, _LE, _LI, _LW
 from cinder.image import cache as image_cache
 from cinder.image import glance
+from cinder.image import image_utils
 from cinder import manager
 from cinder import objects
 from cinder import quota
@@ -190,7 +192,7 @@ def locked_snapshot_operation(f):
 class VolumeManager(manager.SchedulerDependentManager):
     """Manages attachable block storage devices."""
 
-    RPC_API_VERSION = '1.31'
+    RPC_API_VERSION = '1.32'
 
     target = messaging.Target(version=RPC_API_VERSION)
 
@@ -307,7 +309,8 @@ class VolumeManager(manager.SchedulerDependentManager):
 
         :param ctxt: our working context
         """
-        vol_entries = self.db.volume_get_all(ctxt, None, 1, filters=None)
+        vol_entries = self.db.volume_get_all(ctxt, None, 1, filters=None,
+                                             columns=['id'])
 
         if len(vol_entries) == 0:
             LOG.info(_LI("Determined volume DB was empty at startup."))
@@ -3326,3 +3329,123 @@ class VolumeManager(manager.SchedulerDependentManager):
         capabilities = self.driver.capabilities
         LOG.debug("Obtained capabilities list: %s.", capabilities)
         return capabilities
+
+    def prewarm_image_volume_cache(self, ctxt, image_id, host):
+        """Create an image-volume cache entry for an image ahead of use.
+
+        Lets operators load an image into the cache of a backend before
+        many volumes are created from it, e.g. ahead of a boot storm.  An
+        up to date cache entry of the image is only marked as used.
+        """
+        if not self.image_volume_cache:
+            LOG.warning(_LW('Image-volume cache is disabled on host '
+                            '%(host)s, not pre-warming it with image '
+                            '%(image_id)s.'),
+                        {'host': host, 'image_id': image_id})
+            return
+        internal_context = context.get_internal_tenant_context()
+        if not internal_context:
+            LOG.warning(_LW('Unable to get Cinder internal context, not '
+                            'pre-warming the image-volume cache with image '
+                            '%(image_id)s.'), {'image_id': image_id})
+            return
+        utils.require_driver_initialized(self.driver)
+
+        image_service, image_id = glance.get_remote_image_service(ctxt,
+                                                                  image_id)
+        image_meta = image_service.show(ctxt, image_id)
+        if self.image_volume_cache.get_entry(internal_context,
+                                             {'host': host},
+                                             image_id, image_meta):
+            LOG.info(_LI('Image %(image_id)s is already in the image-volume '
+                         'cache of host %(host)s.'),
+                     {'image_id': image_id, 'host': host})
+            return
+
+        virtual_size = self._get_image_virtual_size(ctxt, image_service,
+                                                    image_id, image_meta)
+        size = max(int(math.ceil(float(virtual_size) / units.Gi)),
+                   image_meta.get('min_disk') or 0, 1)
+        if not self.image_volume_cache.ensure_space(internal_context,
+                                                    size, host):
+            LOG.warning(_LW('Unable to ensure space for image-volume in '
+                            'cache. Will skip pre-warming it with image '
+                            '%(image)s on host %(host)s.'),
+                        {'image': image_id, 'host': host})
+            return
+
+        image_volume = self._create_prewarm_image_volume(
+            internal_context, image_id, size, host)
+        try:
+            # The image is downloaded with the credentials of ctxt, the
+            # internal tenant has none.
+            self.create_volume(ctxt, image_volume.id,
+                               request_spec={'image_id': image_id},
+                               allow_reschedule=False)
+            image_volume = self.db.volume_get(internal_context,
+                                              image_volume.id)
+            if image_volume.status != 'available':
+                raise exception.InvalidVolume(_('Volume is not available.'))
+
+            self.db.volume_admin_metadata_update(internal_context.elevated(),
+                                                 image_volume.id,
+                                                 {'readonly': 'True'},
+                                                 False)
+            self.image_volume_cache.create_cache_entry(
+                internal_context, image_volume, image_id, image_meta)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                LOG.exception(_LE('Failed to pre-warm the image-volume '
+                                  'cache of host %(host)s with image '
+                                  '%(image_id)s.'),
+                              {'host': host, 'image_id': image_id})
+                try:
+                    self.delete_volume(internal_context, image_volume.id)
+                except Exception:
+                    LOG.exception(_LE('Could not delete the image volume '
+                                      '%(id)s.'), {'id': image_volume.id})
+
+        LOG.info(_LI('Pre-warmed the image-volume cache of host %(host)s '
+                     'with image %(image_id)s.'),
+                 {'host': host, 'image_id': image_id})
+
+    def _get_image_virtual_size(self, ctxt, image_service, image_id,
+                                image_meta):
+        """Returns the size in bytes of the disk of an image.
+
+        Bare raw images are as big as their data and recent Glance versions
+        report it for the others, the image is only downloaded to read it
+        otherwise.
+        """
+        if image_meta.get('virtual_size'):
+            return image_meta['virtual_size']
+        if (image_meta.get('disk_format') == 'raw' and
+                image_meta.get('container_format') in (None, 'bare') and
+                image_meta.get('size')):
+            return image_meta['size']
+        with image_utils.TemporaryImages.fetch(image_service, ctxt,
+                                               image_id) as tmp_image:
+            return image_utils.qemu_img_info(tmp_image).virtual_size
+
+    def _create_prewarm_image_volume(self, ctx, image_id, size, host):
+        volume_type_id = volume_types.get_default_volume_type().get('id')
+        reserve_opts = {'volumes': 1, 'gigabytes': size}
+        QUOTAS.add_volume_type_opts(ctx, reserve_opts, volume_type_id)
+        reservations = QUOTAS.reserve(ctx, **reserve_opts)
+        try:
+            image_volume = self.db.volume_create(ctx, {
+                'host': host,
+                'size': size,
+                'status': 'creating',
+                'attach_status': 'detached',
+                'project_id': ctx.project_id,
+                'user_id': ctx.user_id,
+                'availability_zone': CONF.storage_availability_zone,
+                'volume_type_id': volume_type_id,
+                'display_name': 'image-%s' % image_id,
+            })
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                QUOTAS.rollback(ctx, reservations)
+        QUOTAS.commit(ctx, reservations, project_id=ctx.project_id)
+        return image_volume
@@ -79,6 +79,7 @@ class VolumeAPI(object):
         1.31 - Updated: create_consistencygroup_from_src(), create_cgsnapshot()
                and delete_cgsnapshot() to cast method only with necessary
                args. Forwarding CGSnapshot object instead of CGSnapshot_id.
+        1.32 - Adds prewarm_image_volume_cache.
     """
 
     BASE_RPC_API_VERSION = '1.0'
@@ -88,7 +89,7 @@ class VolumeAPI(object):
         target = messaging.Target(topic=CONF.volume_topic,
                                   version=self.BASE_RPC_API_VERSION)
         serializer = objects_base.CinderObjectSerializer()
-        self.client = rpc.get_client(target, '1.31', serializer=serializer)
+        self.client = rpc.get_client(target, '1.32', serializer=serializer)
 
     def create_consistencygroup(self, ctxt, group, host):
         new_host = utils.extract_host(host)
@@ -306,3 +307,9 @@ class VolumeAPI(object):
         new_host = utils.extract_host(host)
         cctxt = self.client.prepare(server=new_host, version='1.29')
         return cctxt.call(ctxt, 'get_capabilities', discover=discover)
+
+    def prewarm_image_volume_cache(self, ctxt, image_id, host):
+        new_host = utils.extract_host(host)
+        cctxt = self.client.prepare(server=new_host, version='1.32')
+        cctxt.cast(ctxt, 'prewarm_image_volume_cache', image_id=image_id,
+                   host=host)
@@ -16,7 +16,10 @@
 
 
 import ast
+import errno
+import io
 import math
+import os
 import re
 import time
 import uuid
@@ -47,6 +50,11 @@ CONF = cfg.CONF
 
 LOG = logging.getLogger(__name__)
 
+# Errors meaning an in-kernel copy is not possible between two descriptors,
+# in which case the data is copied through user space instead.
+_NO_IN_KERNEL_COPY_ERRNOS = (errno.EBADF, errno.EINVAL, errno.ENOSYS,
+                             errno.EOPNOTSUPP, errno.EXDEV)
+
 
 def null_safe_str(s):
     return str(s) if s else ''
@@ -368,38 +376,182 @@ def _open_volume_with_path(path, mode):
         LOG.error(_LE("Failed to open volume from %(path)s."), {'path': path})
 
 
-def _transfer_data(src, dest, length, chunk_size):
-    """Transfer data between files (Python IO objects)."""
-
-    chunks = int(math.ceil(length / chunk_size))
-    remaining_length = length
+def _transfer_data_in_kernel(src, dest, length, chunk_size):
+    """Copy data between two file descriptors without leaving the kernel.
 
-    LOG.debug("%(chunks)s chunks of %(bytes)s bytes to be transferred.",
-              {'chunks': chunks, 'bytes': chunk_size})
+    Uses copy_file_range(2) or sendfile(2) when the platform exposes them
+    and both handles are backed by real file descriptors.  Returns the
+    number of bytes copied, or None if nothing could be copied this way
+    and the caller should fall back to copying through user space.
+    """
+    copy = getattr(os, 'copy_file_range', None)
+    if copy is None and getattr(os, 'sendfile', None):
+        def copy(src_fd, dest_fd, count):
+            return os.sendfile(dest_fd, src_fd, None, count)
+    if copy is None:
+        return None
 
-    for chunk in range(0, chunks):
-        before = time.time()
-        data = tpool.execute(src.read, min(chunk_size, remaining_length))
+    try:
+        src_fd = src.fileno()
+        dest_fd = dest.fileno()
+    except (AttributeError, IOError, OSError, ValueError):
+        return None
 
-        # If we have reached end of source, discard any extraneous bytes from
-        # destination volume if trim is enabled and stop writing.
-        if data == b'':
+    tpool.execute(dest.flush)
+    transferred = 0
+    while transferred < length:
+        try:
+            copied = tpool.execute(copy, src_fd, dest_fd,
+                                   min(chunk_size, length - transferred))
+        except OSError as e:
+            if transferred or e.errno not in _NO_IN_KERNEL_COPY_ERRNOS:
+                raise
+            return None
+        if not copied:
             break
-
-        tpool.execute(dest.write, data)
-        remaining_length -= len(data)
-        delta = (time.time() - before)
-        rate = (chunk_size / delta) / units.Ki
-        LOG.debug("Transferred chunk %(chunk)s of %(chunks)s (%(rate)dK/s).",
-                  {'chunk': chunk + 1, 'chunks': chunks, 'rate': rate})
+        transferred += copied
 
         # yield to any other pending operations
         eventlet.sleep(0)
 
+    return transferred
+
+
+# File objects that are done with the buffer they are given once write()
+# returns.
+_FILE_TYPES = (io.IOBase,)
+if six.PY2:
+    _FILE_TYPES += (six.moves.builtins.file,)
+
+
+def _write_fully(dest, view):
+    """Write a whole buffer, coping with raw handles doing short writes."""
+    if not isinstance(dest, _FILE_TYPES):
+        # Others, e.g. the RBD IO wrappers, may only take bytes or keep a
+        # reference to the data after write() has returned, while the
+        # buffer gets reused for the next read.
+        view = view.tobytes()
+    while len(view):
+        written = dest.write(view)
+        if written is None:
+            # Buffered (or non-io) objects either write everything or raise.
+            return
+        view = view[written:]
+
+
+def _read_chunk(src, view):
+    """Fill a buffer from src, preferring readinto() over read()."""
+    readinto = getattr(src, 'readinto', None)
+    if readinto is not None:
+        try:
+            return readinto(view)
+        except (NotImplementedError, io.UnsupportedOperation):
+            pass
+    data = src.read(len(view))
+    view[:len(data)] = data
+    return len(data)
+
+
+def _is_zero_chunk(view, zeros):
+    return view == zeros[:len(view)]
+
+
+def _dest_supports_sparse(dest):
+    seekable = getattr(dest, 'seekable', None)
+    try:
+        return bool(seekable and seekable())
+    except (IOError, OSError, ValueError):
+        return False
+
+
+def _transfer_data(src, dest, length, chunk_size, sparse=False):
+    """Transfer data between files (Python IO objects).
+
+    When both ends are plain files the copy is done in the kernel where the
+    platform allows it.  Otherwise two preallocated buffers are used so that
+    the next chunk is read from src while the previous one is written to
+    dest.  With sparse set, all-zero chunks are skipped by seeking past them
+    on destinations that support it.
+
+    Returns the number of bytes read from src.
+    """
+
+    chunks = int(math.ceil(length / float(chunk_size)))
+
+    LOG.debug("%(chunks)s chunks of %(bytes)s bytes to be transferred.",
+              {'chunks': chunks, 'bytes': chunk_size})
+
+    if not sparse:
+        transferred = _transfer_data_in_kernel(src, dest, length,
+                                               units.Mi * 64)
+        if transferred is not None:
+            tpool.execute(dest.flush)
+            return transferred
+
+    sparse = sparse and _dest_supports_sparse(dest)
+    zeros = memoryview(bytes(bytearray(chunk_size))) if sparse else None
+    buffers = [memoryview(bytearray(chunk_size)) for _i in range(2)]
+    remaining_length = length
+    transferred = 0
+    skipped = 0
+    pending_write = None
+    ends_with_hole = False
+
+    try:
+        for chunk in range(0, chunks):
+            before = time.time()
+            view = buffers[chunk % 2][:min(chunk_size, remaining_length)]
+            read = tpool.execute(_read_chunk, src, view)
+
+            # Only one write is ever in flight, so the buffer it uses is not
+            # touched until it has completed.
+            if pending_write is not None:
+                pending_write.wait()
+                pending_write = None
+
+            # If we have reached end of source, discard any extraneous bytes
+            # from destination volume if trim is enabled and stop writing.
+            if not read:
+                break
+
+            view = view[:read]
+            if sparse and _is_zero_chunk(view, zeros):
+                tpool.execute(dest.seek, read, os.SEEK_CUR)
+                skipped += read
+                ends_with_hole = True
+            else:
+                pending_write = eventlet.spawn(tpool.execute, _write_fully,
+                                               dest, view)
+                ends_with_hole = False
+            remaining_length -= read
+            transferred += read
+            delta = max(time.time() - before, 1e-6)
+            rate = (read / delta) / units.Mi
+            LOG.debug("Transferred chunk %(chunk)s of %(chunks)s "
+                      "(%(rate).2fM/s).",
+                      {'chunk': chunk + 1, 'chunks': chunks, 'rate': rate})
+
+            # yield to any other pending operations
+            eventlet.sleep(0)
+    finally:
+        if pending_write is not None:
+            pending_write.wait()
+
+    if ends_with_hole:
+        # Seeking does not extend a file, so write the last byte for the
+        # destination to end up with the right size.
+        tpool.execute(dest.seek, -1, os.SEEK_CUR)
+        tpool.execute(_write_fully, dest, zeros[:1])
+
+    if skipped:
+        LOG.debug("Skipped %(skipped)d zero bytes of %(bytes)d.",
+                  {'skipped': skipped, 'bytes': transferred})
+
     tpool.execute(dest.flush)
+    return transferred
 
 
-def _copy_volume_with_file(src, dest, size_in_m):
+def _copy_volume_with_file(src, dest, size_in_m, sparse=False):
     src_handle = src
     if isinstance(src, six.string_types):
         src_handle = _open_volume_with_path(src, 'rb')
@@ -418,7 +570,8 @@ def _copy_volume_with_file(src, dest, size_in_m):
 
     start_time = timeutils.utcnow()
 
-    _transfer_data(src_handle, dest_handle, size_in_m * units.Mi, units.Mi * 4)
+    _transfer_data(src_handle, dest_handle, size_in_m * units.Mi, units.Mi * 4,
+                   sparse=sparse)
 
     duration = max(1, timeutils.delta_seconds(start_time, timeutils.utcnow()))
 
@@ -459,7 +612,7 @@ def copy_volume(src, dest, size_in_m, blocksize, sync=False,
                                    execute=execute, ionice=ionice,
                                    sparse=sparse)
     else:
-        _copy_volume_with_file(src, dest, size_in_m)
+        _copy_volume_with_file(src, dest, size_in_m, sparse=sparse)
 
 
 def clear_volume(volume_size, volume_path, volume_clear=None,
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark batch volume placement against one scheduling pass per volume.
+
+Builds a FilterScheduler over a number of fake backends, with the database
+and volume RPC calls made by the scheduler replaced by no-ops, and times
+placing N volumes with N schedule_create_volume calls versus a single
+schedule_create_volumes call.
+
+Usage: python tools/benchmarks/batch_scheduling.py [--hosts N] [--volumes N]
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+
+import mock
+from oslo_utils import timeutils
+
+from cinder import context
+from cinder import objects
+from cinder.scheduler import filter_scheduler
+
+
+def _services(hosts):
+    return [dict(id=i, host='host%d' % i, topic='volume', disabled=False,
+                 availability_zone='nova', updated_at=timeutils.utcnow())
+            for i in range(hosts)]
+
+
+def _capabilities(hosts):
+    return dict(('host%d' % i, {'volume_backend_name': 'backend%d' % i,
+                                'total_capacity_gb': 100000,
+                                'free_capacity_gb': 50000 + i,
+                                'reserved_percentage': 0,
+                                'timestamp': timeutils.utcnow()})
+                for i in range(hosts))
+
+
+def _scheduler(hosts):
+    sched = filter_scheduler.FilterScheduler()
+    sched.host_manager.service_states = _capabilities(hosts)
+    return sched
+
+
+def _request_spec():
+    return {'volume_type': {'name': 'fake_type', 'extra_specs': {}},
+            'volume_properties': {'project_id': 'fake_project',
+                                  'size': 1}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hosts', type=int, default=500)
+    parser.add_argument('--volumes', type=int, default=200)
+    args = parser.parse_args()
+
+    objects.register_all()
+    ctxt = context.RequestContext('fake_user', 'fake_project', is_admin=True)
+    volume_ids = ['volume-%d' % i for i in range(args.volumes)]
+    with mock.patch('cinder.db.service_get_all_by_topic',
+                    return_value=_services(args.hosts)), \
+            mock.patch('cinder.utils.service_is_up', return_value=True), \
+            mock.patch('cinder.volume.rpcapi.VolumeAPI'), \
+            mock.patch('cinder.db.volume_count_get_all_by_host',
+                       return_value={}), \
+            mock.patch('cinder.scheduler.driver.volume_update_db',
+                       side_effect=lambda c, volume_id, host:
+                       {'id': volume_id, 'host': host}):
+        sched = _scheduler(args.hosts)
+        start = time.time()
+        for volume_id in volume_ids:
+            request_spec = _request_spec()
+            request_spec['volume_id'] = volume_id
+            sched.schedule_create_volume(ctxt, request_spec, {})
+        single = time.time() - start
+
+        sched = _scheduler(args.hosts)
+        start = time.time()
+        placements = sched.schedule_create_volumes(ctxt, _request_spec(), {},
+                                                   volume_ids)
+        batch = time.time() - start
+
+    assert len(placements) == args.volumes
+    print("%d volumes on %d hosts" % (args.volumes, args.hosts))
+    print("single calls: %8.3f s (%8.1f volumes/s)" %
+          (single, args.volumes / single))
+    print("batch call:   %8.3f s (%8.1f volumes/s)" %
+          (batch, args.volumes / batch))
+
+
+if __name__ == '__main__':
+    main()
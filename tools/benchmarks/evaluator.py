@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Micro-benchmark for the scheduler filter/goodness function evaluator.
+
+Measures the per-pool cost of evaluating a typical goodness function the
+way GoodnessWeigher and DriverFilter do, once with the parsed expression
+cache disabled (parse on every call, the old behaviour) and once with it
+enabled.
+
+Usage: python tools/benchmarks/evaluator.py [--pools N] [--requests N]
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import time
+
+from cinder.scheduler.evaluator import evaluator
+
+
+GOODNESS_FUNCTION = ("(capabilities.free_capacity_gb > volume.size * 2) ? "
+                     "max(0, min(100, 100 * capabilities.free_capacity_gb / "
+                     "capabilities.total_capacity_gb)) : 0")
+
+
+def _stats(pools):
+    return [{'capabilities': {'free_capacity_gb': 100 + i,
+                              'total_capacity_gb': 1000},
+             'volume': {'size': 10}}
+            for i in range(pools)]
+
+
+def _run(stats, requests):
+    start = time.time()
+    for _i in range(requests):
+        for pool_stats in stats:
+            evaluator.evaluate(GOODNESS_FUNCTION, **pool_stats)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pools', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=20)
+    args = parser.parse_args()
+
+    stats = _stats(args.pools)
+    evaluations = args.pools * args.requests
+
+    evaluator._EXPRESSION_CACHE_SIZE = 0
+    evaluator._expressions = collections.OrderedDict()
+    uncached = _run(stats, args.requests)
+
+    evaluator._EXPRESSION_CACHE_SIZE = 256
+    evaluator._expressions = collections.OrderedDict()
+    cached = _run(stats, args.requests)
+
+    print("%d pools x %d requests" % (args.pools, args.requests))
+    print("parse per call: %8.1f us/pool" % (uncached / evaluations * 1e6))
+    print("cached parse:   %8.1f us/pool" % (cached / evaluations * 1e6))
+    print("speedup:        %8.1fx" % (uncached / cached))
+
+
+if __name__ == '__main__':
+    main()
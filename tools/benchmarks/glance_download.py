@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark image downloads from glance over several connections.
+
+Serves an image from a local stand-in for the glance API server which
+limits the throughput of each connection, like a single TCP stream over a
+long fat network, and times GlanceImageService.download writing it into a
+file with an increasing number of connections.  The downloaded file is
+checked against the image.
+
+Usage: python tools/benchmarks/glance_download.py [--size-mb N]
+           [--rate-mb N] [--connections N,N,...]
+"""
+
+from __future__ import print_function
+
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+from oslo_config import cfg
+from oslo_utils import units
+import requests
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+
+from cinder.common import config  # noqa
+from cinder import context
+from cinder.image import glance
+
+CONF = cfg.CONF
+
+_CHUNK_SIZE = 64 * units.Ki
+
+
+class ThrottledHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves the image, honoring Range headers, at a limited rate."""
+
+    def do_GET(self):
+        image = self.server.image
+        range_header = self.headers.get('Range')
+        if range_header:
+            start, end = [int(x) for x in
+                          range_header[len('bytes='):].split('-')]
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' %
+                             (start, end, len(image)))
+        else:
+            start, end = 0, len(image) - 1
+            self.send_response(200)
+        self.send_header('Content-Length', str(end + 1 - start))
+        self.end_headers()
+        chunk_time = float(_CHUNK_SIZE) / self.server.rate
+        for offset in range(start, end + 1, _CHUNK_SIZE):
+            self.wfile.write(image[offset:min(offset + _CHUNK_SIZE,
+                                              end + 1)])
+            time.sleep(chunk_time)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThrottledServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, image, rate):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                           ThrottledHandler)
+        self.image = image
+        self.rate = rate
+
+
+class FakeImage(object):
+    def __init__(self, image_id, size, checksum):
+        self.id = image_id
+        self.size = size
+        self.checksum = checksum
+
+
+class FakeGlanceClient(object):
+    """Glance client streaming the image data from the local server."""
+
+    def __init__(self, url, size, checksum):
+        self.url = url
+        self.size = size
+        self.checksum = checksum
+        self.images = self
+
+    def get(self, image_id):
+        return FakeImage(image_id, self.size, self.checksum)
+
+    def data(self, image_id):
+        response = requests.get(self.url % image_id, stream=True)
+        return response.iter_content(_CHUNK_SIZE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=256)
+    parser.add_argument('--rate-mb', type=int, default=32,
+                        help='throughput limit of each connection in MB/s')
+    parser.add_argument('--connections', default='1,2,4,8')
+    args = parser.parse_args()
+
+    CONF([], project='cinder')
+    CONF.set_override('auth_strategy', 'noauth')
+    CONF.set_override('glance_api_version', 2)
+    CONF.set_override('glance_download_min_range_mb', 1)
+
+    image = os.urandom(args.size_mb * units.Mi)
+    checksum = hashlib.md5(image).hexdigest()
+    server = ThrottledServer(image, args.rate_mb * units.Mi)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    netloc = '127.0.0.1:%d' % server.server_address[1]
+    client = FakeGlanceClient('http://%s/v2/images/%%s/file' % netloc,
+                              len(image), checksum)
+    glance._create_glance_client = lambda *args, **kwargs: client
+    service = glance.GlanceImageService(
+        client=glance.GlanceClientWrapper('fake', netloc, False))
+    ctxt = context.get_admin_context()
+
+    print("%d MB image, connections limited to %d MB/s" %
+          (args.size_mb, args.rate_mb))
+    print("%12s %10s %10s %10s" % ('connections', 'seconds', 'MB/s',
+                                   'speedup'))
+    baseline = None
+    try:
+        for connections in [int(c) for c in args.connections.split(',')]:
+            CONF.set_override('glance_download_connections', connections)
+            with tempfile.TemporaryFile() as image_file:
+                start = time.time()
+                service.download(ctxt, 'image', image_file)
+                elapsed = time.time() - start
+                image_file.seek(0)
+                assert hashlib.md5(image_file.read()).hexdigest() == checksum
+            baseline = baseline or elapsed
+            print("%12d %10.2f %10.1f %10.2f" %
+                  (connections, elapsed, args.size_mb / elapsed,
+                   baseline / elapsed))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark deep page retrieval of the paginated volume listing.
+
+Creates a database (a temporary sqlite file unless --connection is given)
+with N volumes in one project and times volume_get_all_by_project fetching
+one page at increasing depths using offset, a marker id and a continuation
+token with the sort key values of the marker.
+
+Usage: python tools/benchmarks/pagination.py [--volumes N] [--limit N]
+"""
+
+from __future__ import print_function
+
+import argparse
+import datetime
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+from oslo_config import cfg
+from oslo_utils import timeutils
+
+from cinder.common import config  # noqa
+from cinder.common import sqlalchemyutils
+from cinder import context
+from cinder.db import migration
+from cinder.db.sqlalchemy import api as sqlalchemy_api
+from cinder.db.sqlalchemy import models
+from cinder import objects
+
+CONF = cfg.CONF
+
+
+def _populate(count):
+    now = timeutils.utcnow()
+    rows = [{'id': str(uuid.uuid4()),
+             'project_id': 'fake_project',
+             'user_id': 'fake_user',
+             'size': 1,
+             'status': 'available',
+             'deleted': False,
+             'created_at': now - datetime.timedelta(seconds=i)}
+            for i in range(count)]
+    session = sqlalchemy_api.get_session()
+    with session.begin():
+        for start in range(0, count, 1000):
+            session.execute(models.Volume.__table__.insert(),
+                            rows[start:start + 1000])
+    # Rows sorted as in the default listing: created_at desc, id desc
+    return sorted(rows, key=lambda r: (r['created_at'], r['id']),
+                  reverse=True)
+
+
+def _time(func, repeat):
+    start = time.time()
+    for _i in range(repeat):
+        result = func()
+    return (time.time() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--volumes', type=int, default=100000)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--connection', default=None)
+    args = parser.parse_args()
+
+    tmpdir = None
+    connection = args.connection
+    if connection is None:
+        tmpdir = tempfile.mkdtemp()
+        connection = 'sqlite:///' + os.path.join(tmpdir, 'cinder.sqlite')
+    CONF([], project='cinder')
+    CONF.set_override('connection', connection, 'database')
+
+    try:
+        objects.register_all()
+        migration.db_sync()
+        rows = _populate(args.volumes)
+        ctxt = context.RequestContext('fake_user', 'fake_project',
+                                      is_admin=True)
+
+        def get_page(marker=None, offset=None):
+            return sqlalchemy_api.volume_get_all_by_project(
+                ctxt, 'fake_project', marker, args.limit, offset=offset)
+
+        print("%d volumes, pages of %d, times in ms" %
+              (args.volumes, args.limit))
+        print("%10s %10s %10s %10s" % ('depth', 'offset', 'marker', 'token'))
+        depth = args.limit
+        while depth < args.volumes:
+            last = rows[depth - 1]
+            token = sqlalchemyutils.encode_marker(
+                {'id': last['id'], 'created_at': last['created_at']})
+            by_offset, page1 = _time(lambda: get_page(offset=depth),
+                                     args.repeat)
+            by_marker, page2 = _time(lambda: get_page(marker=last['id']),
+                                     args.repeat)
+            by_token, page3 = _time(lambda: get_page(marker=token),
+                                    args.repeat)
+            expected = [r['id'] for r in rows[depth:depth + args.limit]]
+            for page in (page1, page2, page3):
+                assert [v['id'] for v in page] == expected
+            print("%10d %10.2f %10.2f %10.2f" %
+                  (depth, by_offset, by_marker, by_token))
+            depth *= 4
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark concurrent quota reservations of volumes in one project.
+
+Runs N greenthreads which each create volumes in the same project the way
+the volume API does: reserve the volumes and gigabytes quotas, create the
+volume row and commit the reservations.  Volumes are either reserved one
+at a time or all the volumes of a greenthread with one batch reservation.
+Reports the throughput and the number of deadlocks retried by the DB API.
+
+The database is a temporary sqlite file unless --connection is given;
+deadlocks only happen on a database with row locking, e.g. MySQL.
+
+Usage: python tools/benchmarks/quota_reservation.py [--threads N]
+           [--volumes N] [--connection URL]
+"""
+
+from __future__ import print_function
+
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from oslo_config import cfg
+
+from cinder.common import config  # noqa
+from cinder import context
+from cinder import db
+from cinder.db import migration
+from cinder import exception
+from cinder import objects
+from cinder import quota
+
+CONF = cfg.CONF
+QUOTAS = quota.QUOTAS
+
+
+class DeadlockCounter(logging.Handler):
+    """Count the deadlock retries logged by the DB API."""
+
+    def __init__(self):
+        super(DeadlockCounter, self).__init__()
+        self.count = 0
+
+    def emit(self, record):
+        if 'Deadlock detected' in record.getMessage():
+            self.count += 1
+
+
+def _create_volume(ctxt, size):
+    return db.volume_create(ctxt, {'project_id': ctxt.project_id,
+                                   'user_id': ctxt.user_id,
+                                   'size': size,
+                                   'status': 'creating'})
+
+
+def _create_single(ctxt, count, size, stats):
+    for _i in range(count):
+        try:
+            reservations = QUOTAS.reserve(ctxt, volumes=1, gigabytes=size)
+        except exception.OverQuota:
+            stats['over_quota'] += 1
+            continue
+        _create_volume(ctxt, size)
+        QUOTAS.commit(ctxt, reservations)
+        stats['created'] += 1
+
+
+def _create_batch(ctxt, count, size, stats):
+    deltas_list = [dict(volumes=1, gigabytes=size) for _i in range(count)]
+    try:
+        reservations = QUOTAS.reserve_batch(ctxt, deltas_list)
+    except exception.OverQuota:
+        stats['over_quota'] += count
+        return
+    for item_reservations in reservations:
+        _create_volume(ctxt, size)
+        QUOTAS.commit(ctxt, item_reservations)
+        stats['created'] += 1
+
+
+def _run(ctxt, func, threads, volumes, size):
+    stats = {'created': 0, 'over_quota': 0}
+    pool = eventlet.GreenPool(threads)
+    start = time.time()
+    for _i in range(threads):
+        pool.spawn_n(func, ctxt, volumes, size, stats)
+    pool.waitall()
+    stats['elapsed'] = time.time() - start
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=50)
+    parser.add_argument('--volumes', type=int, default=20,
+                        help='volumes created by each greenthread')
+    parser.add_argument('--size', type=int, default=1)
+    parser.add_argument('--connection', default=None)
+    args = parser.parse_args()
+
+    tmpdir = None
+    connection = args.connection
+    if connection is None:
+        tmpdir = tempfile.mkdtemp()
+        connection = 'sqlite:///' + os.path.join(tmpdir, 'cinder.sqlite')
+    CONF([], project='cinder')
+    CONF.set_override('connection', connection, 'database')
+    CONF.set_override('quota_volumes', -1)
+    CONF.set_override('quota_gigabytes', -1)
+
+    deadlocks = DeadlockCounter()
+    logging.getLogger('cinder.db.sqlalchemy.api').addHandler(deadlocks)
+
+    try:
+        objects.register_all()
+        migration.db_sync()
+
+        print("%d greenthreads creating %d volumes each" %
+              (args.threads, args.volumes))
+        print("%8s %10s %10s %10s %10s" %
+              ('mode', 'created', 'seconds', 'volumes/s', 'deadlocks'))
+        for mode, func in (('single', _create_single),
+                           ('batch', _create_batch)):
+            ctxt = context.RequestContext('fake_user', 'project_' + mode,
+                                          is_admin=True)
+            deadlocks.count = 0
+            stats = _run(ctxt, func, args.threads, args.volumes, args.size)
+            print("%8s %10d %10.2f %10.1f %10d" %
+                  (mode, stats['created'], stats['elapsed'],
+                   stats['created'] / stats['elapsed'], deadlocks.count))
+            usages = db.quota_usage_get_all_by_project(ctxt, ctxt.project_id)
+            assert usages['volumes'] == {'in_use': stats['created'],
+                                         'reserved': 0}
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark RBD volume creates and deletes with pooled RADOS connections.
+
+Runs N greenthreads which each create and delete volumes with the RBD
+volume driver, on top of fake rados and rbd modules: connecting to the
+cluster blocks for the time of a monitor handshake and each librbd call
+blocks its native thread for the time of an operation.  Reports the
+throughput and the number of connections opened, with the connection pool
+disabled and enabled.
+
+Usage: python tools/benchmarks/rbd_connections.py [--threads N]
+           [--volumes N] [--handshake-ms N] [--op-ms N] [--pool-sizes N,N]
+"""
+
+from __future__ import print_function
+
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import time
+
+from oslo_config import cfg
+
+from cinder.common import config  # noqa
+from cinder.volume import configuration
+from cinder.volume.drivers import rbd as rbd_driver
+
+CONF = cfg.CONF
+
+# librados and librbd calls are not green, they block the calling thread
+_blocking_sleep = eventlet.patcher.original('time').sleep
+
+
+class FakeRados(object):
+    """Stand-in for the rados module."""
+
+    class Error(Exception):
+        pass
+
+    def __init__(self, handshake_time):
+        self.handshake_time = handshake_time
+        self.connections = 0
+
+    def Rados(self, **kwargs):
+        return FakeCluster(self)
+
+
+class FakeCluster(object):
+    def __init__(self, rados):
+        self.rados = rados
+        self.state = 'configuring'
+
+    def connect(self, timeout=None):
+        _blocking_sleep(self.rados.handshake_time)
+        self.rados.connections += 1
+        self.state = 'connected'
+
+    def open_ioctx(self, pool):
+        return FakeIoctx(pool)
+
+    def conf_get(self, option):
+        return None
+
+    def shutdown(self):
+        self.state = 'shutdown'
+
+
+class FakeIoctx(object):
+    def __init__(self, pool):
+        self.pool = pool
+
+    def close(self):
+        pass
+
+
+class FakeRBD(object):
+    """Stand-in for the rbd module, with the images kept in memory."""
+
+    RBD_FEATURE_LAYERING = 1
+
+    class Error(Exception):
+        pass
+
+    class ImageNotFound(Error):
+        pass
+
+    class ImageBusy(Error):
+        pass
+
+    def __init__(self, op_time):
+        self.op_time = op_time
+        self.images = set()
+
+    def RBD(self):
+        return self
+
+    def create(self, ioctx, name, size, order, old_format, features):
+        _blocking_sleep(self.op_time)
+        self.images.add(name)
+
+    def remove(self, ioctx, name):
+        _blocking_sleep(self.op_time)
+        self.images.remove(name)
+
+    def Image(self, ioctx, name, snapshot=None, read_only=False):
+        _blocking_sleep(self.op_time)
+        if name not in self.images:
+            raise self.ImageNotFound(name)
+        return FakeImage(self)
+
+
+class FakeImage(object):
+    def __init__(self, rbd):
+        self.rbd = rbd
+
+    def list_snaps(self):
+        return []
+
+    def parent_info(self):
+        raise self.rbd.ImageNotFound()
+
+    def set_snap(self, name):
+        pass
+
+    def close(self):
+        pass
+
+
+def _create_delete(volume_driver, thread, count):
+    for i in range(count):
+        volume = {'name': 'volume-%d-%d' % (thread, i), 'size': 1}
+        volume_driver.create_volume(volume)
+        volume_driver.delete_volume(volume)
+
+
+def _run(args, pool_size):
+    CONF.set_override('rados_connection_pool_size', pool_size)
+    fake_rados = FakeRados(args.handshake_ms / 1000.0)
+    fake_rbd = FakeRBD(args.op_ms / 1000.0)
+    volume_driver = rbd_driver.RBDDriver(
+        configuration=configuration.Configuration(rbd_driver.rbd_opts),
+        rados=fake_rados, rbd=fake_rbd)
+
+    pool = eventlet.GreenPool(args.threads)
+    start = time.time()
+    for thread in range(args.threads):
+        pool.spawn_n(_create_delete, volume_driver, thread, args.volumes)
+    pool.waitall()
+    elapsed = time.time() - start
+    assert not fake_rbd.images
+    return elapsed, fake_rados.connections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--volumes', type=int, default=50,
+                        help='volumes created and deleted by each '
+                             'greenthread')
+    parser.add_argument('--handshake-ms', type=float, default=20,
+                        help='time to connect to the cluster')
+    parser.add_argument('--op-ms', type=float, default=2,
+                        help='time of each librbd call')
+    parser.add_argument('--pool-sizes', default='0,4')
+    args = parser.parse_args()
+
+    CONF([], project='cinder')
+
+    total = args.threads * args.volumes
+    print("%d greenthreads creating and deleting %d volumes each" %
+          (args.threads, args.volumes))
+    print("%10s %10s %10s %12s %10s" %
+          ('pool size', 'seconds', 'volumes/s', 'connections', 'speedup'))
+    baseline = None
+    for pool_size in [int(size) for size in args.pool_sizes.split(',')]:
+        elapsed, connections = _run(args, pool_size)
+        baseline = baseline or elapsed
+        print("%10d %10.2f %10.1f %12d %10.2f" %
+              (pool_size, elapsed, total / elapsed, connections,
+               baseline / elapsed))
+
+
+if __name__ == '__main__':
+    main()